@@ -4,24 +4,68 @@ This library provides clients and associated models for communicating with Azure
 from an IoT device.
 """
 
-from .iothub import *
-from .provisioning import *
-from .common import *
-from . import iothub
-from . import provisioning
-from . import common
-from . import patch
 import sys
+import importlib
 
-if sys.version_info > (3, 5):  # This only works for python 3.5+ at present
-    # Dynamically patch the clients to add shim implementations for all the inherited methods.
-    # This is necessary to generate accurate online docs.
-    # It SHOULD not impact the functionality of the methods themselves in any way.
-    patch.add_shims_for_inherited_methods(IoTHubDeviceClient)  # noqa: F405
-    patch.add_shims_for_inherited_methods(IoTHubModuleClient)  # noqa: F405
-    patch.add_shims_for_inherited_methods(ProvisioningDeviceClient)  # noqa: F405
+# Maps each public name to the subpackage that defines it.  Subpackages are only imported the
+# first time one of their names is accessed, so that (for example) an application which only
+# uses IoT Hub does not pay for importing provisioning.
+_lazy_attributes = {
+    "IoTHubDeviceClient": "iothub",
+    "IoTHubModuleClient": "iothub",
+    "Message": "iothub",
+    "InboxEmpty": "iothub",
+    "MethodResponse": "iothub",
+    "RateLimits": "iothub",
+    "decode_timeseries": "iothub",
+    "connect_all": "iothub",
+    "ProvisioningDeviceClient": "provisioning",
+    "RegistrationResult": "provisioning",
+    "RegistrationCache": "provisioning",
+    "X509": "common",
+    "shutdown_executors": "common.executors",
+}
+_lazy_subpackages = ("iothub", "provisioning", "common", "aio", "patch")
 
+__all__ = [
+    "IoTHubDeviceClient",
+    "IoTHubModuleClient",
+    "Message",
+    "InboxEmpty",
+    "MethodResponse",
+    "RateLimits",
+    "decode_timeseries",
+    "connect_all",
+    "ProvisioningDeviceClient",
+    "RegistrationResult",
+    "RegistrationCache",
+    "shutdown_executors",
+]
 
-# iothub and common subpackages are still showing up in intellisense
+if sys.version_info >= (3, 7):
+    # Module level __getattr__ (PEP 562) is only available in Python 3.7+
 
-__all__ = iothub.__all__ + provisioning.__all__
+    def __getattr__(name):
+        if name in _lazy_attributes:
+            subpackage = importlib.import_module("." + _lazy_attributes[name], __name__)
+            value = getattr(subpackage, name)
+        elif name in _lazy_subpackages:
+            value = importlib.import_module("." + name, __name__)
+        else:
+            raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+        # Cache the value so that __getattr__ is not called again for this name
+        globals()[name] = value
+        return value
+
+    def __dir__():
+        return sorted(set(globals()) | set(_lazy_attributes) | set(_lazy_subpackages))
+
+else:
+    from .iothub import *
+    from .provisioning import *
+    from .common import *
+    from .common.executors import shutdown_executors
+    from . import iothub
+    from . import provisioning
+    from . import common
+    from . import patch
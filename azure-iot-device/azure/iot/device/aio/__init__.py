@@ -4,13 +4,34 @@ This library provides asynchronous clients for communicating with Azure IoT serv
 from an IoT device.
 """
 
-from azure.iot.device.iothub.aio import *
-from azure.iot.device.provisioning.aio import *
-from azure.iot.device import patch
-
-# Dynamically patch the clients to add shim implementations for all the inherited methods.
-# This is necessary to generate accurate online docs.
-# It SHOULD not impact the functionality of the methods themselves in any way.
-patch.add_shims_for_inherited_methods(IoTHubDeviceClient)  # noqa: F405
-patch.add_shims_for_inherited_methods(IoTHubModuleClient)  # noqa: F405
-patch.add_shims_for_inherited_methods(ProvisioningDeviceClient)  # noqa: F405
+import sys
+import importlib
+
+# Maps each public name to the subpackage that defines it.  Subpackages are only imported the
+# first time one of their names is accessed.
+_lazy_attributes = {
+    "IoTHubDeviceClient": "azure.iot.device.iothub.aio",
+    "IoTHubModuleClient": "azure.iot.device.iothub.aio",
+    "connect_all": "azure.iot.device.iothub.aio",
+    "ProvisioningDeviceClient": "azure.iot.device.provisioning.aio",
+}
+
+__all__ = ["IoTHubDeviceClient", "IoTHubModuleClient", "connect_all", "ProvisioningDeviceClient"]
+
+if sys.version_info >= (3, 7):
+    # Module level __getattr__ (PEP 562) is only available in Python 3.7+
+
+    def __getattr__(name):
+        if name not in _lazy_attributes:
+            raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+        value = getattr(importlib.import_module(_lazy_attributes[name]), name)
+        # Cache the value so that __getattr__ is not called again for this name
+        globals()[name] = value
+        return value
+
+    def __dir__():
+        return sorted(set(globals()) | set(_lazy_attributes))
+
+else:
+    from azure.iot.device.iothub.aio import *
+    from azure.iot.device.provisioning.aio import *
@@ -0,0 +1,83 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for
+# license information.
+# --------------------------------------------------------------------------
+"""This module contains helpers for handling message payloads without unnecessary copies.
+
+Payloads may be text, bytes, bytearray, or any other object supporting the buffer protocol
+(memoryview, array.array, NumPy arrays, ...).  Text is encoded exactly once, bytes and bytearray
+payloads are never copied, and other buffers are only copied when they do not simply wrap an
+entire bytes or bytearray object.
+"""
+
+import json
+import sys
+import six
+
+# json.loads() only accepts bytes on Python 3.6+ (and on Python 2, where bytes is str)
+_json_accepts_bytes = six.PY2 or sys.version_info >= (3, 6)
+
+
+def to_bytes_like(payload):
+    """
+    Convert a payload to bytes or bytearray, copying it only if unavoidable.
+
+    Note that a bytearray (or a view over an entire bytearray) is returned as is, so it must not be
+    modified until the payload has been sent.
+
+    :param payload: The payload.  None and numbers are returned unchanged.
+    :returns: The payload as bytes or bytearray, or the original payload if it is None or a number.
+    :raises: TypeError if the payload is not text, a number, None or a buffer.
+    """
+    if payload is None or isinstance(payload, (six.binary_type, bytearray)):
+        return payload
+    if isinstance(payload, six.text_type):
+        return payload.encode("utf-8")
+    if isinstance(payload, six.integer_types + (float,)):
+        return payload
+    view = memoryview(payload)
+    wrapped = getattr(view, "obj", None)
+    if (
+        isinstance(wrapped, (six.binary_type, bytearray))
+        and getattr(view, "c_contiguous", True)
+        and view.nbytes == len(wrapped)
+    ):
+        return wrapped
+    return view.tobytes()
+
+
+def get_size(payload):
+    """
+    Get the number of bytes that a payload takes up on the wire, without converting it.
+
+    :param payload: The payload.
+    :returns: The size of the payload in bytes.
+    """
+    if payload is None:
+        return 0
+    elif isinstance(payload, six.text_type):
+        return len(payload.encode("utf-8"))
+    elif isinstance(payload, (six.binary_type, bytearray)):
+        return len(payload)
+    elif isinstance(payload, six.integer_types + (float,)):
+        # Numbers are sent as their string representation
+        return len(str(payload))
+    else:
+        return memoryview(payload).nbytes
+
+
+def parse_json(payload):
+    """
+    Parse a JSON payload, directly from bytes where possible, rather than decoding it to text first.
+
+    :param payload: The UTF-8 encoded JSON payload, as bytes, bytearray, another buffer, or text.
+    :returns: The parsed JSON.
+    :raises: ValueError if the payload is not valid JSON.
+    """
+    if isinstance(payload, six.text_type):
+        return json.loads(payload)
+    payload = to_bytes_like(payload)
+    if _json_accepts_bytes:
+        return json.loads(payload)
+    return json.loads(payload.decode("utf-8"))
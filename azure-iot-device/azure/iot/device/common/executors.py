@@ -0,0 +1,31 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for
+# license information.
+# --------------------------------------------------------------------------
+"""This module stops the background threads which are shared by every client in the process.
+"""
+
+import logging
+from azure.iot.device.common import timer_scheduler
+from azure.iot.device.common.pipeline import pipeline_thread, pipeline_stages_mqtt
+
+logger = logging.getLogger(__name__)
+
+
+def shutdown_executors():
+    """Stop the background threads which are shared by every client in the process.
+
+    The pipeline and callback threads, the threads used to connect, and the timer thread are
+    created the first time a client needs them, and are not stopped when a client shuts down,
+    since other clients in the process may still be using them.  Applications which need these
+    threads to be gone, such as ones which are stopped and redeployed in the same interpreter,
+    should call this at exit, once every IoT Hub and provisioning client has been shut down.
+
+    Work which has already been handed to the threads is allowed to finish, but timers which
+    have not fired yet are discarded.  The threads are created again if a client is used later.
+    """
+    logger.info("Shutting down shared executors")
+    pipeline_thread.shutdown_executors()
+    pipeline_stages_mqtt.shutdown_connect_executor()
+    timer_scheduler.get_scheduler().shutdown()
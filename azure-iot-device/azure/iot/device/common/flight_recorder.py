@@ -0,0 +1,174 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for
+# license information.
+# --------------------------------------------------------------------------
+"""This module contains an optional in-memory "flight recorder" for the pipeline.
+
+When enabled, the pipeline records a fixed-size binary entry for each step in the lifecycle of
+every operation (run, pass, complete, fail) and every event into a ring buffer.  Recording never
+formats strings or allocates per entry, so it is cheap enough to leave on in production.  When
+something goes wrong, the recent history can be dumped to the log or retrieved programmatically.
+
+The recorder is disabled by default, in which case the cost to the pipeline is a single
+module attribute check per step.
+"""
+
+import logging
+import struct
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+OP_RUN = 1
+OP_PASS = 2
+OP_COMPLETE = 3
+OP_FAIL = 4
+EVENT = 5
+
+_kind_names = {
+    OP_RUN: "run",
+    OP_PASS: "pass",
+    OP_COMPLETE: "complete",
+    OP_FAIL: "fail",
+    EVENT: "event",
+}
+
+# timestamp (double), kind (unsigned char), stage name index (unsigned short),
+# op/event name index (unsigned short), op/event identity (unsigned int)
+_entry = struct.Struct("<dBHHI")
+
+
+class FlightRecorder(object):
+    """
+    A ring buffer of the most recent pipeline operation lifecycle steps.
+
+    Stage and operation names are interned into small integers, so each entry occupies a fixed
+    number of bytes in a preallocated buffer.  Once the buffer is full, the oldest entries are
+    overwritten.
+
+    All methods implemented in this class are threadsafe.
+    """
+
+    def __init__(self, capacity=1024):
+        """
+        Initializer for FlightRecorder.
+        :param int capacity: The maximum number of entries to keep.
+        """
+        if capacity <= 0:
+            raise ValueError("capacity must be greater than 0")
+        self.capacity = capacity
+        self._buffer = bytearray(_entry.size * capacity)
+        self._next = 0
+        self._count = 0
+        self._names = []
+        self._name_indexes = {}
+        self._lock = threading.Lock()
+
+    def _intern(self, name):
+        # Must be called with self._lock held
+        index = self._name_indexes.get(name)
+        if index is None:
+            index = len(self._names)
+            self._names.append(name)
+            self._name_indexes[name] = index
+        return index
+
+    def record(self, kind, stage_name, item_name, item_id):
+        """
+        Add an entry to the recorder.
+        :param int kind: One of OP_RUN, OP_PASS, OP_COMPLETE, OP_FAIL or EVENT.
+        :param str stage_name: The name of the stage where the step occurred.
+        :param str item_name: The name of the operation or event.
+        :param int item_id: A number which identifies the operation or event, such as its id().
+        """
+        timestamp = time.time()
+        with self._lock:
+            _entry.pack_into(
+                self._buffer,
+                self._next * _entry.size,
+                timestamp,
+                kind,
+                self._intern(stage_name),
+                self._intern(item_name),
+                item_id & 0xFFFFFFFF,
+            )
+            self._next = (self._next + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def get_entries(self):
+        """
+        Get the recorded entries, oldest first.
+        :returns: A list of (timestamp, kind name, stage name, operation or event name, id) tuples.
+        """
+        with self._lock:
+            buffer = bytes(self._buffer)
+            names = list(self._names)
+            start = (self._next - self._count) % self.capacity
+            count = self._count
+        entries = []
+        for i in range(count):
+            timestamp, kind, stage_index, item_index, item_id = _entry.unpack_from(
+                buffer, ((start + i) % self.capacity) * _entry.size
+            )
+            entries.append(
+                (timestamp, _kind_names[kind], names[stage_index], names[item_index], item_id)
+            )
+        return entries
+
+    def clear(self):
+        """
+        Remove all entries from the recorder.
+        """
+        with self._lock:
+            self._next = 0
+            self._count = 0
+
+    def dump(self, log=None):
+        """
+        Write the recorded entries to a logger, oldest first.
+        :param log: The logger to write to.  Defaults to the logger for this module.
+        """
+        log = log or logger
+        entries = self.get_entries()
+        log.error("Pipeline flight recorder: {} most recent entries".format(len(entries)))
+        for timestamp, kind, stage_name, item_name, item_id in entries:
+            log.error(
+                "{:.6f} {:<8} {}({}) id={:08x}".format(timestamp, kind, stage_name, item_name, item_id)
+            )
+
+
+# The active recorder.  The pipeline checks this attribute directly, so that recording costs
+# nothing more than an attribute lookup when it is disabled.
+recorder = None
+
+
+def enable(capacity=1024):
+    """
+    Start recording pipeline operation lifecycles.
+    :param int capacity: The maximum number of entries to keep.
+    :returns: The active FlightRecorder.
+    """
+    global recorder
+    recorder = FlightRecorder(capacity)
+    return recorder
+
+
+def disable():
+    """
+    Stop recording pipeline operation lifecycles and discard the recorded entries.
+    """
+    global recorder
+    recorder = None
+
+
+def dump(log=None):
+    """
+    Write the entries from the active recorder to a logger.  Does nothing if the recorder is
+    not enabled.
+    :param log: The logger to write to.  Defaults to the logger for this module.
+    """
+    active_recorder = recorder
+    if active_recorder:
+        active_recorder.dump(log)
@@ -0,0 +1,41 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for
+# license information.
+# --------------------------------------------------------------------------
+"""This module contains a cheap generator for the ids used to match requests with responses."""
+
+import binascii
+import itertools
+import os
+
+
+class RequestIdGenerator(object):
+    """
+    Generates short, unique request ids made up of a random prefix followed by an increasing
+    counter, both in hex.
+
+    Only the prefix comes from os.urandom(), so generating an id costs a counter increment and a
+    string format instead of a uuid4.  The counter is never reset, so ids stay unique for the
+    lifetime of the generator even if the prefix is renewed.  The random prefix keeps them from
+    colliding with ids from other generators, including those from earlier processes.
+
+    All methods implemented in this class are threadsafe.
+    """
+
+    def __init__(self):
+        self._counter = itertools.count(1)
+        self.renew_prefix()
+
+    def renew_prefix(self):
+        """
+        Start using a new random prefix, for example at the start of a new connection.
+        """
+        self._prefix = binascii.hexlify(os.urandom(4)).decode("ascii")
+
+    def next_id(self):
+        """
+        Generate a new request id.
+        :returns: The request id as a str.
+        """
+        return "{}{:x}".format(self._prefix, next(self._counter))
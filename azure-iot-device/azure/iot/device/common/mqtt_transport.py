@@ -6,10 +6,19 @@
 
 import paho.mqtt.client as mqtt
 import logging
+import os
+import socket
 import ssl
 import threading
+import time
 import traceback
+import weakref
+import functools
 from . import errors
+from . import buffers
+from . import timer_scheduler
+from .priority_queue import PriorityQueue
+from .statistics import Counters
 
 logger = logging.getLogger(__name__)
 
@@ -64,6 +73,54 @@ def _create_error_from_rc_code(rc):
         return errors.ProtocolClientError("Unknown CONACK rc={}".format(rc))
 
 
+# The keepalive interval used if none is given, which is the same as Paho's default
+DEFAULT_KEEP_ALIVE = 60
+
+# Weight given to each new round trip time measurement in the smoothed round trip time, as in
+# TCP's smoothed RTT (RFC 6298)
+_ROUND_TRIP_TIME_GAIN = 0.125
+
+# The maximum number of QoS 1 and 2 publishes handed to Paho and waiting for acknowledgement, which
+# is the same as Paho's own limit.  Further publishes wait in the transport, where messages with a
+# higher priority can overtake them, rather than in Paho's queue, which is strictly in order.
+MAX_PUBLISHES_IN_FLIGHT = 20
+
+# SSLContexts shared by all transports with the same certificate configuration, so that CA
+# bundles and client certificates are only parsed once per process.  Contexts are dropped from
+# the cache once no transport is using them.
+_ssl_contexts = weakref.WeakValueDictionary()
+_ssl_contexts_lock = threading.Lock()
+
+
+def _get_file_modified_time(path):
+    try:
+        return os.path.getmtime(path)
+    except (OSError, IOError):
+        # Let loading the certificate report the problem
+        return None
+
+
+class _SessionResumingContext(object):
+    """
+    A wrapper around a (possibly shared) SSLContext which offers the TLS session from this
+    transport's previous connection when Paho wraps a new socket, so that reconnecting can use an
+    abbreviated handshake.  Sessions are kept per transport, since a session carries the identity
+    that was authenticated by the client certificate.
+    """
+
+    def __init__(self, context):
+        self.context = context
+        self.session = None
+
+    def wrap_socket(self, sock, **kwargs):
+        if self.session is not None:
+            kwargs["session"] = self.session
+        return self.context.wrap_socket(sock, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.context, name)
+
+
 class MQTTTransport(object):
     """
     A wrapper class that provides an implementation-agnostic MQTT message broker interface.
@@ -78,7 +135,17 @@ class MQTTTransport(object):
     :type on_mqtt_connection_failure_handler: Function
     """
 
-    def __init__(self, client_id, hostname, username, ca_cert=None, x509_cert=None):
+    def __init__(
+        self,
+        client_id,
+        hostname,
+        username,
+        ca_cert=None,
+        x509_cert=None,
+        keep_alive=None,
+        ping_timeout=None,
+        max_round_trip_time=None,
+    ):
         """
         Constructor to instantiate an MQTT protocol wrapper.
         :param str client_id: The id of the client connecting to the broker.
@@ -86,6 +153,14 @@ class MQTTTransport(object):
         :param str username: Username for login to the remote broker.
         :param str ca_cert: Certificate which can be used to validate a server-side TLS connection (optional).
         :param x509_cert: Certificate which can be used to authenticate connection to a server in lieu of a password (optional).
+        :param int keep_alive: The maximum number of seconds between packets sent to the broker.  When the
+          connection is otherwise idle, a PINGREQ is sent at this interval (optional, defaults to 60).
+        :param float ping_timeout: The number of seconds to wait for a PINGRESP before treating the connection
+          as dead and dropping it, so that it is re-established.  If not provided, Paho drops the connection
+          when no PINGRESP arrives within the keepalive interval (optional).
+        :param float max_round_trip_time: The number of seconds the smoothed round trip time of the
+          keepalive pings may reach before the connection is treated as degraded and dropped, so that
+          it is re-established.  If not provided, the round trip time is only measured (optional).
         """
         self._client_id = client_id
         self._hostname = hostname
@@ -93,6 +168,38 @@ class MQTTTransport(object):
         self._mqtt_client = None
         self._ca_cert = ca_cert
         self._x509_cert = x509_cert
+        self._keep_alive = keep_alive or DEFAULT_KEEP_ALIVE
+        self._ping_timeout = ping_timeout
+        self._max_round_trip_time = max_round_trip_time
+
+        # Time the outstanding PINGREQ was sent, and the timer which drops the connection if its
+        # PINGRESP does not arrive in time.  Pings are sent and answered on Paho's network thread,
+        # while the timer fires on the scheduler thread, so these are guarded by self._ping_lock.
+        self._ping_lock = threading.Lock()
+        self._ping_sent_time = None
+        self._ping_timer = None
+        self._round_trip_time = None
+
+        # Publishes waiting to be handed to Paho, and the number of QoS 1 and 2 publishes which
+        # have been handed to Paho and not acknowledged yet.  Only one thread hands publishes to
+        # Paho at a time (the one which set self._sending), so that publishes with the same
+        # priority are sent in the order they were made.
+        self._outbound = PriorityQueue()
+        self._outbound_lock = threading.Lock()
+        self._publishes_in_flight = 0
+        self._sending = False
+
+        # Notified whenever a publish is acknowledged or the connection drops, so that shutdown()
+        # can wait for outstanding publishes.  Guarded by self._outbound_lock.
+        self._outbound_changed = threading.Condition(self._outbound_lock)
+        self._connected = False
+        self._shutting_down = False
+
+        # MIDs of QoS 0 publishes which Paho has not reported as written yet.  QoS 0 publishes are
+        # not tracked by the OperationManager.  Paho can report the write on its network thread
+        # before publish() returns, so the MID is recorded under a lock which on_publish takes too.
+        self._qos0_lock = threading.Lock()
+        self._qos0_mids = set()
 
         self.on_mqtt_connected_handler = None
         self.on_mqtt_disconnected_handler = None
@@ -100,6 +207,21 @@ class MQTTTransport(object):
         self.on_mqtt_connection_failure_handler = None
 
         self._op_manager = OperationManager()
+        self._counters = Counters(
+            [
+                "publishes_sent",
+                "publishes_acked",
+                "bytes_sent",
+                "messages_received",
+                "bytes_received",
+                "reconnect_attempts",
+                "connection_drops",
+                "pings_sent",
+                "ping_timeouts",
+                "slow_connection_drops",
+                "tls_sessions_resumed",
+            ]
+        )
 
         self._mqtt_client = self._create_mqtt_client()
 
@@ -116,13 +238,23 @@ class MQTTTransport(object):
         mqtt_client.enable_logger(logging.getLogger("paho"))
 
         # Configure TLS/SSL
-        ssl_context = self._create_ssl_context()
-        mqtt_client.tls_set_context(context=ssl_context)
+        self._ssl_context = _SessionResumingContext(self._get_ssl_context())
+        mqtt_client.tls_set_context(context=self._ssl_context)
 
         # Set event handlers
         def on_connect(client, userdata, flags, rc):
             logger.info("connected with result code: {}".format(rc))
 
+            if not rc:
+                # Completions left over from the previous connection can no longer be matched,
+                # and Paho discards QoS 0 publishes which were not written before it reconnected
+                self._op_manager.reset()
+                with self._qos0_lock:
+                    self._qos0_mids.clear()
+                self._save_tls_session(client)
+                with self._outbound_lock:
+                    self._connected = True
+
             if rc:
                 if self.on_mqtt_connection_failure_handler:
                     try:
@@ -147,9 +279,16 @@ class MQTTTransport(object):
 
         def on_disconnect(client, userdata, rc):
             logger.info("disconnected with result code: {}".format(rc))
+            with self._ping_lock:
+                self._ping_sent_time = None
+                self._cancel_ping_timer()
+            with self._outbound_lock:
+                self._connected = False
+                self._outbound_changed.notify_all()
 
             cause = None
             if rc:
+                self._counters.increment("connection_drops")
                 cause = _create_error_from_rc_code(rc)
 
             if self.on_mqtt_disconnected_handler:
@@ -174,13 +313,21 @@ class MQTTTransport(object):
             self._op_manager.complete_operation(mid)
 
         def on_publish(client, userdata, mid):
-            logger.info("payload published for {}".format(mid))
+            logger.debug("payload published for %s", mid)
             # publish failures are returned from the publish() call.  This is just
-            # a notification that a PUBACK was received, so there is no failure case here
-            self._op_manager.complete_operation(mid)
+            # a notification that a PUBACK was received (or, at QoS 0, that the packet was
+            # written), so there is no failure case here
+            with self._qos0_lock:
+                if mid in self._qos0_mids:
+                    self._qos0_mids.discard(mid)
+                    return
+            if self._op_manager.complete_operation(mid):
+                self._counters.increment("publishes_acked")
 
         def on_message(client, userdata, mqtt_message):
-            logger.info("message received on {}".format(mqtt_message.topic))
+            logger.debug("message received on %s", mqtt_message.topic)
+            self._counters.increment("messages_received")
+            self._counters.increment("bytes_received", buffers.get_size(mqtt_message.payload))
 
             if self.on_mqtt_message_received_handler:
                 try:
@@ -199,10 +346,151 @@ class MQTTTransport(object):
         mqtt_client.on_unsubscribe = on_unsubscribe
         mqtt_client.on_publish = on_publish
         mqtt_client.on_message = on_message
+        self._watch_pings(mqtt_client)
 
         logger.info("Created MQTT protocol client, assigned callbacks")
         return mqtt_client
 
+    def _watch_pings(self, mqtt_client):
+        """
+        Hook into Paho's keepalive PINGREQ and PINGRESP handling, which Paho has no callbacks for,
+        in order to measure round trip times and detect missed PINGRESPs.
+        """
+        send_pingreq = getattr(mqtt_client, "_send_pingreq", None)
+        handle_pingresp = getattr(mqtt_client, "_handle_pingresp", None)
+        if not (send_pingreq and handle_pingresp):
+            logger.warning("Unable to track pings with this version of Paho")
+            return
+
+        def _send_pingreq():
+            rc = send_pingreq()
+            if rc == mqtt.MQTT_ERR_SUCCESS:
+                self._on_ping_sent()
+            return rc
+
+        def _handle_pingresp():
+            rc = handle_pingresp()
+            if rc == mqtt.MQTT_ERR_SUCCESS:
+                self._on_ping_response()
+            return rc
+
+        mqtt_client._send_pingreq = _send_pingreq
+        mqtt_client._handle_pingresp = _handle_pingresp
+
+    def _on_ping_sent(self):
+        self._counters.increment("pings_sent")
+        with self._ping_lock:
+            self._ping_sent_time = time.time()
+            if self._ping_timeout:
+                self._cancel_ping_timer()
+                self._ping_timer = timer_scheduler.get_scheduler().schedule(
+                    self._ping_timeout, self._on_ping_timeout, args=(self._ping_sent_time,)
+                )
+
+    def _on_ping_response(self):
+        with self._ping_lock:
+            sent_time = self._ping_sent_time
+            self._ping_sent_time = None
+            self._cancel_ping_timer()
+            if sent_time is None:
+                return
+            round_trip_time = time.time() - sent_time
+            logger.debug("PINGRESP received after %.3f seconds", round_trip_time)
+            if self._round_trip_time is None:
+                self._round_trip_time = round_trip_time
+            else:
+                self._round_trip_time += _ROUND_TRIP_TIME_GAIN * (
+                    round_trip_time - self._round_trip_time
+                )
+            if not self._max_round_trip_time or self._round_trip_time <= self._max_round_trip_time:
+                return
+            smoothed_round_trip_time = self._round_trip_time
+            # The next connection may take a different route, so it is measured afresh
+            self._round_trip_time = None
+        logger.warning(
+            "Round trip time of {:.3f} seconds exceeds {} seconds.  Dropping connection".format(
+                smoothed_round_trip_time, self._max_round_trip_time
+            )
+        )
+        self._counters.increment("slow_connection_drops")
+        self._drop_connection()
+
+    def _on_ping_timeout(self, sent_time):
+        with self._ping_lock:
+            if self._ping_sent_time != sent_time:
+                # The PINGRESP arrived, or a newer PINGREQ has been sent
+                return
+            self._ping_sent_time = None
+        logger.warning(
+            "No PINGRESP received within {} seconds.  Dropping connection".format(
+                self._ping_timeout
+            )
+        )
+        self._counters.increment("ping_timeouts")
+        self._drop_connection()
+
+    def _drop_connection(self):
+        sock = self._mqtt_client.socket()
+        if sock:
+            # Shutting the socket down makes Paho's network loop see a lost connection, so it
+            # reports the disconnection and then reconnects, exactly as for a dropped connection
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except (socket.error, OSError):
+                logger.info("Unable to shut down socket.  It may already be closed")
+
+    def _cancel_ping_timer(self):
+        # Must be called with self._ping_lock held
+        timer = self._ping_timer
+        self._ping_timer = None
+        if timer:
+            timer.cancel()
+
+    @property
+    def round_trip_time(self):
+        """
+        The smoothed round trip time, in seconds, of the keepalive pings on this connection, or
+        None if no ping has completed yet.  Pings are only sent when the connection is otherwise idle
+        for the keepalive interval.
+        """
+        return self._round_trip_time
+
+    def _save_tls_session(self, mqtt_client):
+        """
+        Keep the TLS session of the new connection so that it can be resumed on reconnect.
+        TLS sessions are only available in Python 3.6+.
+        """
+        sock = mqtt_client.socket()
+        if getattr(sock, "session_reused", False):
+            self._counters.increment("tls_sessions_resumed")
+        session = getattr(sock, "session", None)
+        if session is not None:
+            self._ssl_context.session = session
+
+    def _get_ssl_context(self):
+        """
+        Get the SSLContext for this transport's certificates from the process-wide cache, creating
+        it if necessary.
+        """
+        key = (self._ca_cert,)
+        if self._x509_cert is not None:
+            # Include modified times so that certificates which are replaced on disk are reloaded
+            key += (
+                self._x509_cert.certificate_file,
+                self._x509_cert.key_file,
+                self._x509_cert.pass_phrase,
+                _get_file_modified_time(self._x509_cert.certificate_file),
+                _get_file_modified_time(self._x509_cert.key_file),
+            )
+        with _ssl_contexts_lock:
+            ssl_context = _ssl_contexts.get(key)
+            if ssl_context is None:
+                ssl_context = self._create_ssl_context()
+                _ssl_contexts[key] = ssl_context
+            else:
+                logger.info("reusing cached SSL context")
+        return ssl_context
+
     def _create_ssl_context(self):
         """
         This method creates the SSLContext object used by Paho to authenticate the connection.
@@ -241,7 +529,7 @@ class MQTTTransport(object):
 
         self._mqtt_client.username_pw_set(username=self._username, password=password)
 
-        rc = self._mqtt_client.connect(host=self._hostname, port=8883)
+        rc = self._mqtt_client.connect(host=self._hostname, port=8883, keepalive=self._keep_alive)
         logger.debug("_mqtt_client.connect returned rc={}".format(rc))
         if rc:
             raise _create_error_from_rc_code(rc)
@@ -258,6 +546,7 @@ class MQTTTransport(object):
         :param str password: The password for reconnecting with the MQTT broker (Optional).
         """
         logger.info("reconnecting MQTT client")
+        self._counters.increment("reconnect_attempts")
         self._mqtt_client.username_pw_set(username=self._username, password=password)
         rc = self._mqtt_client.reconnect()
         logger.debug("_mqtt_client.reconnect returned rc={}".format(rc))
@@ -288,6 +577,7 @@ class MQTTTransport(object):
         :raises: ValueError if topic is None or has zero string length
         """
         logger.info("subscribing to {} with qos {}".format(topic, qos))
+        self._raise_if_shutting_down()
         (rc, mid) = self._mqtt_client.subscribe(topic, qos=qos)
         logger.debug("_mqtt_client.subscribe returned rc={}".format(rc))
         if rc:
@@ -304,73 +594,375 @@ class MQTTTransport(object):
         :raises: ValueError if topic is None or has zero string length
         """
         logger.info("unsubscribing from {}".format(topic))
+        self._raise_if_shutting_down()
         (rc, mid) = self._mqtt_client.unsubscribe(topic)
         logger.debug("_mqtt_client.unsubscribe returned rc={}".format(rc))
         if rc:
             raise _create_error_from_rc_code(rc)
         self._op_manager.establish_operation(mid, callback)
 
-    def publish(self, topic, payload, qos=1, callback=None):
+    def publish(self, topic, payload, qos=1, callback=None, priority=0):
         """
         Send a message via the MQTT broker.
 
+        Once MAX_PUBLISHES_IN_FLIGHT messages are waiting for acknowledgement, further messages are
+        queued until an acknowledgement arrives.  Queued messages with a higher priority are sent
+        first, and messages with the same priority are always sent in order.
+
         :param str topic: topic: The topic that the message should be published on.
-        :param str payload: The actual message to send.
+        :param payload: The actual message to send, as text, bytes, bytearray or any other buffer
+          such as a memoryview.  Text is encoded to UTF-8 once.  Buffers are handed to Paho
+          without copying wherever possible, so they must not be modified until the callback
+          is triggered.
         :param int qos: the desired quality of service level for the subscription. Defaults to 1.
+          At QoS 0 the MID is not tracked, and the callback is triggered as soon as the message
+          has been handed to the MQTT client, without waiting for any acknowledgement.
         :param callback: A callback to be triggered upon completion (Optional).
+        :param int priority: The priority of the message (Optional).  Defaults to 0.
 
+        :raises: OperationCancelledError if the transport is shutting down
         :raises: ValueError if qos is not 0, 1 or 2
         :raises: ValueError if topic is None or has zero string length
         :raises: ValueError if topic contains a wildcard ("+")
         :raises: ValueError if the length of the payload is greater than 268435455 bytes
         """
-        logger.info("sending")
-        (rc, mid) = self._mqtt_client.publish(topic=topic, payload=payload, qos=qos)
-        logger.debug("_mqtt_client.publish returned rc={}".format(rc))
+        logger.debug("publishing on %s", topic)
+        publish = (topic, buffers.to_bytes_like(payload), qos, callback)
+        with self._outbound_lock:
+            self._raise_if_shutting_down()
+            self._outbound.put(publish, priority)
+            if self._sending:
+                # The thread which is sending will hand this publish to Paho
+                return
+            self._sending = True
+        self._send_queued_publishes(own_publish=publish)
+
+    def _send_queued_publishes(self, own_publish=None):
+        """
+        Hand queued publishes to Paho until the queue is empty or the maximum number of publishes
+        are in flight.  Must only be called by the thread which set self._sending.
+
+        Errors sending own_publish, the publish made by the calling thread, are raised.  Errors
+        sending any other publish are reported by triggering its callback with the error as the
+        error keyword argument, since the thread which made it is no longer waiting on this call.
+        """
+        error = None
+        while True:
+            with self._outbound_lock:
+                if not self._outbound or self._publishes_in_flight >= MAX_PUBLISHES_IN_FLIGHT:
+                    self._sending = False
+                    break
+                publish = self._outbound.get()
+                (topic, payload, qos, callback) = publish
+                if qos:
+                    self._publishes_in_flight += 1
+            try:
+                self._send_publish(topic, payload, qos, callback, queued=publish is not own_publish)
+            except Exception as e:
+                if qos:
+                    with self._outbound_lock:
+                        self._publishes_in_flight -= 1
+                        self._outbound_changed.notify_all()
+                if publish is own_publish:
+                    error = e
+                else:
+                    logger.error("Unexpected error sending queued publish on {}".format(topic))
+                    logger.error(traceback.format_exc())
+                    if callback:
+                        try:
+                            callback(error=e)
+                        except Exception:
+                            logger.error(
+                                "Unexpected error calling callback for publish on {}".format(topic)
+                            )
+                            logger.error(traceback.format_exc())
+        if error:
+            raise error
+
+    def _send_publish(self, topic, payload, qos, callback, queued):
+        if qos == 0:
+            with self._qos0_lock:
+                (rc, mid) = self._mqtt_client.publish(topic=topic, payload=payload, qos=qos)
+                self._qos0_mids.add(mid)
+        else:
+            (rc, mid) = self._mqtt_client.publish(topic=topic, payload=payload, qos=qos)
+        logger.debug("_mqtt_client.publish returned rc=%s", rc)
         if rc:
-            raise _create_error_from_rc_code(rc)
-        self._op_manager.establish_operation(mid, callback)
+            if not (queued and qos and rc == mqtt.MQTT_ERR_NO_CONN):
+                raise _create_error_from_rc_code(rc)
+            # Nobody is left to report the error to, but Paho keeps the message and sends it
+            # once it reconnects, so it still completes.
+            logger.info("queued publish on %s will be sent after reconnecting", topic)
+        self._counters.increment("publishes_sent")
+        self._counters.increment("bytes_sent", buffers.get_size(payload))
+        if qos == 0:
+            if callback and queued:
+                # The publish has been sent, so an error raised by its callback must not be
+                # mistaken for an error sending it.
+                try:
+                    callback()
+                except Exception:
+                    logger.error(
+                        "Unexpected error calling callback for publish on {}".format(topic)
+                    )
+                    logger.error(traceback.format_exc())
+            elif callback:
+                callback()
+        else:
+            self._op_manager.establish_operation(
+                mid, functools.partial(self._on_publish_acknowledged, callback)
+            )
+
+    def _on_publish_acknowledged(self, callback, error=None):
+        with self._outbound_lock:
+            self._publishes_in_flight -= 1
+            self._outbound_changed.notify_all()
+            send = bool(self._outbound) and not self._sending
+            if send:
+                self._sending = True
+        # Fill the slot before completing the publish, so that an error in the callback cannot
+        # leave publishes stranded in the queue.  This hands publishes to Paho from its network
+        # thread while other operations are made on other threads, so their MIDs may be
+        # established out of order, which the OperationManager allows for.
+        if send:
+            self._send_queued_publishes()
+        if callback:
+            if error:
+                callback(error=error)
+            else:
+                callback()
+
+    def _raise_if_shutting_down(self):
+        if self._shutting_down:
+            raise errors.OperationCancelledError("MQTT transport is shutting down")
+
+    def shutdown(self, timeout=None):
+        """
+        Shut the transport down.  New operations are refused, publishes which have already been
+        made are given until the timeout to be acknowledged, then the client disconnects from the
+        MQTT broker.  Any operation which is still pending is then failed, by triggering its
+        callback with an OperationCancelledError as the error keyword argument, in the order in
+        which the operations were made.
+
+        :param float timeout: The maximum number of seconds to wait for outstanding publishes,
+          or None to wait for as long as the client stays connected (optional).
+
+        :returns: The number of operations which were failed.
+        """
+        logger.info("shutting down MQTT client")
+        deadline = None if timeout is None else time.time() + timeout
+        with self._outbound_lock:
+            self._shutting_down = True
+            while self._connected and (self._outbound or self._publishes_in_flight):
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._outbound_changed.wait(remaining)
+            unsent = []
+            while self._outbound:
+                unsent.append(self._outbound.get())
+
+        rc = self._mqtt_client.disconnect()
+        logger.debug("_mqtt_client.disconnect returned rc={}".format(rc))
+        self._mqtt_client.loop_stop()
+
+        # Nothing can complete once the network loop has stopped.  Operations which were handed to
+        # Paho were made before those which were still queued.
+        error = errors.OperationCancelledError(
+            "MQTT transport was shut down before the operation completed"
+        )
+        failed = self._op_manager.cancel_all_operations(error)
+        for topic, payload, qos, callback in unsent:
+            if callback:
+                try:
+                    callback(error=error)
+                except Exception:
+                    logger.error(
+                        "Unexpected error calling callback for publish on {}".format(topic)
+                    )
+                    logger.error(traceback.format_exc())
+        failed += len(unsent)
+        logger.info("MQTT client shut down.  {} operations failed".format(failed))
+        return failed
+
+    def get_statistics(self):
+        """
+        Get the statistics collected by this transport.
+
+        :returns: A dict mapping statistic names to values.
+        """
+        statistics = self._counters.snapshot()
+        statistics.update(self._op_manager.get_statistics())
+        statistics["round_trip_time"] = self._round_trip_time
+        statistics["publishes_queued"] = len(self._outbound)
+        return statistics
+
+    def reset_statistics(self):
+        """
+        Reset the counters collected by this transport.  Values which describe the current
+        state of the transport, such as the number of operations in flight, are not affected.
+        """
+        self._counters.reset()
+        self._op_manager.reset_statistics()
+
+
+# MQTT MIDs are 16 bit.  Paho issues them in order from 1 to 65535, then wraps back around to 1.
+_HALF_MID_RANGE = 32768
+_LOCK_STRIPES = 64
+
+# States of the MIDs in the OperationManager.  MIDs which are not stored are _EMPTY.
+_EMPTY = 0
+_PENDING = 1
+_COMPLETED_EARLY = 2
 
 
 class OperationManager(object):
     """Tracks pending operations and thier associated callbacks until completion.
+
+    Operations are kept in a small set of stripes, each a dict keyed by MID and guarded by its own
+    lock, so a completion arriving on the Paho network thread only contends with operations being
+    established for MIDs in the same stripe.  Only MIDs which are pending or completed early are
+    stored, so an idle manager takes almost no memory, and since there is at most one entry per
+    MID the memory used is bounded however many unknown completions are received.
+
+    A completion which arrives for a MID that is not pending (because its operation has not been
+    established yet, or because it belongs to no operation at all) is tagged with the generation
+    in which its MID is expected to be established.  The generation advances each time Paho wraps
+    its MIDs around and each time the manager is reset on reconnect, so a stale completion can
+    never complete a later operation which reuses the MID.
+
+    MIDs may be established in a different order than Paho issued them, as happens when Paho
+    calls are made from more than one thread, as long as no MID is established more than half
+    the MID range after it was issued.
     """
 
     def __init__(self):
-        # Maps mid->callback for operations where a request has been sent
-        # but the reponse has not yet been received
-        self._pending_operation_callbacks = {}
+        # For each stripe, a dict mapping MIDs to (state, value).  For pending MIDs, the value is
+        # the completion callback.  For MIDs completed early, it is the generation in which they
+        # are expected to be established.  MIDs are in stripe mid % _LOCK_STRIPES, and each
+        # stripe is guarded by the lock with the same index.
+        self._stripes = [{} for _ in range(_LOCK_STRIPES)]
+        self._locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+
+        # (generation, most recently established MID).  Replaced as a whole, so that it can be
+        # read without a lock.
+        self._position = (0, 0)
+        self._position_lock = threading.Lock()
+
+        self._counters = Counters(["unknown_completions"])
+
+    def get_statistics(self):
+        """
+        Get the statistics collected by this OperationManager.
 
-        # Maps mid->mid for responses received that are NOT established in the _pending_operation_callbacks dict.
-        # Necessary because sometimes an operation will complete with a response before the
-        # Paho call returns.
-        # TODO: make this map mid to something more useful (result code?)
-        self._unknown_operation_completions = {}
+        :returns: A dict mapping statistic names to values.
+        """
+        statistics = self._counters.snapshot()
+        pending = 0
+        for lock, stripe in zip(self._locks, self._stripes):
+            with lock:
+                pending += sum(1 for state, _ in stripe.values() if state == _PENDING)
+        statistics["operations_in_flight"] = pending
+        return statistics
+
+    def reset_statistics(self):
+        """
+        Reset the counters collected by this OperationManager.
+        """
+        self._counters.reset()
 
-        self._lock = threading.Lock()
+    def reset(self):
+        """Discard all unknown completions, and start a new generation so that any completion
+        for an operation from before the reset is treated as stale.  Pending operations are
+        kept, since Paho retransmits them after reconnecting.
+
+        This should be called each time the transport connects.
+        """
+        with self._position_lock:
+            generation, last_mid = self._position
+            self._position = (generation + 1, last_mid)
+        for lock, stripe in zip(self._locks, self._stripes):
+            with lock:
+                for mid in [mid for mid, (state, _) in stripe.items() if state == _COMPLETED_EARLY]:
+                    del stripe[mid]
+
+    def cancel_all_operations(self, error):
+        """Fail every pending operation by triggering its callback with the given error as the
+        error keyword argument, in order of MID.  This should only be called once no more
+        completions can arrive, such as after the network loop has stopped.
+
+        :returns: The number of operations which were failed.
+        """
+        pending = []
+        for lock, stripe in zip(self._locks, self._stripes):
+            with lock:
+                for mid, (state, callback) in list(stripe.items()):
+                    if state == _PENDING:
+                        pending.append((mid, callback))
+                        del stripe[mid]
+        pending.sort(key=lambda operation: operation[0])
+        callbacks = [callback for _, callback in pending]
+
+        for callback in callbacks:
+            if callback:
+                try:
+                    callback(error=error)
+                except Exception:
+                    logger.error("Unexpected error calling callback for cancelled operation")
+                    logger.error(traceback.format_exc())
+        return len(callbacks)
+
+    def _advance_position(self, mid):
+        """Record that Paho has issued a MID, and return the generation it belongs to."""
+        with self._position_lock:
+            generation, last_mid = self._position
+            if last_mid - mid > _HALF_MID_RANGE:
+                # Paho has wrapped its MIDs around
+                generation += 1
+                self._position = (generation, mid)
+            elif mid - last_mid > _HALF_MID_RANGE:
+                # The MID was issued before Paho wrapped around, but is established late
+                return generation - 1
+            elif mid > last_mid:
+                self._position = (generation, mid)
+            return generation
+
+    def _get_expected_generation(self, mid):
+        """Return the generation in which a MID that is not pending is expected to be
+        established."""
+        generation, last_mid = self._position
+        if last_mid - mid > _HALF_MID_RANGE:
+            # The MID will next be issued after Paho wraps around
+            return generation + 1
+        elif mid - last_mid > _HALF_MID_RANGE:
+            # The MID was issued before Paho wrapped around
+            return generation - 1
+        else:
+            # The MID has not been issued yet, or was issued recently on another thread and has
+            # not been established yet.  If it has already completed, the completion is stale,
+            # and the MID will not be established again until the generation has advanced.
+            return generation
 
     def establish_operation(self, mid, callback=None):
         """Establish a pending operation identified by MID, and store its completion callback.
 
         If the operation has already been completed, the callback will be triggered.
         """
-        trigger_callback = False
+        generation = self._advance_position(mid)
 
-        with self._lock:
+        stripe = self._stripes[mid % _LOCK_STRIPES]
+        with self._locks[mid % _LOCK_STRIPES]:
             # Check to see if a response was already received for this MID before this method was
             # able to be called due to threading shenanigans
-            if mid in self._unknown_operation_completions:
-
+            trigger_callback = stripe.get(mid) == (_COMPLETED_EARLY, generation)
+            if trigger_callback:
                 # Clear the recorded unknown response now that it has been resolved
-                del self._unknown_operation_completions[mid]
-
-                # Since the operation has already completed, indicate callback should trigger
-                trigger_callback = True
-
+                del stripe[mid]
             else:
-                # Store the operation as pending, along with callback
-                self._pending_operation_callbacks[mid] = callback
-                logger.info("Waiting for response on MID: {}".format(mid))
+                # Store the operation as pending, along with callback.  This replaces any stale
+                # completion left over from an earlier use of the MID.
+                stripe[mid] = (_PENDING, callback)
+                logger.debug("Waiting for response on MID: %s", mid)
 
         # Now that the lock has been released, if the callback should be triggered,
         # go ahead and trigger it now.
@@ -390,17 +982,22 @@ class OperationManager(object):
 
         If the operation MID is unknown, the completion status will be stored until
         the operation is established.
+
+        :returns: True if a pending operation was completed, or False if the completion was
+        stored as unknown.
         """
         callback = None
         trigger_callback = False
 
-        with self._lock:
+        stripe = self._stripes[mid % _LOCK_STRIPES]
+        with self._locks[mid % _LOCK_STRIPES]:
+            state, value = stripe.get(mid, (_EMPTY, None))
             # If the mid is associated with an established pending operation, trigger the associated callback
-            if mid in self._pending_operation_callbacks:
+            if state == _PENDING:
 
                 # Retrieve the callback, and clear the pending operation now that it has been completed
-                callback = self._pending_operation_callbacks[mid]
-                del self._pending_operation_callbacks[mid]
+                callback = value
+                del stripe[mid]
 
                 # Since the operation is complete, indicate the callback should be triggered
                 trigger_callback = True
@@ -408,16 +1005,13 @@ class OperationManager(object):
             else:
                 # Otherwise, store the mid as an unknown response
                 logger.warning("Response received for unknown MID: {}".format(mid))
-                self._unknown_operation_completions[
-                    mid
-                ] = mid  # TODO: set something more useful here
+                self._counters.increment("unknown_completions")
+                stripe[mid] = (_COMPLETED_EARLY, self._get_expected_generation(mid))
 
         # Now that the lock has been released, if the callback should be triggered,
         # go ahead and trigger it now.
         if trigger_callback:
-            logger.info(
-                "Response received for recognized MID: {} - triggering callback".format(mid)
-            )
+            logger.debug("Response received for recognized MID: %s - triggering callback", mid)
             if callback:
                 try:
                     callback()
@@ -426,3 +1020,5 @@ class OperationManager(object):
                     logger.error(traceback.format_exc())
             else:
                 logger.info("No callback set for MID: {}".format(mid))
+
+        return trigger_callback
@@ -7,12 +7,16 @@
 import logging
 import sys
 from . import pipeline_thread
-from azure.iot.device.common import unhandled_exceptions
+from azure.iot.device.common import unhandled_exceptions, flight_recorder
 
 from six.moves import queue
 
 logger = logging.getLogger(__name__)
 
+# The functions in this module are called for every operation at every stage of the pipeline, so
+# log messages pass their arguments to the logger instead of calling str.format.  This way,
+# no strings are built unless the message is actually going to be logged.
+
 
 @pipeline_thread.runs_on_pipeline_thread
 def delegate_to_different_op(stage, original_op, new_op):
@@ -46,22 +50,22 @@ def delegate_to_different_op(stage, original_op, new_op):
     :param PipelineOperation new_op: Operation that is being passed down the pipeline
       to effectively continue the work represented by original_op.  This is most likely
       a different type of operation that is able to accomplish the intention of the
-      original_op in a way that is more specific than the original_op.
+      original_op in a way that is more specific than the original_op.  The new_op takes
+      on the priority of the original_op.
     """
 
-    logger.debug("{}({}): continuing with {} op".format(stage.name, original_op.name, new_op.name))
+    logger.debug("%s(%s): continuing with %s op", stage.name, original_op.name, new_op.name)
 
     @pipeline_thread.runs_on_pipeline_thread
     def new_op_complete(op):
-        logger.info(
-            "{}({}): completing with result from {}".format(
-                stage.name, original_op.name, new_op.name
-            )
+        logger.debug(
+            "%s(%s): completing with result from %s", stage.name, original_op.name, new_op.name
         )
         original_op.error = new_op.error
         complete_op(stage, original_op)
 
     new_op.callback = new_op_complete
+    new_op.priority = original_op.priority
     pass_op_to_next_stage(stage, new_op)
 
 
@@ -78,16 +82,19 @@ def pass_op_to_next_stage(stage, op):
     :param PipelineOperation op: Operation which is being passed on
     """
     if op.error:
-        logger.error("{}({}): op has error.  completing.".format(stage.name, op.name))
+        logger.error("%s(%s): op has error.  completing.", stage.name, op.name)
         complete_op(stage, op)
     elif not stage.next:
-        logger.error("{}({}): no next stage.  completing with error".format(stage.name, op.name))
+        logger.error("%s(%s): no next stage.  completing with error", stage.name, op.name)
         op.error = NotImplementedError(
             "{} not handled after {} stage with no next stage".format(op.name, stage.name)
         )
         complete_op(stage, op)
     else:
-        logger.debug("{}({}): passing to next stage.".format(stage.name, op.name))
+        logger.debug("%s(%s): passing to next stage.", stage.name, op.name)
+        recorder = flight_recorder.recorder
+        if recorder:
+            recorder.record(flight_recorder.OP_PASS, stage.name, op.name, id(op))
         stage.next.run_op(op)
 
 
@@ -99,10 +106,15 @@ def complete_op(stage, op):
     calling the operation's callback directly as it provides several layers of protection
     (such as a try/except wrapper) which are strongly advised.
     """
+    recorder = flight_recorder.recorder
     if op.error:
-        logger.error("{}({}): completing with error {}".format(stage.name, op.name, op.error))
+        logger.error("%s(%s): completing with error %s", stage.name, op.name, op.error)
+        if recorder:
+            recorder.record(flight_recorder.OP_FAIL, stage.name, op.name, id(op))
     else:
-        logger.info("{}({}): completing without error".format(stage.name, op.name))
+        logger.debug("%s(%s): completing without error", stage.name, op.name)
+        if recorder:
+            recorder.record(flight_recorder.OP_COMPLETE, stage.name, op.name, id(op))
 
     try:
         op.callback(op)
@@ -125,12 +137,13 @@ def pass_event_to_previous_stage(stage, event):
     bottom) and move up the pipeline until they're handled or until they error out.
     """
     if stage.previous:
-        logger.debug(
-            "{}({}): pushing event up to {}".format(stage.name, event.name, stage.previous.name)
-        )
+        logger.debug("%s(%s): pushing event up to %s", stage.name, event.name, stage.previous.name)
+        recorder = flight_recorder.recorder
+        if recorder:
+            recorder.record(flight_recorder.EVENT, stage.name, event.name, id(event))
         stage.previous.handle_pipeline_event(event)
     else:
-        logger.error("{}({}): Error: unhandled event".format(stage.name, event.name))
+        logger.error("%s(%s): Error: unhandled event", stage.name, event.name)
         error = NotImplementedError(
             "{} unhandled at {} stage with no previous stage".format(event.name, stage.name)
         )
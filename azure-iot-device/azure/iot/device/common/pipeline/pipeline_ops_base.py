@@ -4,6 +4,12 @@
 # license information.
 # --------------------------------------------------------------------------
 
+# Operation priorities.  Control operations, such as twin requests and method responses, overtake
+# queued operations with a normal priority, such as telemetry.  Operations with the same priority
+# are never reordered.
+PRIORITY_NORMAL = 0
+PRIORITY_CONTROL = 1
+
 
 class PipelineOperation(object):
     """
@@ -28,6 +34,9 @@ class PipelineOperation(object):
     :ivar error: The presence of a value in the error attribute indicates that the operation failed,
       absence of this value indicates that the operation either succeeded or hasn't been handled yet.
     :type error: Error
+    :ivar priority: The priority of the operation, used by stages and transports which queue
+      operations to decide which queued operation goes next.
+    :type priority: int
     """
 
     def __init__(self, callback=None):
@@ -46,6 +55,7 @@ class PipelineOperation(object):
         self.callback = callback
         self.needs_connection = False
         self.error = None
+        self.priority = PRIORITY_NORMAL
 
 
 class ConnectOperation(PipelineOperation):
@@ -87,6 +97,32 @@ class DisconnectOperation(PipelineOperation):
     pass
 
 
+class ShutdownOperation(PipelineOperation):
+    """
+    A PipelineOperation object which tells the pipeline to shut down for good.  Operations which are
+    already in progress are given until the timeout to complete, then the pipeline disconnects and
+    fails any operations which remain, along with any operations which are run after it, with an
+    OperationCancelledError.
+
+    This operation is in the group of base operations because shutting down is a common operation that many clients might need to do.
+
+    Even though this is an base operation, it will most likely be handled by a more specific stage (such as an IoTHub or MQTT stage).
+    """
+
+    def __init__(self, timeout=None, callback=None):
+        """
+        Initializer for ShutdownOperation objects.
+
+        :param float timeout: The maximum number of seconds to wait for operations which are in
+          progress to complete, or None to wait for as long as the connection stays up.
+        :param Function callback: The function that gets called when this operation is complete or has
+          failed.  The callback function must accept A PipelineOperation object which indicates
+          the specific operation which has completed or failed.
+        """
+        super(ShutdownOperation, self).__init__(callback=callback)
+        self.timeout = timeout
+
+
 class EnableFeatureOperation(PipelineOperation):
     """
     A PipelineOperation object which tells the pipeline to "enable" a particular feature.
@@ -112,6 +148,7 @@ class EnableFeatureOperation(PipelineOperation):
           the specific operation which has completed or failed.
         """
         super(EnableFeatureOperation, self).__init__(callback=callback)
+        self.priority = PRIORITY_CONTROL
         self.feature_name = feature_name
 
 
@@ -140,6 +177,7 @@ class DisableFeatureOperation(PipelineOperation):
           the specific operation which has completed or failed.
         """
         super(DisableFeatureOperation, self).__init__(callback=callback)
+        self.priority = PRIORITY_CONTROL
         self.feature_name = feature_name
 
 
@@ -205,6 +243,7 @@ class SendIotRequestAndWaitForResponseOperation(PipelineOperation):
           the specific operation which has completed or failed.
         """
         super(SendIotRequestAndWaitForResponseOperation, self).__init__(callback=callback)
+        self.priority = PRIORITY_CONTROL
         self.request_type = request_type
         self.method = method
         self.resource_location = resource_location
@@ -242,6 +281,7 @@ class SendIotRequestOperation(PipelineOperation):
           the specific operation which has completed or failed.
         """
         super(SendIotRequestOperation, self).__init__(callback=callback)
+        self.priority = PRIORITY_CONTROL
         self.method = method
         self.resource_location = resource_location
         self.request_type = request_type
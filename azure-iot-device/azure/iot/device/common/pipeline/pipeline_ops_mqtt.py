@@ -54,12 +54,14 @@ class MQTTPublishOperation(PipelineOperation):
     This operation is in the group of MQTT operations because its attributes are very specific to the MQTT protocol.
     """
 
-    def __init__(self, topic, payload, callback=None):
+    def __init__(self, topic, payload, qos=1, callback=None):
         """
         Initializer for MQTTPublishOperation objects.
 
         :param str topic: The name of the topic to publish to
         :param str payload: The payload to publish
+        :param int qos: The quality of service level to publish with.  At QoS 0, the operation
+          completes as soon as the payload has been handed to the transport instead of waiting for a PUBACK.
         :param Function callback: The function that gets called when this operation is complete or has failed.
           The callback function must accept A PipelineOperation object which indicates the specific operation which
           has completed or failed.
@@ -67,6 +69,7 @@ class MQTTPublishOperation(PipelineOperation):
         super(MQTTPublishOperation, self).__init__(callback=callback)
         self.topic = topic
         self.payload = payload
+        self.qos = qos
         self.needs_connection = True
 
 
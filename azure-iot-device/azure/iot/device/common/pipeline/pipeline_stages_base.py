@@ -7,13 +7,14 @@
 import logging
 import abc
 import six
-import uuid
-from six.moves import queue
 from . import pipeline_events_base
 from . import pipeline_ops_base
 from . import operation_flow
 from . import pipeline_thread
-from azure.iot.device.common import unhandled_exceptions
+from azure.iot.device.common import unhandled_exceptions, flight_recorder, timer_scheduler, errors
+from azure.iot.device.common.statistics import Counters
+from azure.iot.device.common.priority_queue import PriorityQueue
+from azure.iot.device.common.id_generator import RequestIdGenerator
 
 logger = logging.getLogger(__name__)
 
@@ -92,7 +93,10 @@ class PipelineStage(object):
 
         :param PipelineOperation op: The operation to run.
         """
-        logger.debug("{}({}): running".format(self.name, op.name))
+        logger.debug("%s(%s): running", self.name, op.name)
+        recorder = flight_recorder.recorder
+        if recorder:
+            recorder.record(flight_recorder.OP_RUN, self.name, op.name, id(op))
         try:
             self._execute_op(op)
         except Exception as e:
@@ -161,6 +165,22 @@ class PipelineStage(object):
         if self.previous:
             self.previous.on_disconnected()
 
+    def get_statistics(self):
+        """
+        Get the statistics collected by this stage.  Stages which collect statistics should
+        override this function.  Unlike most stage functions, this can be called from any thread.
+
+        :returns: A dict mapping statistic names to values.
+        """
+        return {}
+
+    def reset_statistics(self):
+        """
+        Reset any counters collected by this stage.  Stages which collect statistics should
+        override this function.  Unlike most stage functions, this can be called from any thread.
+        """
+        pass
+
 
 class PipelineRootStage(PipelineStage):
     """
@@ -187,8 +207,38 @@ class PipelineRootStage(PipelineStage):
         self.on_connected_handler = None
         self.on_disconnected_handler = None
         self.connected = False
+        self._counters = Counters(["operations_run", "connections", "disconnections"])
+
+    def get_statistics(self):
+        return self._counters.snapshot()
+
+    def reset_statistics(self):
+        self._counters.reset()
+
+    def get_pipeline_statistics(self):
+        """
+        Get the statistics collected by every stage in the pipeline.
+
+        :returns: A dict mapping statistic names to values.
+        """
+        statistics = {}
+        stage = self
+        while stage:
+            statistics.update(stage.get_statistics())
+            stage = stage.next
+        return statistics
+
+    def reset_pipeline_statistics(self):
+        """
+        Reset the counters collected by every stage in the pipeline.
+        """
+        stage = self
+        while stage:
+            stage.reset_statistics()
+            stage = stage.next
 
     def run_op(self, op):
+        self._counters.increment("operations_run")
         op.callback = pipeline_thread.invoke_on_callback_thread_nowait(op.callback)
         pipeline_thread.invoke_on_pipeline_thread(super(PipelineRootStage, self).run_op)(op)
 
@@ -242,6 +292,7 @@ class PipelineRootStage(PipelineStage):
             )
         )
         self.connected = True
+        self._counters.increment("connections")
         if self.on_connected_handler:
             pipeline_thread.invoke_on_callback_thread_nowait(self.on_connected_handler)()
 
@@ -253,6 +304,7 @@ class PipelineRootStage(PipelineStage):
             )
         )
         self.connected = False
+        self._counters.increment("disconnections")
         if self.on_disconnected_handler:
             pipeline_thread.invoke_on_callback_thread_nowait(self.on_disconnected_handler)()
 
@@ -311,18 +363,24 @@ class EnsureConnectionStage(PipelineStage):
 
 class SerializeConnectOpsStage(PipelineStage):
     """
-    This stage is responsible for serializing connect, disconnect, and reconnect ops on
+    This stage is responsible for serializing connect, disconnect, reconnect and shutdown ops on
     the pipeline, such that only a single one of these ops can go past this stage at a
     time.  This way, we don't have to worry about cases like "what happens if we try to
     disconnect if we're in the middle of reconnecting."  This stage will wait for the
     reconnect to complete before letting the disconnect past.
+
+    Operations which arrive while the stage is blocked are released in order of priority, so
+    control operations overtake queued telemetry.
     """
 
     def __init__(self):
         super(SerializeConnectOpsStage, self).__init__()
-        self.queue = queue.Queue()
+        self.queue = PriorityQueue()
         self.blocked = False
 
+    def get_statistics(self):
+        return {"blocked_operations": self.queue.qsize()}
+
     @pipeline_thread.runs_on_pipeline_thread
     def _execute_op(self, op):
         # If this stage is currently blocked (because we're waiting for a connection, etc,
@@ -333,7 +391,7 @@ class SerializeConnectOpsStage(PipelineStage):
                     self.name, op.name
                 )
             )
-            self.queue.put_nowait(op)
+            self.queue.put(op, op.priority)
 
         elif isinstance(op, pipeline_ops_base.ConnectOperation) and self.pipeline_root.connected:
             logger.info(
@@ -358,6 +416,7 @@ class SerializeConnectOpsStage(PipelineStage):
             isinstance(op, pipeline_ops_base.DisconnectOperation)
             or isinstance(op, pipeline_ops_base.ConnectOperation)
             or isinstance(op, pipeline_ops_base.ReconnectOperation)
+            or isinstance(op, pipeline_ops_base.ShutdownOperation)
         ):
             self._block(op)
             old_callback = op.callback
@@ -407,9 +466,9 @@ class SerializeConnectOpsStage(PipelineStage):
         # Put a new Queue in self.queue because releasing ops might put them back in the
         # queue, especially if there's a ConnectOperation in the list of ops to release
         old_queue = self.queue
-        self.queue = queue.Queue()
+        self.queue = PriorityQueue()
         while not old_queue.empty():
-            op_to_release = old_queue.get_nowait()
+            op_to_release = old_queue.get()
             if error:
                 # if we're unblocking the queue because something (like a connect operation) failed,
                 # then we fail all of the blocked operations with the same error.
@@ -433,11 +492,36 @@ class CoordinateRequestAndResponseStage(PipelineStage):
     Pipeline stage which is responsible for coordinating SendIotRequestAndWaitForResponseOperation operations.  For each
     SendIotRequestAndWaitForResponseOperation operation, this stage passes down a SendIotRequestOperation operation and waits for
     an IotResponseEvent event.  All other events are passed down unmodified.
+
+    So that neither memory nor waiting threads can grow without bound when responses are lost,
+    requests which do not receive a response within request_timeout seconds fail with a
+    TimeoutError, all pending requests fail with a ConnectionDroppedError when the transport
+    disconnects, and new requests fail immediately while max_pending_requests are outstanding.
     """
 
-    def __init__(self):
+    def __init__(self, request_timeout=60, max_pending_requests=100):
+        """
+        Initializer for CoordinateRequestAndResponseStage.
+        :param float request_timeout: The number of seconds to wait for a response before failing
+          a request, or None to wait forever.
+        :param int max_pending_requests: The maximum number of requests waiting for a response,
+          or None for no limit.
+        """
         super(CoordinateRequestAndResponseStage, self).__init__()
+        self.request_timeout = request_timeout
+        self.max_pending_requests = max_pending_requests
         self.pending_responses = {}
+        self._request_timers = {}
+        self._request_ids = RequestIdGenerator()
+        self._counters = Counters(["requests_timed_out", "requests_rejected"])
+
+    def get_statistics(self):
+        statistics = self._counters.snapshot()
+        statistics["pending_requests"] = len(self.pending_responses)
+        return statistics
+
+    def reset_statistics(self):
+        self._counters.reset()
 
     @pipeline_thread.runs_on_pipeline_thread
     def _execute_op(self, op):
@@ -447,7 +531,25 @@ class CoordinateRequestAndResponseStage(PipelineStage):
             # actual protocol client operation.  The SendIotRequestAndWaitForResponseOperation operation will be
             # completed when the corresponding IotResponse event is received in this stage.
 
-            request_id = str(uuid.uuid4())
+            if (
+                self.max_pending_requests is not None
+                and len(self.pending_responses) >= self.max_pending_requests
+            ):
+                logger.warning(
+                    "{}({}): {} requests already waiting for responses.  Failing request".format(
+                        self.name, op.name, len(self.pending_responses)
+                    )
+                )
+                self._counters.increment("requests_rejected")
+                op.error = errors.PipelineError(
+                    "Too many requests waiting for responses ({})".format(
+                        len(self.pending_responses)
+                    )
+                )
+                operation_flow.complete_op(self, op)
+                return
+
+            request_id = self._request_ids.next_id()
 
             @pipeline_thread.runs_on_pipeline_thread
             def on_send_request_done(send_request_op):
@@ -457,14 +559,9 @@ class CoordinateRequestAndResponseStage(PipelineStage):
                     )
                 )
                 if send_request_op.error:
-                    op.error = send_request_op.error
-                    logger.info(
-                        "{}({}): removing request {} from pending list".format(
-                            self.name, op.name, request_id
-                        )
-                    )
-                    del (self.pending_responses[request_id])
-                    operation_flow.complete_op(self, op)
+                    if self._remove_pending_request(request_id):
+                        op.error = send_request_op.error
+                        operation_flow.complete_op(self, op)
                 else:
                     # request sent.  Nothing to do except wait for the response
                     pass
@@ -479,6 +576,10 @@ class CoordinateRequestAndResponseStage(PipelineStage):
                 "{}({}): adding request {} to pending list".format(self.name, op.name, request_id)
             )
             self.pending_responses[request_id] = op
+            if self.request_timeout is not None:
+                self._request_timers[request_id] = timer_scheduler.get_scheduler().schedule(
+                    self.request_timeout, self._on_request_timeout, args=(request_id,)
+                )
 
             new_op = pipeline_ops_base.SendIotRequestOperation(
                 method=op.method,
@@ -505,9 +606,8 @@ class CoordinateRequestAndResponseStage(PipelineStage):
                     self.name, event.name, event.request_id
                 )
             )
-            if event.request_id in self.pending_responses:
-                op = self.pending_responses[event.request_id]
-                del (self.pending_responses[event.request_id])
+            op = self._remove_pending_request(event.request_id)
+            if op:
                 op.status_code = event.status_code
                 op.response_body = event.response_body
                 logger.info(
@@ -529,3 +629,63 @@ class CoordinateRequestAndResponseStage(PipelineStage):
                 )
         else:
             operation_flow.pass_event_to_previous_stage(self, event)
+
+    @pipeline_thread.runs_on_pipeline_thread
+    def on_connected(self):
+        # Use a new prefix for each connection, so that a response to a request from an earlier
+        # connection can never be mistaken for a response to a new one.
+        self._request_ids.renew_prefix()
+        super(CoordinateRequestAndResponseStage, self).on_connected()
+
+    @pipeline_thread.runs_on_pipeline_thread
+    def on_disconnected(self):
+        # Responses are not redelivered after a reconnect, so any request still waiting for one
+        # would otherwise wait forever.
+        if self.pending_responses:
+            logger.info(
+                "{}: disconnected.  Failing {} pending requests".format(
+                    self.name, len(self.pending_responses)
+                )
+            )
+            for request_id in list(self.pending_responses):
+                op = self._remove_pending_request(request_id)
+                op.error = errors.ConnectionDroppedError(
+                    "Connection dropped while waiting for a response"
+                )
+                operation_flow.complete_op(self, op)
+        super(CoordinateRequestAndResponseStage, self).on_disconnected()
+
+    @pipeline_thread.invoke_on_pipeline_thread_nowait
+    def _on_request_timeout(self, request_id):
+        op = self._remove_pending_request(request_id)
+        if op:
+            logger.warning(
+                "{}({}): no response to request {} after {} seconds.  Failing request".format(
+                    self.name, op.name, request_id, self.request_timeout
+                )
+            )
+            self._counters.increment("requests_timed_out")
+            op.error = errors.TimeoutError(
+                "No response received within {} seconds".format(self.request_timeout)
+            )
+            operation_flow.complete_op(self, op)
+
+    @pipeline_thread.runs_on_pipeline_thread
+    def _remove_pending_request(self, request_id):
+        """
+        Remove a request from the pending list and cancel its timer.
+
+        :returns: The SendIotRequestAndWaitForResponseOperation for the request, or None if it is
+          not pending.
+        """
+        op = self.pending_responses.pop(request_id, None)
+        timer = self._request_timers.pop(request_id, None)
+        if timer:
+            timer.cancel()
+        if op:
+            logger.info(
+                "{}({}): removing request {} from pending list".format(
+                    self.name, op.name, request_id
+                )
+            )
+        return op
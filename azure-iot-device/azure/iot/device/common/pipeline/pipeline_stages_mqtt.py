@@ -6,6 +6,8 @@
 
 import logging
 import six
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from . import (
     pipeline_ops_base,
     PipelineStage,
@@ -19,6 +21,37 @@ from azure.iot.device.common import unhandled_exceptions, errors
 
 logger = logging.getLogger(__name__)
 
+# Connecting blocks on name resolution, the TCP connect and the TLS handshake, so transports
+# connect on a pool of threads shared by all pipelines instead of on the pipeline thread.  This
+# lets many clients in the same process connect at the same time.
+MAX_CONCURRENT_CONNECTS = 32
+
+_connect_executor = None
+_connect_executor_lock = threading.Lock()
+
+
+def _get_connect_executor():
+    global _connect_executor
+    with _connect_executor_lock:
+        if _connect_executor is None:
+            logger.info("Creating connect executor")
+            _connect_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_CONNECTS)
+        return _connect_executor
+
+
+def shutdown_connect_executor():
+    """
+    Stop the threads used to connect transports.  The threads finish any connects which have
+    already started, and are created again if another transport connects later.
+    """
+    global _connect_executor
+    with _connect_executor_lock:
+        executor = _connect_executor
+        _connect_executor = None
+    if executor:
+        logger.info("Shutting down connect executor")
+        executor.shutdown(wait=False)
+
 
 class MQTTTransportStage(PipelineStage):
     """
@@ -27,6 +60,33 @@ class MQTTTransportStage(PipelineStage):
     is not in the MQTT group of operations, but can only be run at the protocol level.
     """
 
+    def __init__(self, keep_alive=None, ping_timeout=None, max_round_trip_time=None):
+        """
+        Initializer for MQTTTransportStage.
+        :param int keep_alive: The MQTT keepalive interval in seconds, or None for the transport default.
+        :param float ping_timeout: The number of seconds to wait for a PINGRESP before dropping the
+          connection, or None to rely on the keepalive interval alone.
+        :param float max_round_trip_time: The smoothed ping round trip time in seconds above which
+          the connection is dropped, or None to never drop it for being slow.
+        """
+        super(MQTTTransportStage, self).__init__()
+        self.keep_alive = keep_alive
+        self.ping_timeout = ping_timeout
+        self.max_round_trip_time = max_round_trip_time
+        self.shut_down = False
+
+    def get_statistics(self):
+        transport = getattr(self, "transport", None)
+        if transport:
+            return transport.get_statistics()
+        else:
+            return {}
+
+    def reset_statistics(self):
+        transport = getattr(self, "transport", None)
+        if transport:
+            transport.reset_statistics()
+
     @pipeline_thread.runs_on_pipeline_thread
     def _cancel_pending_connection_op(self):
         """
@@ -45,7 +105,15 @@ class MQTTTransportStage(PipelineStage):
 
     @pipeline_thread.runs_on_pipeline_thread
     def _execute_op(self, op):
-        if isinstance(op, pipeline_ops_mqtt.SetMQTTConnectionArgsOperation):
+        if self.shut_down:
+            if isinstance(op, pipeline_ops_base.ShutdownOperation):
+                logger.info("{}({}): already shut down.  completing".format(self.name, op.name))
+            else:
+                logger.info("{}({}): pipeline is shut down.  failing op".format(self.name, op.name))
+                op.error = errors.OperationCancelledError("The pipeline has been shut down")
+            operation_flow.complete_op(self, op)
+
+        elif isinstance(op, pipeline_ops_mqtt.SetMQTTConnectionArgsOperation):
             # pipeline_ops_mqtt.SetMQTTConnectionArgsOperation is where we create our MQTTTransport object and set
             # all of its properties.
             logger.info("{}({}): got connection args".format(self.name, op.name))
@@ -62,6 +130,9 @@ class MQTTTransportStage(PipelineStage):
                 username=self.username,
                 ca_cert=self.ca_cert,
                 x509_cert=self.client_cert,
+                keep_alive=self.keep_alive,
+                ping_timeout=self.ping_timeout,
+                max_round_trip_time=self.max_round_trip_time,
             )
             self.transport.on_mqtt_connected_handler = self._on_mqtt_connected
             self.transport.on_mqtt_connection_failure_handler = self._on_mqtt_connection_failure
@@ -93,13 +164,7 @@ class MQTTTransportStage(PipelineStage):
 
             self._cancel_pending_connection_op()
             self._pending_connection_op = op
-            try:
-                self.transport.connect(password=self.sas_token)
-            except Exception as e:
-                logger.error("transport.connect raised error", exc_info=True)
-                self._pending_connection_op = None
-                op.error = e
-                operation_flow.complete_op(self, op)
+            self._start_transport_connect(op, self.transport.connect)
 
         elif isinstance(op, pipeline_ops_base.ReconnectOperation):
             logger.info("{}({}): reconnecting".format(self.name, op.name))
@@ -107,13 +172,7 @@ class MQTTTransportStage(PipelineStage):
             # We set _active_connect_op here because a reconnect is the same as a connect for "active operation" tracking purposes.
             self._cancel_pending_connection_op()
             self._pending_connection_op = op
-            try:
-                self.transport.reconnect(password=self.sas_token)
-            except Exception as e:
-                logger.error("transport.reconnect raised error", exc_info=True)
-                self._pending_connection_op = None
-                op.error = e
-                operation_flow.complete_op(self, op)
+            self._start_transport_connect(op, self.transport.reconnect)
 
         elif isinstance(op, pipeline_ops_base.DisconnectOperation):
             logger.info("{}({}): disconnecting".format(self.name, op.name))
@@ -128,22 +187,42 @@ class MQTTTransportStage(PipelineStage):
                 op.error = e
                 operation_flow.complete_op(self, op)
 
+        elif isinstance(op, pipeline_ops_base.ShutdownOperation):
+            logger.info("{}({}): shutting down".format(self.name, op.name))
+
+            self.shut_down = True
+            if getattr(self, "transport", None):
+                self._cancel_pending_connection_op()
+                self._start_transport_shutdown(op)
+            else:
+                operation_flow.complete_op(self, op)
+
         elif isinstance(op, pipeline_ops_mqtt.MQTTPublishOperation):
-            logger.info("{}({}): publishing on {}".format(self.name, op.name, op.topic))
+            logger.debug(
+                "%s(%s): publishing on %s with qos %s", self.name, op.name, op.topic, op.qos
+            )
 
             @pipeline_thread.invoke_on_pipeline_thread_nowait
-            def on_published():
-                logger.info("{}({}): PUBACK received. completing op.".format(self.name, op.name))
+            def on_published(error=None):
+                logger.debug("%s(%s): publish complete. completing op.", self.name, op.name)
+                op.error = error
                 operation_flow.complete_op(self, op)
 
-            self.transport.publish(topic=op.topic, payload=op.payload, callback=on_published)
+            self.transport.publish(
+                topic=op.topic,
+                payload=op.payload,
+                qos=op.qos,
+                callback=on_published,
+                priority=op.priority,
+            )
 
         elif isinstance(op, pipeline_ops_mqtt.MQTTSubscribeOperation):
             logger.info("{}({}): subscribing to {}".format(self.name, op.name, op.topic))
 
             @pipeline_thread.invoke_on_pipeline_thread_nowait
-            def on_subscribed():
+            def on_subscribed(error=None):
                 logger.info("{}({}): SUBACK received. completing op.".format(self.name, op.name))
+                op.error = error
                 operation_flow.complete_op(self, op)
 
             self.transport.subscribe(topic=op.topic, callback=on_subscribed)
@@ -152,8 +231,9 @@ class MQTTTransportStage(PipelineStage):
             logger.info("{}({}): unsubscribing from {}".format(self.name, op.name, op.topic))
 
             @pipeline_thread.invoke_on_pipeline_thread_nowait
-            def on_unsubscribed():
+            def on_unsubscribed(error=None):
                 logger.info("{}({}): UNSUBACK received.  completing op.".format(self.name, op.name))
+                op.error = error
                 operation_flow.complete_op(self, op)
 
             self.transport.unsubscribe(topic=op.topic, callback=on_unsubscribed)
@@ -161,6 +241,64 @@ class MQTTTransportStage(PipelineStage):
         else:
             operation_flow.pass_op_to_next_stage(self, op)
 
+    @pipeline_thread.runs_on_pipeline_thread
+    def _start_transport_connect(self, op, connect):
+        """
+        Run the transport's connect or reconnect method on a connect thread.  The op completes
+        when the transport reports that the connection succeeded or failed, or here if the
+        connect method raises.
+        """
+        password = self.sas_token
+
+        def connect_proc():
+            try:
+                connect(password=password)
+            except Exception as e:
+                logger.error("transport connect raised error", exc_info=True)
+                self._on_transport_connect_error(op, e)
+
+        _get_connect_executor().submit(connect_proc)
+
+    @pipeline_thread.runs_on_pipeline_thread
+    def _start_transport_shutdown(self, op):
+        """
+        Run the transport's shutdown method on a connect thread, since it waits for outstanding
+        publishes to be acknowledged.  The pipeline thread keeps running meanwhile, so that the
+        operations for those publishes can complete.
+        """
+
+        def shutdown_proc():
+            error = None
+            try:
+                self.transport.shutdown(timeout=op.timeout)
+            except Exception as e:
+                logger.error("transport shutdown raised error", exc_info=True)
+                error = e
+            self._on_transport_shutdown(op, error)
+
+        _get_connect_executor().submit(shutdown_proc)
+
+    @pipeline_thread.invoke_on_pipeline_thread_nowait
+    def _on_transport_shutdown(self, op, error):
+        """
+        Handler that gets called on the connect thread when the transport has shut down.
+        """
+        op.error = error
+        operation_flow.complete_op(self, op)
+
+    @pipeline_thread.invoke_on_pipeline_thread_nowait
+    def _on_transport_connect_error(self, op, error):
+        """
+        Handler that gets called on the connect thread when the transport fails to start connecting.
+        """
+        if self._pending_connection_op is op:
+            self._pending_connection_op = None
+            op.error = error
+            operation_flow.complete_op(self, op)
+        else:
+            # The op was cancelled by a newer connection op while the transport was connecting
+            logger.info("{}({}): connect failed after op was cancelled".format(self.name, op.name))
+
     @pipeline_thread.invoke_on_pipeline_thread_nowait
     def _on_mqtt_message_received(self, topic, payload):
         """
@@ -243,6 +381,8 @@ class MQTTTransportStage(PipelineStage):
                 except errors.ConnectionDroppedError as e:
                     op.error = e
             operation_flow.complete_op(stage=self, op=op)
+        elif self.shut_down:
+            logger.info("{}: disconnected for shutdown".format(self.name))
         else:
             logger.warning("{}: disconnection was unexpected".format(self.name))
             # Regardless of cause, it is now a ConnectionDroppedError
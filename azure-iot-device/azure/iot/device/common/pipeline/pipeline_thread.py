@@ -73,6 +73,9 @@ These decorators use concurrent.futures.Future and the ThreadPoolExecutor becaus
 """
 
 _executors = {}
+# The executors are shared by every pipeline in the process, and the first call for a name can
+# come from several threads at once.  Each name must only ever get one executor.
+_executors_lock = threading.Lock()
 
 
 def _get_named_executor(thread_name):
@@ -81,11 +84,24 @@ def _get_named_executor(thread_name):
     this function will create on with a single worker and assign it to the provided
     name.
     """
-    global _executors
-    if thread_name not in _executors:
-        logger.info("Creating {} executor".format(thread_name))
-        _executors[thread_name] = ThreadPoolExecutor(max_workers=1)
-    return _executors[thread_name]
+    with _executors_lock:
+        if thread_name not in _executors:
+            logger.info("Creating {} executor".format(thread_name))
+            _executors[thread_name] = ThreadPoolExecutor(max_workers=1)
+        return _executors[thread_name]
+
+
+def shutdown_executors():
+    """
+    Stop the pipeline and callback threads.  Work which has already been submitted to them still
+    runs, and the threads are created again if they are needed later.
+    """
+    with _executors_lock:
+        executors = list(_executors.items())
+        _executors.clear()
+    for thread_name, executor in executors:
+        logger.info("Shutting down {} executor".format(thread_name))
+        executor.shutdown(wait=False)
 
 
 def _invoke_on_executor_thread(func, thread_name, block=True):
@@ -105,7 +121,7 @@ def _invoke_on_executor_thread(func, thread_name, block=True):
 
     def wrapper(*args, **kwargs):
         if threading.current_thread().name is not thread_name:
-            logger.info("Starting {} in {} thread".format(function_name, thread_name))
+            logger.debug("Starting %s in %s thread", function_name, thread_name)
 
             def thread_proc():
                 threading.current_thread().name = thread_name
@@ -132,7 +148,7 @@ def _invoke_on_executor_thread(func, thread_name, block=True):
             else:
                 return future
         else:
-            logger.debug("Already in {} thread for {}".format(thread_name, function_name))
+            logger.debug("Already in %s thread for %s", thread_name, function_name)
             return func(*args, **kwargs)
 
     # Silly hack:  On 2.7, we can't use @functools.wraps on callables don't have a __name__ attribute
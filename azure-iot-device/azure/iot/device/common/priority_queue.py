@@ -0,0 +1,69 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for
+# license information.
+# --------------------------------------------------------------------------
+"""This module contains a queue which releases items in order of priority, used to let control
+traffic overtake queued telemetry without reordering either of them.
+"""
+
+import collections
+
+
+class PriorityQueue(object):
+    """
+    A queue with a separate lane for each priority.
+
+    Items are taken from the highest priority lane which is not empty, and items with the same
+    priority are taken in the order they were added, so an item never overtakes an earlier item
+    with the same or a higher priority.
+
+    This class is not threadsafe.
+    """
+
+    def __init__(self):
+        # Lanes by priority, and the priorities of those lanes from highest to lowest
+        self._lanes = {}
+        self._priorities = []
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def qsize(self):
+        """
+        Return the number of items in the queue.
+        """
+        return self._size
+
+    def empty(self):
+        """
+        Return True if the queue is empty.
+        """
+        return self._size == 0
+
+    def put(self, item, priority=0):
+        """
+        Add an item to the back of the lane for its priority.
+        :param item: The item to add.
+        :param int priority: The priority of the item.  Higher values are taken first.
+        """
+        lane = self._lanes.get(priority)
+        if lane is None:
+            lane = self._lanes[priority] = collections.deque()
+            self._priorities.append(priority)
+            self._priorities.sort(reverse=True)
+        lane.append(item)
+        self._size += 1
+
+    def get(self):
+        """
+        Remove and return the oldest item with the highest priority.
+        :raises: IndexError if the queue is empty.
+        """
+        for priority in self._priorities:
+            lane = self._lanes[priority]
+            if lane:
+                self._size -= 1
+                return lane.popleft()
+        raise IndexError("get from an empty PriorityQueue")
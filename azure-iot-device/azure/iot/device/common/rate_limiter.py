@@ -0,0 +1,84 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for
+# license information.
+# --------------------------------------------------------------------------
+"""This module contains a token bucket used to keep the rate of requests to the service under
+a limit, such as the IoT Hub throttles on device connections and messages.
+"""
+
+import threading
+import time
+
+
+class TokenBucket(object):
+    """
+    A token bucket which refills at a fixed rate up to a fixed capacity.
+
+    Callers either take tokens only if they are available (try_acquire), or reserve tokens and
+    are told how long to wait before using them (reserve).  Reservations may put the bucket into
+    debt, which later callers wait out in turn, so that callers proceed in the order they reserved
+    and the long term rate never exceeds the refill rate.
+
+    All methods implemented in this class are threadsafe.
+    """
+
+    def __init__(self, rate, capacity=None):
+        """
+        Initializer for TokenBucket.
+        :param float rate: The number of tokens added to the bucket per second.
+        :param float capacity: The maximum number of tokens in the bucket, which is the largest
+          burst allowed.  Defaults to one second's worth of tokens (at least 1).
+        """
+        if rate <= 0:
+            raise ValueError("rate must be greater than 0")
+        if capacity is None:
+            capacity = max(rate, 1)
+        elif capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = self.capacity
+        self._last_refill = time.time()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        # Must be called with self._lock held
+        now = time.time()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def try_acquire(self, tokens=1):
+        """
+        Take tokens from the bucket if they are all available.
+        :param float tokens: The number of tokens to take.
+        :returns: True if the tokens were taken, False if there were not enough tokens.
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def reserve(self, tokens=1):
+        """
+        Take tokens from the bucket, going into debt if there are not enough.
+        :param float tokens: The number of tokens to take.
+        :returns: The number of seconds the caller must wait before using the tokens.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self, tokens=1):
+        """
+        Take tokens from the bucket, blocking until they are available.
+        :param float tokens: The number of tokens to take.
+        """
+        delay = self.reserve(tokens)
+        if delay:
+            time.sleep(delay)
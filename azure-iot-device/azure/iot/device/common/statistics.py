@@ -0,0 +1,52 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for
+# license information.
+# --------------------------------------------------------------------------
+"""This module contains a simple set of named counters used to collect client statistics."""
+
+import threading
+
+
+class Counters(object):
+    """
+    A set of named integer counters which can be incremented from any thread.
+
+    Each Counters object has its own lock, which is only held long enough to update or copy
+    the underlying dict, so contention between the threads that share it is negligible.
+
+    All methods implemented in this class are threadsafe.
+    """
+
+    def __init__(self, names):
+        """
+        Initializer for Counters.
+        :param names: The names of the counters.  All counters start at zero.
+        """
+        self._names = tuple(names)
+        self._values = dict.fromkeys(self._names, 0)
+        self._lock = threading.Lock()
+
+    def increment(self, name, amount=1):
+        """
+        Increment a counter.
+        :param str name: The name of the counter.
+        :param int amount: The amount to add to the counter.  Defaults to 1.
+        """
+        with self._lock:
+            self._values[name] += amount
+
+    def snapshot(self):
+        """
+        Get the current value of all counters.
+        :returns: A dict mapping counter names to values.
+        """
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self):
+        """
+        Set all counters back to zero.
+        """
+        with self._lock:
+            self._values = dict.fromkeys(self._names, 0)
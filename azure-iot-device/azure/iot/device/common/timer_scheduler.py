@@ -0,0 +1,170 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for
+# license information.
+# --------------------------------------------------------------------------
+"""This module contains a process-wide timer scheduler.  Timeouts are kept in a single heap
+which is serviced by one background thread, so scheduling or cancelling a timer costs
+O(log n) and never creates a new thread.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from azure.iot.device.common import unhandled_exceptions
+
+logger = logging.getLogger(__name__)
+
+
+class TimerHandle(object):
+    """
+    A handle to a scheduled callback, which can be used to cancel it.
+    """
+
+    __slots__ = ["when", "function", "args", "kwargs", "cancelled"]
+
+    def __init__(self, when, function, args, kwargs):
+        self.when = when
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.cancelled = False
+
+    def cancel(self):
+        """
+        Cancel the callback.  This has no effect if the callback has already run.
+        """
+        self.cancelled = True
+
+
+class TimerScheduler(object):
+    """
+    Runs callbacks after a delay, using a heap of deadlines and a single worker thread.
+
+    Callbacks run on the worker thread, one at a time, so they should not block for long.
+    Cancelled timers are left in the heap and discarded when they reach the top.
+
+    All methods implemented in this class are threadsafe.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._heap = []
+        # Tie-breaker so that timers with the same deadline run in the order they were scheduled
+        self._sequence = itertools.count()
+        self._thread = None
+
+    def schedule(self, interval, function, args=None, kwargs=None):
+        """
+        Schedule a function to be called after a delay.
+        :param float interval: The number of seconds to wait before calling the function.
+        :param function: The function to call.
+        :param args: Positional arguments to pass to the function.
+        :param kwargs: Keyword arguments to pass to the function.
+
+        :returns: A TimerHandle which can be used to cancel the call.
+        """
+        handle = TimerHandle(time.time() + interval, function, args or (), kwargs or {})
+        with self._condition:
+            heapq.heappush(self._heap, (handle.when, next(self._sequence), handle))
+            self._ensure_thread()
+            # Wake the worker in case the new timer is due before the one it is waiting for
+            self._condition.notify()
+        return handle
+
+    def shutdown(self):
+        """
+        Stop the worker thread and discard the timers which have not run yet.  A callback which
+        is already running is allowed to finish, and the thread is started again if another
+        timer is scheduled later.
+        """
+        with self._condition:
+            if self._thread is not None:
+                logger.debug("Stopping timer scheduler thread")
+            # The worker exits once it sees that it is no longer the scheduler's thread
+            self._thread = None
+            del self._heap[:]
+            self._condition.notify_all()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            logger.debug("Starting timer scheduler thread")
+            self._thread = threading.Thread(target=self._run, name="timer")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                handle = self._get_next_due()
+            if handle is None:
+                return
+            try:
+                handle.function(*handle.args, **handle.kwargs)
+            except Exception as e:
+                unhandled_exceptions.exception_caught_in_background_thread(e)
+
+    def _get_next_due(self):
+        # Must be called with self._condition held.  Returns None if the thread has been stopped.
+        while True:
+            if self._thread is not threading.current_thread():
+                return None
+            while self._heap and self._heap[0][2].cancelled:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                self._condition.wait()
+                continue
+            delay = self._heap[0][0] - time.time()
+            if delay <= 0:
+                return heapq.heappop(self._heap)[2]
+            self._condition.wait(delay)
+
+
+_scheduler = TimerScheduler()
+
+
+def get_scheduler():
+    """
+    Get the TimerScheduler which is shared by all clients in this process.
+    """
+    return _scheduler
+
+
+class Timer(object):
+    """
+    A drop-in replacement for threading.Timer which runs on the shared TimerScheduler
+    instead of creating a thread per timeout.
+    """
+
+    def __init__(self, interval, function, args=None, kwargs=None):
+        """
+        :param float interval: The number of seconds to wait after start() before calling the function.
+        :param function: The function to call.
+        :param args: Positional arguments to pass to the function.
+        :param kwargs: Keyword arguments to pass to the function.
+        """
+        self.interval = interval
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self._handle = None
+        self._cancelled = False
+
+    def start(self):
+        """
+        Start the timer.
+        """
+        if self._handle is not None:
+            raise RuntimeError("timers can only be started once")
+        if not self._cancelled:
+            self._handle = _scheduler.schedule(self.interval, self.function, self.args, self.kwargs)
+
+    def cancel(self):
+        """
+        Stop the timer if it hasn't finished yet.
+        """
+        self._cancelled = True
+        if self._handle is not None:
+            self._handle.cancel()
@@ -4,6 +4,7 @@
 # license information.
 # --------------------------------------------------------------------------
 import logging
+from azure.iot.device.common import flight_recorder
 
 logger = logging.getLogger(__name__)
 
@@ -25,3 +26,6 @@ def exception_caught_in_background_thread(e):
     # @FUTURE: We should add a mechanism which allows applications to receive these
     # exceptions so they can respond accordingly
     logger.error(msg="Exception caught in background thread.  Unable to handle.", exc_info=e)
+    # If the flight recorder is enabled, log the recent history of the pipeline to help
+    # diagnose the error.
+    flight_recorder.dump(logger)
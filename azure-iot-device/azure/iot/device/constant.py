@@ -11,3 +11,4 @@ USER_AGENT = "py-azure-iot-device/{version}".format(version=VERSION)
 IOTHUB_API_VERSION = "2018-06-30"
 PROVISIONING_API_VERSION = "2019-03-31"
 SECURITY_MESSAGE_INTERFACE_ID = "urn:azureiot:Security:SecurityAgent:1"
+TIMESERIES_CONTENT_TYPE = "application/vnd.azure-iot-device.timeseries"
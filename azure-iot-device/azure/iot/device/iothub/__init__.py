@@ -4,8 +4,17 @@ This library provides functionality for communicating with the Azure IoT Hub
 as a Device or Module.
 """
 
-from .sync_clients import IoTHubDeviceClient, IoTHubModuleClient
+from .sync_clients import IoTHubDeviceClient, IoTHubModuleClient, connect_all
 from .sync_inbox import InboxEmpty
-from .models import Message, MethodResponse
+from .models import Message, MethodResponse, RateLimits, decode_timeseries
 
-__all__ = ["IoTHubDeviceClient", "IoTHubModuleClient", "Message", "InboxEmpty", "MethodResponse"]
+__all__ = [
+    "IoTHubDeviceClient",
+    "IoTHubModuleClient",
+    "Message",
+    "InboxEmpty",
+    "MethodResponse",
+    "RateLimits",
+    "decode_timeseries",
+    "connect_all",
+]
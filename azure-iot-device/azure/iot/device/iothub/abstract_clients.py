@@ -13,10 +13,15 @@ import os
 import io
 from . import auth
 from . import pipeline
+from .models.twin import ReportedPropertiesTracker
 
 
 logger = logging.getLogger(__name__)
 
+# The rate at which connect_all connects clients by default.  IoT Hub accepts at least 100 new
+# device connections per second on every S1 and S2 hub, so this avoids connection throttling.
+DEFAULT_CONNECTIONS_PER_SECOND = 100
+
 # A note on implementation:
 # The intializer methods accept pipeline(s) instead of an auth provider in order to protect
 # the client from logic related to authentication providers. This reduces edge cases, and allows
@@ -40,15 +45,30 @@ class AbstractIoTHubClient(object):
         """
         self._iothub_pipeline = iothub_pipeline
         self._edge_pipeline = None
+        self._reported_properties_tracker = None
 
     @classmethod
-    def create_from_connection_string(cls, connection_string, ca_cert=None):
+    def create_from_connection_string(
+        cls,
+        connection_string,
+        ca_cert=None,
+        keep_alive=None,
+        ping_timeout=None,
+        max_round_trip_time=None,
+    ):
         """
         Instantiate the client from a IoTHub device or module connection string.
 
         :param str connection_string: The connection string for the IoTHub you wish to connect to.
         :param str ca_cert: (OPTIONAL) The trusted certificate chain. Necessary when using a
         connection string with a GatewayHostName parameter.
+        :param int keep_alive: (OPTIONAL) The maximum number of seconds between MQTT packets sent to
+        the hub.  When the connection is idle, a keepalive ping is sent at this interval. Defaults to 60.
+        :param float ping_timeout: (OPTIONAL) The number of seconds to wait for a ping response before
+        the connection is considered dead, dropped and re-established.
+        :param float max_round_trip_time: (OPTIONAL) The number of seconds the smoothed round trip
+        time of the keepalive pings may reach before the connection is considered degraded, dropped
+        and re-established.
 
         :raises: ValueError if given an invalid connection_string.
         """
@@ -57,24 +77,181 @@ class AbstractIoTHubClient(object):
         # in order to differentiate types of connection strings.
         authentication_provider = auth.SymmetricKeyAuthenticationProvider.parse(connection_string)
         authentication_provider.ca_cert = ca_cert  # TODO: make this part of the instantiation
-        iothub_pipeline = pipeline.IoTHubPipeline(authentication_provider)
+        iothub_pipeline = pipeline.IoTHubPipeline(
+            authentication_provider,
+            keep_alive=keep_alive,
+            ping_timeout=ping_timeout,
+            max_round_trip_time=max_round_trip_time,
+        )
         return cls(iothub_pipeline)
 
     @classmethod
-    def create_from_shared_access_signature(cls, sas_token):
+    def create_from_shared_access_signature(
+        cls, sas_token, keep_alive=None, ping_timeout=None, max_round_trip_time=None
+    ):
         """
         Instantiate the client from a Shared Access Signature (SAS) token.
 
         This method of instantiation is not recommended for general usage.
 
         :param str sas_token: The string representation of a SAS token.
+        :param int keep_alive: (OPTIONAL) The maximum number of seconds between MQTT packets sent to
+        the hub.  When the connection is idle, a keepalive ping is sent at this interval. Defaults to 60.
+        :param float ping_timeout: (OPTIONAL) The number of seconds to wait for a ping response before
+        the connection is considered dead, dropped and re-established.
+        :param float max_round_trip_time: (OPTIONAL) The number of seconds the smoothed round trip
+        time of the keepalive pings may reach before the connection is considered degraded, dropped
+        and re-established.
 
         :raises: ValueError if given an invalid sas_token
         """
         authentication_provider = auth.SharedAccessSignatureAuthenticationProvider.parse(sas_token)
-        iothub_pipeline = pipeline.IoTHubPipeline(authentication_provider)
+        iothub_pipeline = pipeline.IoTHubPipeline(
+            authentication_provider,
+            keep_alive=keep_alive,
+            ping_timeout=ping_timeout,
+            max_round_trip_time=max_round_trip_time,
+        )
         return cls(iothub_pipeline)
 
+    @property
+    def telemetry_qos(self):
+        """The MQTT quality of service level used to send messages which do not specify their own.
+
+        At QoS 1 (the default), sending a message completes when the service acknowledges it.
+        At QoS 0, sending a message completes as soon as it has been handed to the transport,
+        and the message may be lost if the connection drops.  This is suitable for high rate
+        telemetry which is quickly superseded.
+        """
+        return self._iothub_pipeline.telemetry_qos
+
+    @telemetry_qos.setter
+    def telemetry_qos(self, qos):
+        if qos not in (0, 1):
+            raise ValueError("Invalid qos {}.  Must be 0 or 1".format(qos))
+        self._iothub_pipeline.telemetry_qos = qos
+
+    def enable_payload_compression(
+        self, encoding="gzip", threshold=1024, level=6, dictionary=None, dictionary_id=None
+    ):
+        """Compress the payloads of messages sent by this client.
+
+        Payloads of at least threshold bytes are compressed, and the codec is recorded in the
+        message's content_encoding so that the consumer of the messages can decompress them.
+        Received C2D and input messages with a matching content_encoding are decompressed
+        before they are delivered.  Messages which already have a content_encoding other than
+        utf-8 are never compressed.
+
+        :param str encoding: The codec to compress payloads with, "gzip" (the default) or "deflate".
+        :param int threshold: Payloads smaller than this number of bytes are sent uncompressed.
+        :param int level: The compression level, from 1 (least CPU) to 9 (fewest bytes).
+        :param bytes dictionary: (OPTIONAL) A preset dictionary of byte sequences which are common
+        in payloads, which improves compression of small payloads.  Only supported with "deflate".
+        :param str dictionary_id: A name for the preset dictionary, sent with each message in the
+        "compression-dictionary" custom property.  Required if a dictionary is given.
+
+        :raises: ValueError if the settings are not valid.
+        """
+        self._iothub_pipeline.set_payload_compression(
+            encoding=encoding,
+            threshold=threshold,
+            level=level,
+            dictionary=dictionary,
+            dictionary_id=dictionary_id,
+        )
+
+    def disable_payload_compression(self):
+        """Stop compressing the payloads of messages sent by this client, and stop decompressing
+        the payloads of messages received by it.
+        """
+        self._iothub_pipeline.set_payload_compression(encoding=None)
+
+    def enable_telemetry_aggregation(self, window_size=None, window_interval=None):
+        """Aggregate numeric telemetry readings into summary messages.
+
+        While enabled, each message passed to send_message whose payload is a JSON object of
+        numbers, such as '{"temperature": 21.5, "humidity": 40}', is added to the current window
+        instead of being sent, and send_message returns immediately.  When the window is full, a
+        single message is sent whose payload maps each key to the "min", "max", "mean", "count" and
+        "last" of its readings in the window.  Messages with a message_id or custom properties are
+        never aggregated.  NumPy is used to compute the summaries if it is installed.
+
+        :param int window_size: (OPTIONAL) The number of messages to aggregate into each summary.
+        :param float window_interval: (OPTIONAL) The maximum number of seconds to aggregate messages
+        for before sending a summary.  At least one of window_size and window_interval is required.
+
+        :raises: ValueError if the settings are not valid.
+        """
+        if window_size is None and window_interval is None:
+            raise ValueError("window_size or window_interval is required")
+        self._iothub_pipeline.set_telemetry_aggregation(
+            window_size=window_size, window_interval=window_interval
+        )
+
+    def disable_telemetry_aggregation(self):
+        """Stop aggregating telemetry readings.  A summary of any readings in the current window
+        is sent immediately.
+        """
+        self._iothub_pipeline.set_telemetry_aggregation(window_size=None, window_interval=None)
+
+    def enable_rate_limiting(self, rate_limits):
+        """Limit the rate at which this client sends messages, twin requests and method responses,
+        so that it stays under the throttles of the IoT Hub instead of being throttled or
+        disconnected by the service.
+
+        Operations which would exceed a limit are queued in order until they can be sent, so
+        sending takes longer instead of failing.  Use RateLimits.for_tier to create limits for the
+        tier and number of units of the hub.  The same RateLimits can be given to several clients
+        to share the limits between them.
+
+        :param rate_limits: The limits for each class of operation.
+        :type rate_limits: RateLimits
+        """
+        self._iothub_pipeline.set_rate_limits(rate_limits)
+
+    def disable_rate_limiting(self):
+        """Stop limiting the rate at which this client sends operations.  Operations which are
+        already queued are still sent when their time comes.
+        """
+        self._iothub_pipeline.set_rate_limits(None)
+
+    def enable_twin_patch_coalescing(self):
+        """Merge desired properties patches which have not been received yet into a single patch.
+
+        While enabled, a patch which arrives while another is still waiting to be returned by
+        receive_twin_desired_properties_patch is merged into the waiting patch, so the next call
+        returns one patch with the combined changes and the "$version" of the latest patch.  The
+        only exception is a patch which sets a property to an object after the waiting patch
+        deleted it or set it to another kind of value.  A merged patch would keep the old contents
+        of the object, so that patch is queued behind the waiting one instead.
+        """
+        self._inbox_manager.coalesce_twin_patches = True
+
+    def disable_twin_patch_coalescing(self):
+        """Stop merging desired properties patches.  A patch which is already waiting is still
+        returned as it is.
+        """
+        self._inbox_manager.coalesce_twin_patches = False
+
+    def enable_reported_properties_diffing(self):
+        """Only send the reported properties which have changed.
+
+        While enabled, the client keeps the reported properties which the service has acknowledged
+        since diffing was enabled, and reduces each patch passed to patch_twin_reported_properties
+        to the properties whose values it changes.  If it changes nothing, no request is sent at
+        all.  This allows an application to pass its entire reported state to
+        patch_twin_reported_properties whenever part of it changes.  Setting a property to None
+        to delete it is only skipped once the service has acknowledged a patch deleting it.
+
+        Diffing assumes that no other client updates the reported properties of the twin.
+        """
+        self._reported_properties_tracker = ReportedPropertiesTracker()
+
+    def disable_reported_properties_diffing(self):
+        """Stop diffing reported properties, and forget the acknowledged reported properties.
+        """
+        self._reported_properties_tracker = None
+
     @abc.abstractmethod
     def connect(self):
         pass
@@ -83,6 +260,10 @@ class AbstractIoTHubClient(object):
     def disconnect(self):
         pass
 
+    @abc.abstractmethod
+    def shutdown(self, timeout=None):
+        pass
+
     @abc.abstractmethod
     def send_message(self, message):
         pass
@@ -111,7 +292,9 @@ class AbstractIoTHubClient(object):
 @six.add_metaclass(abc.ABCMeta)
 class AbstractIoTHubDeviceClient(AbstractIoTHubClient):
     @classmethod
-    def create_from_x509_certificate(cls, x509, hostname, device_id):
+    def create_from_x509_certificate(
+        cls, x509, hostname, device_id, keep_alive=None, ping_timeout=None, max_round_trip_time=None
+    ):
         """
         Instantiate a client which using X509 certificate authentication.
         :param hostname: Host running the IotHub. Can be found in the Azure portal in the Overview tab as the string hostname.
@@ -119,18 +302,34 @@ class AbstractIoTHubDeviceClient(AbstractIoTHubClient):
         If the cert comes from a CER file, it needs to be base64 encoded.
         :type x509: X509
         :param device_id: The ID is used to uniquely identify a device in the IoTHub
+        :param int keep_alive: (OPTIONAL) The maximum number of seconds between MQTT packets sent to
+        the hub.  When the connection is idle, a keepalive ping is sent at this interval. Defaults to 60.
+        :param float ping_timeout: (OPTIONAL) The number of seconds to wait for a ping response before
+        the connection is considered dead, dropped and re-established.
+        :param float max_round_trip_time: (OPTIONAL) The number of seconds the smoothed round trip
+        time of the keepalive pings may reach before the connection is considered degraded, dropped
+        and re-established.
         :return: A IoTHubClient which can use X509 authentication.
         """
         authentication_provider = auth.X509AuthenticationProvider(
             x509=x509, hostname=hostname, device_id=device_id
         )
-        iothub_pipeline = pipeline.IoTHubPipeline(authentication_provider)
+        iothub_pipeline = pipeline.IoTHubPipeline(
+            authentication_provider,
+            keep_alive=keep_alive,
+            ping_timeout=ping_timeout,
+            max_round_trip_time=max_round_trip_time,
+        )
         return cls(iothub_pipeline)
 
     @abc.abstractmethod
     def receive_message(self):
         pass
 
+    @abc.abstractmethod
+    def receive_messages(self, max_messages):
+        pass
+
 
 @six.add_metaclass(abc.ABCMeta)
 class AbstractIoTHubModuleClient(AbstractIoTHubClient):
@@ -146,13 +345,23 @@ class AbstractIoTHubModuleClient(AbstractIoTHubClient):
         self._edge_pipeline = edge_pipeline
 
     @classmethod
-    def create_from_edge_environment(cls):
+    def create_from_edge_environment(
+        cls, keep_alive=None, ping_timeout=None, max_round_trip_time=None
+    ):
         """
         Instantiate the client from the IoT Edge environment.
 
         This method can only be run from inside an IoT Edge container, or in a debugging
         environment configured for Edge development (e.g. Visual Studio, Visual Studio Code)
 
+        :param int keep_alive: (OPTIONAL) The maximum number of seconds between MQTT packets sent to
+        the hub.  When the connection is idle, a keepalive ping is sent at this interval. Defaults to 60.
+        :param float ping_timeout: (OPTIONAL) The number of seconds to wait for a ping response before
+        the connection is considered dead, dropped and re-established.
+        :param float max_round_trip_time: (OPTIONAL) The number of seconds the smoothed round trip
+        time of the keepalive pings may reach before the connection is considered degraded, dropped
+        and re-established.
+
         :raises: IoTEdgeError if the IoT Edge container is not configured correctly.
         :raises: ValueError if debug variables are invalid
         """
@@ -206,12 +415,26 @@ class AbstractIoTHubModuleClient(AbstractIoTHubClient):
                 workload_uri=workload_uri,
                 api_version=api_version,
             )
-        iothub_pipeline = pipeline.IoTHubPipeline(authentication_provider)
+        iothub_pipeline = pipeline.IoTHubPipeline(
+            authentication_provider,
+            keep_alive=keep_alive,
+            ping_timeout=ping_timeout,
+            max_round_trip_time=max_round_trip_time,
+        )
         edge_pipeline = pipeline.EdgePipeline(authentication_provider)
         return cls(iothub_pipeline, edge_pipeline=edge_pipeline)
 
     @classmethod
-    def create_from_x509_certificate(cls, x509, hostname, device_id, module_id):
+    def create_from_x509_certificate(
+        cls,
+        x509,
+        hostname,
+        device_id,
+        module_id,
+        keep_alive=None,
+        ping_timeout=None,
+        max_round_trip_time=None,
+    ):
         """
         Instantiate a client which using X509 certificate authentication.
         :param hostname: Host running the IotHub. Can be found in the Azure portal in the Overview tab as the string hostname.
@@ -220,12 +443,24 @@ class AbstractIoTHubModuleClient(AbstractIoTHubClient):
         :type x509: X509
         :param device_id: The ID is used to uniquely identify a device in the IoTHub
         :param module_id : The ID of the module to uniquely identify a module on a device on the IoTHub.
+        :param int keep_alive: (OPTIONAL) The maximum number of seconds between MQTT packets sent to
+        the hub.  When the connection is idle, a keepalive ping is sent at this interval. Defaults to 60.
+        :param float ping_timeout: (OPTIONAL) The number of seconds to wait for a ping response before
+        the connection is considered dead, dropped and re-established.
+        :param float max_round_trip_time: (OPTIONAL) The number of seconds the smoothed round trip
+        time of the keepalive pings may reach before the connection is considered degraded, dropped
+        and re-established.
         :return: A IoTHubClient which can use X509 authentication.
         """
         authentication_provider = auth.X509AuthenticationProvider(
             x509=x509, hostname=hostname, device_id=device_id, module_id=module_id
         )
-        iothub_pipeline = pipeline.IoTHubPipeline(authentication_provider)
+        iothub_pipeline = pipeline.IoTHubPipeline(
+            authentication_provider,
+            keep_alive=keep_alive,
+            ping_timeout=ping_timeout,
+            max_round_trip_time=max_round_trip_time,
+        )
         return cls(iothub_pipeline)
 
     @abc.abstractmethod
@@ -235,3 +470,7 @@ class AbstractIoTHubModuleClient(AbstractIoTHubClient):
     @abc.abstractmethod
     def receive_message_on_input(self, input_name):
         pass
+
+    @abc.abstractmethod
+    def receive_messages_on_input(self, input_name, max_messages):
+        pass
@@ -4,6 +4,6 @@ This SDK provides asynchronous functionality for communicating with the Azure Io
 as a Device or Module.
 """
 
-from .async_clients import IoTHubDeviceClient, IoTHubModuleClient
+from .async_clients import IoTHubDeviceClient, IoTHubModuleClient, connect_all
 
-__all__ = ["IoTHubDeviceClient", "IoTHubModuleClient"]
+__all__ = ["IoTHubDeviceClient", "IoTHubModuleClient", "connect_all"]
@@ -7,21 +7,49 @@
 Azure IoTHub Device SDK for Python.
 """
 
+import asyncio
+import functools
 import logging
 from azure.iot.device.common import async_adapter
+from azure.iot.device.common.rate_limiter import TokenBucket
 from azure.iot.device.iothub.abstract_clients import (
     AbstractIoTHubClient,
     AbstractIoTHubDeviceClient,
     AbstractIoTHubModuleClient,
+    DEFAULT_CONNECTIONS_PER_SECOND,
 )
 from azure.iot.device.iothub.models import Message
 from azure.iot.device.iothub.pipeline import constant
 from azure.iot.device.iothub.inbox_manager import InboxManager
-from .async_inbox import AsyncClientInbox
+from .async_inbox import AsyncClientInbox, AsyncInboxIterator, DEFAULT_PREFETCH
 
 logger = logging.getLogger(__name__)
 
 
+async def connect_all(
+    clients, connections_per_second=DEFAULT_CONNECTIONS_PER_SECOND, max_concurrent_connects=32
+):
+    """Connect many clients at once, without exceeding a connection rate.
+
+    :param clients: The clients to connect.
+    :param float connections_per_second: The maximum rate at which to start connecting clients.
+    This should not exceed the device connection throttle of the IoT Hub, which depends on its tier
+    and number of units.
+    :param int max_concurrent_connects: The maximum number of clients connecting at the same time.
+    """
+    clients = list(clients)
+    logger.info("Connecting {} clients to Hub...".format(len(clients)))
+    rate_limiter = TokenBucket(connections_per_second)
+    semaphore = asyncio.Semaphore(max_concurrent_connects)
+
+    async def connect(client):
+        async with semaphore:
+            await asyncio.sleep(rate_limiter.reserve())
+            await client.connect()
+
+    await asyncio.gather(*[connect(client) for client in clients])
+
+
 class GenericIoTHubClient(AbstractIoTHubClient):
     """A super class representing a generic asynchronous client.
     This class needs to be extended for specific clients.
@@ -57,35 +85,93 @@ class GenericIoTHubClient(AbstractIoTHubClient):
         self._inbox_manager.clear_all_method_requests()
         logger.info("Cleared all pending method requests due to disconnect")
 
+    def get_statistics(self):
+        """Get a snapshot of the statistics collected by the client.
+
+        This includes counters for messages and bytes sent and received, acknowledgements,
+        reconnects and token renewals, as well as the current number of operations in flight and
+        items waiting in the client's inboxes.  Counters accumulate until reset_statistics is called.
+
+        :returns: A dict mapping statistic names to integer values.
+        """
+        statistics = self._iothub_pipeline.get_statistics()
+        statistics.update(self._inbox_manager.get_statistics())
+        return statistics
+
+    def reset_statistics(self):
+        """Reset all of the client's counters to zero.
+
+        Values which describe the current state of the client, such as the number of items
+        waiting in inboxes, are not affected.
+        """
+        self._iothub_pipeline.reset_statistics()
+        self._inbox_manager.reset_statistics()
+
     async def connect(self):
         """Connects the client to an Azure IoT Hub or Azure IoT Edge Hub instance.
 
         The destination is chosen based on the credentials passed via the auth_provider parameter
         that was provided when this object was initialized.
+
+        :raises: OperationCancelledError if the client has been shut down.
         """
         logger.info("Connecting to Hub...")
         connect_async = async_adapter.emulate_async(self._iothub_pipeline.connect)
 
-        def sync_callback():
-            logger.info("Successfully connected to Hub")
+        def sync_callback(error=None):
+            if not error:
+                logger.info("Successfully connected to Hub")
+            return error
 
         callback = async_adapter.AwaitableCallback(sync_callback)
 
         await connect_async(callback=callback)
-        await callback.completion()
+        error = await callback.completion()
+        if error:
+            raise error
 
     async def disconnect(self):
         """Disconnect the client from the Azure IoT Hub or Azure IoT Edge Hub instance.
+
+        :raises: OperationCancelledError if the client has been shut down.
         """
         logger.info("Disconnecting from Hub...")
         disconnect_async = async_adapter.emulate_async(self._iothub_pipeline.disconnect)
 
-        def sync_callback():
-            logger.info("Successfully disconnected from Hub")
+        def sync_callback(error=None):
+            if not error:
+                logger.info("Successfully disconnected from Hub")
+            return error
 
         callback = async_adapter.AwaitableCallback(sync_callback)
 
         await disconnect_async(callback=callback)
+        error = await callback.completion()
+        if error:
+            raise error
+
+    async def shutdown(self, timeout=None):
+        """Shut down the client for good, once its messages in flight have been delivered.
+
+        The client stops accepting new operations and waits for up to timeout seconds for the
+        service to acknowledge the messages and responses which are in flight.  Any which remain
+        are failed with an OperationCancelledError, and the connection is closed.
+
+        The background threads which are shared by every client in the process keep running.
+        Call azure.iot.device.shutdown_executors() to stop them once every client is shut down.
+
+        :param float timeout: The maximum number of seconds to wait for messages in flight, or
+        None to wait for as long as the connection stays up.
+        """
+        logger.info("Shutting down client...")
+        shutdown_async = async_adapter.emulate_async(self._iothub_pipeline.shutdown)
+
+        def sync_callback():
+            logger.info("Successfully shut down client")
+
+        callback = async_adapter.AwaitableCallback(sync_callback)
+
+        await shutdown_async(timeout=timeout, callback=callback)
         await callback.completion()
 
     async def send_message(self, message):
@@ -103,13 +189,17 @@ class GenericIoTHubClient(AbstractIoTHubClient):
         logger.info("Sending message to Hub...")
         send_message_async = async_adapter.emulate_async(self._iothub_pipeline.send_message)
 
-        def sync_callback():
-            logger.info("Successfully sent message to Hub")
+        def sync_callback(error=None):
+            if not error:
+                logger.info("Successfully sent message to Hub")
+            return error
 
         callback = async_adapter.AwaitableCallback(sync_callback)
 
         await send_message_async(message, callback=callback)
-        await callback.completion()
+        error = await callback.completion()
+        if error:
+            raise error
 
     async def receive_method_request(self, method_name=None):
         """Receive a method request via the Azure IoT Hub or Azure IoT Edge Hub.
@@ -145,37 +235,56 @@ class GenericIoTHubClient(AbstractIoTHubClient):
             self._iothub_pipeline.send_method_response
         )
 
-        def sync_callback():
-            logger.info("Successfully sent method response to Hub")
+        def sync_callback(error=None):
+            if not error:
+                logger.info("Successfully sent method response to Hub")
+            return error
 
         callback = async_adapter.AwaitableCallback(sync_callback)
 
         # TODO: maybe consolidate method_request, result and status into a new object
         await send_method_response_async(method_response, callback=callback)
-        await callback.completion()
+        error = await callback.completion()
+        if error:
+            raise error
+
+    async def _ensure_feature_enabled(self, feature_name):
+        if not self._iothub_pipeline.feature_enabled[feature_name]:
+            await self._enable_feature(feature_name)
 
     async def _enable_feature(self, feature_name):
         """Enable an Azure IoT Hub feature
 
         :param feature_name: The name of the feature to enable.
         See azure.iot.device.common.pipeline.constant for possible values.
+
+        :raises: OperationCancelledError if the client has been shut down.
         """
         logger.info("Enabling feature:" + feature_name + "...")
         enable_feature_async = async_adapter.emulate_async(self._iothub_pipeline.enable_feature)
 
-        def sync_callback():
-            logger.info("Successfully enabled feature:" + feature_name)
+        def sync_callback(error=None):
+            if not error:
+                logger.info("Successfully enabled feature:" + feature_name)
+            return error
 
         callback = async_adapter.AwaitableCallback(sync_callback)
 
         await enable_feature_async(feature_name, callback=callback)
-        await callback.completion()
+        error = await callback.completion()
+        if error:
+            raise error
 
     async def get_twin(self):
         """
         Gets the device or module twin from the Azure IoT Hub or Azure IoT Edge Hub service.
 
         :returns: Twin object which was retrieved from the hub
+
+        :raises: TimeoutError if the service does not respond in time.
+        :raises: ConnectionDroppedError if the connection drops before the service responds.
+        :raises: PipelineError if too many requests are already waiting for a response.
+        :raises: OperationCancelledError if the client is shut down before the service responds.
         """
         logger.info("Getting twin")
 
@@ -186,15 +295,19 @@ class GenericIoTHubClient(AbstractIoTHubClient):
 
         twin = None
 
-        def sync_callback(received_twin):
+        def sync_callback(received_twin=None, error=None):
             nonlocal twin
-            logger.info("Successfully retrieved twin")
+            if not error:
+                logger.info("Successfully retrieved twin")
             twin = received_twin
+            return error
 
         callback = async_adapter.AwaitableCallback(sync_callback)
 
         await get_twin_async(callback=callback)
-        await callback.completion()
+        error = await callback.completion()
+        if error:
+            raise error
 
         return twin
 
@@ -205,11 +318,27 @@ class GenericIoTHubClient(AbstractIoTHubClient):
         If the service returns an error on the patch operation, this function will raise the
         appropriate error.
 
+        If reported properties diffing is enabled, only the properties which the patch changes
+        are sent, and nothing is sent if it changes none of them.
+
         :param reported_properties_patch:
         :type reported_properties_patch: dict, str, int, float, bool, or None (JSON compatible values)
+
+        :raises: TimeoutError if the service does not respond in time.
+        :raises: ConnectionDroppedError if the connection drops before the service responds.
+        :raises: PipelineError if too many requests are already waiting for a response.
+        :raises: OperationCancelledError if the client is shut down before the service responds.
         """
         logger.info("Patching twin reported properties")
 
+        tracker = None
+        if self._reported_properties_tracker and isinstance(reported_properties_patch, dict):
+            tracker = self._reported_properties_tracker
+            reported_properties_patch = tracker.reduce_patch(reported_properties_patch)
+            if not reported_properties_patch:
+                logger.info("Reported properties are unchanged - not sending patch")
+                return
+
         if not self._iothub_pipeline.feature_enabled[constant.TWIN]:
             await self._enable_feature(constant.TWIN)
 
@@ -217,13 +346,19 @@ class GenericIoTHubClient(AbstractIoTHubClient):
             self._iothub_pipeline.patch_twin_reported_properties
         )
 
-        def sync_callback():
+        def sync_callback(error=None):
+            if error:
+                return error
+            if tracker is not None:
+                tracker.acknowledge(reported_properties_patch)
             logger.info("Successfully sent twin patch")
 
         callback = async_adapter.AwaitableCallback(sync_callback)
 
         await patch_twin_async(patch=reported_properties_patch, callback=callback)
-        await callback.completion()
+        error = await callback.completion()
+        if error:
+            raise error
 
     async def receive_twin_desired_properties_patch(self):
         """
@@ -277,6 +412,49 @@ class IoTHubDeviceClient(GenericIoTHubClient, AbstractIoTHubDeviceClient):
         logger.info("Message received")
         return message
 
+    async def receive_messages(self, max_messages, timeout=None):
+        """Receive the messages which have been sent from the Azure IoT Hub, up to a maximum.
+
+        If no message is yet available, will wait until one is available, then return it along
+        with any other messages which have already arrived, so that a batch of messages can be
+        processed together.
+
+        :param int max_messages: The maximum number of messages to return.
+        :param float timeout: Optionally provide a number of seconds until waiting times out.
+
+        :raises: ValueError if max_messages is less than 1.
+        :raises: InboxEmpty if timeout occurs.
+
+        :returns: A list of between 1 and max_messages Messages, in the order they arrived.
+        """
+        if not self._iothub_pipeline.feature_enabled[constant.C2D_MSG]:
+            await self._enable_feature(constant.C2D_MSG)
+        c2d_inbox = self._inbox_manager.get_c2d_message_inbox()
+
+        logger.info("Waiting for messages from Hub...")
+        messages = await c2d_inbox.get_many(max_messages, timeout=timeout)
+        logger.info("{} messages received".format(len(messages)))
+        return messages
+
+    def messages(self, prefetch=DEFAULT_PREFETCH):
+        """Iterate over the messages sent from the Azure IoT Hub, waiting for each to arrive.
+
+        Use with "async for message in client.messages()".  Messages which are already waiting
+        are taken up to prefetch at a time, so that a busy consumer only waits once per batch.
+        Messages which were taken but not returned go back to the inbox when the iterator is closed
+        with aclose() or garbage collected.
+
+        :param int prefetch: The maximum number of waiting messages to take at once.
+        :returns: An asynchronous iterator of Messages.
+
+        :raises: ValueError if prefetch is less than 1.
+        """
+        return AsyncInboxIterator(
+            self._inbox_manager.get_c2d_message_inbox(),
+            prefetch=prefetch,
+            before_wait=functools.partial(self._ensure_feature_enabled, constant.C2D_MSG),
+        )
+
 
 class IoTHubModuleClient(GenericIoTHubClient, AbstractIoTHubModuleClient):
     """An asynchronous module client that connects to an Azure IoT Hub or Azure IoT Edge instance.
@@ -320,13 +498,17 @@ class IoTHubModuleClient(GenericIoTHubClient, AbstractIoTHubModuleClient):
             self._iothub_pipeline.send_output_event
         )
 
-        def sync_callback():
-            logger.info("Successfully sent message to output: " + output_name)
+        def sync_callback(error=None):
+            if not error:
+                logger.info("Successfully sent message to output: " + output_name)
+            return error
 
         callback = async_adapter.AwaitableCallback(sync_callback)
 
         await send_output_event_async(message, callback=callback)
-        await callback.completion()
+        error = await callback.completion()
+        if error:
+            raise error
 
     async def receive_message_on_input(self, input_name):
         """Receive an input message that has been sent from another Module to a specific input.
@@ -344,3 +526,48 @@ class IoTHubModuleClient(GenericIoTHubClient, AbstractIoTHubModuleClient):
         message = await inbox.get()
         logger.info("Input message received on: " + input_name)
         return message
+
+    async def receive_messages_on_input(self, input_name, max_messages, timeout=None):
+        """Receive the input messages which have been sent to a specific input, up to a maximum.
+
+        If no message is yet available, will wait until one is available, then return it along
+        with any other messages which have already arrived on the input, so that a batch of
+        messages can be processed together.
+
+        :param str input_name: The input name to receive messages on.
+        :param int max_messages: The maximum number of messages to return.
+        :param float timeout: Optionally provide a number of seconds until waiting times out.
+
+        :raises: ValueError if max_messages is less than 1.
+        :raises: InboxEmpty if timeout occurs.
+
+        :returns: A list of between 1 and max_messages Messages, in the order they arrived.
+        """
+        if not self._iothub_pipeline.feature_enabled[constant.INPUT_MSG]:
+            await self._enable_feature(constant.INPUT_MSG)
+        inbox = self._inbox_manager.get_input_message_inbox(input_name)
+
+        logger.info("Waiting for input messages on: " + input_name + "...")
+        messages = await inbox.get_many(max_messages, timeout=timeout)
+        logger.info("{} input messages received on: {}".format(len(messages), input_name))
+        return messages
+
+    def input_messages(self, input_name, prefetch=DEFAULT_PREFETCH):
+        """Iterate over the input messages sent to a specific input, waiting for each to arrive.
+
+        Use with "async for message in client.input_messages(input_name)".  Messages which are
+        already waiting are taken up to prefetch at a time, so that a busy consumer only waits
+        once per batch.  Messages which were taken but not returned go back to the inbox when the
+        iterator is closed with aclose() or garbage collected.
+
+        :param str input_name: The input name to receive messages on.
+        :param int prefetch: The maximum number of waiting messages to take at once.
+        :returns: An asynchronous iterator of Messages.
+
+        :raises: ValueError if prefetch is less than 1.
+        """
+        return AsyncInboxIterator(
+            self._inbox_manager.get_input_message_inbox(input_name),
+            prefetch=prefetch,
+            before_wait=functools.partial(self._ensure_feature_enabled, constant.INPUT_MSG),
+        )
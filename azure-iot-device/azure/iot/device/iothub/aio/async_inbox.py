@@ -5,37 +5,117 @@
 # --------------------------------------------------------------------------
 """This module contains an Inbox class for use with an asynchronous client"""
 
-import janus
-from azure.iot.device.iothub.sync_inbox import AbstractInbox
+import asyncio
+import collections
+import threading
+import azure.iot.device.common.asyncio_compat as asyncio_compat
+from azure.iot.device.iothub.sync_inbox import AbstractInbox, InboxEmpty
+
+# The default maximum number of items an AsyncInboxIterator takes from its inbox at once
+DEFAULT_PREFETCH = 32
 
 
 class AsyncClientInbox(AbstractInbox):
     """Holds generic incoming data for an asynchronous client.
 
+    Items are put into the inbox from other threads and taken out on the event loop.  The inbox
+    binds to the event loop of the first coroutine which waits on it, and however many items
+    are put in while a coroutine is waiting, the waiting coroutines are woken by a single
+    callback on the event loop.
+
     All methods implemented in this class are threadsafe.
     """
 
     def __init__(self):
         """Initializer for AsyncClientInbox."""
-        self._queue = janus.Queue()
+        self._items = collections.deque()
+        self._lock = threading.Lock()
+        self._loop = None
+        # Futures of the coroutines waiting for an item, and whether a callback to wake them
+        # has already been scheduled on the event loop
+        self._waiters = []
+        self._wakeup_scheduled = False
 
     def __contains__(self, item):
         """Return True if item is in Inbox, False otherwise"""
-        # Note that this function accesses private attributes of janus, thus it is somewhat
-        # dangerous. Unforutnately, it is the only way to implement this functionality.
-        # However, because this function is only used in tests, I feel it is acceptable.
-        with self._queue._sync_mutex:
-            return item in self._queue._queue
+        with self._lock:
+            return item in self._items
 
     def _put(self, item):
         """Put an item into the Inbox.
 
-        Block if necessary until a free slot is available.
         Only to be used by the InboxManager.
 
         :param item: The item to be put in the Inbox.
         """
-        self._queue.sync_q.put(item)
+        with self._lock:
+            self._items.append(item)
+            if not self._waiters or self._wakeup_scheduled:
+                return
+            self._wakeup_scheduled = True
+            loop = self._loop
+        loop.call_soon_threadsafe(self._wake_waiters)
+
+    def _put_coalesced(self, item, merge):
+        """Put an item into the Inbox, or merge it into the last item in the Inbox if there is one.
+
+        Only to be used by the InboxManager.
+
+        :param item: The item to put in the Inbox.
+        :param merge: A function which takes the last item and item and returns the merged item,
+        or None if they cannot be merged.
+        """
+        with self._lock:
+            if self._items:
+                merged = merge(self._items[-1], item)
+                if merged is not None:
+                    self._items[-1] = merged
+                    return
+        self._put(item)
+
+    def _put_back(self, items):
+        """Return items which were taken from the Inbox to the front of it, in order, so that they
+        are the next items to be taken.
+
+        :param items: The items to return, in the order they were taken.
+        """
+        with self._lock:
+            self._items.extendleft(reversed(items))
+            if not self._waiters or self._wakeup_scheduled:
+                return
+            self._wakeup_scheduled = True
+            loop = self._loop
+        loop.call_soon_threadsafe(self._wake_waiters)
+
+    def _wake_waiters(self):
+        """Wake every coroutine waiting for an item.  Runs on the event loop."""
+        with self._lock:
+            waiters = self._waiters
+            self._waiters = []
+            self._wakeup_scheduled = False
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def _wait(self, timeout=None):
+        """Wait until an item may be available.  Must be called without holding the lock, when
+        the Inbox was empty.
+
+        :raises: asyncio.TimeoutError if the timeout passes first.
+        """
+        loop = asyncio_compat.get_running_loop()
+        with self._lock:
+            if self._items:
+                return
+            self._loop = loop
+            waiter = asyncio_compat.create_future(loop)
+            self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        finally:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
 
     async def get(self):
         """Remove and return an item from the Inbox.
@@ -44,20 +124,114 @@ class AsyncClientInbox(AbstractInbox):
 
         :returns: An item from the Inbox.
         """
-        return await self._queue.async_q.get()
+        while True:
+            with self._lock:
+                if self._items:
+                    return self._items.popleft()
+            await self._wait()
+
+    async def get_many(self, max_items, timeout=None):
+        """Remove and return the items which are available in the Inbox, up to a maximum.
+
+        If Inbox is empty, wait until an item is available, then take every item which is
+        available, up to max_items, without releasing the lock of the Inbox in between.
+
+        :param int max_items: The maximum number of items to return.
+        :param float timeout: Optionally provide a number of seconds until waiting times out.
+
+        :raises: ValueError if max_items is less than 1
+        :raises: InboxEmpty if timeout occurs because the inbox is empty
+
+        :returns: A list of between 1 and max_items items from the Inbox, in order.
+        """
+        if max_items < 1:
+            raise ValueError("max_items must be at least 1")
+        loop = asyncio_compat.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            with self._lock:
+                if self._items:
+                    items = []
+                    while self._items and len(items) < max_items:
+                        items.append(self._items.popleft())
+                    return items
+            remaining = None if deadline is None else max(deadline - loop.time(), 0)
+            try:
+                await self._wait(remaining)
+            except asyncio.TimeoutError:
+                raise InboxEmpty("Inbox is empty")
 
     def empty(self):
         """Returns True if the inbox is empty, False otherwise
 
         :returns: Boolean indicating if the inbox is empty
         """
-        return self._queue.async_q.empty()
+        return not self._items
+
+    def qsize(self):
+        """Returns the approximate number of items in the inbox
+
+        :returns: The number of items in the inbox
+        """
+        return len(self._items)
 
     def clear(self):
         """Remove all items from the inbox.
         """
-        while True:
-            try:
-                self._queue.sync_q.get_nowait()
-            except janus.SyncQueueEmpty:
-                break
+        with self._lock:
+            self._items.clear()
+
+
+class AsyncInboxIterator(object):
+    """An asynchronous iterator over the items arriving in an AsyncClientInbox.
+
+    When it runs out of items, the iterator waits for the next item, then takes any others which
+    are already waiting in the inbox up to the prefetch depth, so that a consumer which is behind
+    only waits on the inbox once per batch.  Items taken from the inbox are returned in order,
+    and are not returned by any other receive call.
+
+    When the iterator is closed with aclose(), or garbage collected after the consumer breaks out
+    of its loop or is cancelled, the items it took but did not return are put back at the front
+    of the inbox, so that the next receive call returns them.
+    """
+
+    def __init__(self, inbox, prefetch=DEFAULT_PREFETCH, before_wait=None):
+        """Initializer for AsyncInboxIterator.
+
+        :param inbox: The AsyncClientInbox to take items from.
+        :param int prefetch: The maximum number of items to take from the inbox at once.
+        :param before_wait: (OPTIONAL) A coroutine function which is awaited before each wait
+        on the inbox, such as one which enables the feature that fills the inbox.
+
+        :raises: ValueError if prefetch is less than 1.
+        """
+        # Set first, since __del__ still runs if the prefetch is rejected
+        self._items = collections.deque()
+        if prefetch < 1:
+            raise ValueError("prefetch must be at least 1")
+        self._inbox = inbox
+        self._prefetch = prefetch
+        self._before_wait = before_wait
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self._items:
+            if self._before_wait:
+                await self._before_wait()
+            self._items.extend(await self._inbox.get_many(self._prefetch))
+        return self._items.popleft()
+
+    async def aclose(self):
+        """Put the items which were taken from the inbox but not returned back into the inbox."""
+        self._put_back_items()
+
+    def __del__(self):
+        self._put_back_items()
+
+    def _put_back_items(self):
+        items = self._items
+        if items:
+            self._items = collections.deque()
+            self._inbox._put_back(items)
@@ -8,16 +8,30 @@ import os
 import base64
 import json
 import six.moves.urllib as urllib
-import requests
-import requests_unixsocket
 import logging
 from .base_renewable_token_authentication_provider import BaseRenewableTokenAuthenticationProvider
 from azure.iot.device import constant
 
-requests_unixsocket.monkeypatch()
-
 logger = logging.getLogger(__name__)
 
+_requests = None
+
+
+def _get_requests():
+    """
+    Import requests, with unix socket support, the first time an IoTEdgeHsm is created.  This is
+    deferred because both libraries are slow to import, and requests_unixsocket monkeypatches
+    requests, which we don't want to do unless the IoT Edge HSM is actually being used.
+    """
+    global _requests
+    if _requests is None:
+        import requests
+        import requests_unixsocket
+
+        requests_unixsocket.monkeypatch()
+        _requests = requests
+    return _requests
+
 
 class IoTEdgeError(Exception):
     pass
@@ -99,6 +113,7 @@ class IoTEdgeHsm(object):
         self.api_version = api_version
         self.module_generation_id = module_generation_id
         self.workload_uri = _format_socket_uri(workload_uri)
+        self._requests = _get_requests()
 
     # TODO: Is this really the right name? It returns a certificate FROM the trust bundle,
     # not the trust bundle itself
@@ -112,6 +127,7 @@ class IoTEdgeHsm(object):
 
         :raises: IoTEdgeError if unable to retrieve the certificate.
         """
+        requests = self._requests
         r = requests.get(
             self.workload_uri + "trust-bundle",
             params={"api-version": self.api_version},
@@ -158,6 +174,7 @@ class IoTEdgeHsm(object):
         )
         sign_request = {"keyId": "primary", "algo": "HMACSHA256", "data": encoded_data_str}
 
+        requests = self._requests
         r = requests.post(  # TODO: can we use json field instead of data?
             url=path,
             params={"api-version": self.api_version},
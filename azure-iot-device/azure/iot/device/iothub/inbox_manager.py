@@ -6,6 +6,8 @@
 """This module contains a manager for inboxes."""
 
 import logging
+from azure.iot.device.common.statistics import Counters
+from azure.iot.device.iothub.models.twin import merge_patches
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +19,9 @@ class InboxManager(object):
     :ivar input_message_inboxes: A dictionary mapping input names to input message Inboxes.
     :ivar generic_method_request_inbox: The generic method request Inbox.
     :ivar named_method_request_inboxes: A dictionary mapping method names to method request Inboxes.
+    :ivar twin_patch_inbox: The twin patch Inbox.
+    :ivar coalesce_twin_patches: Whether twin patches are merged into the patch waiting in the twin
+    patch Inbox, if there is one, instead of being queued behind it.
     """
 
     def __init__(self, inbox_type):
@@ -30,6 +35,28 @@ class InboxManager(object):
         self.generic_method_request_inbox = self._create_inbox()
         self.named_method_request_inboxes = {}
         self.twin_patch_inbox = self._create_inbox()
+        self.coalesce_twin_patches = False
+        self._counters = Counters(["inbox_items_routed", "inbox_items_dropped"])
+
+    def get_statistics(self):
+        """Get the statistics collected by the InboxManager.
+
+        :returns: A dict mapping statistic names to values.
+        """
+        statistics = self._counters.snapshot()
+        # Copy the dicts of inboxes, since new inboxes could be added from another thread
+        inboxes = (
+            [self.c2d_message_inbox, self.generic_method_request_inbox, self.twin_patch_inbox]
+            + list(self.input_message_inboxes.copy().values())
+            + list(self.named_method_request_inboxes.copy().values())
+        )
+        statistics["inbox_depth"] = sum(inbox.qsize() for inbox in inboxes)
+        return statistics
+
+    def reset_statistics(self):
+        """Reset the counters collected by the InboxManager.
+        """
+        self._counters.reset()
 
     def get_input_message_inbox(self, input_name):
         """Retrieve the input message Inbox for a given input.
@@ -87,8 +114,11 @@ class InboxManager(object):
     def clear_all_method_requests(self):
         """Delete all method requests currently in inboxes.
         """
-        self.generic_method_request_inbox.clear()
-        for inbox in self.named_method_request_inboxes.values():
+        inboxes = [self.generic_method_request_inbox] + list(
+            self.named_method_request_inboxes.values()
+        )
+        for inbox in inboxes:
+            self._counters.increment("inbox_items_dropped", inbox.qsize())
             inbox.clear()
 
     def route_input_message(self, input_name, incoming_message):
@@ -105,9 +135,11 @@ class InboxManager(object):
             inbox = self.input_message_inboxes[input_name]
         except KeyError:
             logger.warning("No input message inbox for {} - dropping message".format(input_name))
+            self._counters.increment("inbox_items_dropped")
             return False
         else:
             inbox._put(incoming_message)
+            self._counters.increment("inbox_items_routed")
             logger.info("Input message sent to {} inbox".format(input_name))
             return True
 
@@ -119,6 +151,7 @@ class InboxManager(object):
         :returns: Boolean indicating if message was successfully routed or not.
         """
         self.c2d_message_inbox._put(incoming_message)
+        self._counters.increment("inbox_items_routed")
         logger.info("C2D message sent to inbox")
         return True
 
@@ -137,15 +170,23 @@ class InboxManager(object):
         except KeyError:
             inbox = self.generic_method_request_inbox
         inbox._put(incoming_method_request)
+        self._counters.increment("inbox_items_routed")
         return True
 
     def route_twin_patch(self, incoming_patch):
         """Route an incoming twin patch to the twin patch Inbox.
 
+        If twin patches are being coalesced, and a patch is already waiting in the Inbox, the
+        incoming patch is merged into it, unless no single patch has the effect of both.
+
         :param incoming_patch: The patch to be routed.
 
         :returns: Boolean indicating if patch was successfully routed or not.
         """
-        self.twin_patch_inbox._put(incoming_patch)
+        if self.coalesce_twin_patches:
+            self.twin_patch_inbox._put_coalesced(incoming_patch, merge_patches)
+        else:
+            self.twin_patch_inbox._put(incoming_patch)
+        self._counters.increment("inbox_items_routed")
         logger.info("twin patch message sent to inbox")
         return True
@@ -5,3 +5,5 @@ This package provides object models for use within the Azure IoT Hub Device SDK.
 
 from .message import Message
 from .methods import MethodRequest, MethodResponse
+from .timeseries import decode_timeseries
+from .rate_limits import RateLimits
@@ -6,6 +6,7 @@
 """This module contains a class representing messages that are sent or received.
 """
 from azure.iot.device import constant
+from . import timeseries
 
 
 # TODO: Revise this class. Does all of this REALLY need to be here?
@@ -26,10 +27,17 @@ class Message(object):
     :ivar content_encoding: Content encoding of the message data. Can be 'utf-8', 'utf-16' or 'utf-32'
     :ivar content_type: Content type property used to route messages with the message-body. Can be 'application/json'
     :ivar output_name: Name of the output that the is being sent to.
+    :ivar qos: The MQTT quality of service level to send the message with. 0 sends the message without waiting for acknowledgement from the service, 1 waits for acknowledgement. If None, the client's telemetry_qos is used.
     """
 
     def __init__(
-        self, data, message_id=None, content_encoding=None, content_type=None, output_name=None
+        self,
+        data,
+        message_id=None,
+        content_encoding=None,
+        content_type=None,
+        output_name=None,
+        qos=None,
     ):
         """
         Initializer for Message
@@ -39,6 +47,7 @@ class Message(object):
         :param str content_encoding: Content encoding of the message data. Can be 'utf-8', 'utf-16' or 'utf-32'
         :param str content_type: Content type property used to routes with the message body. Can be 'application/json'
         :param str output_name: Name of the output that the is being sent to.
+        :param int qos: (OPTIONAL) The MQTT quality of service level to send the message with, 0 or 1. Defaults to the client's telemetry_qos.
         """
         self.data = data
         self.custom_properties = {}
@@ -54,8 +63,42 @@ class Message(object):
         self.content_encoding = content_encoding
         self.content_type = content_type
         self.output_name = output_name
+        self.qos = qos
         self._iothub_interface_id = None
 
+    @classmethod
+    def from_timeseries(
+        cls, timestamps, columns, compress=False, message_id=None, output_name=None, qos=None
+    ):
+        """
+        Create a message carrying a batch of numeric time-series samples in a compact columnar
+        binary encoding, which is far smaller and cheaper to produce than one JSON object per
+        sample.  The payload can be read back with decode_timeseries().
+
+        :param timestamps: The integer timestamp of each sample (for example, milliseconds since
+            the epoch), as an array.array, a NumPy array or any sequence of ints.
+        :param dict columns: A dict mapping each column name to its values, one per timestamp.
+            Each column may be an array.array or NumPy array, whose type is kept, or any sequence
+            of numbers, which is encoded as 64 bit floating point.
+        :param bool compress: Whether to compress the payload with zlib.  If True, the
+            content_encoding of the message is 'deflate'.
+        :param str message_id: A user-settable identifier for the message.
+        :param str output_name: Name of the output that the is being sent to.
+        :param int qos: (OPTIONAL) The MQTT quality of service level to send the message with.
+
+        :returns: A Message whose content_type identifies the time-series encoding.
+        :raises: ValueError if the batch is empty or a column does not have one value per
+            timestamp.
+        """
+        return cls(
+            timeseries.encode_timeseries(timestamps, columns, compress=compress),
+            message_id=message_id,
+            content_encoding="deflate" if compress else None,
+            content_type=constant.TIMESERIES_CONTENT_TYPE,
+            output_name=output_name,
+            qos=qos,
+        )
+
     @property
     def iothub_interface_id(self):
         return self._iothub_interface_id
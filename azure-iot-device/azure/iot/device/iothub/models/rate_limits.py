@@ -0,0 +1,99 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for
+# license information.
+# --------------------------------------------------------------------------
+"""This module contains a class representing client-side limits on the rate of requests sent
+to IoT Hub, used to stay under the hub's throttles.
+"""
+
+from azure.iot.device.common.rate_limiter import TokenBucket
+
+# Operation classes which are rate limited separately
+TELEMETRY = "telemetry"
+TWIN = "twin"
+METHODS = "methods"
+
+# Direct method throttles are measured in bandwidth.  Method responses are counted in chunks of
+# this many bytes, so methods limits are in chunks per second.
+METHOD_CHUNK_SIZE = 4096
+
+# IoT Hub throttles for each tier, as (operations per second per unit, minimum operations per
+# second for the hub).  Twin reads and updates share a single limit, so the lower update limit
+# is used.
+_tier_throttles = {
+    "S1": {TELEMETRY: (12, 100), TWIN: (0, 50), METHODS: (160 * 1024 / METHOD_CHUNK_SIZE, 0)},
+    "S2": {TELEMETRY: (120, 0), TWIN: (5, 50), METHODS: (480 * 1024 / METHOD_CHUNK_SIZE, 0)},
+    "S3": {
+        TELEMETRY: (6000, 0),
+        TWIN: (250, 0),
+        METHODS: (24 * 1024 * 1024 / METHOD_CHUNK_SIZE, 0),
+    },
+}
+
+
+class RateLimits(object):
+    """Limits on the rate at which a client sends telemetry, twin requests and method responses.
+
+    Operations which would exceed a limit are queued, in order, until they can be sent, so the
+    operations complete later instead of being throttled by the service.  IoT Hub's throttles apply
+    to the whole hub, so the same RateLimits object can be given to every client in a process to
+    share the limits between them.
+
+    :ivar telemetry: The TokenBucket for telemetry and output messages, or None for no limit.
+    :ivar twin: The TokenBucket for twin get and patch requests, or None for no limit.
+    :ivar methods: The TokenBucket for method responses, in chunks of 4 KB, or None for no limit.
+    """
+
+    def __init__(self, telemetry=None, twin=None, methods=None, burst_seconds=1):
+        """Initializer for RateLimits.
+
+        :param float telemetry: (OPTIONAL) The maximum number of messages sent per second.
+        :param float twin: (OPTIONAL) The maximum number of twin requests sent per second.
+        :param float methods: (OPTIONAL) The maximum number of 4 KB chunks of method response
+        sent per second.
+        :param float burst_seconds: The number of seconds worth of operations which can be sent at
+        once before operations are queued.
+
+        :raises: ValueError if a limit is not greater than 0.
+        """
+        self.telemetry = self._create_bucket(telemetry, burst_seconds)
+        self.twin = self._create_bucket(twin, burst_seconds)
+        self.methods = self._create_bucket(methods, burst_seconds)
+
+    @staticmethod
+    def _create_bucket(rate, burst_seconds):
+        if rate is None:
+            return None
+        return TokenBucket(rate, capacity=max(rate * burst_seconds, 1))
+
+    @classmethod
+    def for_tier(cls, tier, units=1, fraction=0.9, burst_seconds=1):
+        """Create limits which keep the rate of operations under the throttles of an IoT Hub.
+
+        :param str tier: The tier of the hub, "S1", "S2" or "S3".  The free tier has the same
+        throttles as S1.
+        :param int units: The number of units of the hub.
+        :param float fraction: The fraction of each throttle to use, which leaves headroom for
+        other clients of the hub and for the difference between the client's and the service's
+        measurements.
+        :param float burst_seconds: The number of seconds worth of operations which can be sent at
+        once before operations are queued.
+
+        :raises: ValueError if the tier is not known.
+        """
+        tier = "S1" if tier.upper() == "F1" else tier.upper()
+        if tier not in _tier_throttles:
+            raise ValueError("Unknown IoT Hub tier {}".format(tier))
+        rates = {
+            name: max(per_unit * units, minimum) * fraction
+            for name, (per_unit, minimum) in _tier_throttles[tier].items()
+        }
+        return cls(burst_seconds=burst_seconds, **rates)
+
+    def get_bucket(self, operation_class):
+        """Get the TokenBucket for an operation class, or None if it is not limited.
+
+        :param str operation_class: "telemetry", "twin" or "methods".
+        """
+        return getattr(self, operation_class)
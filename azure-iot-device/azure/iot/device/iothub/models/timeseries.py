@@ -0,0 +1,269 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for
+# license information.
+# --------------------------------------------------------------------------
+"""This module contains a compact columnar binary encoding for batches of numeric time-series
+samples.
+
+A batch is a column of integer timestamps plus any number of named columns of numeric values,
+one value per timestamp.  Timestamps are delta-encoded using the narrowest integer type which
+holds every delta, and each column of values is packed as a typed array, so encoding and
+decoding run at buffer-copy speed instead of formatting one JSON number at a time.
+
+All integers are little-endian.  The layout is:
+
+    magic (4 bytes) | version (uint8) | delta type code (1 byte) | sample count (uint32)
+    first timestamp (int64) | deltas (sample count - 1 packed values)
+    column count (uint16)
+    for each column: name length (uint16) | name (utf-8) | type code (1 byte) | packed values
+
+Type codes are those of the struct module with standard sizes (b, B, h, H, i, I, q, Q, f, d).
+"""
+
+import array
+import operator
+import struct
+import sys
+import zlib
+import six
+
+MAGIC = b"IOTS"
+VERSION = 1
+
+_header = struct.Struct("<4sBcI")
+_first_timestamp = struct.Struct("<q")
+_column_count = struct.Struct("<H")
+_name_length = struct.Struct("<H")
+
+# Maps (kind, item size) to the standard sized type code, where kind is "i" for signed integers,
+# "u" for unsigned integers and "f" for floating point, as in NumPy
+_type_codes = {
+    ("i", 1): "b",
+    ("u", 1): "B",
+    ("i", 2): "h",
+    ("u", 2): "H",
+    ("i", 4): "i",
+    ("u", 4): "I",
+    ("i", 8): "q",
+    ("u", 8): "Q",
+    ("f", 4): "f",
+    ("f", 8): "d",
+}
+_kinds = {type_code: kind_and_size for kind_and_size, type_code in _type_codes.items()}
+_delta_type_codes = "bhiq"
+
+
+def _numpy_dtype(type_code):
+    kind, size = _kinds[type_code]
+    return "<{}{}".format(kind, size)
+
+
+def _array_type_code(values):
+    """
+    Get the standard sized type code for an array.array, whose type codes are native sized.
+    """
+    native = values.typecode
+    kind = "f" if native in "fd" else ("u" if native.isupper() else "i")
+    return _type_codes[(kind, values.itemsize)]
+
+
+def _new_array(type_code, values=()):
+    """
+    Create an array.array whose items have the standard size for type_code.
+    """
+    for native in "bBhHiIlLqQfd":
+        if _array_type_code(array.array(native)) == type_code:
+            return array.array(native, values)
+    raise ValueError("Type code '{}' is not supported on this platform".format(type_code))
+
+
+def _pack_column(values, type_code=None):
+    """
+    Pack a column of numbers into little-endian bytes without formatting each value.
+
+    :param values: An array.array, a NumPy array or any sequence of numbers.
+    :param str type_code: The type code to pack with.  Defaults to the type of the array, or "d"
+        for other sequences.
+    :returns: A tuple of the type code and the packed bytes.
+    """
+    dtype = getattr(values, "dtype", None)
+    if dtype is not None:
+        # NumPy arrays can convert themselves, so there is no need to import NumPy here
+        if type_code is None:
+            type_code = _type_codes.get((dtype.kind, dtype.itemsize))
+            if type_code is None:
+                raise ValueError("Unsupported array type: {}".format(dtype))
+        elif type_code not in _kinds:
+            raise ValueError("Unsupported type code: {}".format(type_code))
+        return type_code, values.astype(_numpy_dtype(type_code), copy=False).tobytes()
+
+    if isinstance(values, array.array) and values.typecode in "bBhHiIlLqQfd":
+        if type_code is None:
+            type_code = _array_type_code(values)
+        elif type_code != _array_type_code(values):
+            values = _new_array(type_code, values)
+    else:
+        type_code = type_code or "d"
+        if type_code not in _kinds:
+            raise ValueError("Unsupported type code: {}".format(type_code))
+        values = _new_array(type_code, values)
+    if sys.byteorder == "big":
+        values = array.array(values.typecode, values)
+        values.byteswap()
+    return type_code, _array_to_bytes(values)
+
+
+def _array_to_bytes(values):
+    return values.tobytes() if six.PY3 else values.tostring()
+
+
+def _array_from_bytes(values, data):
+    if six.PY3:
+        values.frombytes(data)
+    else:
+        values.fromstring(data)
+
+
+def _delta_type_code(low, high):
+    for type_code in _delta_type_codes:
+        bits = _kinds[type_code][1] * 8
+        if -(1 << (bits - 1)) <= low and high < (1 << (bits - 1)):
+            return type_code
+    raise ValueError("Timestamp deltas must fit in a signed 64 bit integer")
+
+
+def _encode_timestamps(timestamps):
+    """
+    Delta-encode a column of integer timestamps.
+
+    :returns: A tuple of the first timestamp, the delta type code and the packed deltas.
+    """
+    if getattr(timestamps, "dtype", None) is not None:
+        if timestamps.dtype.kind not in "iu":
+            raise TypeError("Timestamps must be integers")
+        timestamps = timestamps.astype("<i8", copy=False)
+        deltas = timestamps[1:] - timestamps[:-1]
+        first = int(timestamps[0])
+        low, high = (int(deltas.min()), int(deltas.max())) if len(deltas) else (0, 0)
+    else:
+        if not isinstance(timestamps, array.array):
+            timestamps = _new_array("q", timestamps)
+        first = timestamps[0]
+        deltas = _new_array("q", map(operator.sub, timestamps[1:], timestamps[:-1]))
+        low, high = (min(deltas), max(deltas)) if deltas else (0, 0)
+    delta_type_code = _delta_type_code(low, high)
+    return first, delta_type_code, _pack_column(deltas, delta_type_code)[1]
+
+
+def encode_timeseries(timestamps, columns, compress=False, level=6):
+    """
+    Encode a batch of time-series samples.
+
+    :param timestamps: The integer timestamp of each sample (for example, milliseconds since the
+        epoch), as an array.array, a NumPy array or any sequence of ints.
+    :param dict columns: A dict mapping each column name to its values, one per timestamp.  Each
+        column may be an array.array or NumPy array, whose type is kept, or any sequence of
+        numbers, which is encoded as 64 bit floating point.
+    :param bool compress: Whether to compress the encoded batch with zlib.
+    :param int level: The zlib compression level, from 1 to 9.
+    :returns: The encoded batch as bytes.
+    :raises: ValueError if the batch is empty or a column does not have one value per timestamp.
+    """
+    count = len(timestamps)
+    if count == 0:
+        raise ValueError("A time-series batch must contain at least one sample")
+    if count > 0xFFFFFFFF:
+        raise ValueError("A time-series batch cannot contain more than 2**32 - 1 samples")
+    if len(columns) > 0xFFFF:
+        raise ValueError("A time-series batch cannot contain more than 65535 columns")
+
+    first, delta_type_code, deltas = _encode_timestamps(timestamps)
+    parts = [
+        _header.pack(MAGIC, VERSION, delta_type_code.encode("ascii"), count),
+        _first_timestamp.pack(first),
+        deltas,
+        _column_count.pack(len(columns)),
+    ]
+    for name, values in six.iteritems(columns):
+        if len(values) != count:
+            raise ValueError(
+                "Column '{}' has {} values but there are {} timestamps".format(
+                    name, len(values), count
+                )
+            )
+        encoded_name = name.encode("utf-8")
+        type_code, packed = _pack_column(values)
+        parts.extend(
+            [_name_length.pack(len(encoded_name)), encoded_name, type_code.encode("ascii"), packed]
+        )
+    payload = b"".join(parts)
+    if compress:
+        payload = zlib.compress(payload, level)
+    return payload
+
+
+def decode_timeseries(payload):
+    """
+    Decode a batch of time-series samples produced by encode_timeseries().  Compressed batches are detected
+    and decompressed automatically.
+
+    :param payload: The encoded batch, as bytes, bytearray or memoryview, or a Message carrying
+        it.
+    :returns: A tuple of the timestamps, as an array.array of int64, and a dict mapping each column
+        name to its values, as an array.array of the column's type.  Arrays can be wrapped by NumPy
+        without copying with numpy.frombuffer().
+    :raises: ValueError if the payload is not a valid time-series batch.
+    """
+    payload = memoryview(getattr(payload, "data", payload))
+    if payload[:4].tobytes() != MAGIC:
+        try:
+            payload = memoryview(zlib.decompress(payload.tobytes()))
+        except zlib.error:
+            raise ValueError("Payload is not a time-series batch")
+    try:
+        return _decode(payload)
+    except (struct.error, KeyError, UnicodeDecodeError):
+        raise ValueError("Time-series batch is truncated or corrupt")
+
+
+def _decode(payload):
+    magic, version, delta_type_code, count = _header.unpack_from(payload, 0)
+    if magic != MAGIC:
+        raise ValueError("Payload is not a time-series batch")
+    if version != VERSION:
+        raise ValueError("Unsupported time-series batch version: {}".format(version))
+    offset = _header.size
+    (first,) = _first_timestamp.unpack_from(payload, offset)
+    offset += _first_timestamp.size
+
+    deltas, offset = _unpack_column(payload, offset, delta_type_code.decode("ascii"), count - 1)
+    timestamps = _new_array("q", [first])
+    total = first
+    for delta in deltas:
+        total += delta
+        timestamps.append(total)
+
+    (column_count,) = _column_count.unpack_from(payload, offset)
+    offset += _column_count.size
+    columns = {}
+    for _ in range(column_count):
+        (name_length,) = _name_length.unpack_from(payload, offset)
+        offset += _name_length.size
+        name = payload[offset : offset + name_length].tobytes().decode("utf-8")
+        offset += name_length
+        type_code = payload[offset : offset + 1].tobytes().decode("ascii")
+        offset += 1
+        columns[name], offset = _unpack_column(payload, offset, type_code, count)
+    return timestamps, columns
+
+
+def _unpack_column(payload, offset, type_code, count):
+    size = _kinds[type_code][1] * count
+    if offset + size > len(payload):
+        raise ValueError("Time-series batch is truncated or corrupt")
+    values = _new_array(type_code)
+    _array_from_bytes(values, payload[offset : offset + size].tobytes())
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values, offset + size
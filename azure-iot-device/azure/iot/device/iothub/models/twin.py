@@ -6,6 +6,9 @@
 """This module contains classes related to device twin and module twin functionality
 """
 
+import copy
+import json
+
 
 class Twin(object):
     """Represents a device twin or module twin
@@ -26,3 +29,128 @@ class Twin(object):
         """
         self.desiried_properties = None
         self.reported_properties = None
+
+
+def merge_patches(patch, later_patch):
+    """Merge two twin patches into a single patch which has the effect of applying both of them
+    in order, if there is one.
+
+    Patches are JSON merge patches, so nested objects are merged key by key, and properties which
+    later_patch deletes by setting them to None are kept in the merged patch as None.  A merge
+    patch cannot replace an object with another object, though, only merge into it.  So if patch
+    deletes or sets a property to a value which is not an object, and later_patch sets it to an
+    object, no single patch has the same effect and None is returned.  The "$version" of the
+    merged patch is that of later_patch.  Neither patch is modified.
+
+    :param dict patch: The earlier patch.
+    :param dict later_patch: The patch to apply after patch.
+    :returns: The merged patch, or None if the patches cannot be merged.
+    """
+    merged = dict(patch)
+    for key, value in later_patch.items():
+        if isinstance(value, dict) and key in merged:
+            if not isinstance(merged[key], dict):
+                return None
+            merged[key] = merge_patches(merged[key], value)
+            if merged[key] is None:
+                return None
+        else:
+            merged[key] = value
+    return merged
+
+
+def apply_patch(properties, patch, keep_deleted=False):
+    """Apply a twin patch to a set of properties.
+
+    Properties set to None by the patch are deleted.  Objects in the properties which the patch
+    does not change are shared with the result rather than copied, and values taken from the patch
+    are copied, so neither argument is modified or aliased by the result.
+
+    :param dict properties: The properties to apply the patch to.
+    :param dict patch: The patch to apply.
+    :param bool keep_deleted: Keep properties deleted by the patch as None, to record that they
+    are known to be absent, instead of removing them.
+    :returns: The patched properties.
+    """
+    patched = dict(properties)
+    for key, value in patch.items():
+        if value is None:
+            if keep_deleted:
+                patched[key] = None
+            else:
+                patched.pop(key, None)
+        elif isinstance(value, dict):
+            current = patched.get(key)
+            patched[key] = apply_patch(
+                current if isinstance(current, dict) else {}, value, keep_deleted
+            )
+        else:
+            patched[key] = copy.deepcopy(value)
+    return patched
+
+
+def reduce_patch(properties, patch):
+    """Reduce a twin patch to the changes it makes to a set of properties.
+
+    A property which is None in the properties is known to be absent, so deleting it changes
+    nothing.  Nothing is known about a property which is missing from the properties, so any value
+    the patch gives it is kept, including None.
+
+    :param dict properties: The properties the patch will be applied to.
+    :param dict patch: The patch to reduce.
+    :returns: A patch with the same effect on the properties as patch, which only contains copies
+    of the properties it changes.  The patch is empty if nothing would change.
+    """
+    reduced = {}
+    for key, value in patch.items():
+        if key not in properties:
+            reduced[key] = copy.deepcopy(value)
+        elif value is None:
+            if properties[key] is not None:
+                reduced[key] = None
+        elif isinstance(value, dict) and isinstance(properties[key], dict):
+            changes = reduce_patch(properties[key], value)
+            if changes:
+                reduced[key] = changes
+        elif not _same_value(properties[key], value):
+            reduced[key] = copy.deepcopy(value)
+    return reduced
+
+
+def _same_value(value, other):
+    # 1, 1.0 and True are equal in Python, but are different values in JSON
+    if type(value) is not type(other):
+        return False
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, sort_keys=True) == json.dumps(other, sort_keys=True)
+    return value == other
+
+
+class ReportedPropertiesTracker(object):
+    """Tracks the reported properties which the service has acknowledged, in order to reduce
+    reported properties patches to the properties they change.
+
+    Properties which an acknowledged patch deleted are kept as None, since only those are known
+    to be absent from the twin.  Deleting any other property is always sent to the service.
+
+    This class is threadsafe, as the acknowledged properties are replaced, never modified.
+    """
+
+    def __init__(self):
+        self._acknowledged = {}
+
+    def reduce_patch(self, patch):
+        """Reduce a reported properties patch to the changes it makes to the acknowledged
+        reported properties.
+
+        :param dict patch: The patch to reduce.
+        :returns: The reduced patch, which is empty if nothing would change.
+        """
+        return reduce_patch(self._acknowledged, patch)
+
+    def acknowledge(self, patch):
+        """Apply a reported properties patch which the service has acknowledged.
+
+        :param dict patch: The acknowledged patch.
+        """
+        self._acknowledged = apply_patch(self._acknowledged, patch, keep_deleted=True)
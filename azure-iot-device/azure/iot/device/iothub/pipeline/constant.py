@@ -12,3 +12,10 @@ INPUT_MSG = "input"
 METHODS = "methods"
 TWIN = "twin"
 TWIN_PATCHES = "twin_patches"
+
+# Payload compression encodings
+GZIP = "gzip"
+DEFLATE = "deflate"
+
+# Custom message property naming the preset dictionary a payload was compressed with
+COMPRESSION_DICTIONARY_PROPERTY = "compression-dictionary"
@@ -5,7 +5,9 @@
 # --------------------------------------------------------------------------
 
 import logging
+import six
 import sys
+from azure.iot.device.common import errors
 from azure.iot.device.common.pipeline import (
     pipeline_stages_base,
     pipeline_ops_base,
@@ -24,11 +26,27 @@ logger = logging.getLogger(__name__)
 
 
 class IoTHubPipeline(object):
-    def __init__(self, auth_provider):
+    def __init__(self, auth_provider, keep_alive=None, ping_timeout=None, max_round_trip_time=None):
         """
         Constructor for instantiating a pipeline adapter object
         :param auth_provider: The authentication provider
+        :param int keep_alive: The maximum number of seconds between MQTT packets, after which a
+          keepalive ping is sent (optional, defaults to 60).
+        :param float ping_timeout: The number of seconds to wait for a ping response before the
+          connection is considered dead, dropped and re-established (optional).
+        :param float max_round_trip_time: The number of seconds the smoothed ping round trip time
+          may reach before the connection is considered degraded, dropped and re-established
+          (optional).
         """
+        if keep_alive is not None and (
+            not isinstance(keep_alive, six.integer_types) or keep_alive <= 0
+        ):
+            raise ValueError("keep_alive must be a positive integer")
+        if ping_timeout is not None and ping_timeout <= 0:
+            raise ValueError("ping_timeout must be greater than 0")
+        if max_round_trip_time is not None and max_round_trip_time <= 0:
+            raise ValueError("max_round_trip_time must be greater than 0")
+
         self.feature_enabled = {
             constant.C2D_MSG: False,
             constant.INPUT_MSG: False,
@@ -37,6 +55,10 @@ class IoTHubPipeline(object):
             constant.TWIN_PATCHES: False,
         }
 
+        # The MQTT quality of service level used for telemetry and output messages that do not
+        # specify their own.  At QoS 0, sends complete without waiting for a PUBACK.
+        self.telemetry_qos = 1
+
         # Event Handlers - Will be set by Client after instantiation of this object
         self.on_connected = None
         self.on_disconnected = None
@@ -50,10 +72,19 @@ class IoTHubPipeline(object):
             .append_stage(pipeline_stages_iothub.UseAuthProviderStage())
             .append_stage(pipeline_stages_iothub.HandleTwinOperationsStage())
             .append_stage(pipeline_stages_base.CoordinateRequestAndResponseStage())
+            .append_stage(pipeline_stages_iothub.TelemetryAggregationStage())
+            .append_stage(pipeline_stages_iothub.PayloadCompressionStage())
+            .append_stage(pipeline_stages_iothub.RateLimitStage())
             .append_stage(pipeline_stages_iothub_mqtt.IoTHubMQTTConverterStage())
             .append_stage(pipeline_stages_base.EnsureConnectionStage())
             .append_stage(pipeline_stages_base.SerializeConnectOpsStage())
-            .append_stage(pipeline_stages_mqtt.MQTTTransportStage())
+            .append_stage(
+                pipeline_stages_mqtt.MQTTTransportStage(
+                    keep_alive=keep_alive,
+                    ping_timeout=ping_timeout,
+                    max_round_trip_time=max_round_trip_time,
+                )
+            )
         )
 
         def _on_pipeline_event(event):
@@ -111,15 +142,41 @@ class IoTHubPipeline(object):
 
         self._pipeline.run_op(op)
 
+    def get_statistics(self):
+        """
+        Get the statistics collected by the stages of the pipeline and by the transport.
+
+        :returns: A dict mapping statistic names to values.
+        """
+        return self._pipeline.get_pipeline_statistics()
+
+    def reset_statistics(self):
+        """
+        Reset the counters collected by the stages of the pipeline and by the transport.
+        """
+        self._pipeline.reset_pipeline_statistics()
+
+    def _get_message_qos(self, message):
+        qos = message.qos if message.qos is not None else self.telemetry_qos
+        if qos not in (0, 1):
+            raise ValueError("Invalid qos {}.  Must be 0 or 1".format(qos))
+        return qos
+
     def connect(self, callback=None):
         """
         Connect to the service.
 
         :param callback: callback which is called when the connection to the service is complete.
+          If the pipeline is shut down first, it is called with an error keyword argument.
         """
         logger.info("Starting ConnectOperation on the pipeline")
 
         def on_complete(call):
+            if isinstance(call.error, errors.OperationCancelledError):
+                # The pipeline was shut down before the operation completed
+                if callback:
+                    callback(error=call.error)
+                return
             if call.error:
                 # TODO we need error semantics on the client
                 sys.exit(1)  # TODO: raise an error instead
@@ -133,10 +190,16 @@ class IoTHubPipeline(object):
         Disconnect from the service.
 
         :param callback: callback which is called when the connection to the service has been disconnected
+          If the pipeline is shut down first, it is called with an error keyword argument.
         """
         logger.info("Starting DisconnectOperation on the pipeline")
 
         def on_complete(call):
+            if isinstance(call.error, errors.OperationCancelledError):
+                # The pipeline was shut down before the operation completed
+                if callback:
+                    callback(error=call.error)
+                return
             if call.error:
                 # TODO we need error semantics on the client
                 sys.exit(1)
@@ -145,15 +208,54 @@ class IoTHubPipeline(object):
 
         self._pipeline.run_op(pipeline_ops_base.DisconnectOperation(callback=on_complete))
 
+    def shutdown(self, timeout=None, callback=None):
+        """
+        Shut down the pipeline for good.  New operations are rejected, and publishes which are
+        in flight are given until the timeout to be acknowledged, after which the connection is
+        closed and any operations which remain fail with an OperationCancelledError.  The pipeline
+        threads are shared by every pipeline in the process, so they are left running until
+        azure.iot.device.shutdown_executors() is called.
+
+        :param float timeout: The maximum number of seconds to wait for publishes which are in
+          flight, or None to wait for as long as the connection stays up.
+        :param callback: callback which is called when the pipeline has shut down.
+
+        :raises: ValueError if the timeout is negative
+        """
+        if timeout is not None and timeout < 0:
+            raise ValueError("timeout must not be negative")
+        logger.info("Starting ShutdownOperation on the pipeline")
+
+        def on_complete(call):
+            if call.error:
+                # TODO we need error semantics on the client
+                sys.exit(1)
+            if callback:
+                callback()
+
+        self._pipeline.run_op(
+            pipeline_ops_base.ShutdownOperation(timeout=timeout, callback=on_complete)
+        )
+
     def send_message(self, message, callback=None):
         """
         Send a telemetry message to the service.
 
         :param message: message to send.
-        :param callback: callback which is called when the message publish has been acknowledged by the service.
+        :param callback: callback which is called when the message publish has been acknowledged by the service,
+          or, at QoS 0, when the message has been handed to the transport.
+          If the pipeline is shut down first, it is called with an error keyword argument.
+
+        :raises: ValueError if the message qos is not 0 or 1
         """
+        qos = self._get_message_qos(message)
 
         def on_complete(call):
+            if isinstance(call.error, errors.OperationCancelledError):
+                # The pipeline was shut down before the service acknowledged the operation
+                if callback:
+                    callback(error=call.error)
+                return
             if call.error:
                 # TODO we need error semantics on the client
                 sys.exit(1)
@@ -161,7 +263,9 @@ class IoTHubPipeline(object):
                 callback()
 
         self._pipeline.run_op(
-            pipeline_ops_iothub.SendD2CMessageOperation(message=message, callback=on_complete)
+            pipeline_ops_iothub.SendD2CMessageOperation(
+                message=message, qos=qos, callback=on_complete
+            )
         )
 
     def send_output_event(self, message, callback=None):
@@ -169,10 +273,20 @@ class IoTHubPipeline(object):
         Send an output message to the service.
 
         :param message: message to send.
-        :param callback: callback which is called when the message publish has been acknowledged by the service.
+        :param callback: callback which is called when the message publish has been acknowledged by the service,
+          or, at QoS 0, when the message has been handed to the transport.
+          If the pipeline is shut down first, it is called with an error keyword argument.
+
+        :raises: ValueError if the message qos is not 0 or 1
         """
+        qos = self._get_message_qos(message)
 
         def on_complete(call):
+            if isinstance(call.error, errors.OperationCancelledError):
+                # The pipeline was shut down before the service acknowledged the operation
+                if callback:
+                    callback(error=call.error)
+                return
             if call.error:
                 # TODO we need error semantics on the client
                 sys.exit(1)
@@ -180,7 +294,108 @@ class IoTHubPipeline(object):
                 callback()
 
         self._pipeline.run_op(
-            pipeline_ops_iothub.SendOutputEventOperation(message=message, callback=on_complete)
+            pipeline_ops_iothub.SendOutputEventOperation(
+                message=message, qos=qos, callback=on_complete
+            )
+        )
+
+    def set_payload_compression(
+        self, encoding, threshold=1024, level=6, dictionary=None, dictionary_id=None, callback=None
+    ):
+        """
+        Configure compression of outgoing message payloads and decompression of incoming ones.
+
+        :param str encoding: "gzip" or "deflate", or None to disable compression.
+        :param int threshold: Payloads smaller than this number of bytes are sent uncompressed.
+        :param int level: The compression level, from 1 (fastest) to 9 (smallest).
+        :param bytes dictionary: (OPTIONAL) A preset dictionary.  Only supported with "deflate".
+        :param str dictionary_id: A name for the preset dictionary.  Required with a dictionary.
+        :param callback: callback which is called when the new settings are in effect.
+
+        :raises: ValueError if the settings are not valid
+        """
+        if encoding not in (None, constant.GZIP, constant.DEFLATE):
+            raise ValueError("Invalid encoding {}.  Must be gzip or deflate".format(encoding))
+        if threshold < 0:
+            raise ValueError("threshold must not be negative")
+        if not 1 <= level <= 9:
+            raise ValueError("level must be between 1 and 9")
+        if dictionary:
+            if encoding != constant.DEFLATE:
+                raise ValueError("A preset dictionary can only be used with deflate encoding")
+            if six.PY2:
+                raise ValueError("Preset dictionaries are not supported on Python 2")
+            if not dictionary_id:
+                raise ValueError("A dictionary_id is required with a preset dictionary")
+
+        def on_complete(call):
+            if call.error:
+                # TODO we need error semantics on the client
+                sys.exit(1)
+            if callback:
+                callback()
+
+        self._pipeline.run_op(
+            pipeline_ops_iothub.SetPayloadCompressionOperation(
+                encoding=encoding,
+                threshold=threshold,
+                level=level,
+                dictionary=dictionary,
+                dictionary_id=dictionary_id,
+                callback=on_complete,
+            )
+        )
+
+    def set_rate_limits(self, rate_limits, callback=None):
+        """
+        Limit the rate at which telemetry, twin requests and method responses are sent.
+
+        :param rate_limits: The RateLimits to apply, or None to stop limiting the rate of operations.
+        :param callback: callback which is called when the new limits are in effect.
+        """
+
+        def on_complete(call):
+            if call.error:
+                # TODO we need error semantics on the client
+                sys.exit(1)
+            if callback:
+                callback()
+
+        self._pipeline.run_op(
+            pipeline_ops_iothub.SetRateLimitsOperation(
+                rate_limits=rate_limits, callback=on_complete
+            )
+        )
+
+    def set_telemetry_aggregation(self, window_size=None, window_interval=None, callback=None):
+        """
+        Configure aggregation of numeric telemetry readings into summary messages.
+
+        :param int window_size: The number of messages to aggregate into each summary message.
+        :param float window_interval: The maximum number of seconds to aggregate messages for.
+          If both window_size and window_interval are None, aggregation is disabled.
+        :param callback: callback which is called when the new settings are in effect.
+
+        :raises: ValueError if the settings are not valid
+        """
+        if window_size is not None and (
+            not isinstance(window_size, six.integer_types) or window_size < 1
+        ):
+            raise ValueError("window_size must be a positive integer")
+        if window_interval is not None and window_interval <= 0:
+            raise ValueError("window_interval must be greater than 0")
+
+        def on_complete(call):
+            if call.error:
+                # TODO we need error semantics on the client
+                sys.exit(1)
+            if callback:
+                callback()
+
+        self._pipeline.run_op(
+            pipeline_ops_iothub.SetTelemetryAggregationOperation(
+                window_size=window_size, window_interval=window_interval, callback=on_complete
+            )
         )
 
     def send_method_response(self, method_response, callback=None):
@@ -188,11 +403,17 @@ class IoTHubPipeline(object):
         Send a method response to the service.
 
         :param method_response: the method response to send
-        :param callback: callback which is called when response has been acknowledged by the service
+        :param callback: callback which is called when response has been acknowledged by the service.
+          If the pipeline is shut down first, it is called with an error keyword argument.
         """
         logger.info("IoTHubPipeline send_method_response called")
 
         def on_complete(call):
+            if isinstance(call.error, errors.OperationCancelledError):
+                # The pipeline was shut down before the service acknowledged the operation
+                if callback:
+                    callback(error=call.error)
+                return
             if call.error:
                 # TODO we need error semantics on the client
                 sys.exit(1)
@@ -211,11 +432,15 @@ class IoTHubPipeline(object):
 
         :param callback: callback which is called when request has been acknowledged by the service.
         This callback should have one parameter, which will contain the requested twin when called.
+        If the request fails, times out or is cancelled, it is called with an error keyword
+        argument instead.
         """
 
         def on_complete(call):
             if call.error:
-                sys.exit(1)
+                if callback:
+                    callback(error=call.error)
+                return
             if callback:
                 callback(call.twin)
 
@@ -227,11 +452,15 @@ class IoTHubPipeline(object):
 
         :param patch: the reported properties patch to send
         :param callback: callback which is called when request has been acknowledged by the service.
+          If the request fails, times out or is cancelled, it is called with an error keyword
+          argument.
         """
 
         def on_complete(call):
             if call.error:
-                sys.exit(1)
+                if callback:
+                    callback(error=call.error)
+                return
             if callback:
                 callback()
 
@@ -247,6 +476,7 @@ class IoTHubPipeline(object):
 
         :param feature_name: one of the feature name constants from constant.py
         :param callback: callback which is called when the feature is enabled
+          If the pipeline is shut down first, it is called with an error keyword argument.
 
         :raises: ValueError if feature_name is invalid
         """
@@ -256,6 +486,11 @@ class IoTHubPipeline(object):
         self.feature_enabled[feature_name] = True
 
         def on_complete(call):
+            if isinstance(call.error, errors.OperationCancelledError):
+                # The pipeline was shut down before the operation completed
+                if callback:
+                    callback(error=call.error)
+                return
             if call.error:
                 # TODO we need error semantics on the client
                 sys.exit(1)
@@ -272,6 +507,7 @@ class IoTHubPipeline(object):
         """
         Disable the given feature by subscribing to the appropriate topics.
         :param callback: callback which is called when the feature is disabled
+          If the pipeline is shut down first, it is called with an error keyword argument.
 
         :param feature_name: one of the feature name constants from constant.py
 
@@ -283,6 +519,11 @@ class IoTHubPipeline(object):
         self.feature_enabled[feature_name] = False
 
         def on_complete(call):
+            if isinstance(call.error, errors.OperationCancelledError):
+                # The pipeline was shut down before the operation completed
+                if callback:
+                    callback(error=call.error)
+                return
             if call.error:
                 # TODO we need error semantics on the client
                 sys.exit(1)
@@ -4,6 +4,7 @@
 # license information.
 # --------------------------------------------------------------------------
 from azure.iot.device.common.pipeline import PipelineOperation
+from azure.iot.device.common.pipeline.pipeline_ops_base import PRIORITY_CONTROL
 
 
 # TODO: Combine SetAuthProviderOperation and SetX509AuthProviderOperation once
@@ -111,17 +112,19 @@ class SendD2CMessageOperation(PipelineOperation):
     This operation is in the group of IoTHub operations because it is very specific to the IoTHub client
     """
 
-    def __init__(self, message, callback=None):
+    def __init__(self, message, qos=1, callback=None):
         """
         Initializer for SendD2CMessageOperation objects.
 
         :param Message message: The message that we're sending to the service
+        :param int qos: The MQTT quality of service level to send the message with
         :param Function callback: The function that gets called when this operation is complete or has failed.
          The callback function must accept A PipelineOperation object which indicates the specific operation which
          has completed or failed.
         """
         super(SendD2CMessageOperation, self).__init__(callback=callback)
         self.message = message
+        self.qos = qos
 
 
 class SendOutputEventOperation(PipelineOperation):
@@ -131,18 +134,20 @@ class SendOutputEventOperation(PipelineOperation):
     This operation is in the group of IoTHub operations because it is very specific to the IoTHub client
     """
 
-    def __init__(self, message, callback=None):
+    def __init__(self, message, qos=1, callback=None):
         """
         Initializer for SendOutputEventOperation objects.
 
         :param Message message: The output message that we're sending to the service. The name of the output is
           expected to be stored in the output_name attribute of this object
+        :param int qos: The MQTT quality of service level to send the message with
         :param Function callback: The function that gets called when this operation is complete or has failed.
          The callback function must accept A PipelineOperation object which indicates the specific operation which
          has completed or failed.
         """
         super(SendOutputEventOperation, self).__init__(callback=callback)
         self.message = message
+        self.qos = qos
 
 
 class SendMethodResponseOperation(PipelineOperation):
@@ -164,6 +169,7 @@ class SendMethodResponseOperation(PipelineOperation):
         :type callback: Function/callable
         """
         super(SendMethodResponseOperation, self).__init__(callback=callback)
+        self.priority = PRIORITY_CONTROL
         self.method_response = method_response
 
 
@@ -181,6 +187,7 @@ class GetTwinOperation(PipelineOperation):
         Initializer for GetTwinOperation objects.
         """
         super(GetTwinOperation, self).__init__(callback=callback)
+        self.priority = PRIORITY_CONTROL
         self.twin = None
 
 
@@ -198,4 +205,87 @@ class PatchTwinReportedPropertiesOperation(PipelineOperation):
         :type patch: dict, str, int, float, bool, or None (JSON compatible values)
         """
         super(PatchTwinReportedPropertiesOperation, self).__init__(callback=callback)
+        self.priority = PRIORITY_CONTROL
         self.patch = patch
+
+
+class SetPayloadCompressionOperation(PipelineOperation):
+    """
+    A PipelineOperation object which contains arguments used to configure the compression of message
+    payloads sent to, and the decompression of message payloads received from, the service.
+
+    This operation is in the group of IoTHub operations because it is very specific to the IoTHub client
+    """
+
+    def __init__(
+        self, encoding, threshold=1024, level=6, dictionary=None, dictionary_id=None, callback=None
+    ):
+        """
+        Initializer for SetPayloadCompressionOperation objects.
+
+        :param str encoding: The codec to compress payloads with, "gzip" or "deflate", or None to
+          disable compression and decompression.
+        :param int threshold: Payloads smaller than this number of bytes are sent uncompressed.
+        :param int level: The compression level, from 1 (fastest) to 9 (smallest).
+        :param bytes dictionary: (OPTIONAL) A preset dictionary of byte sequences which are expected
+          to occur in payloads.  Only supported with the "deflate" encoding.
+        :param str dictionary_id: (OPTIONAL) A name for the preset dictionary, which is sent with
+          each compressed message so that the receiver knows which dictionary to decompress it with.
+        :param Function callback: The function that gets called when this operation is complete or has failed.
+         The callback function must accept A PipelineOperation object which indicates the specific operation which
+         has completed or failed.
+        """
+        super(SetPayloadCompressionOperation, self).__init__(callback=callback)
+        self.encoding = encoding
+        self.threshold = threshold
+        self.level = level
+        self.dictionary = dictionary
+        self.dictionary_id = dictionary_id
+
+
+class SetTelemetryAggregationOperation(PipelineOperation):
+    """
+    A PipelineOperation object which contains arguments used to configure the aggregation of numeric
+    telemetry readings into periodic summary messages.
+
+    This operation is in the group of IoTHub operations because it is very specific to the IoTHub client
+    """
+
+    def __init__(self, window_size=None, window_interval=None, callback=None):
+        """
+        Initializer for SetTelemetryAggregationOperation objects.
+
+        :param int window_size: The number of messages to aggregate into each summary message, or
+          None for no limit.
+        :param float window_interval: The maximum number of seconds to aggregate messages for before
+          sending a summary message, or None for no limit.  If both window_size and window_interval
+          are None, aggregation is disabled.
+        :param Function callback: The function that gets called when this operation is complete or has failed.
+         The callback function must accept A PipelineOperation object which indicates the specific operation which
+         has completed or failed.
+        """
+        super(SetTelemetryAggregationOperation, self).__init__(callback=callback)
+        self.window_size = window_size
+        self.window_interval = window_interval
+
+
+class SetRateLimitsOperation(PipelineOperation):
+    """
+    A PipelineOperation object which contains the limits on the rate at which telemetry, twin
+    requests and method responses are sent to the service.
+
+    This operation is in the group of IoTHub operations because it is very specific to the IoTHub client
+    """
+
+    def __init__(self, rate_limits, callback=None):
+        """
+        Initializer for SetRateLimitsOperation objects.
+
+        :param rate_limits: The RateLimits to apply, or None to stop limiting the rate of operations.
+        :type rate_limits: RateLimits
+        :param Function callback: The function that gets called when this operation is complete or has failed.
+         The callback function must accept A PipelineOperation object which indicates the specific operation which
+         has completed or failed.
+        """
+        super(SetRateLimitsOperation, self).__init__(callback=callback)
+        self.rate_limits = rate_limits
@@ -4,25 +4,82 @@
 # license information.
 # --------------------------------------------------------------------------
 
+import collections
+import copy
 import json
 import logging
+import math
+import six
+import zlib
 from azure.iot.device.common.pipeline import (
     pipeline_ops_base,
     PipelineStage,
     operation_flow,
     pipeline_thread,
 )
-from azure.iot.device.common import unhandled_exceptions
+from azure.iot.device.common import unhandled_exceptions, timer_scheduler, buffers, errors
+from azure.iot.device.common.statistics import Counters
+from azure.iot.device.iothub.models import Message
+from azure.iot.device.iothub.models import rate_limits
 from . import pipeline_ops_iothub
+from . import pipeline_events_iothub
 from . import constant
 
 logger = logging.getLogger(__name__)
 
+_numpy = None
+_numpy_checked = False
+
+
+def _get_numpy():
+    """
+    Import NumPy, if it is installed, the first time telemetry aggregation is enabled.  This is
+    deferred because NumPy is slow to import and only needed for aggregation.
+
+    :returns: The numpy module, or None if it is not installed.
+    """
+    global _numpy, _numpy_checked
+    if not _numpy_checked:
+        try:
+            import numpy
+
+            _numpy = numpy
+        except ImportError:
+            logger.info("NumPy is not installed.  Telemetry will be aggregated in pure Python")
+        _numpy_checked = True
+    return _numpy
+
+
+def _summarize(values, numpy=None):
+    """
+    Summarize a list of numeric readings.
+
+    :param list values: The readings, oldest first.
+    :param numpy: The numpy module, used to vectorize the summary, or None.
+    :returns: A dict containing the min, max, mean, count and last reading.
+    """
+    if numpy:
+        array = numpy.asarray(values, dtype=float)
+        minimum, maximum, mean = float(array.min()), float(array.max()), float(array.mean())
+    else:
+        minimum, maximum = float(min(values)), float(max(values))
+        mean = math.fsum(values) / len(values)
+    return {"min": minimum, "max": maximum, "mean": mean, "count": len(values), "last": values[-1]}
+
+
+def _is_number(value):
+    return isinstance(value, six.integer_types + (float,)) and not isinstance(value, bool)
+
+
+# Maps each supported content encoding to the zlib wbits value which produces that format
+_compression_wbits = {constant.DEFLATE: zlib.MAX_WBITS, constant.GZIP: zlib.MAX_WBITS | 16}
+
 
 class UseAuthProviderStage(PipelineStage):
     def __init__(self):
         super(UseAuthProviderStage, self).__init__()
         self.auth_provider = None
+        self._counters = Counters(["token_renewals"])
 
     """
     PipelineStage which extracts relevant AuthenticationProvider values for a new
@@ -31,6 +88,12 @@ class UseAuthProviderStage(PipelineStage):
     All other operations are passed down.
     """
 
+    def get_statistics(self):
+        return self._counters.snapshot()
+
+    def reset_statistics(self):
+        self._counters.reset()
+
     @pipeline_thread.runs_on_pipeline_thread
     def _execute_op(self, op):
         if isinstance(op, pipeline_ops_iothub.SetAuthProviderOperation):
@@ -70,6 +133,7 @@ class UseAuthProviderStage(PipelineStage):
         logger.info(
             "%s: New sas token received.  Passing down UpdateSasTokenOperation.".format(self.name)
         )
+        self._counters.increment("token_renewals")
 
         @pipeline_thread.runs_on_pipeline_thread
         def on_token_update_complete(op):
@@ -119,7 +183,7 @@ class HandleTwinOperationsStage(PipelineStage):
                 logger.info("{}({}): Got response for GetTwinOperation".format(self.name, op.name))
                 map_twin_error(original_op=op, twin_op=twin_op)
                 if not twin_op.error:
-                    op.twin = json.loads(twin_op.response_body.decode("utf-8"))
+                    op.twin = buffers.parse_json(twin_op.response_body)
                 operation_flow.complete_op(self, op)
 
             operation_flow.pass_op_to_next_stage(
@@ -163,3 +227,434 @@ class HandleTwinOperationsStage(PipelineStage):
 
         else:
             operation_flow.pass_op_to_next_stage(self, op)
+
+
+class PayloadCompressionStage(PipelineStage):
+    """
+    PipelineStage which compresses the payloads of outgoing telemetry and output messages, and
+    decompresses the payloads of incoming C2D and input messages which were compressed the same way.
+
+    Compression is disabled until a SetPayloadCompressionOperation enables it.  Compressed messages
+    carry the codec in content_encoding, plus a custom property naming the preset dictionary if one
+    was used, so that the receiving side knows how to decompress them.  Payloads which are below the
+    size threshold, do not shrink when compressed, or already have a content_encoding other than
+    utf-8 are sent as-is.
+    """
+
+    def __init__(self):
+        super(PayloadCompressionStage, self).__init__()
+        self.encoding = None
+        self.threshold = None
+        self.level = None
+        self.dictionary = None
+        self.dictionary_id = None
+        self._counters = Counters(
+            ["payloads_compressed", "payload_bytes_saved", "payloads_decompressed"]
+        )
+
+    def get_statistics(self):
+        return self._counters.snapshot()
+
+    def reset_statistics(self):
+        self._counters.reset()
+
+    @pipeline_thread.runs_on_pipeline_thread
+    def _execute_op(self, op):
+        if isinstance(op, pipeline_ops_iothub.SetPayloadCompressionOperation):
+            logger.debug("%s(%s): setting payload encoding to %s", self.name, op.name, op.encoding)
+            self.encoding = op.encoding
+            self.threshold = op.threshold
+            self.level = op.level
+            self.dictionary = op.dictionary
+            self.dictionary_id = op.dictionary_id
+            operation_flow.complete_op(self, op)
+
+        elif self.encoding and (
+            isinstance(op, pipeline_ops_iothub.SendD2CMessageOperation)
+            or isinstance(op, pipeline_ops_iothub.SendOutputEventOperation)
+        ):
+            op.message = self._compress_message(op.message)
+            operation_flow.pass_op_to_next_stage(self, op)
+
+        else:
+            operation_flow.pass_op_to_next_stage(self, op)
+
+    @pipeline_thread.runs_on_pipeline_thread
+    def _handle_pipeline_event(self, event):
+        if self.encoding and (
+            isinstance(event, pipeline_events_iothub.C2DMessageEvent)
+            or isinstance(event, pipeline_events_iothub.InputMessageEvent)
+        ):
+            self._decompress_message(event.message)
+        operation_flow.pass_event_to_previous_stage(self, event)
+
+    @pipeline_thread.runs_on_pipeline_thread
+    def _compress_message(self, message):
+        """
+        Return a copy of the message with a compressed payload, or the original message if
+        it should not be compressed.  The original message is never modified, since it
+        belongs to the caller.
+        """
+        if message.content_encoding and message.content_encoding.lower() != "utf-8":
+            return message
+
+        data = message.data
+        if data is None or isinstance(data, six.integer_types + (float,)):
+            return message
+        try:
+            data = buffers.to_bytes_like(data)
+        except TypeError:
+            return message
+        if len(data) < self.threshold:
+            return message
+
+        wbits = _compression_wbits[self.encoding]
+        if self.dictionary:
+            compressor = zlib.compressobj(
+                self.level,
+                zlib.DEFLATED,
+                wbits,
+                zlib.DEF_MEM_LEVEL,
+                zlib.Z_DEFAULT_STRATEGY,
+                self.dictionary,
+            )
+        else:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, wbits)
+        compressed = compressor.compress(data) + compressor.flush()
+        if len(compressed) >= len(data):
+            return message
+
+        compressed_message = copy.copy(message)
+        compressed_message.data = compressed
+        compressed_message.content_encoding = self.encoding
+        compressed_message.custom_properties = dict(message.custom_properties)
+        if self.dictionary:
+            compressed_message.custom_properties[
+                constant.COMPRESSION_DICTIONARY_PROPERTY
+            ] = self.dictionary_id
+
+        self._counters.increment("payloads_compressed")
+        self._counters.increment("payload_bytes_saved", len(data) - len(compressed))
+        return compressed_message
+
+    @pipeline_thread.runs_on_pipeline_thread
+    def _decompress_message(self, message):
+        """
+        Decompress the payload of a received message in place, if it carries a supported
+        content_encoding.  Messages which cannot be decompressed are left untouched.
+        """
+        encoding = message.content_encoding and message.content_encoding.lower()
+        if encoding not in _compression_wbits:
+            return
+
+        dictionary_id = message.custom_properties.get(constant.COMPRESSION_DICTIONARY_PROPERTY)
+        if dictionary_id is not None and dictionary_id != self.dictionary_id:
+            logger.warning(
+                "%s: message compressed with unknown dictionary %s.  Leaving payload compressed.",
+                self.name,
+                dictionary_id,
+            )
+            return
+
+        try:
+            if dictionary_id is not None:
+                decompressor = zlib.decompressobj(_compression_wbits[encoding], self.dictionary)
+            else:
+                decompressor = zlib.decompressobj(_compression_wbits[encoding])
+            data = decompressor.decompress(message.data) + decompressor.flush()
+        except (zlib.error, TypeError):
+            logger.warning(
+                "%s: unable to decompress %s payload.  Leaving payload compressed.",
+                self.name,
+                encoding,
+                exc_info=True,
+            )
+            return
+
+        message.data = data
+        message.content_encoding = None
+        message.custom_properties.pop(constant.COMPRESSION_DICTIONARY_PROPERTY, None)
+        self._counters.increment("payloads_decompressed")
+
+
+class TelemetryAggregationStage(PipelineStage):
+    """
+    PipelineStage which aggregates numeric telemetry readings into summary messages.
+
+    Aggregation is disabled until a SetTelemetryAggregationOperation enables it.  While enabled,
+    each telemetry message whose payload is a JSON object of numbers (and which carries no message
+    id, custom properties or output name) is absorbed into the current window, and its operation
+    completes immediately.  When the window reaches window_size messages, or window_interval
+    seconds after it was started, a single message is sent with a JSON object mapping each key to
+    the min, max, mean, count and last of its readings.  Errors sending a summary are reported to
+    the unhandled exception handler, since the operations for the readings have already completed.
+
+    Other messages pass through immediately, so they may overtake readings which are still waiting
+    in the window.  NumPy is used to summarize the readings if it is installed.
+    """
+
+    def __init__(self):
+        super(TelemetryAggregationStage, self).__init__()
+        self.window_size = None
+        self.window_interval = None
+        self._readings = {}
+        self._window_count = 0
+        self._window_qos = 0
+        self._window_timer = None
+        # Incremented each time a window is sent, so that timers for earlier windows are ignored
+        self._window_generation = 0
+        self._numpy = None
+        self._counters = Counters(["readings_aggregated", "aggregate_messages_sent"])
+
+    def get_statistics(self):
+        return self._counters.snapshot()
+
+    def reset_statistics(self):
+        self._counters.reset()
+
+    @pipeline_thread.runs_on_pipeline_thread
+    def _execute_op(self, op):
+        if isinstance(op, pipeline_ops_iothub.SetTelemetryAggregationOperation):
+            logger.debug(
+                "%s(%s): setting window_size=%s, window_interval=%s",
+                self.name,
+                op.name,
+                op.window_size,
+                op.window_interval,
+            )
+            # Readings in the current window were collected under the old settings
+            self._send_window()
+            self.window_size = op.window_size
+            self.window_interval = op.window_interval
+            if self.window_size or self.window_interval:
+                self._numpy = _get_numpy()
+            operation_flow.complete_op(self, op)
+
+        elif isinstance(op, pipeline_ops_base.ShutdownOperation):
+            # The operations for the readings in the window have already completed, so send them
+            # before the pipeline drains
+            self._send_window()
+            operation_flow.pass_op_to_next_stage(self, op)
+
+        elif (self.window_size or self.window_interval) and isinstance(
+            op, pipeline_ops_iothub.SendD2CMessageOperation
+        ):
+            readings = self._get_readings(op.message)
+            if readings:
+                self._add_to_window(readings, op.qos)
+                operation_flow.complete_op(self, op)
+            else:
+                operation_flow.pass_op_to_next_stage(self, op)
+
+        else:
+            operation_flow.pass_op_to_next_stage(self, op)
+
+    @pipeline_thread.runs_on_pipeline_thread
+    def _get_readings(self, message):
+        """
+        Return the numeric readings in a message as a dict, or None if the message cannot
+        be aggregated.
+        """
+        if (
+            message.message_id is not None
+            or message.custom_properties
+            or message.output_name
+            or message.iothub_interface_id
+        ):
+            return None
+        if message.content_encoding and message.content_encoding.lower() != "utf-8":
+            return None
+
+        data = message.data
+        if isinstance(data, (six.binary_type, bytearray)):
+            try:
+                data = data.decode("utf-8")
+            except UnicodeDecodeError:
+                return None
+        if isinstance(data, six.text_type):
+            # Cheap check to avoid parsing payloads which cannot be JSON objects
+            if not data.lstrip().startswith("{"):
+                return None
+            try:
+                data = json.loads(data)
+            except ValueError:
+                return None
+        if not isinstance(data, dict) or not data:
+            return None
+        for value in six.itervalues(data):
+            if not _is_number(value):
+                return None
+        return data
+
+    @pipeline_thread.runs_on_pipeline_thread
+    def _add_to_window(self, readings, qos):
+        for key, value in six.iteritems(readings):
+            self._readings.setdefault(key, []).append(value)
+        self._window_count += 1
+        # A summary which contains any reading that needed to be acknowledged is acknowledged
+        self._window_qos = max(self._window_qos, qos)
+        self._counters.increment("readings_aggregated")
+
+        if self.window_size and self._window_count >= self.window_size:
+            self._send_window()
+        elif self.window_interval and self._window_count == 1:
+            self._window_timer = timer_scheduler.get_scheduler().schedule(
+                self.window_interval, self._on_window_timer, args=(self._window_generation,)
+            )
+
+    @pipeline_thread.invoke_on_pipeline_thread_nowait
+    def _on_window_timer(self, generation):
+        if generation == self._window_generation:
+            logger.debug("%s: window interval expired", self.name)
+            self._send_window()
+
+    @pipeline_thread.runs_on_pipeline_thread
+    def _send_window(self):
+        """
+        Send a summary of the readings in the current window, if there are any, and start a
+        new window.
+        """
+        self._window_generation += 1
+        if self._window_timer:
+            self._window_timer.cancel()
+            self._window_timer = None
+        if not self._window_count:
+            return
+
+        summary = {}
+        for key, values in six.iteritems(self._readings):
+            summary[key] = _summarize(values, self._numpy)
+        message = Message(
+            json.dumps(summary), content_encoding="utf-8", content_type="application/json"
+        )
+        qos = self._window_qos
+        self._readings = {}
+        self._window_count = 0
+        self._window_qos = 0
+        self._counters.increment("aggregate_messages_sent")
+
+        @pipeline_thread.runs_on_pipeline_thread
+        def on_summary_sent(op):
+            if op.error:
+                logger.error("%s: unable to send telemetry summary", self.name)
+                unhandled_exceptions.exception_caught_in_background_thread(op.error)
+
+        logger.debug("%s: sending summary of %s keys", self.name, len(summary))
+        operation_flow.pass_op_to_next_stage(
+            self,
+            pipeline_ops_iothub.SendD2CMessageOperation(
+                message=message, qos=qos, callback=on_summary_sent
+            ),
+        )
+
+
+class RateLimitStage(PipelineStage):
+    """
+    PipelineStage which keeps the rate of telemetry, twin requests and method responses under the
+    limits set by a SetRateLimitsOperation, so that the service does not throttle the client.
+
+    Each class of operation takes tokens from its own TokenBucket.  An operation which would
+    exceed its limit is queued until the tokens it reserved are available, and operations of the
+    same class which arrive while others are queued wait behind them, so each class stays in
+    order.  Since the operations do not complete until they are sent, callers which wait for them
+    are slowed to the limit.  Rate limiting is disabled until a SetRateLimitsOperation enables it.
+    """
+
+    def __init__(self):
+        super(RateLimitStage, self).__init__()
+        self.rate_limits = None
+        self._queues = {
+            rate_limits.TELEMETRY: collections.deque(),
+            rate_limits.TWIN: collections.deque(),
+            rate_limits.METHODS: collections.deque(),
+        }
+        self._counters = Counters(["operations_delayed"])
+
+    def get_statistics(self):
+        statistics = self._counters.snapshot()
+        statistics["operations_queued"] = sum(len(queue) for queue in self._queues.values())
+        return statistics
+
+    def reset_statistics(self):
+        self._counters.reset()
+
+    @pipeline_thread.runs_on_pipeline_thread
+    def _execute_op(self, op):
+        if isinstance(op, pipeline_ops_iothub.SetRateLimitsOperation):
+            logger.debug("%s(%s): setting rate limits", self.name, op.name)
+            self.rate_limits = op.rate_limits
+            operation_flow.complete_op(self, op)
+            return
+
+        if isinstance(op, pipeline_ops_base.ShutdownOperation):
+            # Queued operations have not been sent, so they cannot be part of the drain
+            self._fail_queued_operations()
+            operation_flow.pass_op_to_next_stage(self, op)
+            return
+
+        operation_class, tokens = self._classify(op)
+        bucket = self.rate_limits.get_bucket(operation_class) if operation_class else None
+        if not bucket:
+            operation_flow.pass_op_to_next_stage(self, op)
+            return
+
+        delay = bucket.reserve(tokens)
+        queue = self._queues[operation_class]
+        if delay or queue:
+            logger.debug("%s(%s): delaying %.3f seconds", self.name, op.name, delay)
+            self._counters.increment("operations_delayed")
+            queue.append(op)
+            # Timers run in deadline order, and each one releases the operation at the head of the
+            # queue, so operations leave the queue in the order they arrived.
+            timer_scheduler.get_scheduler().schedule(
+                delay, self._on_delay_expired, args=(operation_class,)
+            )
+        else:
+            operation_flow.pass_op_to_next_stage(self, op)
+
+    @pipeline_thread.runs_on_pipeline_thread
+    def _classify(self, op):
+        """
+        Return the class of an operation and the number of tokens it takes, or (None, 0) if the
+        operation is not rate limited.
+        """
+        if not self.rate_limits:
+            return None, 0
+        if isinstance(op, pipeline_ops_iothub.SendD2CMessageOperation) or isinstance(
+            op, pipeline_ops_iothub.SendOutputEventOperation
+        ):
+            return rate_limits.TELEMETRY, 1
+        if (
+            isinstance(op, pipeline_ops_base.SendIotRequestOperation)
+            and op.request_type == constant.TWIN
+        ):
+            return rate_limits.TWIN, 1
+        if isinstance(op, pipeline_ops_iothub.SendMethodResponseOperation):
+            size = len(json.dumps(op.method_response.payload))
+            chunks = int(math.ceil(size / float(rate_limits.METHOD_CHUNK_SIZE)))
+            return rate_limits.METHODS, max(chunks, 1)
+        return None, 0
+
+    @pipeline_thread.runs_on_pipeline_thread
+    def _fail_queued_operations(self):
+        for operation_class, queue in self._queues.items():
+            if queue:
+                logger.info(
+                    "%s: shutting down.  failing %d queued %s operations",
+                    self.name,
+                    len(queue),
+                    operation_class,
+                )
+            while queue:
+                op = queue.popleft()
+                op.error = errors.OperationCancelledError(
+                    "The pipeline was shut down before the operation was sent"
+                )
+                operation_flow.complete_op(self, op)
+
+    @pipeline_thread.invoke_on_pipeline_thread_nowait
+    def _on_delay_expired(self, operation_class):
+        queue = self._queues[operation_class]
+        if queue:
+            # The queue is empty if its operations were failed by a shutdown
+            operation_flow.pass_op_to_next_stage(self, queue.popleft())
@@ -16,6 +16,7 @@ from azure.iot.device.common.pipeline import (
     operation_flow,
     pipeline_thread,
 )
+from azure.iot.device.common import buffers
 from azure.iot.device.iothub.models import Message, MethodRequest
 from . import pipeline_ops_iothub, pipeline_events_iothub, mqtt_topic_iothub
 from . import constant as pipeline_constant
@@ -146,7 +147,9 @@ class IoTHubMQTTConverterStage(PipelineStage):
             operation_flow.delegate_to_different_op(
                 stage=self,
                 original_op=op,
-                new_op=pipeline_ops_mqtt.MQTTPublishOperation(topic=topic, payload=op.message.data),
+                new_op=pipeline_ops_mqtt.MQTTPublishOperation(
+                    topic=topic, payload=op.message.data, qos=op.qos
+                ),
             )
 
         elif isinstance(op, pipeline_ops_iothub.SendMethodResponseOperation):
@@ -254,7 +257,7 @@ class IoTHubMQTTConverterStage(PipelineStage):
                 method_received = MethodRequest(
                     request_id=request_id,
                     name=method_name,
-                    payload=json.loads(event.payload.decode("utf-8")),
+                    payload=buffers.parse_json(event.payload),
                 )
                 operation_flow.pass_event_to_previous_stage(
                     self, pipeline_events_iothub.MethodRequestEvent(method_received)
@@ -274,7 +277,7 @@ class IoTHubMQTTConverterStage(PipelineStage):
                 operation_flow.pass_event_to_previous_stage(
                     self,
                     pipeline_events_iothub.TwinDesiredPropertiesPatchEvent(
-                        patch=json.loads(event.payload.decode("utf-8"))
+                        patch=buffers.parse_json(event.payload)
                     ),
                 )
 
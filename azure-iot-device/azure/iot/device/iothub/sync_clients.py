@@ -9,10 +9,13 @@ Azure IoTHub Device SDK for Python.
 
 import logging
 import threading
+from concurrent.futures import ThreadPoolExecutor
+from azure.iot.device.common.rate_limiter import TokenBucket
 from .abstract_clients import (
     AbstractIoTHubClient,
     AbstractIoTHubDeviceClient,
     AbstractIoTHubModuleClient,
+    DEFAULT_CONNECTIONS_PER_SECOND,
 )
 from .models import Message
 from .inbox_manager import InboxManager
@@ -22,6 +25,36 @@ from .pipeline import constant
 logger = logging.getLogger(__name__)
 
 
+def connect_all(
+    clients, connections_per_second=DEFAULT_CONNECTIONS_PER_SECOND, max_concurrent_connects=32
+):
+    """Connect many clients at once, without exceeding a connection rate.
+
+    This is a synchronous call, meaning that this function will not return until all of the
+    clients have connected.
+
+    :param clients: The clients to connect.
+    :param float connections_per_second: The maximum rate at which to start connecting clients.
+    This should not exceed the device connection throttle of the IoT Hub, which depends on its tier
+    and number of units.
+    :param int max_concurrent_connects: The maximum number of clients connecting at the same time.
+    """
+    clients = list(clients)
+    if not clients:
+        return
+    logger.info("Connecting {} clients to Hub...".format(len(clients)))
+    rate_limiter = TokenBucket(connections_per_second)
+
+    def connect(client):
+        rate_limiter.acquire()
+        client.connect()
+
+    with ThreadPoolExecutor(max_workers=min(max_concurrent_connects, len(clients))) as executor:
+        futures = [executor.submit(connect, client) for client in clients]
+    for future in futures:
+        future.result()
+
+
 class GenericIoTHubClient(AbstractIoTHubClient):
     """A superclass representing a generic synchronous client.
     This class needs to be extended for specific clients.
@@ -57,6 +90,28 @@ class GenericIoTHubClient(AbstractIoTHubClient):
         self._inbox_manager.clear_all_method_requests()
         logger.info("Cleared all pending method requests due to disconnect")
 
+    def get_statistics(self):
+        """Get a snapshot of the statistics collected by the client.
+
+        This includes counters for messages and bytes sent and received, acknowledgements,
+        reconnects and token renewals, as well as the current number of operations in flight and
+        items waiting in the client's inboxes.  Counters accumulate until reset_statistics is called.
+
+        :returns: A dict mapping statistic names to integer values.
+        """
+        statistics = self._iothub_pipeline.get_statistics()
+        statistics.update(self._inbox_manager.get_statistics())
+        return statistics
+
+    def reset_statistics(self):
+        """Reset all of the client's counters to zero.
+
+        Values which describe the current state of the client, such as the number of items
+        waiting in inboxes, are not affected.
+        """
+        self._iothub_pipeline.reset_statistics()
+        self._inbox_manager.reset_statistics()
+
     def connect(self):
         """Connects the client to an Azure IoT Hub or Azure IoT Edge Hub instance.
 
@@ -65,40 +120,87 @@ class GenericIoTHubClient(AbstractIoTHubClient):
 
         This is a synchronous call, meaning that this function will not return until the connection
         to the service has been completely established.
+
+        :raises: OperationCancelledError if the client has been shut down.
         """
         logger.info("Connecting to Hub...")
 
         connect_complete = threading.Event()
 
-        def callback():
+        class context:
+            error = None
+
+        def callback(error=None):
+            context.error = error
             connect_complete.set()
-            logger.info("Successfully connected to Hub")
+            if not error:
+                logger.info("Successfully connected to Hub")
 
         self._iothub_pipeline.connect(callback=callback)
         connect_complete.wait()
+        if context.error:
+            raise context.error
 
     def disconnect(self):
         """Disconnect the client from the Azure IoT Hub or Azure IoT Edge Hub instance.
 
         This is a synchronous call, meaning that this function will not return until the connection
         to the service has been completely closed.
+
+        :raises: OperationCancelledError if the client has been shut down.
         """
         logger.info("Disconnecting from Hub...")
 
         disconnect_complete = threading.Event()
 
-        def callback():
+        class context:
+            error = None
+
+        def callback(error=None):
+            context.error = error
             disconnect_complete.set()
-            logger.info("Successfully disconnected from Hub")
+            if not error:
+                logger.info("Successfully disconnected from Hub")
 
         self._iothub_pipeline.disconnect(callback=callback)
         disconnect_complete.wait()
+        if context.error:
+            raise context.error
+
+    def shutdown(self, timeout=None):
+        """Shut down the client for good, once its messages in flight have been delivered.
+
+        The client stops accepting new operations and waits for up to timeout seconds for the
+        service to acknowledge the messages and responses which are in flight.  Any which remain
+        are failed with an OperationCancelledError, and the connection is closed.
+
+        The background threads which are shared by every client in the process keep running.
+        Call azure.iot.device.shutdown_executors() to stop them once every client is shut down.
+
+        This is a synchronous call, meaning that this function will not return until the client
+        has shut down.
+
+        :param float timeout: The maximum number of seconds to wait for messages in flight, or
+        None to wait for as long as the connection stays up.
+        """
+        logger.info("Shutting down client...")
+
+        shutdown_complete = threading.Event()
+
+        def callback():
+            shutdown_complete.set()
+            logger.info("Successfully shut down client")
+
+        self._iothub_pipeline.shutdown(timeout=timeout, callback=callback)
+        shutdown_complete.wait()
 
     def send_message(self, message):
         """Sends a message to the default events endpoint on the Azure IoT Hub or Azure IoT Edge Hub instance.
 
         This is a synchronous event, meaning that this function will not return until the event
         has been sent to the service and the service has acknowledged receipt of the event.
+        Messages sent at QoS 0 (see telemetry_qos) are not acknowledged, so this function returns
+        as soon as the message has been handed to the transport.
 
         If the connection to the service has not previously been opened by a call to connect, this
         function will open the connection before sending the event.
@@ -112,12 +214,19 @@ class GenericIoTHubClient(AbstractIoTHubClient):
         logger.info("Sending message to Hub...")
         send_complete = threading.Event()
 
-        def callback():
+        class context:
+            error = None
+
+        def callback(error=None):
+            context.error = error
             send_complete.set()
-            logger.info("Successfully sent message to Hub")
+            if not error:
+                logger.info("Successfully sent message to Hub")
 
         self._iothub_pipeline.send_message(message, callback=callback)
         send_complete.wait()
+        if context.error:
+            raise context.error
 
     def receive_method_request(self, method_name=None, block=True, timeout=None):
         """Receive a method request via the Azure IoT Hub or Azure IoT Edge Hub.
@@ -159,12 +268,19 @@ class GenericIoTHubClient(AbstractIoTHubClient):
         logger.info("Sending method response to Hub...")
         send_complete = threading.Event()
 
-        def callback():
+        class context:
+            error = None
+
+        def callback(error=None):
+            context.error = error
             send_complete.set()
-            logger.info("Successfully sent method response to Hub")
+            if not error:
+                logger.info("Successfully sent method response to Hub")
 
         self._iothub_pipeline.send_method_response(method_response, callback=callback)
         send_complete.wait()
+        if context.error:
+            raise context.error
 
     def _enable_feature(self, feature_name):
         """Enable an Azure IoT Hub feature.
@@ -174,16 +290,25 @@ class GenericIoTHubClient(AbstractIoTHubClient):
 
         :param feature_name: The name of the feature to enable.
         See azure.iot.device.common.pipeline.constant for possible values
+
+        :raises: OperationCancelledError if the client has been shut down.
         """
         logger.info("Enabling feature:" + feature_name + "...")
         enable_complete = threading.Event()
 
-        def callback():
+        class context:
+            error = None
+
+        def callback(error=None):
+            context.error = error
             enable_complete.set()
-            logger.info("Successfully enabled feature:" + feature_name)
+            if not error:
+                logger.info("Successfully enabled feature:" + feature_name)
 
         self._iothub_pipeline.enable_feature(feature_name, callback=callback)
         enable_complete.wait()
+        if context.error:
+            raise context.error
 
     def get_twin(self):
         """
@@ -193,6 +318,11 @@ class GenericIoTHubClient(AbstractIoTHubClient):
         has been retrieved from the service.
 
         :returns: Twin object which was retrieved from the hub
+
+        :raises: TimeoutError if the service does not respond in time.
+        :raises: ConnectionDroppedError if the connection drops before the service responds.
+        :raises: PipelineError if too many requests are already waiting for a response.
+        :raises: OperationCancelledError if the client is shut down before the service responds.
         """
         if not self._iothub_pipeline.feature_enabled[constant.TWIN]:
             self._enable_feature(constant.TWIN)
@@ -202,15 +332,19 @@ class GenericIoTHubClient(AbstractIoTHubClient):
         # (https://stackoverflow.com/a/28433571)
         class context:
             twin = None
+            error = None
 
         op_complete = threading.Event()
 
-        def on_pipeline_op_complete(retrieved_twin):
+        def on_pipeline_op_complete(retrieved_twin=None, error=None):
             context.twin = retrieved_twin
+            context.error = error
             op_complete.set()
 
         self._iothub_pipeline.get_twin(callback=on_pipeline_op_complete)
         op_complete.wait()
+        if context.error:
+            raise context.error
         return context.twin
 
     def patch_twin_reported_properties(self, reported_properties_patch):
@@ -223,21 +357,46 @@ class GenericIoTHubClient(AbstractIoTHubClient):
         If the service returns an error on the patch operation, this function will raise the
         appropriate error.
 
+        If reported properties diffing is enabled, only the properties which the patch changes
+        are sent, and nothing is sent if it changes none of them.
+
         :param reported_properties_patch:
         :type reported_properties_patch: dict, str, int, float, bool, or None (JSON compatible values)
+
+        :raises: TimeoutError if the service does not respond in time.
+        :raises: ConnectionDroppedError if the connection drops before the service responds.
+        :raises: PipelineError if too many requests are already waiting for a response.
+        :raises: OperationCancelledError if the client is shut down before the service responds.
         """
+        tracker = None
+        if self._reported_properties_tracker and isinstance(reported_properties_patch, dict):
+            tracker = self._reported_properties_tracker
+            reported_properties_patch = tracker.reduce_patch(reported_properties_patch)
+            if not reported_properties_patch:
+                logger.info("Reported properties are unchanged - not sending patch")
+                return
+
         if not self._iothub_pipeline.feature_enabled[constant.TWIN]:
             self._enable_feature(constant.TWIN)
 
         op_complete = threading.Event()
 
-        def on_pipeline_op_complete():
+        class context:
+            error = None
+
+        def on_pipeline_op_complete(error=None):
+            if error:
+                context.error = error
+            elif tracker is not None:
+                tracker.acknowledge(reported_properties_patch)
             op_complete.set()
 
         self._iothub_pipeline.patch_twin_reported_properties(
             patch=reported_properties_patch, callback=on_pipeline_op_complete
         )
         op_complete.wait()
+        if context.error:
+            raise context.error
         print("Done with patch")
 
     def receive_twin_desired_properties_patch(self, block=True, timeout=None):
@@ -312,6 +471,33 @@ class IoTHubDeviceClient(GenericIoTHubClient, AbstractIoTHubDeviceClient):
         logger.info("Message received")
         return message
 
+    def receive_messages(self, max_messages, block=True, timeout=None):
+        """Receive the messages which have been sent from the Azure IoT Hub, up to a maximum.
+
+        Waits for the first message in the same way as receive_message, then returns it along
+        with any other messages which have already arrived, so that a batch of messages can be
+        processed together.
+
+        :param int max_messages: The maximum number of messages to return.
+        :param bool block: Indicates if the operation should block until a message is received.
+        Default True.
+        :param int timeout: Optionally provide a number of seconds until blocking times out.
+
+        :raises: ValueError if max_messages is less than 1.
+        :raises: InboxEmpty if timeout occurs on a blocking operation.
+        :raises: InboxEmpty if no message is available on a non-blocking operation.
+
+        :returns: A list of between 1 and max_messages Messages, in the order they arrived.
+        """
+        if not self._iothub_pipeline.feature_enabled[constant.C2D_MSG]:
+            self._enable_feature(constant.C2D_MSG)
+        c2d_inbox = self._inbox_manager.get_c2d_message_inbox()
+
+        logger.info("Waiting for messages from Hub...")
+        messages = c2d_inbox.get_many(max_messages, block=block, timeout=timeout)
+        logger.info("{} messages received".format(len(messages)))
+        return messages
+
 
 class IoTHubModuleClient(GenericIoTHubClient, AbstractIoTHubModuleClient):
     """A synchronous module client that connects to an Azure IoT Hub or Azure IoT Edge instance.
@@ -342,6 +528,8 @@ class IoTHubModuleClient(GenericIoTHubClient, AbstractIoTHubModuleClient):
 
         This is a synchronous event, meaning that this function will not return until the event
         has been sent to the service and the service has acknowledged receipt of the event.
+        Messages sent at QoS 0 (see telemetry_qos) are not acknowledged, so this function returns
+        as soon as the message has been handed to the transport.
 
         If the connection to the service has not previously been opened by a call to connect, this
         function will open the connection before sending the event.
@@ -357,12 +545,19 @@ class IoTHubModuleClient(GenericIoTHubClient, AbstractIoTHubModuleClient):
         logger.info("Sending message to output:" + output_name + "...")
         send_complete = threading.Event()
 
-        def callback():
-            logger.info("Successfully sent message to output: " + output_name)
+        class context:
+            error = None
+
+        def callback(error=None):
+            if not error:
+                logger.info("Successfully sent message to output: " + output_name)
+            context.error = error
             send_complete.set()
 
         self._iothub_pipeline.send_output_event(message, callback=callback)
         send_complete.wait()
+        if context.error:
+            raise context.error
 
     def receive_message_on_input(self, input_name, block=True, timeout=None):
         """Receive an input message that has been sent from another Module to a specific input.
@@ -385,3 +580,31 @@ class IoTHubModuleClient(GenericIoTHubClient, AbstractIoTHubModuleClient):
         message = input_inbox.get(block=block, timeout=timeout)
         logger.info("Input message received on: " + input_name)
         return message
+
+    def receive_messages_on_input(self, input_name, max_messages, block=True, timeout=None):
+        """Receive the input messages which have been sent to a specific input, up to a maximum.
+
+        Waits for the first message in the same way as receive_message_on_input, then returns it
+        along with any other messages which have already arrived on the input, so that a batch of
+        messages can be processed together.
+
+        :param str input_name: The input name to receive messages on.
+        :param int max_messages: The maximum number of messages to return.
+        :param bool block: Indicates if the operation should block until a message is received.
+        Default True.
+        :param int timeout: Optionally provide a number of seconds until blocking times out.
+
+        :raises: ValueError if max_messages is less than 1.
+        :raises: InboxEmpty if timeout occurs on a blocking operation.
+        :raises: InboxEmpty if no message is available on a non-blocking operation.
+
+        :returns: A list of between 1 and max_messages Messages, in the order they arrived.
+        """
+        if not self._iothub_pipeline.feature_enabled[constant.INPUT_MSG]:
+            self._enable_feature(constant.INPUT_MSG)
+        input_inbox = self._inbox_manager.get_input_message_inbox(input_name)
+
+        logger.info("Waiting for input messages on: " + input_name + "...")
+        messages = input_inbox.get_many(max_messages, block=block, timeout=timeout)
+        logger.info("{} input messages received on: {}".format(len(messages), input_name))
+        return messages
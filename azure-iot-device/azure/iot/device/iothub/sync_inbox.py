@@ -7,6 +7,7 @@
 
 from six.moves import queue
 import six
+import time
 from abc import ABCMeta, abstractmethod
 
 
@@ -35,6 +36,21 @@ class AbstractInbox:
         """
         pass
 
+    @abstractmethod
+    def _put_coalesced(self, item, merge):
+        """Put an item into the Inbox, or merge it into the last item in the Inbox if there is one.
+
+        Implementation MUST be a synchronous function, and must replace the last item with
+        merge(last_item, item) under the same acquisition of its lock as checking for it.  If
+        merge returns None, the item must be put into the Inbox after the last item instead.
+        Only to be used by the InboxManager.
+
+        :param item: The item to put in the Inbox.
+        :param merge: A function which takes the last item and item and returns the merged item,
+        or None if they cannot be merged.
+        """
+        pass
+
     @abstractmethod
     def get(self):
         """Remove and return an item from the inbox.
@@ -46,6 +62,19 @@ class AbstractInbox:
         """
         pass
 
+    @abstractmethod
+    def get_many(self, max_items):
+        """Remove and return the items which are available in the inbox, up to a maximum.
+
+        Implementation should have the capability to block until at least one item is available,
+        and should take all of the items it returns under a single acquisition of its lock.
+        Implementation can be a synchronous function or an asynchronous coroutine.
+
+        :param int max_items: The maximum number of items to return.
+        :returns: A list of items from the Inbox, in order.
+        """
+        pass
+
     @abstractmethod
     def empty(self):
         """Returns True if the inbox is empty, False otherwise
@@ -60,6 +89,14 @@ class AbstractInbox:
         """
         pass
 
+    @abstractmethod
+    def qsize(self):
+        """Returns the approximate number of items in the inbox
+
+        :returns: The number of items in the inbox
+        """
+        pass
+
 
 class SyncClientInbox(AbstractInbox):
     """Holds generic incoming data for a synchronous client.
@@ -86,6 +123,23 @@ class SyncClientInbox(AbstractInbox):
         """
         self._queue.put(item)
 
+    def _put_coalesced(self, item, merge):
+        """Put an item into the inbox, or merge it into the last item in the inbox if there is one.
+
+        Only to be used by the InboxManager.
+
+        :param item: The item to put in the inbox.
+        :param merge: A function which takes the last item and item and returns the merged item,
+        or None if they cannot be merged.
+        """
+        with self._queue.mutex:
+            if self._queue.queue:
+                merged = merge(self._queue.queue[-1], item)
+                if merged is not None:
+                    self._queue.queue[-1] = merged
+                    return
+        self._queue.put(item)
+
     def get(self, block=True, timeout=None):
         """Remove and return an item from the inbox.
 
@@ -103,6 +157,40 @@ class SyncClientInbox(AbstractInbox):
         except queue.Empty:
             raise InboxEmpty("Inbox is empty")
 
+    def get_many(self, max_items, block=True, timeout=None):
+        """Remove and return the items which are available in the inbox, up to a maximum.
+
+        Waits in the same way as get for the first item, then takes every item which is
+        available, up to max_items, without releasing the lock of the inbox in between.
+
+        :param int max_items: The maximum number of items to return.
+        :param bool block: Indicates if the operation should block until an item is available.
+        Default True.
+        :param int timeout: Optionally provide a number of seconds until blocking times out.
+
+        :raises: ValueError if max_items is less than 1
+        :raises: InboxEmpty if timeout occurs because the inbox is empty
+        :raises: InboxEmpty if inbox is empty in non-blocking mode
+
+        :returns: A list of between 1 and max_items items from the Inbox, in order.
+        """
+        if max_items < 1:
+            raise ValueError("max_items must be at least 1")
+        deadline = None if (not block or timeout is None) else time.time() + timeout
+        with self._queue.not_empty:
+            while not self._queue.queue:
+                if not block:
+                    raise InboxEmpty("Inbox is empty")
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise InboxEmpty("Inbox is empty")
+                self._queue.not_empty.wait(remaining)
+            items = []
+            while self._queue.queue and len(items) < max_items:
+                items.append(self._queue.queue.popleft())
+            self._queue.not_full.notify()
+        return items
+
     def empty(self):
         """Returns True if the inbox is empty, False otherwise
 
@@ -110,6 +198,13 @@ class SyncClientInbox(AbstractInbox):
         """
         return self._queue.empty()
 
+    def qsize(self):
+        """Returns the approximate number of items in the inbox
+
+        :returns: The number of items in the inbox
+        """
+        return self._queue.qsize()
+
     def clear(self):
         """Remove all items from the inbox.
         """
@@ -140,3 +140,35 @@ def add_shims_for_inherited_methods(target_class):
     # NOTE: the __qualname__ attributes of these new shim methods are merely the method name,
     # rather than <class_name>.<method_name>, due to the scoping of the definition.
     # This shouldn't matter, but in case it does, I am documenting that fact here.
+
+
+_documentation_shims_added = False
+
+
+def add_shims_for_documentation():
+    """Add shim methods to all the public client classes, so that the generated online docs
+    accurately show inherited methods.
+
+    This is not done when the library is imported, since it is slow and not needed at runtime.
+    Documentation builds should call this function before generating docs.
+
+    This currently only works for Python 3.5+
+    """
+    global _documentation_shims_added
+    if _documentation_shims_added:
+        return
+
+    from azure.iot.device import iothub, provisioning
+    from azure.iot.device.iothub import aio as iothub_aio
+    from azure.iot.device.provisioning import aio as provisioning_aio
+
+    for target_class in [
+        iothub.IoTHubDeviceClient,
+        iothub.IoTHubModuleClient,
+        provisioning.ProvisioningDeviceClient,
+        iothub_aio.IoTHubDeviceClient,
+        iothub_aio.IoTHubModuleClient,
+        provisioning_aio.ProvisioningDeviceClient,
+    ]:
+        add_shims_for_inherited_methods(target_class)
+    _documentation_shims_added = True
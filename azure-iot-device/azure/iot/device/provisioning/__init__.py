@@ -6,5 +6,6 @@ human intervention, enabling customers to provision millions of devices in a sec
 """
 from .provisioning_device_client import ProvisioningDeviceClient
 from .models import RegistrationResult
+from .registration_cache import RegistrationCache
 
-__all__ = ["ProvisioningDeviceClient", "RegistrationResult"]
+__all__ = ["ProvisioningDeviceClient", "RegistrationResult", "RegistrationCache"]
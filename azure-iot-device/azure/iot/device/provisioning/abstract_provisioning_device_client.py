@@ -24,16 +24,26 @@ class AbstractProvisioningDeviceClient(object):
     Super class for any client that can be used to register devices to Device Provisioning Service.
     """
 
-    def __init__(self, provisioning_pipeline):
+    def __init__(self, provisioning_pipeline, registration_cache=None):
         """
         Initializes the provisioning client.
         :param provisioning_pipeline: Instance of the provisioning pipeline object.
+        :param registration_cache: (OPTIONAL) Cache in which successful registration results are
+        stored, and from which they are returned on subsequent calls to register.
+        :type registration_cache: RegistrationCache
         """
         self._provisioning_pipeline = provisioning_pipeline
+        self._registration_cache = registration_cache
 
     @classmethod
     def create_from_symmetric_key(
-        cls, provisioning_host, registration_id, id_scope, symmetric_key, protocol_choice=None
+        cls,
+        provisioning_host,
+        registration_id,
+        id_scope,
+        symmetric_key,
+        protocol_choice=None,
+        registration_cache=None,
     ):
         """
         Create a client which can be used to run the registration of a device with provisioning service
@@ -51,6 +61,9 @@ class AbstractProvisioningDeviceClient(object):
         option enabled. Users can provide their own symmetric keys for enrollments by disabling this option within
         16 bytes and 64 bytes and in valid Base64 format.
         :param protocol_choice: The choice for the protocol to be used. This is optional and will default to protocol MQTT currently.
+        :param registration_cache: (OPTIONAL) A RegistrationCache. If provided, a previously cached
+        result for this registration is returned by register without contacting the service, and
+        new successful results are stored in it.
         :return: A ProvisioningDeviceClient which can register via Symmetric Key.
         """
         if protocol_choice is not None:
@@ -62,7 +75,7 @@ class AbstractProvisioningDeviceClient(object):
                 provisioning_host, registration_id, id_scope, symmetric_key
             )
             mqtt_provisioning_pipeline = ProvisioningPipeline(security_client)
-            return cls(mqtt_provisioning_pipeline)
+            return cls(mqtt_provisioning_pipeline, registration_cache=registration_cache)
         else:
             raise NotImplementedError(
                 "A symmetric key can only create symmetric key security client which is compatible "
@@ -71,7 +84,13 @@ class AbstractProvisioningDeviceClient(object):
 
     @classmethod
     def create_from_x509_certificate(
-        cls, provisioning_host, registration_id, id_scope, x509, protocol_choice=None
+        cls,
+        provisioning_host,
+        registration_id,
+        id_scope,
+        x509,
+        protocol_choice=None,
+        registration_cache=None,
     ):
         """
         Create a client which can be used to run the registration of a device with provisioning service
@@ -86,6 +105,9 @@ class AbstractProvisioningDeviceClient(object):
         :param x509: The x509 certificate, To use the certificate the enrollment object needs to contain cert (either the root certificate or one of the intermediate CA certificates).
         If the cert comes from a CER file, it needs to be base64 encoded.
         :param protocol_choice: The choice for the protocol to be used. This is optional and will default to protocol MQTT currently.
+        :param registration_cache: (OPTIONAL) A RegistrationCache. If provided, a previously cached
+        result for this registration is returned by register without contacting the service, and
+        new successful results are stored in it.
         :return: A ProvisioningDeviceClient which can register via Symmetric Key.
         """
         if protocol_choice is None:
@@ -95,7 +117,7 @@ class AbstractProvisioningDeviceClient(object):
         if protocol_name == "mqtt":
             security_client = X509SecurityClient(provisioning_host, registration_id, id_scope, x509)
             mqtt_provisioning_pipeline = ProvisioningPipeline(security_client)
-            return cls(mqtt_provisioning_pipeline)
+            return cls(mqtt_provisioning_pipeline, registration_cache=registration_cache)
         else:
             raise NotImplementedError(
                 "A x509 certificate can only create x509 security client which is compatible only "
@@ -109,6 +131,45 @@ class AbstractProvisioningDeviceClient(object):
         """
         pass
 
+    def _get_cached_registration_result(self):
+        """
+        Return the cached registration result for this registration, if caching is enabled and
+        there is one.
+        """
+        if self._registration_cache is None:
+            return None
+        return self._registration_cache.get(
+            self._provisioning_pipeline.id_scope, self._provisioning_pipeline.registration_id
+        )
+
+    def _cache_registration_result(self, result):
+        """
+        Store a registration result in the cache, if caching is enabled and the device was assigned.
+        """
+        if self._registration_cache is None or result is None or result.status != "assigned":
+            return
+        try:
+            self._registration_cache.set(
+                self._provisioning_pipeline.id_scope,
+                self._provisioning_pipeline.registration_id,
+                result,
+            )
+        except (OSError, IOError):
+            # Failing to cache is not a failure to register
+            logger.warning("Unable to write registration result to cache", exc_info=True)
+
+    def clear_cached_registration(self):
+        """
+        Remove any cached registration result for this registration, so that the next call to
+        register will contact the Device Provisioning Service.
+
+        This should be called if the assigned IoT Hub rejects the cached identity.
+        """
+        if self._registration_cache is not None:
+            self._registration_cache.remove(
+                self._provisioning_pipeline.id_scope, self._provisioning_pipeline.registration_id
+            )
+
     @abc.abstractmethod
     def cancel(self):
         """
@@ -26,14 +26,17 @@ class ProvisioningDeviceClient(AbstractProvisioningDeviceClient):
     using Symmetric Key authentication.
     """
 
-    def __init__(self, provisioning_pipeline):
+    def __init__(self, provisioning_pipeline, registration_cache=None):
         """
         Initializer for the Provisioning Client.
         NOTE : This initializer should not be called directly.
         Instead, the class method `create_from_security_client` should be used to create a client object.
         :param provisioning_pipeline: The protocol pipeline for provisioning. As of now this only supports MQTT.
+        :param registration_cache: (OPTIONAL) The RegistrationCache used to skip registration on restart.
         """
-        super(ProvisioningDeviceClient, self).__init__(provisioning_pipeline)
+        super(ProvisioningDeviceClient, self).__init__(
+            provisioning_pipeline, registration_cache=registration_cache
+        )
         self._polling_machine = PollingMachine(provisioning_pipeline)
 
     async def register(self):
@@ -41,7 +44,15 @@ class ProvisioningDeviceClient(AbstractProvisioningDeviceClient):
         Register the device with the provisioning service.
         Before returning the client will also disconnect from the provisioning service.
         If a registration attempt is made while a previous registration is in progress it may throw an error.
+
+        If the client was created with a registration cache that holds a result for this
+        registration, that result is returned immediately without contacting the service.
         """
+        cached_result = self._get_cached_registration_result()
+        if cached_result is not None:
+            logger.info("Using cached registration result")
+            return cached_result
+
         logger.info("Registering with Provisioning Service...")
         register_async = async_adapter.emulate_async(self._polling_machine.register)
 
@@ -52,7 +63,9 @@ class ProvisioningDeviceClient(AbstractProvisioningDeviceClient):
         callback = async_adapter.AwaitableCallback(sync_on_register_complete)
 
         await register_async(callback=callback)
-        return await callback.completion()
+        result = await callback.completion()
+        self._cache_registration_result(result)
+        return result
 
     async def cancel(self):
         """
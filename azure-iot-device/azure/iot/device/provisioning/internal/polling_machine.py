@@ -4,11 +4,12 @@
 # license information.
 # --------------------------------------------------------------------------
 import logging
-import uuid
 import json
 import traceback
-from threading import Timer
-from transitions import Machine
+import six
+from collections import deque
+from azure.iot.device.common.timer_scheduler import Timer
+from azure.iot.device.common.id_generator import RequestIdGenerator
 from azure.iot.device.provisioning.pipeline import constant
 import six.moves.urllib as urllib
 from .request_response_provider import RequestResponseProvider
@@ -24,6 +25,139 @@ logger = logging.getLogger(__name__)
 POS_STATUS_CODE_IN_TOPIC = 3
 POS_QUERY_PARAM_PORTION = 2
 
+STATES = (
+    "disconnected",
+    "initializing",
+    "registering",
+    "waiting_to_poll",
+    "polling",
+    "completed",
+    "error",
+    "cancelling",
+)
+
+TRANSITIONS = [
+    {
+        "trigger": "_trig_register",
+        "source": "disconnected",
+        "before": "_initialize_register",
+        "dest": "initializing",
+    },
+    {
+        "trigger": "_trig_register",
+        "source": "error",
+        "before": "_initialize_register",
+        "dest": "initializing",
+    },
+    {"trigger": "_trig_register", "source": "registering", "dest": None},
+    {
+        "trigger": "_trig_send_register_request",
+        "source": "initializing",
+        "before": "_send_register_request",
+        "dest": "registering",
+    },
+    {
+        "trigger": "_trig_send_register_request",
+        "source": "waiting_to_poll",
+        "before": "_send_register_request",
+        "dest": "registering",
+    },
+    {
+        "trigger": "_trig_wait",
+        "source": "registering",
+        "dest": "waiting_to_poll",
+        "after": "_wait_for_interval",
+    },
+    {"trigger": "_trig_wait", "source": "cancelling", "dest": None},
+    {
+        "trigger": "_trig_wait",
+        "source": "polling",
+        "dest": "waiting_to_poll",
+        "after": "_wait_for_interval",
+    },
+    {
+        "trigger": "_trig_poll",
+        "source": "waiting_to_poll",
+        "dest": "polling",
+        "after": "_query_operation_status",
+    },
+    {"trigger": "_trig_poll", "source": "cancelling", "dest": None},
+    {
+        "trigger": "_trig_complete",
+        "source": ["registering", "waiting_to_poll", "polling"],
+        "dest": "completed",
+        "after": "_call_complete",
+    },
+    {
+        "trigger": "_trig_error",
+        "source": ["registering", "waiting_to_poll", "polling"],
+        "dest": "error",
+        "after": "_call_error",
+    },
+    {"trigger": "_trig_error", "source": "cancelling", "dest": None},
+    {
+        "trigger": "_trig_cancel",
+        "source": ["disconnected", "completed"],
+        "dest": None,
+        "after": "_inform_no_process",
+    },
+    {
+        "trigger": "_trig_cancel",
+        "source": ["initializing", "registering", "waiting_to_poll", "polling"],
+        "dest": "cancelling",
+        "after": "_call_cancel",
+    },
+]
+
+
+def _compile_transition_table(transitions):
+    """
+    Compile a list of transition definitions into a dict which maps (trigger, source state)
+    to a (dest state, before callback name, after callback name) tuple.  A dest of None means
+    that the transition runs its callbacks without changing state.
+    """
+    table = {}
+    for transition in transitions:
+        sources = transition["source"]
+        if isinstance(sources, six.string_types):
+            sources = [sources]
+        for state in sources + [transition["dest"]]:
+            if state is not None and state not in STATES:
+                raise ValueError("Unknown state {} in transition table".format(state))
+        for source in sources:
+            table[(transition["trigger"], source)] = (
+                transition["dest"],
+                transition.get("before"),
+                transition.get("after"),
+            )
+    return table
+
+
+# Shared by every PollingMachine, so that creating a machine does not need to build any
+# per-instance state machine structures.
+_TRANSITION_TABLE = _compile_transition_table(TRANSITIONS)
+
+
+class _EventData(object):
+    """
+    The arguments which a trigger was fired with.  This is passed to transition callbacks.
+    """
+
+    __slots__ = ["trigger", "args", "kwargs"]
+
+    def __init__(self, trigger, args, kwargs):
+        self.trigger = trigger
+        self.args = args
+        self.kwargs = kwargs
+
+
+def _make_trigger(trigger):
+    def fire(self, *args, **kwargs):
+        return self._fire_trigger(_EventData(trigger, args, kwargs))
+
+    fire.__name__ = trigger
+    return fire
+
 
 class PollingMachine(object):
     """
@@ -45,117 +179,68 @@ class PollingMachine(object):
         self._registration_result = None
 
         self._operations = {}
+        self._request_ids = RequestIdGenerator()
 
         self._request_response_provider = RequestResponseProvider(provisioning_pipeline)
 
-        states = [
-            "disconnected",
-            "initializing",
-            "registering",
-            "waiting_to_poll",
-            "polling",
-            "completed",
-            "error",
-            "cancelling",
-        ]
-
-        transitions = [
-            {
-                "trigger": "_trig_register",
-                "source": "disconnected",
-                "before": "_initialize_register",
-                "dest": "initializing",
-            },
-            {
-                "trigger": "_trig_register",
-                "source": "error",
-                "before": "_initialize_register",
-                "dest": "initializing",
-            },
-            {"trigger": "_trig_register", "source": "registering", "dest": None},
-            {
-                "trigger": "_trig_send_register_request",
-                "source": "initializing",
-                "before": "_send_register_request",
-                "dest": "registering",
-            },
-            {
-                "trigger": "_trig_send_register_request",
-                "source": "waiting_to_poll",
-                "before": "_send_register_request",
-                "dest": "registering",
-            },
-            {
-                "trigger": "_trig_wait",
-                "source": "registering",
-                "dest": "waiting_to_poll",
-                "after": "_wait_for_interval",
-            },
-            {"trigger": "_trig_wait", "source": "cancelling", "dest": None},
-            {
-                "trigger": "_trig_wait",
-                "source": "polling",
-                "dest": "waiting_to_poll",
-                "after": "_wait_for_interval",
-            },
-            {
-                "trigger": "_trig_poll",
-                "source": "waiting_to_poll",
-                "dest": "polling",
-                "after": "_query_operation_status",
-            },
-            {"trigger": "_trig_poll", "source": "cancelling", "dest": None},
-            {
-                "trigger": "_trig_complete",
-                "source": ["registering", "waiting_to_poll", "polling"],
-                "dest": "completed",
-                "after": "_call_complete",
-            },
-            {
-                "trigger": "_trig_error",
-                "source": ["registering", "waiting_to_poll", "polling"],
-                "dest": "error",
-                "after": "_call_error",
-            },
-            {"trigger": "_trig_error", "source": "cancelling", "dest": None},
-            {
-                "trigger": "_trig_cancel",
-                "source": ["disconnected", "completed"],
-                "dest": None,
-                "after": "_inform_no_process",
-            },
-            {
-                "trigger": "_trig_cancel",
-                "source": ["initializing", "registering", "waiting_to_poll", "polling"],
-                "dest": "cancelling",
-                "after": "_call_cancel",
-            },
-        ]
-
-        def _on_transition_complete(event_data):
-            if not event_data.transition:
-                dest = "[no transition]"
-            else:
-                dest = event_data.transition.dest
-            logger.info(
-                "Transition complete.  Trigger={}, Src={}, Dest={}, result={}, error{}".format(
-                    event_data.event.name,
-                    event_data.transition.source,
-                    dest,
-                    str(event_data.result),
-                    str(event_data.error),
-                )
+        self.state = "disconnected"
+
+        # Triggers which are fired while a transition is already running (i.e. from inside a
+        # transition callback) are queued and run after the current transition completes.
+        self._pending_triggers = deque()
+        self._running_transition = False
+
+    _trig_register = _make_trigger("_trig_register")
+    _trig_send_register_request = _make_trigger("_trig_send_register_request")
+    _trig_wait = _make_trigger("_trig_wait")
+    _trig_poll = _make_trigger("_trig_poll")
+    _trig_complete = _make_trigger("_trig_complete")
+    _trig_error = _make_trigger("_trig_error")
+    _trig_cancel = _make_trigger("_trig_cancel")
+
+    def _fire_trigger(self, event_data):
+        """
+        Run the transition for a trigger, or queue it if another transition is already running.
+        """
+        self._pending_triggers.append(event_data)
+        if self._running_transition:
+            return True
+
+        self._running_transition = True
+        try:
+            while self._pending_triggers:
+                self._run_transition(self._pending_triggers[0])
+                self._pending_triggers.popleft()
+        except Exception:
+            self._pending_triggers.clear()
+            raise
+        finally:
+            self._running_transition = False
+        return True
+
+    def _run_transition(self, event_data):
+        source = self.state
+        try:
+            dest, before, after = _TRANSITION_TABLE[(event_data.trigger, source)]
+        except KeyError:
+            raise RuntimeError(
+                "Can't trigger event {} from state {}!".format(event_data.trigger, source)
             )
 
-        self._state_machine = Machine(
-            model=self,
-            states=states,
-            transitions=transitions,
-            initial="disconnected",
-            send_event=True,  # Use event_data structures to pass transition arguments
-            finalize_event=_on_transition_complete,
-            queued=True,
-        )
+        try:
+            if before:
+                getattr(self, before)(event_data)
+            if dest is not None:
+                self.state = dest
+            if after:
+                getattr(self, after)(event_data)
+        finally:
+            logger.debug(
+                "Transition complete.  Trigger=%s, Src=%s, Dest=%s",
+                event_data.trigger,
+                source,
+                dest if dest is not None else "[no transition]",
+            )
 
     def register(self, callback=None):
         """
@@ -186,7 +271,7 @@ class PollingMachine(object):
         logger.info("Sending registration request")
         self._set_query_timer()
 
-        request_id = str(uuid.uuid4())
+        request_id = self._request_ids.next_id()
 
         self._operations[request_id] = constant.PUBLISH_TOPIC_REGISTRATION.format(request_id)
         self._request_response_provider.send_request(
@@ -203,7 +288,7 @@ class PollingMachine(object):
         logger.info("Querying operation status from polling machine")
         self._set_query_timer()
 
-        request_id = str(uuid.uuid4())
+        request_id = self._request_ids.next_id()
         result = event_data.args[0].args[0]
 
         operation_id = result.operation_id
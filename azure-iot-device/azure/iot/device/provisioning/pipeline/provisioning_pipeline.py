@@ -30,6 +30,10 @@ class ProvisioningPipeline(object):
         self.on_disconnected = None
         self.on_message_received = None
 
+        # Identity of the registration, used to key any cached registration results
+        self.id_scope = security_client.id_scope
+        self.registration_id = security_client.registration_id
+
         self._pipeline = (
             pipeline_stages_base.PipelineRootStage()
             .append_stage(pipeline_stages_provisioning.UseSecurityClientStage())
@@ -21,14 +21,17 @@ class ProvisioningDeviceClient(AbstractProvisioningDeviceClient):
     using Symmetric Key authentication.
     """
 
-    def __init__(self, provisioning_pipeline):
+    def __init__(self, provisioning_pipeline, registration_cache=None):
         """
         Initializer for the Provisioning Client.
         NOTE : This initializer should not be called directly.
         Instead, the class methods that start with `create_from_` should be used to create a client object.
         :param provisioning_pipeline: The protocol pipeline for provisioning. As of now this only supports MQTT.
+        :param registration_cache: (OPTIONAL) The RegistrationCache used to skip registration on restart.
         """
-        super(ProvisioningDeviceClient, self).__init__(provisioning_pipeline)
+        super(ProvisioningDeviceClient, self).__init__(
+            provisioning_pipeline, registration_cache=registration_cache
+        )
         self._polling_machine = PollingMachine(provisioning_pipeline)
 
     def register(self):
@@ -38,7 +41,15 @@ class ProvisioningDeviceClient(AbstractProvisioningDeviceClient):
         process has completed successfully or the attempt has resulted in a failure. Before returning
         the client will also disconnect from the provisioning service.
         If a registration attempt is made while a previous registration is in progress it may throw an error.
+
+        If the client was created with a registration cache that holds a result for this
+        registration, that result is returned immediately without contacting the service.
         """
+        cached_result = self._get_cached_registration_result()
+        if cached_result is not None:
+            logger.info("Using cached registration result")
+            return cached_result
+
         logger.info("Registering with Provisioning Service...")
         register_complete = Event()
 
@@ -56,6 +67,7 @@ class ProvisioningDeviceClient(AbstractProvisioningDeviceClient):
         self._polling_machine.register(callback=on_register_complete)
 
         register_complete.wait()
+        self._cache_registration_result(context.registration_result)
         return context.registration_result
 
     def cancel(self):
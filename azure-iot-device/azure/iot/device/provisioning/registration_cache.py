@@ -0,0 +1,162 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for
+# license information.
+# --------------------------------------------------------------------------
+"""This module contains a persistent cache of registration results, which allows a device that has
+already been provisioned to skip the Device Provisioning Service on restart.
+"""
+
+import io
+import os
+import six
+import json
+import logging
+import threading
+from .models.registration_result import RegistrationResult, RegistrationState
+
+logger = logging.getLogger(__name__)
+
+
+class RegistrationCache(object):
+    """
+    A file-backed store of successful registration results, keyed by ID scope and registration ID.
+
+    Only results with an "assigned" status are stored. If the IoT Hub later rejects the cached
+    identity, the entry should be removed and the device registered again.
+
+    All methods implemented in this class are threadsafe.
+    """
+
+    def __init__(self, path):
+        """
+        Initializer for RegistrationCache.
+        :param str path: The path of the file in which registration results are stored. The file
+        will be created on the first call to set() if it does not already exist.
+        """
+        self._path = path
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        return self._path
+
+    def get(self, id_scope, registration_id):
+        """
+        Retrieve the cached registration result for a device.
+        :param str id_scope: The ID scope of the provisioning service.
+        :param str registration_id: The registration ID of the device.
+        :returns: The cached RegistrationResult, or None if there is no cached result.
+        """
+        with self._lock:
+            entry = self._read().get(_get_key(id_scope, registration_id))
+        if entry is None:
+            return None
+        try:
+            return _decode_result(entry)
+        except (KeyError, TypeError):
+            logger.warning(
+                "Ignoring malformed registration cache entry for {}".format(registration_id)
+            )
+            return None
+
+    def set(self, id_scope, registration_id, registration_result):
+        """
+        Store a registration result for a device, replacing any previously cached result.
+        :param str id_scope: The ID scope of the provisioning service.
+        :param str registration_id: The registration ID of the device.
+        :param registration_result: The result of a completed registration.
+        :type registration_result: RegistrationResult
+
+        :raises: ValueError if the registration result does not have an "assigned" status.
+        """
+        if registration_result.status != "assigned":
+            raise ValueError("Only assigned registration results can be cached")
+        with self._lock:
+            entries = self._read()
+            entries[_get_key(id_scope, registration_id)] = _encode_result(registration_result)
+            self._write(entries)
+
+    def remove(self, id_scope, registration_id):
+        """
+        Remove the cached registration result for a device, if there is one.
+        :param str id_scope: The ID scope of the provisioning service.
+        :param str registration_id: The registration ID of the device.
+        """
+        with self._lock:
+            entries = self._read()
+            if entries.pop(_get_key(id_scope, registration_id), None) is not None:
+                self._write(entries)
+
+    def _read(self):
+        try:
+            with io.open(self._path, mode="r", encoding="utf-8") as cache_file:
+                entries = json.load(cache_file)
+        except (OSError, IOError):
+            # No cache file yet.
+            return {}
+        except ValueError:
+            logger.warning("Registration cache {} is corrupt.  Ignoring it.".format(self._path))
+            return {}
+        if not isinstance(entries, dict):
+            logger.warning("Registration cache {} is corrupt.  Ignoring it.".format(self._path))
+            return {}
+        return entries
+
+    def _write(self, entries):
+        # Write to a temporary file and then move it into place, so that a crash in the middle
+        # of a write can never leave a truncated cache behind.
+        temp_path = self._path + ".tmp"
+        with io.open(temp_path, mode="w", encoding="utf-8") as cache_file:
+            cache_file.write(six.text_type(json.dumps(entries)))
+        if hasattr(os, "replace"):
+            os.replace(temp_path, self._path)
+        else:
+            # Python 2.7 has no atomic replace, and os.rename won't overwrite on Windows.
+            if os.path.exists(self._path):
+                os.remove(self._path)
+            os.rename(temp_path, self._path)
+
+
+def _get_key(id_scope, registration_id):
+    return "{}/{}".format(id_scope, registration_id)
+
+
+def _encode_result(registration_result):
+    state = registration_result.registration_state
+    encoded_state = None
+    if state is not None:
+        encoded_state = {
+            "deviceId": state.device_id,
+            "assignedHub": state.assigned_hub,
+            "substatus": state.sub_status,
+            "createdDateTimeUtc": state.created_date_time,
+            "lastUpdatedDateTimeUtc": state.last_update_date_time,
+            "etag": state.etag,
+        }
+    return {
+        "requestId": registration_result.request_id,
+        "operationId": registration_result.operation_id,
+        "status": registration_result.status,
+        "registrationState": encoded_state,
+    }
+
+
+def _decode_result(entry):
+    encoded_state = entry["registrationState"]
+    registration_state = None
+    if encoded_state is not None:
+        registration_state = RegistrationState(
+            device_id=encoded_state["deviceId"],
+            assigned_hub=encoded_state["assignedHub"],
+            sub_status=encoded_state["substatus"],
+            created_date_time=encoded_state["createdDateTimeUtc"],
+            last_update_date_time=encoded_state["lastUpdatedDateTimeUtc"],
+            etag=encoded_state["etag"],
+        )
+    return RegistrationResult(
+        request_id=entry["requestId"],
+        operation_id=entry["operationId"],
+        status=entry["status"],
+        registration_state=registration_state,
+    )
@@ -62,13 +62,15 @@ setup(
         # Actual project dependencies
         "six>=1.12.0,<2.0.0",
         "paho-mqtt>=1.4.0,<2.0.0",
-        "transitions>=0.6.8,<1.0.0",
         "requests>=2.20.0,<3.0.0",
         "requests-unixsocket>=0.1.5,<1.0.0",
-        "janus>=0.4.0,<1.0.0;python_version>='3.5'",
         "futures;python_version == '2.7'",
     ],
-    extras_require={":python_version<'3.0'": ["azure-iot-nspkg>=1.0.1"]},
+    extras_require={
+        ":python_version<'3.0'": ["azure-iot-nspkg>=1.0.1"],
+        # Vectorizes telemetry aggregation
+        "numpy": ["numpy"],
+    },
     python_requires=">=2.7, !=3.0.*, !=3.1.*, !=3.2.*, !=3.3*, <4",
     packages=find_packages(
         exclude=[
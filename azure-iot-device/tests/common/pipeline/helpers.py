@@ -25,6 +25,7 @@ all_common_ops = [
     pipeline_ops_base.ConnectOperation,
     pipeline_ops_base.ReconnectOperation,
     pipeline_ops_base.DisconnectOperation,
+    pipeline_ops_base.ShutdownOperation,
     pipeline_ops_base.EnableFeatureOperation,
     pipeline_ops_base.DisableFeatureOperation,
     pipeline_ops_base.UpdateSasTokenOperation,
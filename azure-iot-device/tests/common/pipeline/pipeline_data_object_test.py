@@ -5,6 +5,7 @@
 # --------------------------------------------------------------------------
 import pytest
 import inspect
+from azure.iot.device.common.pipeline import pipeline_ops_base
 
 fake_count = 0
 
@@ -21,7 +22,11 @@ def get_next_fake_value():
     return "__fake_value_{}__".format(fake_count)
 
 
-base_operation_defaults = {"needs_connection": False, "error": None}
+base_operation_defaults = {
+    "needs_connection": False,
+    "error": None,
+    "priority": pipeline_ops_base.PRIORITY_NORMAL,
+}
 base_event_defaults = {}
 
 
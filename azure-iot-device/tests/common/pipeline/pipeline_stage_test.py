@@ -196,12 +196,18 @@ class ThreadLaunchedError(Exception):
     pass
 
 
+# Methods defined on PipelineStage which every stage allows to be called from any thread
+methods_that_all_stages_can_run_in_any_thread = ["get_statistics", "reset_statistics"]
+
+
 def add_pipeline_thread_tests(
     cls, module, methods_that_enter_pipeline_thread, methods_that_can_run_in_any_thread
 ):
     def does_method_assert_pipeline_thread(method_name):
         if method_name.startswith("__"):
             return False
+        elif method_name in methods_that_all_stages_can_run_in_any_thread:
+            return False
         elif method_name in methods_that_enter_pipeline_thread:
             return False
         elif method_name in methods_that_can_run_in_any_thread:
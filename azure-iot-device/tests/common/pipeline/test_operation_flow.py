@@ -5,6 +5,7 @@
 # --------------------------------------------------------------------------
 import logging
 import pytest
+from azure.iot.device.common import flight_recorder
 from azure.iot.device.common.pipeline import (
     pipeline_thread,
     pipeline_stages_base,
@@ -72,6 +73,12 @@ class TestContineWithDifferntOp(object):
         delegate_to_different_op(stage, original_op=op, new_op=new_op)
         assert_callback_failed(op=op, error=new_op.error)
 
+    @pytest.mark.it("Gives the new op the priority of the original op")
+    def test_copies_priority(self, stage, op, new_op):
+        op.priority = pipeline_ops_base.PRIORITY_CONTROL
+        delegate_to_different_op(stage, original_op=op, new_op=new_op)
+        assert new_op.priority == pipeline_ops_base.PRIORITY_CONTROL
+
 
 @pytest.mark.describe("pass_op_to_next_stage()")
 class TestContinueOp(object):
@@ -131,3 +138,32 @@ class TestCompleteOp(object):
         op.callback = mocker.Mock(side_effect=fake_base_exception)
         with pytest.raises(UnhandledException):
             complete_op(stage, op)
+
+
+@pytest.mark.describe("Operation flow with the flight recorder enabled")
+class TestOperationFlowFlightRecorder(object):
+    @pytest.fixture(autouse=True)
+    def recorder(self):
+        recorder = flight_recorder.enable()
+        yield recorder
+        flight_recorder.disable()
+
+    @pytest.mark.it("Records each op that is passed to the next stage")
+    def test_records_pass(self, stage, op, recorder):
+        pass_op_to_next_stage(stage, op)
+        assert recorder.get_entries()[0][1:4] == ("pass", stage.name, op.name)
+
+    @pytest.mark.it("Records each op that completes successfully")
+    def test_records_complete(self, stage, op, callback, recorder):
+        op.callback = callback
+        complete_op(stage, op)
+        assert [entry[1:4] for entry in recorder.get_entries()] == [
+            ("complete", stage.name, op.name)
+        ]
+
+    @pytest.mark.it("Records each op that fails")
+    def test_records_fail(self, stage, op, callback, fake_exception, recorder):
+        op.error = fake_exception
+        op.callback = callback
+        complete_op(stage, op)
+        assert [entry[1:4] for entry in recorder.get_entries()] == [("fail", stage.name, op.name)]
@@ -33,6 +33,12 @@ pipeline_data_object_test.add_operation_test(
     positional_arguments=[],
     keyword_arguments={"callback": None},
 )
+pipeline_data_object_test.add_operation_test(
+    cls=pipeline_ops_base.ShutdownOperation,
+    module=this_module,
+    positional_arguments=[],
+    keyword_arguments={"timeout": None, "callback": None},
+)
 pipeline_data_object_test.add_operation_test(
     cls=pipeline_ops_base.ReconnectOperation,
     module=this_module,
@@ -42,12 +48,14 @@ pipeline_data_object_test.add_operation_test(
 pipeline_data_object_test.add_operation_test(
     cls=pipeline_ops_base.EnableFeatureOperation,
     module=this_module,
+    extra_defaults={"priority": pipeline_ops_base.PRIORITY_CONTROL},
     positional_arguments=["feature_name"],
     keyword_arguments={"callback": None},
 )
 pipeline_data_object_test.add_operation_test(
     cls=pipeline_ops_base.DisableFeatureOperation,
     module=this_module,
+    extra_defaults={"priority": pipeline_ops_base.PRIORITY_CONTROL},
     positional_arguments=["feature_name"],
     keyword_arguments={"callback": None},
 )
@@ -60,12 +68,14 @@ pipeline_data_object_test.add_operation_test(
 pipeline_data_object_test.add_operation_test(
     cls=pipeline_ops_base.SendIotRequestAndWaitForResponseOperation,
     module=this_module,
+    extra_defaults={"priority": pipeline_ops_base.PRIORITY_CONTROL},
     positional_arguments=["request_type", "method", "resource_location", "request_body"],
     keyword_arguments={"callback": None},
 )
 pipeline_data_object_test.add_operation_test(
     cls=pipeline_ops_base.SendIotRequestOperation,
     module=this_module,
+    extra_defaults={"priority": pipeline_ops_base.PRIORITY_CONTROL},
     positional_arguments=[
         "request_type",
         "method",
@@ -21,7 +21,7 @@ pipeline_data_object_test.add_operation_test(
     cls=pipeline_ops_mqtt.MQTTPublishOperation,
     module=this_module,
     positional_arguments=["topic", "payload"],
-    keyword_arguments={"callback": None},
+    keyword_arguments={"qos": 1, "callback": None},
     extra_defaults={"needs_connection": True},
 )
 pipeline_data_object_test.add_operation_test(
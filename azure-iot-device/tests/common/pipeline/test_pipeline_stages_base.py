@@ -8,7 +8,7 @@ import pytest
 import sys
 import six
 import threading
-from six.moves import queue
+from azure.iot.device.common.priority_queue import PriorityQueue
 from azure.iot.device.common.pipeline import (
     pipeline_stages_base,
     pipeline_ops_base,
@@ -16,6 +16,7 @@ from azure.iot.device.common.pipeline import (
     pipeline_events_base,
     operation_flow,
 )
+from azure.iot.device.common import timer_scheduler, errors
 from tests.common.pipeline.helpers import (
     make_mock_stage,
     assert_callback_failed,
@@ -53,7 +54,12 @@ pipeline_stage_test.add_base_pipeline_stage_tests(
     handled_ops=[],
     all_events=all_common_events,
     handled_events=all_common_events,
-    methods_that_can_run_in_any_thread=["append_stage", "run_op"],
+    methods_that_can_run_in_any_thread=[
+        "append_stage",
+        "run_op",
+        "get_pipeline_statistics",
+        "reset_pipeline_statistics",
+    ],
     extra_initializer_defaults={
         "on_pipeline_event_handler": None,
         "on_connected_handler": None,
@@ -160,6 +166,53 @@ TestPipelineRootStagePipelineThreading.test_pipeline_root_runs_on_event_received
     _test_pipeline_root_runs_on_event_received_in_callback_thread
 )
 
+
+@pytest.mark.describe("PipelineRootStage - .get_pipeline_statistics()")
+class TestPipelineRootStageStatistics(object):
+    @pytest.fixture
+    def root(self):
+        return (
+            pipeline_stages_base.PipelineRootStage()
+            .append_stage(pipeline_stages_base.SerializeConnectOpsStage())
+            .append_stage(pipeline_stages_base.CoordinateRequestAndResponseStage())
+        )
+
+    @pytest.mark.it("Merges the statistics from every stage in the pipeline")
+    def test_merges_statistics(self, root):
+        root.next.queue.put(FakeOperation(callback=None))
+        root.next.next.pending_responses["fake_request_id"] = FakeOperation(callback=None)
+
+        assert root.get_pipeline_statistics() == {
+            "operations_run": 0,
+            "connections": 0,
+            "disconnections": 0,
+            "blocked_operations": 1,
+            "pending_requests": 1,
+            "requests_timed_out": 0,
+            "requests_rejected": 0,
+        }
+
+    @pytest.mark.it("Counts connections and disconnections")
+    def test_counts_connections(self, root):
+        root.on_connected()
+        root.on_disconnected()
+        root.on_connected()
+
+        statistics = root.get_pipeline_statistics()
+        assert statistics["connections"] == 2
+        assert statistics["disconnections"] == 1
+
+    @pytest.mark.it("Resets the counters in every stage in the pipeline")
+    def test_reset(self, root, mocker):
+        root.on_connected()
+        mocker.spy(root.next, "reset_statistics")
+
+        root.reset_pipeline_statistics()
+
+        assert root.get_pipeline_statistics()["connections"] == 0
+        assert root.next.reset_statistics.call_count == 1
+
+
 pipeline_stage_test.add_base_pipeline_stage_tests(
     cls=pipeline_stages_base.EnsureConnectionStage,
     module=this_module,
@@ -288,10 +341,11 @@ pipeline_stage_test.add_base_pipeline_stage_tests(
         pipeline_ops_base.ConnectOperation,
         pipeline_ops_base.DisconnectOperation,
         pipeline_ops_base.ReconnectOperation,
+        pipeline_ops_base.ShutdownOperation,
     ],
     all_events=all_common_events,
     handled_events=[],
-    extra_initializer_defaults={"blocked": False, "queue": queue.Queue},
+    extra_initializer_defaults={"blocked": False, "queue": PriorityQueue},
 )
 
 connection_ops = [
@@ -458,6 +512,26 @@ class TestSerializeConnectOpStageRunOp(object):
         for op in fake_ops:
             assert_callback_failed(op=op, error=fake_exception)
 
+    @pytest.mark.parametrize(
+        "params", connection_ops, ids=[x["op_class"].__name__ for x in connection_ops]
+    )
+    @pytest.mark.it(
+        "Passes down pending control operations ahead of other pending operations, keeping operations with the same priority in order"
+    )
+    def test_unblocks_control_ops_first(self, params, stage, connection_op, fake_ops, mocker):
+        control_ops = [FakeOperation(callback=mocker.MagicMock()) for _ in range(2)]
+        for op in control_ops:
+            op.priority = pipeline_ops_base.PRIORITY_CONTROL
+        stage.pipeline_root.connected = params["connected_flag_required_to_run"]
+        stage.run_op(connection_op)
+        for op in [fake_ops[0], control_ops[0], fake_ops[1], control_ops[1], fake_ops[2]]:
+            stage.run_op(op)
+
+        operation_flow.complete_op(stage=stage.next, op=connection_op)
+
+        released_ops = [call[0][0] for call in stage.next.run_op.call_args_list[1:]]
+        assert released_ops == control_ops + fake_ops
+
     @pytest.mark.it(
         "Does not immediately pass down operations in the queue if an operation in the queue causes the stage to re-block"
     )
@@ -553,10 +627,22 @@ pipeline_stage_test.add_base_pipeline_stage_tests(
     handled_ops=[pipeline_ops_base.SendIotRequestAndWaitForResponseOperation],
     all_events=all_common_events,
     handled_events=[pipeline_events_base.IotResponseEvent],
-    extra_initializer_defaults={"pending_responses": dict},
+    methods_that_enter_pipeline_thread=["_on_request_timeout"],
+    extra_initializer_defaults={
+        "pending_responses": dict,
+        "request_timeout": 60,
+        "max_pending_requests": 100,
+    },
 )
 
 
+@pytest.fixture
+def scheduler(mocker):
+    scheduler = mocker.MagicMock()
+    mocker.patch.object(timer_scheduler, "get_scheduler", return_value=scheduler)
+    return scheduler
+
+
 fake_request_type = "__fake_request_type__"
 fake_method = "__fake_method__"
 fake_resource_location = "__fake_resource_location__"
@@ -585,7 +671,7 @@ class TestCoordinateRequestAndResponseSendIotRequestRunOp(object):
         return make_fake_request_and_response(mocker)
 
     @pytest.fixture
-    def stage(self, mocker):
+    def stage(self, mocker, scheduler):
         return make_mock_stage(mocker, pipeline_stages_base.CoordinateRequestAndResponseStage)
 
     @pytest.mark.it(
@@ -631,6 +717,45 @@ class TestCoordinateRequestAndResponseSendIotRequestRunOp(object):
         stage.run_op(op)
         assert_callback_failed(op=op)
 
+    @pytest.mark.it("Schedules a timer for the request_timeout")
+    def test_schedules_timer(self, stage, op, scheduler):
+        stage.request_timeout = 10
+        stage.run_op(op)
+
+        assert scheduler.schedule.call_count == 1
+        assert scheduler.schedule.call_args[0][0] == 10
+
+    @pytest.mark.it("Does not schedule a timer if the request_timeout is None")
+    def test_no_timeout(self, stage, op, scheduler):
+        stage.request_timeout = None
+        stage.run_op(op)
+
+        assert scheduler.schedule.call_count == 0
+        assert op.callback.call_count == 0
+
+    @pytest.mark.it(
+        "Fails the op with a PipelineError without sending it if max_pending_requests are already waiting for responses"
+    )
+    def test_too_many_pending_requests(self, stage, op, mocker):
+        stage.max_pending_requests = 2
+        stage.run_op(make_fake_request_and_response(mocker))
+        stage.run_op(make_fake_request_and_response(mocker))
+        stage.next.run_op.reset_mock()
+        stage.run_op(op)
+
+        assert stage.next.run_op.call_count == 0
+        assert_callback_failed(op=op, error=errors.PipelineError)
+        assert len(stage.pending_responses) == 2
+        assert stage.get_statistics()["requests_rejected"] == 1
+
+    @pytest.mark.it("Does not limit the number of pending requests if max_pending_requests is None")
+    def test_no_limit(self, stage, mocker):
+        stage.max_pending_requests = None
+        for _ in range(150):
+            stage.run_op(make_fake_request_and_response(mocker))
+
+        assert len(stage.pending_responses) == 150
+
     @pytest.mark.it("Allows BaseExceptions rised on the SendIotRequestOperation op to propogate")
     def test_new_op_raises_base_exception(self, stage, op, mocker):
         stage.next._execute_op = mocker.Mock(side_effect=UnhandledException)
@@ -648,7 +773,7 @@ class TestCoordinateRequestAndResponseSendIotRequestHandleEvent(object):
         return make_fake_request_and_response(mocker)
 
     @pytest.fixture
-    def stage(self, mocker):
+    def stage(self, mocker, scheduler):
         return make_mock_stage(mocker, pipeline_stages_base.CoordinateRequestAndResponseStage)
 
     @pytest.fixture
@@ -720,3 +845,129 @@ class TestCoordinateRequestAndResponseSendIotRequestHandleEvent(object):
         operation_flow.pass_event_to_previous_stage(stage.next, iot_response)
         assert op.callback.call_count == 0
         assert unhandled_error_handler.call_count == 0
+
+    @pytest.mark.it("Cancels the request timer when the response is received")
+    def test_cancels_timer(self, stage, op, iot_response, scheduler):
+        operation_flow.pass_event_to_previous_stage(stage.next, iot_response)
+
+        assert scheduler.schedule.return_value.cancel.call_count == 1
+
+
+@pytest.mark.describe("CoordinateRequestAndResponseStage - request timeouts")
+class TestCoordinateRequestAndResponseTimeout(object):
+    @pytest.fixture
+    def op(self, mocker):
+        return make_fake_request_and_response(mocker)
+
+    @pytest.fixture
+    def stage(self, mocker, scheduler):
+        return make_mock_stage(mocker, pipeline_stages_base.CoordinateRequestAndResponseStage)
+
+    @pytest.fixture
+    def fire_timer(self, scheduler):
+        def fire_timer():
+            schedule_args = scheduler.schedule.call_args
+            schedule_args[0][1](*schedule_args[1]["args"])
+
+        return fire_timer
+
+    @pytest.mark.it(
+        "Fails the op with a TimeoutError and removes it from the pending list when the timer fires"
+    )
+    def test_times_out(self, stage, op, fire_timer):
+        stage.run_op(op)
+        fire_timer()
+
+        assert_callback_failed(op=op, error=errors.TimeoutError)
+        assert stage.pending_responses == {}
+        assert stage.get_statistics()["requests_timed_out"] == 1
+
+    @pytest.mark.it("Ignores a response which arrives after the request timed out")
+    def test_late_response(self, stage, op, fire_timer, unhandled_error_handler):
+        stage.run_op(op)
+        request_id = stage.next.run_op.call_args[0][0].request_id
+        fire_timer()
+        op.callback.reset_mock()
+
+        operation_flow.pass_event_to_previous_stage(
+            stage.next,
+            pipeline_events_base.IotResponseEvent(
+                request_id=request_id,
+                status_code=fake_status_code,
+                response_body=fake_response_body,
+            ),
+        )
+        assert op.callback.call_count == 0
+        assert unhandled_error_handler.call_count == 0
+
+    @pytest.mark.it("Does nothing if the timer fires after the response was received")
+    def test_timer_after_response(self, stage, op, fire_timer):
+        stage.run_op(op)
+        request_id = stage.next.run_op.call_args[0][0].request_id
+        operation_flow.pass_event_to_previous_stage(
+            stage.next,
+            pipeline_events_base.IotResponseEvent(
+                request_id=request_id,
+                status_code=fake_status_code,
+                response_body=fake_response_body,
+            ),
+        )
+        op.callback.reset_mock()
+        fire_timer()
+
+        assert op.callback.call_count == 0
+        assert stage.get_statistics()["requests_timed_out"] == 0
+
+
+@pytest.mark.describe("CoordinateRequestAndResponseStage - .on_connected()")
+class TestCoordinateRequestAndResponseOnConnected(object):
+    @pytest.fixture
+    def stage(self, mocker, scheduler):
+        stage = make_mock_stage(mocker, pipeline_stages_base.CoordinateRequestAndResponseStage)
+        stage.previous = mocker.MagicMock()
+        return stage
+
+    @pytest.mark.it("Uses a new request_id prefix for requests sent after connecting")
+    def test_renews_prefix(self, stage, mocker):
+        stage.run_op(make_fake_request_and_response(mocker))
+        stage.on_connected()
+        stage.run_op(make_fake_request_and_response(mocker))
+
+        first_id = stage.next.run_op.call_args_list[0][0][0].request_id
+        second_id = stage.next.run_op.call_args_list[1][0][0].request_id
+        assert first_id[:8] != second_id[:8]
+
+    @pytest.mark.it("Passes the connection on to the previous stage")
+    def test_passes_on(self, stage):
+        stage.on_connected()
+
+        assert stage.previous.on_connected.call_count == 1
+
+
+@pytest.mark.describe("CoordinateRequestAndResponseStage - .on_disconnected()")
+class TestCoordinateRequestAndResponseOnDisconnected(object):
+    @pytest.fixture
+    def stage(self, mocker, scheduler):
+        stage = make_mock_stage(mocker, pipeline_stages_base.CoordinateRequestAndResponseStage)
+        stage.previous = mocker.MagicMock()
+        return stage
+
+    @pytest.mark.it(
+        "Fails all pending requests with a ConnectionDroppedError and cancels their timers"
+    )
+    def test_fails_pending_requests(self, stage, mocker, scheduler):
+        ops = [make_fake_request_and_response(mocker) for _ in range(3)]
+        for op in ops:
+            stage.run_op(op)
+        stage.on_disconnected()
+
+        for op in ops:
+            assert_callback_failed(op=op, error=errors.ConnectionDroppedError)
+        assert stage.pending_responses == {}
+        assert scheduler.schedule.return_value.cancel.call_count == 3
+
+    @pytest.mark.it("Passes the disconnection on to the previous stage")
+    def test_passes_on(self, stage):
+        stage.on_disconnected()
+
+        assert stage.previous.on_disconnected.call_count == 1
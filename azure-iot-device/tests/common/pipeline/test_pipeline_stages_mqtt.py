@@ -53,6 +53,7 @@ ops_handled_by_this_stage = [
     pipeline_ops_base.ConnectOperation,
     pipeline_ops_base.DisconnectOperation,
     pipeline_ops_base.ReconnectOperation,
+    pipeline_ops_base.ShutdownOperation,
     pipeline_ops_base.UpdateSasTokenOperation,
     pipeline_ops_mqtt.SetMQTTConnectionArgsOperation,
     pipeline_ops_mqtt.MQTTPublishOperation,
@@ -75,10 +76,27 @@ pipeline_stage_test.add_base_pipeline_stage_tests(
         "_on_mqtt_connected",
         "_on_mqtt_connection_failure",
         "_on_mqtt_disconnected",
+        "_on_transport_connect_error",
+        "_on_transport_shutdown",
     ],
+    extra_initializer_defaults={
+        "keep_alive": None,
+        "ping_timeout": None,
+        "max_round_trip_time": None,
+        "shut_down": False,
+    },
 )
 
 
+@pytest.fixture(autouse=True)
+def connect_executor(mocker):
+    # Run transport connects inline instead of on the connect threads
+    executor = mocker.MagicMock()
+    executor.submit.side_effect = lambda fn: fn()
+    mocker.patch.object(pipeline_stages_mqtt, "_get_connect_executor", return_value=executor)
+    return executor
+
+
 @pytest.fixture
 def stage(mocker):
     stage = pipeline_stages_mqtt.MQTTTransportStage()
@@ -202,8 +220,23 @@ class TestMQTTProviderRunOpWithSetConnectionArgs(RunOpTests):
             username=fake_username,
             ca_cert=fake_ca_cert,
             x509_cert=fake_certificate,
+            keep_alive=None,
+            ping_timeout=None,
+            max_round_trip_time=None,
         )
 
+    @pytest.mark.it(
+        "Initializes the MQTTTransport object with the keep_alive, ping_timeout and max_round_trip_time the stage was created with"
+    )
+    def test_passes_keep_alive(self, stage, transport, mocker, op_set_connection_args):
+        stage.keep_alive = 15
+        stage.ping_timeout = 5
+        stage.max_round_trip_time = 2
+        stage.run_op(op_set_connection_args)
+        assert transport.call_args[1]["keep_alive"] == 15
+        assert transport.call_args[1]["ping_timeout"] == 5
+        assert transport.call_args[1]["max_round_trip_time"] == 2
+
     @pytest.mark.it("Sets handlers on the transport")
     def test_sets_parameters(self, stage, transport, mocker, op_set_connection_args):
         stage.run_op(op_set_connection_args)
@@ -273,6 +306,33 @@ class TestMQTTProviderExecuteOpWithConnect(RunOpTests):
         assert_callback_failed(op=op_connect, error=fake_exception)
         assert stage._pending_connection_op is None
 
+    @pytest.mark.it("Connects on a connect thread instead of the pipeline thread")
+    def test_uses_connect_executor(self, stage, create_transport, op_connect, connect_executor):
+        connect_executor.submit.side_effect = None
+        stage.run_op(op_connect)
+        assert connect_executor.submit.call_count == 1
+        assert stage.transport.connect.call_count == 0
+
+        connect_executor.submit.call_args[0][0]()
+        assert stage.transport.connect.call_count == 1
+
+    @pytest.mark.it(
+        "Does not complete the operation again if the connect fails after the operation was cancelled"
+    )
+    def test_fails_after_cancel(
+        self, mocker, stage, create_transport, op_connect, connect_executor, fake_exception
+    ):
+        connect_executor.submit.side_effect = None
+        stage.transport.connect.side_effect = fake_exception
+        stage.run_op(op_connect)
+        op_disconnect = pipeline_ops_base.DisconnectOperation(callback=mocker.MagicMock())
+        stage.run_op(op_disconnect)
+        assert_callback_failed(op=op_connect, error=errors.PipelineError)
+
+        connect_executor.submit.call_args_list[0][0][0]()
+        assert op_connect.callback.call_count == 1
+        assert stage._pending_connection_op is op_disconnect
+
 
 @pytest.mark.describe("MQTTTransportStage - .run_op() -- called with ReconnectOperation")
 class TestMQTTProviderExecuteOpWithReconnect(RunOpTests):
@@ -364,14 +424,102 @@ class TestMQTTProviderExecuteOpWithDisconnect(RunOpTests):
         assert stage._pending_connection_op is None
 
 
+@pytest.mark.describe("MQTTTransportStage - .run_op() -- called with ShutdownOperation")
+class TestMQTTProviderExecuteOpWithShutdown(RunOpTests):
+    @pytest.fixture
+    def op_shutdown(self, mocker):
+        return pipeline_ops_base.ShutdownOperation(timeout=5, callback=mocker.MagicMock())
+
+    @pytest.mark.it("Shuts down the MQTTTransport with the timeout of the op")
+    def test_transport_shutdown(self, mocker, stage, create_transport, op_shutdown):
+        stage.run_op(op_shutdown)
+        assert stage.transport.shutdown.call_count == 1
+        assert stage.transport.shutdown.call_args == mocker.call(timeout=5)
+
+    @pytest.mark.it("Completes the operation with success once the MQTTTransport has shut down")
+    def test_complete(self, stage, create_transport, op_shutdown):
+        stage.run_op(op_shutdown)
+        assert_callback_succeeded(op=op_shutdown)
+
+    @pytest.mark.it("Fails the operation if there is a failure shutting down the MQTTTransport")
+    def test_fails_operation(self, stage, create_transport, op_shutdown, fake_exception):
+        stage.transport.shutdown.side_effect = fake_exception
+        stage.run_op(op_shutdown)
+        assert_callback_failed(op=op_shutdown, error=fake_exception)
+
+    @pytest.mark.it("Completes the operation immediately if there is no MQTTTransport")
+    def test_no_transport(self, stage, op_shutdown):
+        stage.run_op(op_shutdown)
+        assert_callback_succeeded(op=op_shutdown)
+
+    @pytest.mark.it("Cancels any pending connection operation")
+    def test_pending_operation_cancelled(self, mocker, stage, create_transport, op_shutdown):
+        pending_connection_op = pipeline_ops_base.ConnectOperation(callback=mocker.MagicMock())
+        stage._pending_connection_op = pending_connection_op
+        stage.run_op(op_shutdown)
+
+        assert_callback_failed(op=pending_connection_op, error=errors.PipelineError)
+        assert stage._pending_connection_op is None
+
+    @pytest.mark.it(
+        "Fails any later operation with an OperationCancelledError, without using the MQTTTransport"
+    )
+    def test_fails_later_operations(
+        self, stage, create_transport, op_shutdown, op_publish, op_connect
+    ):
+        stage.run_op(op_shutdown)
+        stage.run_op(op_publish)
+        stage.run_op(op_connect)
+
+        assert_callback_failed(op=op_publish, error=errors.OperationCancelledError)
+        assert_callback_failed(op=op_connect, error=errors.OperationCancelledError)
+        assert stage.transport.publish.call_count == 0
+        assert stage.transport.connect.call_count == 0
+
+    @pytest.mark.it("Completes a second ShutdownOperation without shutting down again")
+    def test_second_shutdown(self, mocker, stage, create_transport, op_shutdown):
+        second_shutdown = pipeline_ops_base.ShutdownOperation(callback=mocker.MagicMock())
+        stage.run_op(op_shutdown)
+        stage.run_op(second_shutdown)
+
+        assert_callback_succeeded(op=second_shutdown)
+        assert stage.transport.shutdown.call_count == 1
+
+    @pytest.mark.it(
+        "Does not treat the disconnection caused by the shutdown as a dropped connection"
+    )
+    def test_disconnect_not_dropped(self, stage, create_transport, op_shutdown):
+        stage.run_op(op_shutdown)
+        stage.transport.on_mqtt_disconnected_handler(None)
+
+        assert stage.pipeline_root.on_disconnected.call_count == 1
+        assert stage.pipeline_root.handle_pipeline_event.call_count == 0
+
+
 @pytest.mark.describe("MQTTTransportStage - .run_op() -- called with MQTTPublishOperation")
 class TestMQTTProviderExecuteOpWithMQTTPublishOperation(RunOpTests):
-    @pytest.mark.it("Does an MQTT publish via the MQTTTransport")
-    def test_mqtt_publish(self, mocker, stage, create_transport, op_publish):
+    @pytest.mark.it(
+        "Does an MQTT publish via the MQTTTransport, using the qos and priority of the op"
+    )
+    @pytest.mark.parametrize("qos", [0, 1])
+    @pytest.mark.parametrize(
+        "priority",
+        [
+            pytest.param(pipeline_ops_base.PRIORITY_NORMAL, id="Normal priority"),
+            pytest.param(pipeline_ops_base.PRIORITY_CONTROL, id="Control priority"),
+        ],
+    )
+    def test_mqtt_publish(self, mocker, stage, create_transport, op_publish, qos, priority):
+        op_publish.qos = qos
+        op_publish.priority = priority
         stage.run_op(op_publish)
         assert stage.transport.publish.call_count == 1
         assert stage.transport.publish.call_args == mocker.call(
-            topic=op_publish.topic, payload=op_publish.payload, callback=mocker.ANY
+            topic=op_publish.topic,
+            payload=op_publish.payload,
+            qos=qos,
+            callback=mocker.ANY,
+            priority=priority,
         )
 
     @pytest.mark.it(
@@ -386,6 +534,13 @@ class TestMQTTProviderExecuteOpWithMQTTPublishOperation(RunOpTests):
 
         assert_callback_succeeded(op=op_publish)
 
+    @pytest.mark.it("Completes the operation with the error the MQTT publish failed with")
+    def test_complete_with_error(self, stage, create_transport, op_publish, fake_exception):
+        stage.run_op(op_publish)
+        stage.transport.publish.call_args[1]["callback"](error=fake_exception)
+
+        assert_callback_failed(op=op_publish, error=fake_exception)
+
 
 @pytest.mark.describe("MQTTTransportStage - .run_op() -- called with MQTTSubscribeOperation")
 class TestMQTTProviderExecuteOpWithMQTTSubscribeOperation(RunOpTests):
@@ -0,0 +1,96 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for
+# license information.
+# --------------------------------------------------------------------------
+import array
+import pytest
+import logging
+from azure.iot.device.common import buffers
+
+logging.basicConfig(level=logging.DEBUG)
+
+fake_bytes = b"Alohomora"
+
+
+@pytest.mark.describe("buffers - .to_bytes_like()")
+class TestToBytesLike(object):
+    @pytest.mark.it("Returns bytes, bytearray, None and numbers unchanged")
+    @pytest.mark.parametrize(
+        "payload",
+        [fake_bytes, bytearray(fake_bytes), None, 42, 3.14],
+        ids=["bytes", "bytearray", "None", "int", "float"],
+    )
+    def test_unchanged(self, payload):
+        assert buffers.to_bytes_like(payload) is payload
+
+    @pytest.mark.it("Encodes text as UTF-8")
+    def test_text(self):
+        assert buffers.to_bytes_like("Alohomora é") == b"Alohomora \xc3\xa9"
+
+    @pytest.mark.it(
+        "Returns the underlying object of a memoryview over an entire bytes or bytearray object"
+    )
+    @pytest.mark.parametrize("buffer_type", [bytes, bytearray])
+    def test_whole_memoryview(self, buffer_type):
+        buffer = buffer_type(fake_bytes)
+        assert buffers.to_bytes_like(memoryview(buffer)) is buffer
+
+    @pytest.mark.it("Copies a memoryview over part of an object to bytes")
+    def test_partial_memoryview(self):
+        buffer = bytearray(fake_bytes)
+        result = buffers.to_bytes_like(memoryview(buffer)[1:4])
+
+        assert result == b"loh"
+        assert isinstance(result, bytes)
+
+    @pytest.mark.it("Copies other buffers to bytes")
+    def test_other_buffer(self):
+        values = array.array("B", [1, 2, 3])
+        assert buffers.to_bytes_like(values) == b"\x01\x02\x03"
+
+    @pytest.mark.it("Raises a TypeError for objects which are not payloads")
+    def test_invalid(self):
+        with pytest.raises(TypeError):
+            buffers.to_bytes_like(object())
+
+
+@pytest.mark.describe("buffers - .get_size()")
+class TestGetSize(object):
+    @pytest.mark.it("Returns the number of bytes the payload takes up on the wire")
+    @pytest.mark.parametrize(
+        "payload, size",
+        [
+            pytest.param(None, 0, id="None"),
+            pytest.param("é", 2, id="text"),
+            pytest.param(fake_bytes, 9, id="bytes"),
+            pytest.param(bytearray(fake_bytes), 9, id="bytearray"),
+            pytest.param(1234, 4, id="int"),
+            pytest.param(memoryview(fake_bytes)[2:], 7, id="memoryview"),
+            pytest.param(array.array("d", [1.0, 2.0]), 16, id="array"),
+        ],
+    )
+    def test_size(self, payload, size):
+        assert buffers.get_size(payload) == size
+
+
+@pytest.mark.describe("buffers - .parse_json()")
+class TestParseJson(object):
+    @pytest.mark.it("Parses JSON from text, bytes, bytearray or memoryview")
+    @pytest.mark.parametrize(
+        "payload",
+        [
+            '{"spell": "Lumos"}',
+            b'{"spell": "Lumos"}',
+            bytearray(b'{"spell": "Lumos"}'),
+            memoryview(b'{"spell": "Lumos"}'),
+        ],
+        ids=["text", "bytes", "bytearray", "memoryview"],
+    )
+    def test_parses(self, payload):
+        assert buffers.parse_json(payload) == {"spell": "Lumos"}
+
+    @pytest.mark.it("Raises a ValueError if the payload is not valid JSON")
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            buffers.parse_json(b"Nox")
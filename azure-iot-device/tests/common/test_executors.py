@@ -0,0 +1,48 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for
+# license information.
+# --------------------------------------------------------------------------
+import pytest
+import logging
+from azure.iot.device.common import executors, timer_scheduler
+from azure.iot.device.common.pipeline import pipeline_thread, pipeline_stages_mqtt
+
+logging.basicConfig(level=logging.INFO)
+
+
+@pytest.mark.describe("shutdown_executors()")
+class TestShutdownExecutors(object):
+    @pytest.fixture(autouse=True)
+    def mock_scheduler_shutdown(self, mocker):
+        # The scheduler is shared with the rest of the tests, so its timers must not be discarded
+        return mocker.patch.object(timer_scheduler.get_scheduler(), "shutdown")
+
+    @pytest.mark.it("Shuts down the pipeline, callback and connect executors")
+    def test_shuts_down_executors(self):
+        pipeline_executor = pipeline_thread._get_named_executor("pipeline")
+        callback_executor = pipeline_thread._get_named_executor("callback")
+        connect_executor = pipeline_stages_mqtt._get_connect_executor()
+
+        executors.shutdown_executors()
+
+        for executor in [pipeline_executor, callback_executor, connect_executor]:
+            with pytest.raises(RuntimeError):
+                executor.submit(lambda: None)
+
+    @pytest.mark.it("Creates new executors if they are needed after being shut down")
+    def test_recreates_executors(self):
+        pipeline_executor = pipeline_thread._get_named_executor("pipeline")
+        connect_executor = pipeline_stages_mqtt._get_connect_executor()
+
+        executors.shutdown_executors()
+
+        assert pipeline_thread._get_named_executor("pipeline") is not pipeline_executor
+        assert pipeline_thread._get_named_executor("pipeline").submit(lambda: True).result()
+        assert pipeline_stages_mqtt._get_connect_executor() is not connect_executor
+
+    @pytest.mark.it("Shuts down the shared timer scheduler")
+    def test_shuts_down_timer_scheduler(self, mock_scheduler_shutdown):
+        executors.shutdown_executors()
+
+        assert mock_scheduler_shutdown.call_count == 1
@@ -0,0 +1,107 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for
+# license information.
+# --------------------------------------------------------------------------
+import pytest
+from azure.iot.device.common import flight_recorder
+from azure.iot.device.common.flight_recorder import FlightRecorder
+
+
+@pytest.fixture(autouse=True)
+def disable_recorder():
+    yield
+    flight_recorder.disable()
+
+
+def get_steps(recorder):
+    return [entry[1:] for entry in recorder.get_entries()]
+
+
+@pytest.mark.describe("FlightRecorder")
+class TestFlightRecorder(object):
+    @pytest.mark.it("Raises a ValueError if capacity is not greater than 0")
+    @pytest.mark.parametrize("capacity", [0, -1])
+    def test_bad_capacity(self, capacity):
+        with pytest.raises(ValueError):
+            FlightRecorder(capacity)
+
+    @pytest.mark.it("Returns recorded entries oldest first")
+    def test_get_entries(self):
+        recorder = FlightRecorder(4)
+        recorder.record(flight_recorder.OP_RUN, "Owlery", "SendHedwig", 1)
+        recorder.record(flight_recorder.OP_PASS, "Owlery", "SendHedwig", 1)
+        recorder.record(flight_recorder.OP_FAIL, "Gringotts", "OpenVault", 713)
+        assert get_steps(recorder) == [
+            ("run", "Owlery", "SendHedwig", 1),
+            ("pass", "Owlery", "SendHedwig", 1),
+            ("fail", "Gringotts", "OpenVault", 713),
+        ]
+
+    @pytest.mark.it("Records a timestamp with each entry")
+    def test_timestamp(self, mocker):
+        mocker.patch.object(flight_recorder.time, "time", return_value=1234.5)
+        recorder = FlightRecorder(4)
+        recorder.record(flight_recorder.EVENT, "Owlery", "Arrival", 1)
+        assert recorder.get_entries()[0][0] == 1234.5
+
+    @pytest.mark.it("Overwrites the oldest entries once capacity is reached")
+    def test_wraparound(self):
+        recorder = FlightRecorder(3)
+        for i in range(5):
+            recorder.record(flight_recorder.OP_COMPLETE, "Owlery", "SendHedwig", i)
+        assert [entry[4] for entry in recorder.get_entries()] == [2, 3, 4]
+
+    @pytest.mark.it("Truncates ids to 32 bits")
+    def test_truncates_id(self):
+        recorder = FlightRecorder(1)
+        recorder.record(flight_recorder.OP_RUN, "Owlery", "SendHedwig", 0x1DEADBEEF)
+        assert recorder.get_entries()[0][4] == 0xDEADBEEF
+
+    @pytest.mark.it("Removes all entries when cleared")
+    def test_clear(self):
+        recorder = FlightRecorder(3)
+        recorder.record(flight_recorder.OP_RUN, "Owlery", "SendHedwig", 1)
+        recorder.clear()
+        assert recorder.get_entries() == []
+        recorder.record(flight_recorder.OP_PASS, "Owlery", "SendHedwig", 2)
+        assert get_steps(recorder) == [("pass", "Owlery", "SendHedwig", 2)]
+
+    @pytest.mark.it("Writes a header and one line per entry when dumped")
+    def test_dump(self, mocker):
+        log = mocker.MagicMock()
+        recorder = FlightRecorder(3)
+        recorder.record(flight_recorder.OP_RUN, "Owlery", "SendHedwig", 1)
+        recorder.record(flight_recorder.OP_COMPLETE, "Owlery", "SendHedwig", 1)
+        recorder.dump(log)
+        assert log.error.call_count == 3
+        assert "SendHedwig" in log.error.call_args[0][0]
+
+
+@pytest.mark.describe("flight_recorder module")
+class TestFlightRecorderModule(object):
+    @pytest.mark.it("Has no active recorder by default")
+    def test_disabled_by_default(self):
+        assert flight_recorder.recorder is None
+
+    @pytest.mark.it("Sets the active recorder when enabled, and removes it when disabled")
+    def test_enable_disable(self):
+        recorder = flight_recorder.enable(16)
+        assert flight_recorder.recorder is recorder
+        assert recorder.capacity == 16
+        flight_recorder.disable()
+        assert flight_recorder.recorder is None
+
+    @pytest.mark.it("Dumps the active recorder")
+    def test_dump_enabled(self, mocker):
+        log = mocker.MagicMock()
+        flight_recorder.enable(4)
+        flight_recorder.recorder.record(flight_recorder.OP_RUN, "Owlery", "SendHedwig", 1)
+        flight_recorder.dump(log)
+        assert log.error.call_count == 2
+
+    @pytest.mark.it("Does nothing when dumped while disabled")
+    def test_dump_disabled(self, mocker):
+        log = mocker.MagicMock()
+        flight_recorder.dump(log)
+        assert log.error.call_count == 0
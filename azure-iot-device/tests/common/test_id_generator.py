@@ -0,0 +1,45 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for
+# license information.
+# --------------------------------------------------------------------------
+import pytest
+import logging
+from azure.iot.device.common.id_generator import RequestIdGenerator
+
+logging.basicConfig(level=logging.DEBUG)
+
+
+@pytest.mark.describe("RequestIdGenerator")
+class TestRequestIdGenerator(object):
+    @pytest.mark.it("Generates ids made of an 8 character hex prefix and an increasing hex counter")
+    def test_format(self):
+        generator = RequestIdGenerator()
+        first = generator.next_id()
+        second = generator.next_id()
+
+        assert first[:8] == second[:8]
+        assert int(first[:8], 16) >= 0
+        assert first[8:] == "1"
+        assert second[8:] == "2"
+
+    @pytest.mark.it("Generates unique ids")
+    def test_unique(self):
+        generator = RequestIdGenerator()
+        ids = [generator.next_id() for _ in range(10000)]
+
+        assert len(set(ids)) == len(ids)
+
+    @pytest.mark.it("Uses a different random prefix for each generator")
+    def test_different_generators(self):
+        assert RequestIdGenerator().next_id()[:8] != RequestIdGenerator().next_id()[:8]
+
+    @pytest.mark.it("Keeps counting after the prefix is renewed")
+    def test_renew_prefix(self):
+        generator = RequestIdGenerator()
+        first = generator.next_id()
+        generator.renew_prefix()
+        second = generator.next_id()
+
+        assert first[:8] != second[:8]
+        assert second[8:] == "2"
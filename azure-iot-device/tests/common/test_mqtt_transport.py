@@ -4,12 +4,18 @@
 # license information.
 # --------------------------------------------------------------------------
 
+from azure.iot.device.common import mqtt_transport
 from azure.iot.device.common.mqtt_transport import MQTTTransport, OperationManager
 from azure.iot.device.common.models.x509 import X509
-from azure.iot.device.common import errors
+from azure.iot.device.common import errors, timer_scheduler
 import paho.mqtt.client as mqtt
 import ssl
+import socket
 import copy
+import functools
+import itertools
+import threading
+import time
 import pytest
 import logging
 
@@ -122,6 +128,11 @@ operation_return_codes = [
 ]
 
 
+@pytest.fixture(autouse=True)
+def clear_ssl_context_cache():
+    mqtt_transport._ssl_contexts.clear()
+
+
 @pytest.fixture
 def mock_mqtt_client(mocker):
     mock = mocker.patch.object(mqtt, "Client")
@@ -132,6 +143,8 @@ def mock_mqtt_client(mocker):
     mock_mqtt_client.connect.return_value = 0
     mock_mqtt_client.reconnect.return_value = 0
     mock_mqtt_client.disconnect.return_value = 0
+    mock_mqtt_client.socket.return_value.session = None
+    mock_mqtt_client.socket.return_value.session_reused = False
     return mock_mqtt_client
 
 
@@ -172,7 +185,7 @@ class TestInstantiation(object):
 
         # Verify context has been set
         assert mock_mqtt_client.tls_set_context.call_count == 1
-        assert mock_mqtt_client.tls_set_context.call_args == mocker.call(context=mock_ssl_context)
+        assert mock_mqtt_client.tls_set_context.call_args[1]["context"].context is mock_ssl_context
 
     @pytest.mark.it(
         "Configures TLS/SSL context using default certificates if protocol wrapper not instantiated with a CA certificate"
@@ -257,8 +270,7 @@ class TestInstantiation(object):
         transport = MQTTTransport(
             client_id=fake_device_id, hostname=fake_hostname, username=fake_username
         )
-        assert transport._op_manager._pending_operation_callbacks == {}
-        assert transport._op_manager._unknown_operation_completions == {}
+        assert not any(transport._op_manager._stripes)
 
 
 @pytest.mark.describe("MQTTTransport - .connect()")
@@ -295,7 +307,23 @@ class TestConnect(object):
         transport.connect(password)
 
         assert mock_mqtt_client.connect.call_count == 1
-        assert mock_mqtt_client.connect.call_args == mocker.call(host=fake_hostname, port=8883)
+        assert mock_mqtt_client.connect.call_args == mocker.call(
+            host=fake_hostname, port=8883, keepalive=60
+        )
+
+    @pytest.mark.it("Uses the keepalive interval provided when the transport was created")
+    def test_custom_keep_alive(self, mocker, mock_mqtt_client):
+        transport = MQTTTransport(
+            client_id=fake_device_id,
+            hostname=fake_hostname,
+            username=fake_username,
+            keep_alive=15,
+        )
+        transport.connect(fake_password)
+
+        assert mock_mqtt_client.connect.call_args == mocker.call(
+            host=fake_hostname, port=8883, keepalive=15
+        )
 
     @pytest.mark.it("Starts MQTT Network Loop")
     @pytest.mark.parametrize(
@@ -391,6 +419,14 @@ class TestEventConnectComplete(object):
         assert callback.call_count == 1
         assert callback.call_args == mocker.call()
 
+    @pytest.mark.it("Discards unknown operation completions from the previous connection")
+    def test_resets_operation_manager(self, mocker, mock_mqtt_client, transport):
+        reset = mocker.spy(transport._op_manager, "reset")
+
+        mock_mqtt_client.on_connect(client=mock_mqtt_client, userdata=None, flags=None, rc=fake_rc)
+
+        assert reset.call_count == 1
+
     @pytest.mark.it(
         "Skips on_mqtt_connected_handler event handler if set to 'None' upon successful connect completion"
     )
@@ -1112,9 +1148,34 @@ class TestPublish(object):
 
         assert mock_mqtt_client.publish.call_count == 1
         assert mock_mqtt_client.publish.call_args == mocker.call(
-            topic=fake_topic, payload=fake_payload, qos=qos
+            topic=fake_topic, payload=fake_payload.encode("utf-8"), qos=qos
         )
 
+    @pytest.mark.it("Passes bytes and bytearray payloads to Paho without copying them")
+    @pytest.mark.parametrize("payload_type", [bytes, bytearray])
+    def test_bytes_payload(self, mock_mqtt_client, transport, payload_type):
+        payload = payload_type(b"Wingardium Leviosa")
+        transport.publish(topic=fake_topic, payload=payload)
+
+        assert mock_mqtt_client.publish.call_args[1]["payload"] is payload
+
+    @pytest.mark.it(
+        "Passes a memoryview over an entire bytes or bytearray payload to Paho as the underlying object"
+    )
+    @pytest.mark.parametrize("payload_type", [bytes, bytearray])
+    def test_memoryview_payload(self, mock_mqtt_client, transport, payload_type):
+        buffer = payload_type(b"Wingardium Leviosa")
+        transport.publish(topic=fake_topic, payload=memoryview(buffer))
+
+        assert mock_mqtt_client.publish.call_args[1]["payload"] is buffer
+
+    @pytest.mark.it("Converts other buffers, such as a partial memoryview, to bytes for Paho")
+    def test_partial_memoryview_payload(self, mock_mqtt_client, transport):
+        buffer = bytearray(b"Wingardium Leviosa")
+        transport.publish(topic=fake_topic, payload=memoryview(buffer)[:10])
+
+        assert mock_mqtt_client.publish.call_args[1]["payload"] == b"Wingardiu" + b"m"
+
     @pytest.mark.it("Raises ValueError on invalid QoS")
     @pytest.mark.parametrize("qos", [pytest.param(-1, id="QoS < 0"), pytest.param(3, id="Qos > 2")])
     def test_raises_value_error_invalid_qos(self, qos):
@@ -1367,6 +1428,276 @@ class TestPublish(object):
         with pytest.raises(error_params["error"]):
             transport.publish(topic=fake_topic, payload=fake_payload, callback=None)
 
+    @pytest.mark.it("Triggers callback as soon as Paho returns when publishing at QoS 0")
+    def test_qos_0_triggers_callback_immediately(
+        self, mocker, mock_mqtt_client, transport, message_info
+    ):
+        callback = mocker.MagicMock()
+        mock_mqtt_client.publish.return_value = message_info
+
+        transport.publish(topic=fake_topic, payload=fake_payload, qos=0, callback=callback)
+
+        assert callback.call_count == 1
+        assert transport.get_statistics()["operations_in_flight"] == 0
+
+    @pytest.mark.it("Ignores the Paho on_publish event for a QoS 0 publish")
+    @pytest.mark.parametrize("early", [False, True], ids=["After publish", "Before publish"])
+    def test_qos_0_ignores_on_publish(
+        self, mocker, mock_mqtt_client, transport, message_info, early
+    ):
+        callback = mocker.MagicMock()
+        network_thread = threading.Thread(
+            target=mock_mqtt_client.on_publish,
+            kwargs={"client": mock_mqtt_client, "userdata": None, "mid": message_info.mid},
+        )
+
+        def trigger_early_on_publish(topic, payload, qos):
+            # Paho reports the write on its network thread before publish() returns
+            network_thread.start()
+            network_thread.join(0.1)
+            return message_info
+
+        if early:
+            mock_mqtt_client.publish.side_effect = trigger_early_on_publish
+        else:
+            mock_mqtt_client.publish.return_value = message_info
+
+        transport.publish(topic=fake_topic, payload=fake_payload, qos=0, callback=callback)
+        if early:
+            network_thread.join()
+        else:
+            mock_mqtt_client.on_publish(
+                client=mock_mqtt_client, userdata=None, mid=message_info.mid
+            )
+
+        assert callback.call_count == 1
+        assert not any(transport._op_manager._stripes)
+        assert transport.get_statistics()["unknown_completions"] == 0
+
+    @pytest.mark.it(
+        "Completes a QoS 1 publish which reuses the MID of a QoS 0 publish that was not written before reconnecting"
+    )
+    def test_qos_0_mid_reused_after_reconnect(self, mocker, mock_mqtt_client, transport):
+        callback = mocker.MagicMock()
+        transport.publish(topic=fake_topic, payload=fake_payload, qos=0)
+        mock_mqtt_client.on_connect(client=mock_mqtt_client, userdata=None, flags=None, rc=fake_rc)
+
+        transport.publish(topic=fake_topic, payload=fake_payload, qos=1, callback=callback)
+        mock_mqtt_client.on_publish(client=mock_mqtt_client, userdata=None, mid=fake_mid)
+
+        assert callback.call_count == 1
+
+
+@pytest.mark.describe("MQTTTransport - .publish() -- Outbound Queue")
+class TestPublishQueue(object):
+    @pytest.fixture(autouse=True)
+    def mids(self, mock_mqtt_client):
+        # Paho issues MIDs in order
+        mids = itertools.count(1)
+        mock_mqtt_client.publish.side_effect = lambda topic, payload, qos: (fake_rc, next(mids))
+        return mids
+
+    def published_topics(self, mock_mqtt_client):
+        return [call[1]["topic"] for call in mock_mqtt_client.publish.call_args_list]
+
+    def fill_window(self, transport):
+        for _ in range(mqtt_transport.MAX_PUBLISHES_IN_FLIGHT):
+            transport.publish(topic=fake_topic, payload=fake_payload)
+
+    @pytest.mark.it("Hands at most MAX_PUBLISHES_IN_FLIGHT QoS 1 publishes to Paho at once")
+    def test_limits_publishes_in_flight(self, mock_mqtt_client, transport):
+        self.fill_window(transport)
+        transport.publish(topic="queued_topic", payload=fake_payload)
+
+        assert mock_mqtt_client.publish.call_count == mqtt_transport.MAX_PUBLISHES_IN_FLIGHT
+        assert transport.get_statistics()["publishes_queued"] == 1
+
+    @pytest.mark.it("Hands a queued publish to Paho when a publish in flight is acknowledged")
+    def test_sends_queued_publish_on_puback(self, mocker, mock_mqtt_client, transport):
+        callback = mocker.MagicMock()
+        self.fill_window(transport)
+        transport.publish(topic="queued_topic", payload=fake_payload, callback=callback)
+
+        mock_mqtt_client.on_publish(client=mock_mqtt_client, userdata=None, mid=1)
+
+        assert self.published_topics(mock_mqtt_client)[-1] == "queued_topic"
+        assert transport.get_statistics()["publishes_queued"] == 0
+        assert callback.call_count == 0
+
+        mock_mqtt_client.on_publish(
+            client=mock_mqtt_client, userdata=None, mid=mqtt_transport.MAX_PUBLISHES_IN_FLIGHT + 1
+        )
+        assert callback.call_count == 1
+
+    @pytest.mark.it(
+        "Completes a subscribe whose SUBACK arrives after a queued publish with a later MID is handed to Paho on acknowledgement"
+    )
+    def test_subscribe_overtaken_by_queued_publish(self, mocker, mock_mqtt_client, transport, mids):
+        callback = mocker.MagicMock()
+        self.fill_window(transport)
+        transport.publish(topic="queued_topic", payload=fake_payload)
+
+        def subscribe(topic, qos):
+            mid = next(mids)
+            # Before subscribe() returns, a PUBACK arrives on the network thread and the queued
+            # publish is handed to Paho with the next MID, then the SUBACK arrives
+            mock_mqtt_client.on_publish(client=mock_mqtt_client, userdata=None, mid=1)
+            mock_mqtt_client.on_subscribe(
+                client=mock_mqtt_client, userdata=None, mid=mid, granted_qos=qos
+            )
+            return (fake_rc, mid)
+
+        mock_mqtt_client.subscribe.side_effect = subscribe
+        transport.subscribe(topic=fake_topic, callback=callback)
+
+        assert self.published_topics(mock_mqtt_client)[-1] == "queued_topic"
+        assert callback.call_count == 1
+
+    @pytest.mark.it(
+        "Hands queued publishes with a higher priority to Paho first, keeping publishes with the same priority in order"
+    )
+    def test_priority(self, mock_mqtt_client, transport):
+        self.fill_window(transport)
+        transport.publish(topic="telemetry_1", payload=fake_payload, priority=0)
+        transport.publish(topic="control_1", payload=fake_payload, priority=1)
+        transport.publish(topic="telemetry_2", payload=fake_payload, priority=0)
+        transport.publish(topic="control_2", payload=fake_payload, priority=1)
+
+        for mid in range(1, 5):
+            mock_mqtt_client.on_publish(client=mock_mqtt_client, userdata=None, mid=mid)
+
+        assert self.published_topics(mock_mqtt_client)[-4:] == [
+            "control_1",
+            "control_2",
+            "telemetry_1",
+            "telemetry_2",
+        ]
+
+    @pytest.mark.it("Does not count QoS 0 publishes against the limit")
+    def test_qos_0(self, mock_mqtt_client, transport):
+        for _ in range(mqtt_transport.MAX_PUBLISHES_IN_FLIGHT):
+            transport.publish(topic=fake_topic, payload=fake_payload, qos=0)
+        transport.publish(topic=fake_topic, payload=fake_payload, qos=1)
+
+        assert mock_mqtt_client.publish.call_count == mqtt_transport.MAX_PUBLISHES_IN_FLIGHT + 1
+
+    @pytest.mark.it(
+        "Completes a queued publish once it is acknowledged, if Paho keeps it to send after reconnecting"
+    )
+    def test_queued_publish_while_disconnected(self, mocker, mock_mqtt_client, transport):
+        callback = mocker.MagicMock()
+        self.fill_window(transport)
+        transport.publish(topic="queued_topic", payload=fake_payload, callback=callback)
+
+        mock_mqtt_client.publish.side_effect = None
+        mock_mqtt_client.publish.return_value = (mqtt.MQTT_ERR_NO_CONN, 100)
+        mock_mqtt_client.on_publish(client=mock_mqtt_client, userdata=None, mid=1)
+        assert callback.call_count == 0
+
+        mock_mqtt_client.on_publish(client=mock_mqtt_client, userdata=None, mid=100)
+        assert callback.call_count == 1
+
+    @pytest.mark.it(
+        "Triggers the callback of a queued publish with the error if handing it to Paho fails"
+    )
+    def test_queued_publish_fails(self, mocker, mock_mqtt_client, transport):
+        callback = mocker.MagicMock()
+        self.fill_window(transport)
+        transport.publish(topic="queued_topic", payload=fake_payload, qos=0, callback=callback)
+
+        mock_mqtt_client.publish.side_effect = None
+        mock_mqtt_client.publish.return_value = (mqtt.MQTT_ERR_NO_CONN, 100)
+        mock_mqtt_client.on_publish(client=mock_mqtt_client, userdata=None, mid=1)
+
+        assert callback.call_count == 1
+        assert isinstance(callback.call_args[1]["error"], errors.ConnectionDroppedError)
+        assert transport.get_statistics()["publishes_queued"] == 0
+
+
+@pytest.mark.describe("MQTTTransport - .shutdown()")
+class TestShutdown(object):
+    @pytest.fixture(autouse=True)
+    def mids(self, mock_mqtt_client):
+        mids = itertools.count(1)
+        mock_mqtt_client.publish.side_effect = lambda topic, payload, qos: (fake_rc, next(mids))
+
+    def connect(self, mock_mqtt_client):
+        mock_mqtt_client.on_connect(client=mock_mqtt_client, userdata=None, flags=None, rc=fake_rc)
+
+    @pytest.mark.it("Waits for publishes in flight to be acknowledged before disconnecting")
+    def test_waits_for_pubacks(self, mocker, mock_mqtt_client, transport):
+        callback = mocker.MagicMock()
+        self.connect(mock_mqtt_client)
+        transport.publish(topic=fake_topic, payload=fake_payload, callback=callback)
+
+        shutdown_thread = threading.Thread(target=transport.shutdown, kwargs={"timeout": 10})
+        shutdown_thread.start()
+        while not transport._shutting_down:
+            time.sleep(0.01)
+        assert mock_mqtt_client.disconnect.call_count == 0
+
+        mock_mqtt_client.on_publish(client=mock_mqtt_client, userdata=None, mid=1)
+        shutdown_thread.join()
+
+        assert callback.call_args == mocker.call()
+        assert mock_mqtt_client.disconnect.call_count == 1
+        assert mock_mqtt_client.loop_stop.call_count == 1
+
+    @pytest.mark.it(
+        "Fails the operations which are still pending at the deadline with an OperationCancelledError"
+    )
+    def test_fails_at_deadline(self, mocker, mock_mqtt_client, transport):
+        publish_callback = mocker.MagicMock()
+        subscribe_callback = mocker.MagicMock()
+        self.connect(mock_mqtt_client)
+        transport.publish(topic=fake_topic, payload=fake_payload, callback=publish_callback)
+        transport.subscribe(topic=fake_topic, callback=subscribe_callback)
+
+        assert transport.shutdown(timeout=0) == 2
+
+        assert isinstance(publish_callback.call_args[1]["error"], errors.OperationCancelledError)
+        assert isinstance(subscribe_callback.call_args[1]["error"], errors.OperationCancelledError)
+        assert mock_mqtt_client.disconnect.call_count == 1
+
+    @pytest.mark.it("Does not wait for acknowledgements if the client is not connected")
+    def test_not_connected(self, mocker, mock_mqtt_client, transport):
+        callback = mocker.MagicMock()
+        transport.publish(topic=fake_topic, payload=fake_payload, callback=callback)
+
+        assert transport.shutdown() == 1
+        assert isinstance(callback.call_args[1]["error"], errors.OperationCancelledError)
+
+    @pytest.mark.it(
+        "Fails publishes in flight before queued publishes, keeping the order they were made in"
+    )
+    def test_failure_order(self, mocker, mock_mqtt_client, transport):
+        failed = []
+        for i in range(mqtt_transport.MAX_PUBLISHES_IN_FLIGHT + 2):
+            transport.publish(
+                topic=fake_topic,
+                payload=fake_payload,
+                callback=functools.partial(lambda i, error: failed.append(i), i),
+            )
+
+        transport.shutdown(timeout=0)
+
+        assert failed == list(range(mqtt_transport.MAX_PUBLISHES_IN_FLIGHT + 2))
+
+    @pytest.mark.it("Refuses new operations once shutdown has started")
+    @pytest.mark.parametrize(
+        "operation, kwargs",
+        [
+            pytest.param("publish", {"topic": fake_topic, "payload": fake_payload}, id="Publish"),
+            pytest.param("subscribe", {"topic": fake_topic}, id="Subscribe"),
+            pytest.param("unsubscribe", {"topic": fake_topic}, id="Unsubscribe"),
+        ],
+    )
+    def test_refuses_new_operations(self, mock_mqtt_client, transport, operation, kwargs):
+        transport.shutdown()
+
+        with pytest.raises(errors.OperationCancelledError):
+            getattr(transport, operation)(**kwargs)
+
 
 @pytest.mark.describe("MQTTTransport - EVENT: Message Received")
 class TestMessageReceived(object):
@@ -1481,13 +1812,429 @@ class TestMisc(object):
         assert callback3.call_count == 1
 
 
+@pytest.mark.describe("MQTTTransport - .get_statistics()")
+class TestGetStatistics(object):
+    @pytest.mark.it("Starts with all counters at zero")
+    def test_initial_values(self, transport):
+        statistics = transport.get_statistics()
+        assert statistics == {
+            "publishes_sent": 0,
+            "publishes_acked": 0,
+            "bytes_sent": 0,
+            "messages_received": 0,
+            "bytes_received": 0,
+            "reconnect_attempts": 0,
+            "connection_drops": 0,
+            "pings_sent": 0,
+            "ping_timeouts": 0,
+            "slow_connection_drops": 0,
+            "tls_sessions_resumed": 0,
+            "unknown_completions": 0,
+            "operations_in_flight": 0,
+            "round_trip_time": None,
+            "publishes_queued": 0,
+        }
+
+    @pytest.mark.it("Counts publishes, bytes sent and operations in flight")
+    @pytest.mark.parametrize(
+        "payload, size",
+        [
+            pytest.param(fake_payload, len(fake_payload), id="str payload"),
+            pytest.param(b"\x00\x01\x02", 3, id="bytes payload"),
+            pytest.param(u"\u00e9", 2, id="non-ascii payload"),
+            pytest.param(None, 0, id="no payload"),
+            pytest.param(memoryview(bytearray(5)), 5, id="memoryview payload"),
+        ],
+    )
+    def test_publish(self, transport, payload, size):
+        transport.publish(topic=fake_topic, payload=payload)
+
+        statistics = transport.get_statistics()
+        assert statistics["publishes_sent"] == 1
+        assert statistics["bytes_sent"] == size
+        assert statistics["operations_in_flight"] == 1
+
+    @pytest.mark.it("Counts PUBACKs and removes acknowledged operations from the in-flight count")
+    def test_puback(self, mock_mqtt_client, transport):
+        transport.publish(topic=fake_topic, payload=fake_payload)
+        mock_mqtt_client.on_publish(client=mock_mqtt_client, userdata=None, mid=fake_mid)
+
+        statistics = transport.get_statistics()
+        assert statistics["publishes_acked"] == 1
+        assert statistics["operations_in_flight"] == 0
+
+    @pytest.mark.it("Does not count a duplicate PUBACK")
+    def test_duplicate_puback(self, mock_mqtt_client, transport):
+        transport.publish(topic=fake_topic, payload=fake_payload)
+        mock_mqtt_client.on_publish(client=mock_mqtt_client, userdata=None, mid=fake_mid)
+        mock_mqtt_client.on_publish(client=mock_mqtt_client, userdata=None, mid=fake_mid)
+
+        statistics = transport.get_statistics()
+        assert statistics["publishes_acked"] == 1
+        assert statistics["unknown_completions"] == 1
+
+    @pytest.mark.it("Does not count the write of a QoS 0 publish as a PUBACK")
+    def test_qos_0_publish(self, mock_mqtt_client, transport):
+        transport.publish(topic=fake_topic, payload=fake_payload, qos=0)
+        mock_mqtt_client.on_publish(client=mock_mqtt_client, userdata=None, mid=fake_mid)
+
+        statistics = transport.get_statistics()
+        assert statistics["publishes_sent"] == 1
+        assert statistics["publishes_acked"] == 0
+        assert statistics["unknown_completions"] == 0
+
+    @pytest.mark.it("Counts completions for unknown MIDs")
+    def test_unknown_completion(self, mock_mqtt_client, transport):
+        mock_mqtt_client.on_publish(client=mock_mqtt_client, userdata=None, mid=fake_mid)
+        assert transport.get_statistics()["unknown_completions"] == 1
+
+    @pytest.mark.it("Counts messages and bytes received")
+    def test_message_received(self, mock_mqtt_client, transport):
+        message = mqtt.MQTTMessage(mid=fake_mid, topic=fake_topic.encode())
+        message.payload = fake_payload.encode()
+        mock_mqtt_client.on_message(client=mock_mqtt_client, userdata=None, mqtt_message=message)
+
+        statistics = transport.get_statistics()
+        assert statistics["messages_received"] == 1
+        assert statistics["bytes_received"] == len(fake_payload)
+
+    @pytest.mark.it("Counts reconnect attempts")
+    def test_reconnect(self, transport):
+        transport.reconnect(fake_password)
+        assert transport.get_statistics()["reconnect_attempts"] == 1
+
+    @pytest.mark.it("Counts unexpected disconnects as connection drops")
+    @pytest.mark.parametrize(
+        "rc, drops", [pytest.param(0, 0, id="rc == 0"), pytest.param(7, 1, id="rc != 0")]
+    )
+    def test_disconnect(self, mock_mqtt_client, transport, rc, drops):
+        mock_mqtt_client.on_disconnect(client=mock_mqtt_client, userdata=None, rc=rc)
+        assert transport.get_statistics()["connection_drops"] == drops
+
+    @pytest.mark.it("Resets counters but not the number of operations in flight")
+    def test_reset(self, transport):
+        transport.publish(topic=fake_topic, payload=fake_payload)
+        transport.reset_statistics()
+
+        statistics = transport.get_statistics()
+        assert statistics["publishes_sent"] == 0
+        assert statistics["bytes_sent"] == 0
+        assert statistics["operations_in_flight"] == 1
+
+
+@pytest.mark.describe("MQTTTransport - TLS")
+class TestTLS(object):
+    @pytest.fixture
+    def mock_ssl_context_constructor(self, mocker):
+        return mocker.patch.object(ssl, "SSLContext")
+
+    @pytest.fixture
+    def connect(self, mock_mqtt_client):
+        def connect():
+            mock_mqtt_client.on_connect(
+                client=mock_mqtt_client, userdata=None, flags=None, rc=fake_rc
+            )
+
+        return connect
+
+    def get_context(self, mock_mqtt_client):
+        return mock_mqtt_client.tls_set_context.call_args[1]["context"]
+
+    @pytest.mark.it("Shares an SSLContext between transports using the same certificates")
+    def test_shares_context(self, mock_mqtt_client, mock_ssl_context_constructor):
+        transport1 = MQTTTransport(
+            client_id=fake_device_id, hostname=fake_hostname, username=fake_username
+        )
+        transport2 = MQTTTransport(
+            client_id=fake_device_id, hostname=fake_hostname, username=fake_username
+        )
+
+        assert mock_ssl_context_constructor.call_count == 1
+        assert transport1._ssl_context.context is transport2._ssl_context.context
+
+    @pytest.mark.it("Creates separate SSLContexts for different certificates")
+    @pytest.mark.parametrize(
+        "kwargs1, kwargs2",
+        [
+            pytest.param({}, {"ca_cert": "dummy_certificate"}, id="Different CA certificate"),
+            pytest.param(
+                {"x509_cert": X509("fantastic_beasts", "where_to_find_them")},
+                {"x509_cert": X509("fantastic_beasts", "the_crimes_of_grindelwald")},
+                id="Different client certificate",
+            ),
+        ],
+    )
+    def test_separate_contexts(
+        self, mocker, mock_mqtt_client, mock_ssl_context_constructor, kwargs1, kwargs2
+    ):
+        mock_ssl_context_constructor.side_effect = lambda **kwargs: mocker.MagicMock()
+        MQTTTransport(
+            client_id=fake_device_id, hostname=fake_hostname, username=fake_username, **kwargs1
+        )
+        MQTTTransport(
+            client_id=fake_device_id, hostname=fake_hostname, username=fake_username, **kwargs2
+        )
+
+        assert mock_ssl_context_constructor.call_count == 2
+
+    @pytest.mark.it("Creates a new SSLContext when the client certificate files have changed")
+    def test_certificate_modified(self, mocker, mock_mqtt_client, mock_ssl_context_constructor):
+        mock_getmtime = mocker.patch.object(mqtt_transport.os.path, "getmtime", return_value=1.0)
+        x509 = X509("fantastic_beasts", "where_to_find_them")
+        MQTTTransport(
+            client_id=fake_device_id, hostname=fake_hostname, username=fake_username, x509_cert=x509
+        )
+        mock_getmtime.return_value = 2.0
+        MQTTTransport(
+            client_id=fake_device_id, hostname=fake_hostname, username=fake_username, x509_cert=x509
+        )
+
+        assert mock_ssl_context_constructor.call_count == 2
+
+    @pytest.mark.it("Delegates to the SSLContext")
+    def test_delegates(self, mock_mqtt_client, mock_ssl_context_constructor):
+        MQTTTransport(client_id=fake_device_id, hostname=fake_hostname, username=fake_username)
+        context = self.get_context(mock_mqtt_client)
+
+        assert context.check_hostname is True
+        assert context.verify_mode == ssl.CERT_REQUIRED
+
+    @pytest.mark.it("Does not offer a TLS session on the first connection")
+    def test_no_session(self, mock_mqtt_client, mock_ssl_context_constructor):
+        MQTTTransport(client_id=fake_device_id, hostname=fake_hostname, username=fake_username)
+        context = self.get_context(mock_mqtt_client)
+        context.wrap_socket("fake_socket", server_hostname=fake_hostname)
+
+        assert mock_ssl_context_constructor.return_value.wrap_socket.call_args == (
+            ("fake_socket",),
+            {"server_hostname": fake_hostname},
+        )
+
+    @pytest.mark.it("Offers the TLS session from the previous connection when reconnecting")
+    def test_resumes_session(self, mock_mqtt_client, mock_ssl_context_constructor, connect):
+        MQTTTransport(client_id=fake_device_id, hostname=fake_hostname, username=fake_username)
+        context = self.get_context(mock_mqtt_client)
+        mock_mqtt_client.socket.return_value.session = "fake_session"
+        connect()
+        context.wrap_socket("fake_socket", server_hostname=fake_hostname)
+
+        assert mock_ssl_context_constructor.return_value.wrap_socket.call_args == (
+            ("fake_socket",),
+            {"server_hostname": fake_hostname, "session": "fake_session"},
+        )
+
+    @pytest.mark.it("Does not share TLS sessions between transports")
+    def test_sessions_not_shared(self, mock_mqtt_client, mock_ssl_context_constructor):
+        transport1 = MQTTTransport(
+            client_id=fake_device_id, hostname=fake_hostname, username=fake_username
+        )
+        mock_mqtt_client.socket.return_value.session = "fake_session"
+        transport1._save_tls_session(mock_mqtt_client)
+        transport2 = MQTTTransport(
+            client_id=fake_device_id, hostname=fake_hostname, username=fake_username
+        )
+
+        assert transport1._ssl_context.session == "fake_session"
+        assert transport2._ssl_context.session is None
+
+    @pytest.mark.it("Counts connections which resumed a TLS session")
+    def test_counts_resumed(self, mock_mqtt_client, mock_ssl_context_constructor, connect):
+        transport = MQTTTransport(
+            client_id=fake_device_id, hostname=fake_hostname, username=fake_username
+        )
+        connect()
+        mock_mqtt_client.socket.return_value.session_reused = True
+        connect()
+
+        assert transport.get_statistics()["tls_sessions_resumed"] == 1
+
+
+@pytest.mark.describe("MQTTTransport - Keepalive pings")
+class TestKeepalivePings(object):
+    @pytest.fixture
+    def mock_time(self, mocker):
+        return mocker.patch.object(mqtt_transport, "time")
+
+    @pytest.fixture
+    def scheduler(self, mocker):
+        scheduler = mocker.MagicMock()
+        mocker.patch.object(timer_scheduler, "get_scheduler", return_value=scheduler)
+        return scheduler
+
+    @pytest.fixture
+    def paho_send_pingreq(self, mocker, mock_mqtt_client):
+        mock_mqtt_client._send_pingreq = mocker.MagicMock(return_value=mqtt.MQTT_ERR_SUCCESS)
+        return mock_mqtt_client._send_pingreq
+
+    @pytest.fixture
+    def paho_handle_pingresp(self, mocker, mock_mqtt_client):
+        mock_mqtt_client._handle_pingresp = mocker.MagicMock(return_value=mqtt.MQTT_ERR_SUCCESS)
+        return mock_mqtt_client._handle_pingresp
+
+    @pytest.fixture
+    def transport(self, mock_mqtt_client, paho_send_pingreq, paho_handle_pingresp):
+        return MQTTTransport(
+            client_id=fake_device_id,
+            hostname=fake_hostname,
+            username=fake_username,
+            ping_timeout=10,
+        )
+
+    def ping(self, mock_mqtt_client, mock_time, sent, received):
+        mock_time.time.return_value = sent
+        mock_mqtt_client._send_pingreq()
+        mock_time.time.return_value = received
+        mock_mqtt_client._handle_pingresp()
+
+    @pytest.mark.it("Still calls Paho to send PINGREQs and handle PINGRESPs")
+    def test_calls_paho(
+        self, mock_mqtt_client, transport, paho_send_pingreq, paho_handle_pingresp, scheduler
+    ):
+        assert mock_mqtt_client._send_pingreq() == mqtt.MQTT_ERR_SUCCESS
+        assert mock_mqtt_client._handle_pingresp() == mqtt.MQTT_ERR_SUCCESS
+        assert paho_send_pingreq.call_count == 1
+        assert paho_handle_pingresp.call_count == 1
+
+    @pytest.mark.it("Has no round trip time until a PINGRESP is received")
+    def test_no_round_trip_time(self, transport):
+        assert transport.round_trip_time is None
+
+    @pytest.mark.it("Measures the round trip time of the first ping")
+    def test_first_ping(self, mock_mqtt_client, transport, mock_time, scheduler):
+        self.ping(mock_mqtt_client, mock_time, sent=100.0, received=100.4)
+
+        assert transport.round_trip_time == pytest.approx(0.4)
+        assert transport.get_statistics()["round_trip_time"] == pytest.approx(0.4)
+        assert transport.get_statistics()["pings_sent"] == 1
+
+    @pytest.mark.it("Smooths the round trip time over subsequent pings")
+    def test_smoothed(self, mock_mqtt_client, transport, mock_time, scheduler):
+        self.ping(mock_mqtt_client, mock_time, sent=100.0, received=100.4)
+        self.ping(mock_mqtt_client, mock_time, sent=160.0, received=161.2)
+
+        assert transport.round_trip_time == pytest.approx(0.4 + (1.2 - 0.4) / 8)
+
+    @pytest.mark.it("Ignores a PINGRESP when no PINGREQ is outstanding")
+    def test_unexpected_pingresp(self, mock_mqtt_client, transport, mock_time, scheduler):
+        mock_mqtt_client._handle_pingresp()
+        assert transport.round_trip_time is None
+
+    @pytest.mark.it("Does not track a PINGREQ which Paho failed to send")
+    def test_failed_pingreq(
+        self, mock_mqtt_client, transport, paho_send_pingreq, mock_time, scheduler
+    ):
+        paho_send_pingreq.return_value = mqtt.MQTT_ERR_NO_CONN
+        self.ping(mock_mqtt_client, mock_time, sent=100.0, received=100.4)
+
+        assert transport.round_trip_time is None
+        assert transport.get_statistics()["pings_sent"] == 0
+        assert scheduler.schedule.call_count == 0
+
+    @pytest.mark.it("Starts a ping timeout timer when a PINGREQ is sent")
+    def test_starts_timer(self, mock_mqtt_client, transport, scheduler):
+        mock_mqtt_client._send_pingreq()
+
+        assert scheduler.schedule.call_count == 1
+        assert scheduler.schedule.call_args[0][0] == 10
+
+    @pytest.mark.it("Does not start a timer if no ping timeout was provided")
+    def test_no_ping_timeout(
+        self, mock_mqtt_client, paho_send_pingreq, paho_handle_pingresp, scheduler
+    ):
+        MQTTTransport(client_id=fake_device_id, hostname=fake_hostname, username=fake_username)
+        mock_mqtt_client._send_pingreq()
+
+        assert scheduler.schedule.call_count == 0
+
+    @pytest.mark.it("Cancels the ping timeout timer when the PINGRESP is received")
+    def test_cancels_timer(self, mock_mqtt_client, transport, scheduler):
+        mock_mqtt_client._send_pingreq()
+        mock_mqtt_client._handle_pingresp()
+
+        assert scheduler.schedule.return_value.cancel.call_count == 1
+
+    @pytest.mark.it("Cancels the ping timeout timer when the connection is lost")
+    def test_cancels_timer_on_disconnect(self, mock_mqtt_client, transport, scheduler):
+        mock_mqtt_client._send_pingreq()
+        mock_mqtt_client.on_disconnect(client=mock_mqtt_client, userdata=None, rc=7)
+
+        assert scheduler.schedule.return_value.cancel.call_count == 1
+
+    @pytest.mark.it("Drops the connection if the PINGRESP is not received before the timeout")
+    def test_timeout_drops_connection(self, mock_mqtt_client, transport, scheduler):
+        mock_mqtt_client._send_pingreq()
+        call_args = scheduler.schedule.call_args
+        call_args[0][1](*call_args[1]["args"])
+
+        sock = mock_mqtt_client.socket.return_value
+        assert sock.shutdown.call_count == 1
+        assert sock.shutdown.call_args == ((socket.SHUT_RDWR,),)
+        assert transport.get_statistics()["ping_timeouts"] == 1
+
+    @pytest.mark.it("Does not drop the connection if the timer fires after the PINGRESP")
+    def test_late_timer(self, mock_mqtt_client, transport, scheduler):
+        mock_mqtt_client._send_pingreq()
+        call_args = scheduler.schedule.call_args
+        mock_mqtt_client._handle_pingresp()
+        call_args[0][1](*call_args[1]["args"])
+
+        assert mock_mqtt_client.socket.return_value.shutdown.call_count == 0
+        assert transport.get_statistics()["ping_timeouts"] == 0
+
+    @pytest.mark.it("Tolerates a socket which is already closed when the ping times out")
+    def test_timeout_socket_closed(self, mock_mqtt_client, transport, scheduler):
+        mock_mqtt_client.socket.return_value.shutdown.side_effect = socket.error()
+        mock_mqtt_client._send_pingreq()
+        call_args = scheduler.schedule.call_args
+        call_args[0][1](*call_args[1]["args"])
+
+        assert transport.get_statistics()["ping_timeouts"] == 1
+
+    @pytest.mark.it("Drops the connection if the smoothed round trip time exceeds the maximum")
+    def test_max_round_trip_time(
+        self, mock_mqtt_client, paho_send_pingreq, paho_handle_pingresp, mock_time, scheduler
+    ):
+        transport = MQTTTransport(
+            client_id=fake_device_id,
+            hostname=fake_hostname,
+            username=fake_username,
+            max_round_trip_time=1,
+        )
+        self.ping(mock_mqtt_client, mock_time, sent=100.0, received=100.4)
+        # A single slow ping only moves the smoothed round trip time by an eighth of the difference
+        self.ping(mock_mqtt_client, mock_time, sent=160.0, received=165.0)
+        sock = mock_mqtt_client.socket.return_value
+        assert sock.shutdown.call_count == 0
+
+        self.ping(mock_mqtt_client, mock_time, sent=220.0, received=225.0)
+
+        assert sock.shutdown.call_count == 1
+        assert sock.shutdown.call_args == ((socket.SHUT_RDWR,),)
+        assert transport.get_statistics()["slow_connection_drops"] == 1
+        # The next connection is measured afresh
+        assert transport.round_trip_time is None
+
+    @pytest.mark.it(
+        "Does not drop the connection for a slow round trip time if no maximum was provided"
+    )
+    def test_no_max_round_trip_time(self, mock_mqtt_client, transport, mock_time, scheduler):
+        self.ping(mock_mqtt_client, mock_time, sent=100.0, received=200.0)
+
+        assert mock_mqtt_client.socket.return_value.shutdown.call_count == 0
+        assert transport.get_statistics()["slow_connection_drops"] == 0
+
+
+def get_state(manager, mid):
+    stripe = manager._stripes[mid % mqtt_transport._LOCK_STRIPES]
+    return stripe.get(mid, (mqtt_transport._EMPTY,))[0]
+
+
 @pytest.mark.describe("OperationManager")
 class TestOperationManager(object):
     @pytest.mark.it("Instantiates with no operation tracking information")
     def test_instantiates_empty(self):
         manager = OperationManager()
-        assert len(manager._pending_operation_callbacks) == 0
-        assert len(manager._unknown_operation_completions) == 0
+        assert not any(manager._stripes)
 
 
 @pytest.mark.describe("OperationManager - .establish_operation()")
@@ -1510,8 +2257,9 @@ class TestOperationManagerEstablishOperation(object):
         mid = 1
         manager.establish_operation(mid, optional_callback)
 
-        assert len(manager._pending_operation_callbacks) == 1
-        assert manager._pending_operation_callbacks[mid] is optional_callback
+        assert manager.get_statistics()["operations_in_flight"] == 1
+        assert get_state(manager, mid) == mqtt_transport._PENDING
+        assert manager._stripes[mid % mqtt_transport._LOCK_STRIPES][mid][1] is optional_callback
 
     @pytest.mark.it(
         "Resolves operation tracking when MID corresponds to a previous unknown completion"
@@ -1522,13 +2270,12 @@ class TestOperationManagerEstablishOperation(object):
 
         # Cause early completion of an unknown operation
         manager.complete_operation(mid)
-        assert len(manager._unknown_operation_completions) == 1
-        assert manager._unknown_operation_completions[mid]
+        assert get_state(manager, mid) == mqtt_transport._COMPLETED_EARLY
 
         # Establish operation that was already completed
         manager.establish_operation(mid)
 
-        assert len(manager._unknown_operation_completions) == 0
+        assert not any(manager._stripes)
 
     @pytest.mark.it(
         "Triggers the callback if provided when MID corresponds to a previous unknown completion"
@@ -1584,7 +2331,8 @@ class TestOperationManagerEstablishOperation(object):
         manager.complete_operation(mid)
 
         # Set up mock tracking
-        lock_spy = mocker.spy(manager, "_lock")
+        lock_spy = mocker.MagicMock(wraps=manager._locks[mid])
+        manager._locks[mid] = lock_spy
         mock_tracker = mocker.MagicMock()
         calls_during_lock = []
 
@@ -1621,11 +2369,11 @@ class TestOperationManagerCompleteOperation(object):
 
         # Establish a pending operation
         manager.establish_operation(mid)
-        assert len(manager._pending_operation_callbacks) == 1
+        assert get_state(manager, mid) == mqtt_transport._PENDING
 
         # Complete pending operation
         manager.complete_operation(mid)
-        assert len(manager._pending_operation_callbacks) == 0
+        assert not any(manager._stripes)
 
     @pytest.mark.it("Triggers callback for a pending operation when resolving")
     def test_complete_pending_operation_callback(self, mocker):
@@ -1639,6 +2387,17 @@ class TestOperationManagerCompleteOperation(object):
         manager.complete_operation(mid)
         assert cb_mock.call_count == 1
 
+    @pytest.mark.it(
+        "Returns True if a pending operation was completed, and False for an unknown completion"
+    )
+    def test_returns_whether_completed(self):
+        manager = OperationManager()
+        manager.establish_operation(1)
+
+        assert manager.complete_operation(1) is True
+        assert manager.complete_operation(1) is False
+        assert manager.complete_operation(2) is False
+
     @pytest.mark.it("Recovers from Exception thrown in callback")
     def test_callback_raises_exception(self, mocker):
         manager = OperationManager()
@@ -1672,8 +2431,7 @@ class TestOperationManagerCompleteOperation(object):
         mid = 1
 
         manager.complete_operation(mid)
-        assert len(manager._unknown_operation_completions) == 1
-        assert manager._unknown_operation_completions[mid]
+        assert get_state(manager, mid) == mqtt_transport._COMPLETED_EARLY
 
     @pytest.mark.it("Does not trigger the callback until after thread lock has been released")
     def test_callback_called_after_lock_release(self, mocker):
@@ -1685,7 +2443,8 @@ class TestOperationManagerCompleteOperation(object):
         manager.establish_operation(mid, cb_mock)
 
         # Set up mock tracking
-        lock_spy = mocker.spy(manager, "_lock")
+        lock_spy = mocker.MagicMock(wraps=manager._locks[mid])
+        manager._locks[mid] = lock_spy
         mock_tracker = mocker.MagicMock()
         calls_during_lock = []
 
@@ -1711,3 +2470,172 @@ class TestOperationManagerCompleteOperation(object):
 
         # Callback WAS NOT called while the lock was held
         assert mocker.call.cb() not in calls_during_lock
+
+
+@pytest.mark.describe("OperationManager - MID reuse")
+class TestOperationManagerMidReuse(object):
+    @pytest.mark.it(
+        "Stores at most one entry per MID however many unknown completions are received"
+    )
+    def test_bounded_memory(self):
+        manager = OperationManager()
+        for mid in range(1, 65536):
+            manager.complete_operation(mid)
+        for mid in range(1, 65536):
+            manager.complete_operation(mid)
+
+        assert sum(len(stripe) for stripe in manager._stripes) == 65535
+        assert manager.get_statistics()["unknown_completions"] == 2 * 65535
+
+    @pytest.mark.it(
+        "Triggers the callback for an early completion received just after Paho wraps its MIDs around"
+    )
+    def test_early_completion_after_wrap(self, mocker):
+        manager = OperationManager()
+        manager.establish_operation(65535)
+        manager.complete_operation(65535)
+        cb_mock = mocker.MagicMock()
+
+        manager.complete_operation(1)
+        manager.establish_operation(1, cb_mock)
+
+        assert cb_mock.call_count == 1
+
+    @pytest.mark.it(
+        "Does not complete an operation with a stale completion left over from an earlier use of its MID"
+    )
+    def test_stale_completion(self, mocker):
+        manager = OperationManager()
+        # An unknown completion for MID 10 which is never established
+        manager.complete_operation(10)
+        for mid in range(11, 65536):
+            manager.establish_operation(mid)
+            manager.complete_operation(mid)
+        for mid in range(1, 10):
+            manager.establish_operation(mid)
+            manager.complete_operation(mid)
+        cb_mock = mocker.MagicMock()
+
+        # MID 10 is reused after Paho wraps around
+        manager.establish_operation(10, cb_mock)
+
+        assert cb_mock.call_count == 0
+        manager.complete_operation(10)
+        assert cb_mock.call_count == 1
+
+    @pytest.mark.it(
+        "Does not complete a later use of a MID with a repeated completion for an operation which has already completed"
+    )
+    def test_repeated_completion(self, mocker):
+        manager = OperationManager()
+        manager.establish_operation(1)
+        manager.establish_operation(2)
+        manager.complete_operation(1)
+
+        manager.complete_operation(1)
+        for mid in range(3, 65536):
+            manager.establish_operation(mid)
+            manager.complete_operation(mid)
+        cb_mock = mocker.MagicMock()
+        manager.establish_operation(1, cb_mock)
+
+        assert cb_mock.call_count == 0
+
+
+@pytest.mark.describe("OperationManager - MIDs established out of order")
+class TestOperationManagerOutOfOrder(object):
+    @pytest.mark.it(
+        "Triggers the callback for an early completion of a MID which is established after a later MID"
+    )
+    def test_early_completion(self, mocker):
+        manager = OperationManager()
+        cb_mock = mocker.MagicMock()
+        manager.establish_operation(2)
+        manager.complete_operation(1)
+        manager.establish_operation(1, cb_mock)
+
+        assert cb_mock.call_count == 1
+        assert manager.get_statistics()["operations_in_flight"] == 1
+
+    @pytest.mark.it(
+        "Triggers the callback for an early completion of a MID issued before Paho wraps around, which is established after a MID issued after it wraps around"
+    )
+    def test_early_completion_across_wrap(self, mocker):
+        manager = OperationManager()
+        manager.establish_operation(65534)
+        manager.complete_operation(65534)
+        cb_mock = mocker.MagicMock()
+        manager.establish_operation(1)
+        manager.complete_operation(65535)
+        manager.establish_operation(65535, cb_mock)
+
+        assert cb_mock.call_count == 1
+
+    @pytest.mark.it("Completes operations which are established out of order")
+    def test_pending(self, mocker):
+        manager = OperationManager()
+        cb_mock1 = mocker.MagicMock()
+        cb_mock2 = mocker.MagicMock()
+        manager.establish_operation(2, cb_mock2)
+        manager.establish_operation(1, cb_mock1)
+        manager.complete_operation(1)
+        manager.complete_operation(2)
+
+        assert cb_mock1.call_count == 1
+        assert cb_mock2.call_count == 1
+        assert manager.get_statistics()["operations_in_flight"] == 0
+
+
+@pytest.mark.describe("OperationManager - .cancel_all_operations()")
+class TestOperationManagerCancelAllOperations(object):
+    @pytest.mark.it("Fails each pending operation with the error, in order of MID")
+    def test_fails_pending_operations(self, mocker):
+        manager = OperationManager()
+        failed = []
+        for mid in [3, 1, 2]:
+            manager.establish_operation(
+                mid, functools.partial(lambda mid, error: failed.append((mid, error)), mid)
+            )
+        error = errors.OperationCancelledError()
+
+        assert manager.cancel_all_operations(error) == 3
+        assert failed == [(1, error), (2, error), (3, error)]
+        assert manager.get_statistics()["operations_in_flight"] == 0
+
+    @pytest.mark.it("Does not fail operations which have completed")
+    def test_skips_completed_operations(self, mocker):
+        manager = OperationManager()
+        cb_mock = mocker.MagicMock()
+        manager.establish_operation(1, cb_mock)
+        manager.complete_operation(1)
+
+        assert manager.cancel_all_operations(errors.OperationCancelledError()) == 0
+        assert cb_mock.call_count == 1
+
+
+@pytest.mark.describe("OperationManager - .reset()")
+class TestOperationManagerReset(object):
+    @pytest.mark.it("Discards unknown completions")
+    def test_discards_unknown_completions(self, mocker):
+        manager = OperationManager()
+        manager.complete_operation(1)
+        manager.complete_operation(3)
+        cb_mock = mocker.MagicMock()
+
+        manager.reset()
+        manager.establish_operation(1, cb_mock)
+
+        assert cb_mock.call_count == 0
+        assert get_state(manager, 3) == mqtt_transport._EMPTY
+
+    @pytest.mark.it("Keeps pending operations, so that they complete when Paho retransmits them")
+    def test_keeps_pending_operations(self, mocker):
+        manager = OperationManager()
+        cb_mock = mocker.MagicMock()
+        manager.establish_operation(1, cb_mock)
+
+        manager.reset()
+        manager.complete_operation(1)
+
+        assert cb_mock.call_count == 1
+        assert manager.get_statistics()["operations_in_flight"] == 0
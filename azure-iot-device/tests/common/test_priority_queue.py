@@ -0,0 +1,61 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for
+# license information.
+# --------------------------------------------------------------------------
+import pytest
+import logging
+from azure.iot.device.common.priority_queue import PriorityQueue
+
+logging.basicConfig(level=logging.DEBUG)
+
+
+@pytest.mark.describe("PriorityQueue")
+class TestPriorityQueue(object):
+    @pytest.mark.it("Returns items with the same priority in the order they were added")
+    def test_fifo(self):
+        queue = PriorityQueue()
+        for item in range(5):
+            queue.put(item)
+
+        assert [queue.get() for _ in range(5)] == [0, 1, 2, 3, 4]
+
+    @pytest.mark.it("Returns items with a higher priority first")
+    def test_priority(self):
+        queue = PriorityQueue()
+        queue.put("telemetry_1")
+        queue.put("control_1", priority=1)
+        queue.put("telemetry_2")
+        queue.put("urgent", priority=2)
+        queue.put("control_2", priority=1)
+
+        assert [queue.get() for _ in range(5)] == [
+            "urgent",
+            "control_1",
+            "control_2",
+            "telemetry_1",
+            "telemetry_2",
+        ]
+
+    @pytest.mark.it("Reports the number of items in the queue")
+    def test_size(self):
+        queue = PriorityQueue()
+        assert queue.empty()
+        queue.put("telemetry")
+        queue.put("control", priority=1)
+
+        assert len(queue) == 2
+        assert queue.qsize() == 2
+        assert not queue.empty()
+
+        queue.get()
+        assert len(queue) == 1
+
+    @pytest.mark.it("Raises an IndexError when getting from an empty queue")
+    def test_empty(self):
+        queue = PriorityQueue()
+        queue.put("telemetry")
+        queue.get()
+
+        with pytest.raises(IndexError):
+            queue.get()
@@ -0,0 +1,104 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for
+# license information.
+# --------------------------------------------------------------------------
+import pytest
+import logging
+from azure.iot.device.common import rate_limiter
+from azure.iot.device.common.rate_limiter import TokenBucket
+
+logging.basicConfig(level=logging.DEBUG)
+
+
+@pytest.fixture
+def mock_time(mocker):
+    mock_time = mocker.patch.object(rate_limiter, "time")
+    mock_time.time.return_value = 1000.0
+    return mock_time
+
+
+@pytest.mark.describe("TokenBucket - Instantiation")
+class TestTokenBucketInstantiation(object):
+    @pytest.mark.it("Defaults the capacity to one second's worth of tokens")
+    @pytest.mark.parametrize(
+        "rate, capacity",
+        [pytest.param(10, 10, id="rate > 1"), pytest.param(0.5, 1, id="rate < 1")],
+    )
+    def test_default_capacity(self, rate, capacity):
+        assert TokenBucket(rate).capacity == capacity
+
+    @pytest.mark.it("Raises a ValueError if the rate is not greater than 0")
+    @pytest.mark.parametrize("rate", [pytest.param(0, id="Zero"), pytest.param(-1, id="Negative")])
+    def test_invalid_rate(self, rate):
+        with pytest.raises(ValueError):
+            TokenBucket(rate)
+
+    @pytest.mark.it("Raises a ValueError if the capacity is less than 1")
+    def test_invalid_capacity(self):
+        with pytest.raises(ValueError):
+            TokenBucket(10, capacity=0.5)
+
+
+@pytest.mark.describe("TokenBucket - .try_acquire()")
+class TestTokenBucketTryAcquire(object):
+    @pytest.mark.it("Allows a burst of up to the capacity")
+    def test_burst(self, mock_time):
+        bucket = TokenBucket(10, capacity=5)
+        assert [bucket.try_acquire() for _ in range(6)] == [True] * 5 + [False]
+
+    @pytest.mark.it("Refills at the rate")
+    def test_refill(self, mock_time):
+        bucket = TokenBucket(10, capacity=5)
+        for _ in range(5):
+            bucket.try_acquire()
+
+        mock_time.time.return_value += 0.25
+        assert bucket.try_acquire(tokens=2) is True
+        assert bucket.try_acquire() is False
+
+    @pytest.mark.it("Does not refill beyond the capacity")
+    def test_refill_capacity(self, mock_time):
+        bucket = TokenBucket(10, capacity=5)
+        mock_time.time.return_value += 60
+        assert bucket.try_acquire(tokens=5) is True
+        assert bucket.try_acquire() is False
+
+
+@pytest.mark.describe("TokenBucket - .reserve()")
+class TestTokenBucketReserve(object):
+    @pytest.mark.it("Does not delay while tokens are available")
+    def test_no_delay(self, mock_time):
+        bucket = TokenBucket(10, capacity=2)
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == 0
+
+    @pytest.mark.it("Delays successive callers by the time it takes to refill their tokens")
+    def test_delay(self, mock_time):
+        bucket = TokenBucket(10, capacity=1)
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == pytest.approx(0.1)
+        assert bucket.reserve() == pytest.approx(0.2)
+
+    @pytest.mark.it("Prevents try_acquire from succeeding until the debt is repaid")
+    def test_debt(self, mock_time):
+        bucket = TokenBucket(10, capacity=1)
+        bucket.reserve(tokens=3)
+
+        mock_time.time.return_value += 0.2
+        assert bucket.try_acquire() is False
+        mock_time.time.return_value += 0.1
+        assert bucket.try_acquire() is True
+
+
+@pytest.mark.describe("TokenBucket - .acquire()")
+class TestTokenBucketAcquire(object):
+    @pytest.mark.it("Sleeps until the tokens are available")
+    def test_sleeps(self, mock_time):
+        bucket = TokenBucket(10, capacity=1)
+        bucket.acquire()
+        assert mock_time.sleep.call_count == 0
+
+        bucket.acquire()
+        assert mock_time.sleep.call_count == 1
+        assert mock_time.sleep.call_args[0][0] == pytest.approx(0.1)
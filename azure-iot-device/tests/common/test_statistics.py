@@ -0,0 +1,54 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for
+# license information.
+# --------------------------------------------------------------------------
+import pytest
+import threading
+from azure.iot.device.common.statistics import Counters
+
+
+@pytest.mark.describe("Counters")
+class TestCounters(object):
+    @pytest.mark.it("Starts all counters at zero")
+    def test_initial_values(self):
+        counters = Counters(["wands", "brooms"])
+        assert counters.snapshot() == {"wands": 0, "brooms": 0}
+
+    @pytest.mark.it("Increments counters by one, or by the given amount")
+    def test_increment(self):
+        counters = Counters(["wands", "brooms"])
+        counters.increment("wands")
+        counters.increment("brooms", 7)
+        assert counters.snapshot() == {"wands": 1, "brooms": 7}
+
+    @pytest.mark.it("Returns a snapshot which does not change when the counters do")
+    def test_snapshot_is_copy(self):
+        counters = Counters(["wands"])
+        snapshot = counters.snapshot()
+        counters.increment("wands")
+        assert snapshot == {"wands": 0}
+
+    @pytest.mark.it("Resets all counters to zero")
+    def test_reset(self):
+        counters = Counters(["wands", "brooms"])
+        counters.increment("wands")
+        counters.increment("brooms", 7)
+        counters.reset()
+        assert counters.snapshot() == {"wands": 0, "brooms": 0}
+
+    @pytest.mark.it("Does not lose increments made from multiple threads")
+    def test_threadsafe(self):
+        counters = Counters(["wands"])
+
+        def increment_many():
+            for _ in range(1000):
+                counters.increment("wands")
+
+        threads = [threading.Thread(target=increment_many) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert counters.snapshot() == {"wands": 8000}
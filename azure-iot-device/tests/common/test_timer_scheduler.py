@@ -0,0 +1,160 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for
+# license information.
+# --------------------------------------------------------------------------
+import pytest
+import logging
+import threading
+from azure.iot.device.common import timer_scheduler
+from azure.iot.device.common.timer_scheduler import TimerScheduler, Timer
+
+logging.basicConfig(level=logging.INFO)
+
+wait_timeout = 5
+
+
+@pytest.fixture
+def scheduler():
+    return TimerScheduler()
+
+
+@pytest.mark.describe("TimerScheduler")
+class TestTimerScheduler(object):
+    @pytest.mark.it("Calls the scheduled function with the given arguments after the interval")
+    def test_calls_function(self, scheduler, mocker):
+        called = threading.Event()
+        mock_function = mocker.MagicMock(side_effect=lambda *args, **kwargs: called.set())
+
+        scheduler.schedule(0.01, mock_function, args=("Hedwig",), kwargs={"owner": "Harry"})
+
+        assert called.wait(wait_timeout)
+        assert mock_function.call_args == mocker.call("Hedwig", owner="Harry")
+
+    @pytest.mark.it("Calls functions in deadline order, regardless of scheduling order")
+    def test_deadline_order(self, scheduler):
+        order = []
+        done = threading.Event()
+
+        def record(name):
+            order.append(name)
+            if len(order) == 3:
+                done.set()
+
+        scheduler.schedule(0.15, record, args=("third",))
+        scheduler.schedule(0.05, record, args=("first",))
+        scheduler.schedule(0.1, record, args=("second",))
+
+        assert done.wait(wait_timeout)
+        assert order == ["first", "second", "third"]
+
+    @pytest.mark.it("Does not call a function whose handle has been cancelled")
+    def test_cancel(self, scheduler, mocker):
+        done = threading.Event()
+        mock_cancelled = mocker.MagicMock()
+
+        handle = scheduler.schedule(0.01, mock_cancelled)
+        handle.cancel()
+        scheduler.schedule(0.05, done.set)
+
+        assert done.wait(wait_timeout)
+        assert mock_cancelled.call_count == 0
+
+    @pytest.mark.it("Services all timers from a single thread")
+    def test_single_thread(self, scheduler):
+        threads = set()
+        done = threading.Event()
+
+        def record():
+            threads.add(threading.current_thread())
+
+        for _ in range(20):
+            scheduler.schedule(0.01, record)
+        scheduler.schedule(0.05, done.set)
+
+        assert done.wait(wait_timeout)
+        assert len(threads) == 1
+
+    @pytest.mark.it("Keeps running timers after a function raises an exception")
+    def test_exception_in_function(self, scheduler, mocker):
+        mock_handler = mocker.patch.object(
+            timer_scheduler.unhandled_exceptions, "exception_caught_in_background_thread"
+        )
+        done = threading.Event()
+        error = ValueError("Expelliarmus")
+
+        def raise_error():
+            raise error
+
+        scheduler.schedule(0.01, raise_error)
+        scheduler.schedule(0.05, done.set)
+
+        assert done.wait(wait_timeout)
+        assert mock_handler.call_args == mocker.call(error)
+
+    @pytest.mark.it("Stops its thread and discards pending timers when shut down")
+    def test_shutdown(self, scheduler, mocker):
+        mock_function = mocker.MagicMock()
+        scheduler.schedule(0.01, lambda: None)
+        thread = scheduler._thread
+        scheduler.schedule(0.05, mock_function)
+
+        scheduler.shutdown()
+
+        thread.join(wait_timeout)
+        assert not thread.is_alive()
+        assert mock_function.call_count == 0
+
+    @pytest.mark.it("Starts a new thread if a timer is scheduled after it was shut down")
+    def test_schedule_after_shutdown(self, scheduler):
+        done = threading.Event()
+        scheduler.schedule(0.01, lambda: None)
+        scheduler.shutdown()
+
+        scheduler.schedule(0.01, done.set)
+
+        assert done.wait(wait_timeout)
+
+
+@pytest.mark.describe("Timer")
+class TestTimer(object):
+    @pytest.mark.it("Schedules the function on the shared scheduler when started")
+    def test_start(self, mocker):
+        mock_schedule = mocker.patch.object(timer_scheduler.get_scheduler(), "schedule")
+        mock_function = mocker.MagicMock()
+
+        timer = Timer(3, mock_function)
+        assert mock_schedule.call_count == 0
+        timer.start()
+
+        assert mock_schedule.call_count == 1
+        assert mock_schedule.call_args == mocker.call(3, mock_function, None, None)
+
+    @pytest.mark.it("Cancels the scheduled call when cancelled")
+    def test_cancel(self, mocker):
+        mock_schedule = mocker.patch.object(timer_scheduler.get_scheduler(), "schedule")
+
+        timer = Timer(3, mocker.MagicMock())
+        timer.start()
+        timer.cancel()
+
+        assert mock_schedule.return_value.cancel.call_count == 1
+
+    @pytest.mark.it("Does not schedule anything if cancelled before it is started")
+    def test_cancel_before_start(self, mocker):
+        mock_schedule = mocker.patch.object(timer_scheduler.get_scheduler(), "schedule")
+
+        timer = Timer(3, mocker.MagicMock())
+        timer.cancel()
+        timer.start()
+
+        assert mock_schedule.call_count == 0
+
+    @pytest.mark.it("Raises a RuntimeError if started twice")
+    def test_start_twice(self, mocker):
+        mocker.patch.object(timer_scheduler.get_scheduler(), "schedule")
+
+        timer = Timer(3, mocker.MagicMock())
+        timer.start()
+        with pytest.raises(RuntimeError):
+            timer.start()
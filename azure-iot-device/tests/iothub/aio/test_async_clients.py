@@ -12,10 +12,13 @@ import time
 import os
 import io
 from azure.iot.device.iothub.aio import IoTHubDeviceClient, IoTHubModuleClient
+from azure.iot.device.iothub.aio import async_clients
 from azure.iot.device.iothub.pipeline import IoTHubPipeline, constant
-from azure.iot.device.iothub.models import Message, MethodRequest
+from azure.iot.device.iothub.models import Message, MethodRequest, RateLimits
 from azure.iot.device.iothub.aio.async_inbox import AsyncClientInbox
-from azure.iot.device.common import async_adapter
+from azure.iot.device.iothub.sync_inbox import InboxEmpty
+from azure.iot.device.common import async_adapter, errors
+from azure.iot.device.common.pipeline import pipeline_stages_base
 from azure.iot.device.iothub.auth import IoTEdgeError
 from azure.iot.device.common.models.x509 import X509
 
@@ -112,7 +115,24 @@ class SharedClientCreateFromConnectionStringTests(object):
         client_class.create_from_connection_string(*args, **kwargs)
 
         assert mock_pipeline_init.call_count == 1
-        assert mock_pipeline_init.call_args == mocker.call(mock_auth)
+        assert mock_pipeline_init.call_args == mocker.call(
+            mock_auth, keep_alive=None, ping_timeout=None, max_round_trip_time=None
+        )
+
+    @pytest.mark.it(
+        "Passes the keep_alive, ping_timeout and max_round_trip_time to the IoTHubPipeline"
+    )
+    def test_pipeline_keep_alive(self, mocker, client_class, connection_string):
+        mocker.patch("azure.iot.device.iothub.auth.SymmetricKeyAuthenticationProvider")
+        mock_pipeline_init = mocker.patch("azure.iot.device.iothub.pipeline.IoTHubPipeline")
+
+        client_class.create_from_connection_string(
+            connection_string, keep_alive=15, ping_timeout=5, max_round_trip_time=2
+        )
+
+        assert mock_pipeline_init.call_args == mocker.call(
+            mocker.ANY, keep_alive=15, ping_timeout=5, max_round_trip_time=2
+        )
 
     @pytest.mark.it("Uses the IoTHubPipeline to instantiate the client")
     @pytest.mark.parametrize(
@@ -195,7 +215,24 @@ class SharedClientCreateFromSharedAccessSignature(object):
         client_class.create_from_shared_access_signature(sas_token_string)
 
         assert mock_pipeline_init.call_count == 1
-        assert mock_pipeline_init.call_args == mocker.call(mock_auth)
+        assert mock_pipeline_init.call_args == mocker.call(
+            mock_auth, keep_alive=None, ping_timeout=None, max_round_trip_time=None
+        )
+
+    @pytest.mark.it(
+        "Passes the keep_alive, ping_timeout and max_round_trip_time to the IoTHubPipeline"
+    )
+    def test_pipeline_keep_alive(self, mocker, client_class, sas_token_string):
+        mocker.patch("azure.iot.device.iothub.auth.SharedAccessSignatureAuthenticationProvider")
+        mock_pipeline_init = mocker.patch("azure.iot.device.iothub.pipeline.IoTHubPipeline")
+
+        client_class.create_from_shared_access_signature(
+            sas_token_string, keep_alive=15, ping_timeout=5, max_round_trip_time=2
+        )
+
+        assert mock_pipeline_init.call_args == mocker.call(
+            mocker.ANY, keep_alive=15, ping_timeout=5, max_round_trip_time=2
+        )
 
     @pytest.mark.it("Uses the IoTHubPipeline to instantiate the client")
     async def test_client_instantiation(self, mocker, client_class, sas_token_string):
@@ -247,6 +284,16 @@ class SharedClientConnectTests(object):
         # Assert callback completion is waited upon
         assert cb_mock.completion.call_count == 1
 
+    @pytest.mark.it(
+        "Raises the error if the 'connect' pipeline operation is cancelled by a shutdown"
+    )
+    async def test_raises_cancelled_error(self, client, iothub_pipeline):
+        error = errors.OperationCancelledError()
+        iothub_pipeline.connect.side_effect = lambda callback: callback(error=error)
+
+        with pytest.raises(errors.OperationCancelledError):
+            await client.connect()
+
 
 class SharedClientDisconnectTests(object):
     @pytest.mark.it("Begins a 'disconnect' pipeline operation")
@@ -268,6 +315,38 @@ class SharedClientDisconnectTests(object):
         # Assert callback completion is waited upon
         assert cb_mock.completion.call_count == 1
 
+    @pytest.mark.it(
+        "Raises the error if the 'disconnect' pipeline operation is cancelled by a shutdown"
+    )
+    async def test_raises_cancelled_error(self, client, iothub_pipeline):
+        error = errors.OperationCancelledError()
+        iothub_pipeline.disconnect.side_effect = lambda callback: callback(error=error)
+
+        with pytest.raises(errors.OperationCancelledError):
+            await client.disconnect()
+
+
+class SharedClientShutdownTests(object):
+    @pytest.mark.it("Begins a 'shutdown' pipeline operation with the provided timeout")
+    async def test_calls_pipeline_shutdown(self, client, iothub_pipeline):
+        await client.shutdown(timeout=5)
+        assert iothub_pipeline.shutdown.call_count == 1
+        assert iothub_pipeline.shutdown.call_args[1]["timeout"] == 5
+
+    @pytest.mark.it(
+        "Waits for the completion of the 'shutdown' pipeline operation before returning"
+    )
+    async def test_waits_for_pipeline_op_completion(self, mocker, client, iothub_pipeline):
+        cb_mock = mocker.patch.object(async_adapter, "AwaitableCallback").return_value
+        cb_mock.completion.return_value = await create_completed_future(None)
+
+        await client.shutdown()
+
+        # Assert callback is sent to pipeline
+        assert iothub_pipeline.shutdown.call_args[1]["callback"] is cb_mock
+        # Assert callback completion is waited upon
+        assert cb_mock.completion.call_count == 1
+
 
 class SharedClientDisconnectEventTests(object):
     @pytest.mark.it("Clears all pending MethodRequests upon disconnect")
@@ -300,6 +379,16 @@ class SharedClientSendD2CMessageTests(object):
         # Assert callback completion is waited upon
         assert cb_mock.completion.call_count == 1
 
+    @pytest.mark.it(
+        "Raises the error if the 'send_message' pipeline operation is cancelled by a shutdown"
+    )
+    async def test_raises_cancelled_error(self, client, iothub_pipeline, message):
+        error = errors.OperationCancelledError()
+        iothub_pipeline.send_message.side_effect = lambda message, callback: callback(error=error)
+
+        with pytest.raises(errors.OperationCancelledError):
+            await client.send_message(message)
+
     @pytest.mark.it(
         "Wraps 'message' input parameter in a Message object if it is not a Message object"
     )
@@ -424,6 +513,30 @@ class SharedClientSendMethodResponseTests(object):
         # Assert callback completion is waited upon
         assert cb_mock.completion.call_count == 1
 
+    @pytest.mark.it(
+        "Raises the error if the 'send_method_response' pipeline operation is cancelled by a shutdown"
+    )
+    async def test_raises_cancelled_error(self, client, iothub_pipeline, method_response):
+        error = errors.OperationCancelledError()
+        iothub_pipeline.send_method_response.side_effect = lambda response, callback: callback(
+            error=error
+        )
+
+        with pytest.raises(errors.OperationCancelledError):
+            await client.send_method_response(method_response)
+
+
+def real_pipeline_with_unanswered_twin_requests(mocker, request_timeout):
+    """Create a real IoTHubPipeline whose requests are never answered by the service"""
+    pipeline = IoTHubPipeline(mocker.MagicMock())
+    pipeline.feature_enabled[constant.TWIN] = True
+    stage = pipeline._pipeline
+    while not isinstance(stage, pipeline_stages_base.CoordinateRequestAndResponseStage):
+        stage = stage.next
+    stage.request_timeout = request_timeout
+    mocker.patch.object(stage.next, "run_op")
+    return pipeline
+
 
 class SharedClientGetTwinTests(object):
     @pytest.mark.it("Implicitly enables twin messaging feature if not already enabled")
@@ -449,6 +562,20 @@ class SharedClientGetTwinTests(object):
         await client.get_twin()
         assert iothub_pipeline.enable_feature.call_count == 0
 
+    @pytest.mark.it(
+        "Raises the error if enabling the twin messaging feature is cancelled by a shutdown"
+    )
+    async def test_enable_feature_cancelled(self, client, iothub_pipeline):
+        iothub_pipeline.feature_enabled.__getitem__.return_value = False
+        error = errors.OperationCancelledError()
+        iothub_pipeline.enable_feature.side_effect = lambda feature_name, callback: callback(
+            error=error
+        )
+
+        with pytest.raises(errors.OperationCancelledError):
+            await client.get_twin()
+        assert iothub_pipeline.get_twin.call_count == 0
+
     @pytest.mark.it("Begins a 'get_twin' pipeline operation")
     async def test_get_twin_calls_pipeline(self, client, iothub_pipeline):
         await client.get_twin()
@@ -482,6 +609,32 @@ class SharedClientGetTwinTests(object):
         returned_twin = await client.get_twin()
         assert returned_twin == twin
 
+    @pytest.mark.it("Raises the error if the 'get_twin' pipeline operation fails")
+    @pytest.mark.parametrize(
+        "error",
+        [
+            pytest.param(errors.TimeoutError(), id="TimeoutError"),
+            pytest.param(errors.ConnectionDroppedError(), id="ConnectionDroppedError"),
+            pytest.param(errors.PipelineError(), id="PipelineError"),
+            pytest.param(errors.OperationCancelledError(), id="OperationCancelledError"),
+        ],
+    )
+    async def test_raises_error_on_pipeline_op_failure(self, client, iothub_pipeline, error):
+        iothub_pipeline.get_twin.side_effect = lambda callback: callback(error=error)
+
+        with pytest.raises(type(error)):
+            await client.get_twin()
+
+    @pytest.mark.it(
+        "Raises TimeoutError if the service does not respond to the twin request in time"
+    )
+    async def test_request_timeout(self, mocker, client_class):
+        pipeline = real_pipeline_with_unanswered_twin_requests(mocker, request_timeout=0.1)
+        client = client_class(pipeline)
+
+        with pytest.raises(errors.TimeoutError):
+            await client.get_twin()
+
 
 class SharedClientPatchTwinReportedPropertiesTests(object):
     @pytest.mark.it("Implicitly enables twin messaging feature if not already enabled")
@@ -539,6 +692,94 @@ class SharedClientPatchTwinReportedPropertiesTests(object):
         # Assert callback completion is waited upon
         assert cb_mock.completion.call_count == 1
 
+    @pytest.mark.it(
+        "Raises the error if the 'patch_twin_reported_properties' pipeline operation fails"
+    )
+    @pytest.mark.parametrize(
+        "error",
+        [
+            pytest.param(errors.TimeoutError(), id="TimeoutError"),
+            pytest.param(errors.ConnectionDroppedError(), id="ConnectionDroppedError"),
+            pytest.param(errors.PipelineError(), id="PipelineError"),
+            pytest.param(errors.OperationCancelledError(), id="OperationCancelledError"),
+        ],
+    )
+    async def test_raises_error_on_pipeline_op_failure(
+        self, client, iothub_pipeline, twin_patch_reported, error
+    ):
+        iothub_pipeline.patch_twin_reported_properties.side_effect = (
+            lambda patch, callback: callback(error=error)
+        )
+
+        with pytest.raises(type(error)):
+            await client.patch_twin_reported_properties(twin_patch_reported)
+
+    @pytest.mark.it(
+        "Raises TimeoutError if the service does not respond to the reported properties patch in time"
+    )
+    async def test_request_timeout(self, mocker, client_class, twin_patch_reported):
+        pipeline = real_pipeline_with_unanswered_twin_requests(mocker, request_timeout=0.1)
+        client = client_class(pipeline)
+
+        with pytest.raises(errors.TimeoutError):
+            await client.patch_twin_reported_properties(twin_patch_reported)
+
+    @pytest.mark.it(
+        "Does not treat a failed patch as acknowledged, if reported properties diffing is enabled"
+    )
+    async def test_diffing_failed_patch(self, client, iothub_pipeline):
+        client.enable_reported_properties_diffing()
+        iothub_pipeline.patch_twin_reported_properties.side_effect = (
+            lambda patch, callback: callback(error=errors.TimeoutError())
+        )
+        with pytest.raises(errors.TimeoutError):
+            await client.patch_twin_reported_properties({"house": "Gryffindor"})
+
+        iothub_pipeline.patch_twin_reported_properties.side_effect = None
+        await client.patch_twin_reported_properties({"house": "Gryffindor"})
+
+        assert iothub_pipeline.patch_twin_reported_properties.call_count == 2
+        assert iothub_pipeline.patch_twin_reported_properties.call_args[1]["patch"] == {
+            "house": "Gryffindor"
+        }
+
+    @pytest.mark.it(
+        "Sends only the properties which change the acknowledged reported properties, if reported properties diffing is enabled"
+    )
+    async def test_diffing(self, client, iothub_pipeline):
+        client.enable_reported_properties_diffing()
+        await client.patch_twin_reported_properties(
+            {"house": "Gryffindor", "pet": {"owl": "Hedwig"}}
+        )
+        await client.patch_twin_reported_properties(
+            {"house": "Gryffindor", "pet": {"owl": "Hedwig", "rat": "Scabbers"}, "wand": None}
+        )
+
+        assert iothub_pipeline.patch_twin_reported_properties.call_count == 2
+        assert iothub_pipeline.patch_twin_reported_properties.call_args[1]["patch"] == {
+            "pet": {"rat": "Scabbers"},
+            "wand": None,
+        }
+
+    @pytest.mark.it(
+        "Does not send a patch which does not change the acknowledged reported properties, if reported properties diffing is enabled"
+    )
+    async def test_diffing_unchanged(self, client, iothub_pipeline):
+        client.enable_reported_properties_diffing()
+        await client.patch_twin_reported_properties({"house": "Gryffindor"})
+        await client.patch_twin_reported_properties({"house": "Gryffindor"})
+
+        assert iothub_pipeline.patch_twin_reported_properties.call_count == 1
+
+    @pytest.mark.it("Sends the patch as provided, if reported properties diffing is disabled")
+    async def test_diffing_disabled(self, client, iothub_pipeline):
+        client.enable_reported_properties_diffing()
+        client.disable_reported_properties_diffing()
+        await client.patch_twin_reported_properties({"house": "Gryffindor"})
+        await client.patch_twin_reported_properties({"house": "Gryffindor"})
+
+        assert iothub_pipeline.patch_twin_reported_properties.call_count == 2
+
 
 class SharedClientReceiveTwinDesiredPropertiesPatchTests(object):
     @pytest.mark.it("Implicitly enables twin patch messaging feature if not already enabled")
@@ -581,6 +822,148 @@ class SharedClientReceiveTwinDesiredPropertiesPatchTests(object):
         assert received_patch is twin_patch_desired
 
 
+class SharedClientPayloadCompressionTests(object):
+    @pytest.mark.it("Enables gzip compression on the IoTHubPipeline with default settings")
+    def test_enable_defaults(self, mocker, client, iothub_pipeline):
+        client.enable_payload_compression()
+
+        assert iothub_pipeline.set_payload_compression.call_count == 1
+        assert iothub_pipeline.set_payload_compression.call_args == mocker.call(
+            encoding="gzip", threshold=1024, level=6, dictionary=None, dictionary_id=None
+        )
+
+    @pytest.mark.it("Enables compression on the IoTHubPipeline with the provided settings")
+    def test_enable(self, mocker, client, iothub_pipeline):
+        client.enable_payload_compression(
+            encoding="deflate", threshold=1, level=9, dictionary=b"Leviosa", dictionary_id="charms"
+        )
+
+        assert iothub_pipeline.set_payload_compression.call_args == mocker.call(
+            encoding="deflate", threshold=1, level=9, dictionary=b"Leviosa", dictionary_id="charms"
+        )
+
+    @pytest.mark.it("Disables compression on the IoTHubPipeline")
+    def test_disable(self, mocker, client, iothub_pipeline):
+        client.disable_payload_compression()
+
+        assert iothub_pipeline.set_payload_compression.call_args == mocker.call(encoding=None)
+
+
+class SharedClientTelemetryAggregationTests(object):
+    @pytest.mark.it("Enables aggregation on the IoTHubPipeline with the provided settings")
+    @pytest.mark.parametrize("window_size, window_interval", [(100, None), (None, 1.5), (100, 1.5)])
+    def test_enable(self, mocker, client, iothub_pipeline, window_size, window_interval):
+        client.enable_telemetry_aggregation(
+            window_size=window_size, window_interval=window_interval
+        )
+
+        assert iothub_pipeline.set_telemetry_aggregation.call_count == 1
+        assert iothub_pipeline.set_telemetry_aggregation.call_args == mocker.call(
+            window_size=window_size, window_interval=window_interval
+        )
+
+    @pytest.mark.it("Raises a ValueError if neither window_size nor window_interval is provided")
+    def test_enable_no_window(self, client, iothub_pipeline):
+        with pytest.raises(ValueError):
+            client.enable_telemetry_aggregation()
+
+        assert iothub_pipeline.set_telemetry_aggregation.call_count == 0
+
+    @pytest.mark.it("Disables aggregation on the IoTHubPipeline")
+    def test_disable(self, mocker, client, iothub_pipeline):
+        client.disable_telemetry_aggregation()
+
+        assert iothub_pipeline.set_telemetry_aggregation.call_args == mocker.call(
+            window_size=None, window_interval=None
+        )
+
+
+class SharedClientRateLimitingTests(object):
+    @pytest.mark.it("Sets the provided RateLimits on the IoTHubPipeline")
+    def test_enable(self, mocker, client, iothub_pipeline):
+        rate_limits = RateLimits.for_tier("S1")
+        client.enable_rate_limiting(rate_limits)
+
+        assert iothub_pipeline.set_rate_limits.call_count == 1
+        assert iothub_pipeline.set_rate_limits.call_args == mocker.call(rate_limits)
+
+    @pytest.mark.it("Removes the RateLimits from the IoTHubPipeline")
+    def test_disable(self, mocker, client, iothub_pipeline):
+        client.disable_rate_limiting()
+
+        assert iothub_pipeline.set_rate_limits.call_args == mocker.call(None)
+
+
+class SharedClientTwinPatchCoalescingTests(object):
+    @pytest.mark.it("Enables coalescing of twin patches on the InboxManager")
+    def test_enable(self, client):
+        client.enable_twin_patch_coalescing()
+        assert client._inbox_manager.coalesce_twin_patches is True
+
+    @pytest.mark.it("Disables coalescing of twin patches on the InboxManager")
+    def test_disable(self, client):
+        client.enable_twin_patch_coalescing()
+        client.disable_twin_patch_coalescing()
+        assert client._inbox_manager.coalesce_twin_patches is False
+
+    @pytest.mark.it("Receives a single merged patch for the patches which arrived while enabled")
+    @pytest.mark.asyncio
+    async def test_receives_merged_patch(self, client, iothub_pipeline):
+        iothub_pipeline.feature_enabled.__getitem__.return_value = True
+        client.enable_twin_patch_coalescing()
+        iothub_pipeline.on_twin_patch_received({"house": "Gryffindor", "$version": 1})
+        iothub_pipeline.on_twin_patch_received({"wand": "holly", "$version": 2})
+
+        patch = await client.receive_twin_desired_properties_patch()
+        assert patch == {"house": "Gryffindor", "wand": "holly", "$version": 2}
+        assert client._inbox_manager.get_twin_patch_inbox().empty()
+
+
+class SharedClientTelemetryQosTests(object):
+    @pytest.mark.it("Gets the telemetry_qos from the IoTHubPipeline")
+    def test_get(self, client, iothub_pipeline):
+        iothub_pipeline.telemetry_qos = 0
+        assert client.telemetry_qos == 0
+
+    @pytest.mark.it("Sets the telemetry_qos on the IoTHubPipeline")
+    @pytest.mark.parametrize("qos", [0, 1])
+    def test_set(self, client, iothub_pipeline, qos):
+        client.telemetry_qos = qos
+        assert iothub_pipeline.telemetry_qos == qos
+
+    @pytest.mark.it("Raises a ValueError if set to a qos other than 0 or 1")
+    @pytest.mark.parametrize("qos", [-1, 2, None])
+    def test_set_invalid(self, client, iothub_pipeline, qos):
+        iothub_pipeline.telemetry_qos = 1
+        with pytest.raises(ValueError):
+            client.telemetry_qos = qos
+        assert iothub_pipeline.telemetry_qos == 1
+
+
+class SharedClientStatisticsTests(object):
+    @pytest.mark.it("Returns the statistics from the IoTHubPipeline merged with those of the inboxes")
+    def test_get_statistics(self, client, iothub_pipeline):
+        iothub_pipeline.get_statistics.return_value = {"publishes_sent": 3, "bytes_sent": 42}
+        client._inbox_manager.route_twin_patch({"house": "Hufflepuff"})
+
+        statistics = client.get_statistics()
+
+        assert iothub_pipeline.get_statistics.call_count == 1
+        assert statistics["publishes_sent"] == 3
+        assert statistics["bytes_sent"] == 42
+        assert statistics["inbox_items_routed"] == 1
+        assert statistics["inbox_depth"] == 1
+
+    @pytest.mark.it("Resets the statistics in the IoTHubPipeline and the inboxes")
+    def test_reset_statistics(self, client, iothub_pipeline):
+        client._inbox_manager.route_twin_patch({"house": "Hufflepuff"})
+
+        client.reset_statistics()
+
+        assert iothub_pipeline.reset_statistics.call_count == 1
+        assert client.get_statistics()["inbox_items_routed"] == 0
+
+
 ################
 # DEVICE TESTS #
 ################
@@ -675,7 +1058,9 @@ class TestIoTHubDeviceClientCreateFromX509Certificate(IoTHubDeviceClientTestsCon
         )
 
         assert mock_pipeline_init.call_count == 1
-        assert mock_pipeline_init.call_args == mocker.call(mock_auth)
+        assert mock_pipeline_init.call_args == mocker.call(
+            mock_auth, keep_alive=None, ping_timeout=None, max_round_trip_time=None
+        )
 
     @pytest.mark.it("Uses the IoTHubPipeline to instantiate the client")
     async def test_client_instantiation(self, mocker, client_class, x509):
@@ -708,6 +1093,11 @@ class TestIoTHubDeviceClientDisconnect(IoTHubDeviceClientTestsConfig, SharedClie
     pass
 
 
+@pytest.mark.describe("IoTHubDeviceClient (Asynchronous) - .shutdown()")
+class TestIoTHubDeviceClientShutdown(IoTHubDeviceClientTestsConfig, SharedClientShutdownTests):
+    pass
+
+
 @pytest.mark.describe("IoTHubDeviceClient (Asynchronous) - EVENT: Disconnect")
 class TestIoTHubDeviceClientDisconnectEvent(
     IoTHubDeviceClientTestsConfig, SharedClientDisconnectEventTests
@@ -760,6 +1150,69 @@ class TestIoTHubDeviceClientReceiveC2DMessage(IoTHubDeviceClientTestsConfig):
         assert received_message is message
 
 
+@pytest.mark.describe("IoTHubDeviceClient (Asynchronous) - .receive_messages()")
+class TestIoTHubDeviceClientReceiveC2DMessages(IoTHubDeviceClientTestsConfig):
+    @pytest.mark.it("Implicitly enables C2D messaging feature if not already enabled")
+    async def test_enables_c2d_messaging_only_if_not_already_enabled(
+        self, client, iothub_pipeline, message
+    ):
+        client._inbox_manager.get_c2d_message_inbox()._put(message)
+
+        iothub_pipeline.feature_enabled.__getitem__.return_value = False  # C2D will appear disabled
+        await client.receive_messages(10)
+        assert iothub_pipeline.enable_feature.call_count == 1
+        assert iothub_pipeline.enable_feature.call_args[0][0] == constant.C2D_MSG
+
+    @pytest.mark.it("Returns the available messages from the C2D inbox, up to max_messages")
+    async def test_returns_messages_from_c2d_inbox(self, client, iothub_pipeline):
+        iothub_pipeline.feature_enabled.__getitem__.return_value = True  # C2D will appear enabled
+        messages = [Message(str(i)) for i in range(3)]
+        for message in messages:
+            client._inbox_manager.get_c2d_message_inbox()._put(message)
+
+        assert await client.receive_messages(2) == messages[:2]
+        assert await client.receive_messages(2) == messages[2:]
+
+    @pytest.mark.it("Raises InboxEmpty exception after the timeout if there are no messages")
+    async def test_times_out(self, client, iothub_pipeline):
+        iothub_pipeline.feature_enabled.__getitem__.return_value = True  # C2D will appear enabled
+        with pytest.raises(InboxEmpty):
+            await client.receive_messages(10, timeout=0.01)
+
+
+@pytest.mark.describe("IoTHubDeviceClient (Asynchronous) - .messages()")
+class TestIoTHubDeviceClientMessages(IoTHubDeviceClientTestsConfig):
+    @pytest.mark.it("Implicitly enables C2D messaging feature if not already enabled")
+    async def test_enables_c2d_messaging(self, client, iothub_pipeline, message):
+        client._inbox_manager.get_c2d_message_inbox()._put(message)
+        iothub_pipeline.feature_enabled.__getitem__.return_value = False  # C2D will appear disabled
+
+        assert await client.messages().__anext__() is message
+        assert iothub_pipeline.enable_feature.call_count == 1
+        assert iothub_pipeline.enable_feature.call_args[0][0] == constant.C2D_MSG
+
+    @pytest.mark.it("Iterates over the messages in the C2D inbox, in order")
+    async def test_iterates_over_c2d_inbox(self, client, iothub_pipeline):
+        iothub_pipeline.feature_enabled.__getitem__.return_value = True  # C2D will appear enabled
+        messages = [Message(str(i)) for i in range(3)]
+        for message in messages:
+            client._inbox_manager.get_c2d_message_inbox()._put(message)
+
+        received_messages = []
+        async for message in client.messages(prefetch=2):
+            received_messages.append(message)
+            if len(received_messages) == len(messages):
+                break
+
+        assert received_messages == messages
+        assert iothub_pipeline.enable_feature.call_count == 0
+
+    @pytest.mark.it("Raises a ValueError if prefetch is less than 1")
+    async def test_invalid_prefetch(self, client):
+        with pytest.raises(ValueError):
+            client.messages(prefetch=0)
+
+
 @pytest.mark.describe("IoTHubDeviceClient (Asynchronous) - .receive_method_request()")
 class TestIoTHubDeviceClientReceiveMethodRequest(
     IoTHubDeviceClientTestsConfig, SharedClientReceiveMethodRequestTests
@@ -795,6 +1248,52 @@ class TestIoTHubDeviceClientReceiveTwinDesiredPropertiesPatch(
     pass
 
 
+@pytest.mark.describe(
+    "IoTHubDeviceClient (Asynchronous) - .enable_payload_compression() / .disable_payload_compression()"
+)
+class TestIoTHubDeviceClientPayloadCompression(
+    IoTHubDeviceClientTestsConfig, SharedClientPayloadCompressionTests
+):
+    pass
+
+
+@pytest.mark.describe(
+    "IoTHubDeviceClient (Asynchronous) - .enable_telemetry_aggregation() / .disable_telemetry_aggregation()"
+)
+class TestIoTHubDeviceClientTelemetryAggregation(
+    IoTHubDeviceClientTestsConfig, SharedClientTelemetryAggregationTests
+):
+    pass
+
+
+@pytest.mark.describe(
+    "IoTHubDeviceClient (Asynchronous) - .enable_rate_limiting() / .disable_rate_limiting()"
+)
+class TestIoTHubDeviceClientRateLimiting(IoTHubDeviceClientTestsConfig, SharedClientRateLimitingTests):
+    pass
+
+
+@pytest.mark.describe(
+    "IoTHubDeviceClient (Asynchronous) - .enable_twin_patch_coalescing() / .disable_twin_patch_coalescing()"
+)
+class TestIoTHubDeviceClientTwinPatchCoalescing(
+    IoTHubDeviceClientTestsConfig, SharedClientTwinPatchCoalescingTests
+):
+    pass
+
+
+@pytest.mark.describe("IoTHubDeviceClient (Asynchronous) - .telemetry_qos")
+class TestIoTHubDeviceClientTelemetryQos(
+    IoTHubDeviceClientTestsConfig, SharedClientTelemetryQosTests
+):
+    pass
+
+
+@pytest.mark.describe("IoTHubDeviceClient (Asynchronous) - .get_statistics()")
+class TestIoTHubDeviceClientStatistics(IoTHubDeviceClientTestsConfig, SharedClientStatisticsTests):
+    pass
+
+
 ################
 # MODULE TESTS #
 ################
@@ -940,7 +1439,9 @@ class TestIoTHubModuleClientCreateFromEdgeEnvironmentWithContainerEnv(
         client_class.create_from_edge_environment()
 
         assert mock_iothub_pipeline_init.call_count == 1
-        assert mock_iothub_pipeline_init.call_args == mocker.call(mock_auth)
+        assert mock_iothub_pipeline_init.call_args == mocker.call(
+            mock_auth, keep_alive=None, ping_timeout=None, max_round_trip_time=None
+        )
         assert mock_edge_pipeline_init.call_count == 1
         assert mock_edge_pipeline_init.call_args == mocker.call(mock_auth)
 
@@ -1102,9 +1603,13 @@ class TestIoTHubModuleClientCreateFromEdgeEnvironmentWithDebugEnv(IoTHubModuleCl
         client_class.create_from_edge_environment()
 
         assert mock_iothub_pipeline_init.call_count == 1
-        assert mock_iothub_pipeline_init.call_args == mocker.call(mock_auth)
+        assert mock_iothub_pipeline_init.call_args == mocker.call(
+            mock_auth, keep_alive=None, ping_timeout=None, max_round_trip_time=None
+        )
         assert mock_edge_pipeline_init.call_count == 1
-        assert mock_iothub_pipeline_init.call_args == mocker.call(mock_auth)
+        assert mock_iothub_pipeline_init.call_args == mocker.call(
+            mock_auth, keep_alive=None, ping_timeout=None, max_round_trip_time=None
+        )
 
     @pytest.mark.it("Uses the IoTHubPipeline and the EdgePipeline to instantiate the client")
     async def test_client_instantiation(
@@ -1228,7 +1733,9 @@ class TestIoTHubModuleClientCreateFromX509Certificate(IoTHubModuleClientTestsCon
         )
 
         assert mock_pipeline_init.call_count == 1
-        assert mock_pipeline_init.call_args == mocker.call(mock_auth)
+        assert mock_pipeline_init.call_args == mocker.call(
+            mock_auth, keep_alive=None, ping_timeout=None, max_round_trip_time=None
+        )
 
     @pytest.mark.it("Uses the IoTHubPipeline to instantiate the client")
     async def test_client_instantiation(self, mocker, client_class, x509):
@@ -1261,6 +1768,11 @@ class TestIoTHubModuleClientDisconnect(IoTHubModuleClientTestsConfig, SharedClie
     pass
 
 
+@pytest.mark.describe("IoTHubModuleClient (Asynchronous) - .shutdown()")
+class TestIoTHubModuleClientShutdown(IoTHubModuleClientTestsConfig, SharedClientShutdownTests):
+    pass
+
+
 @pytest.mark.describe("IoTHubModuleClient (Asynchronous) - EVENT: Disconnect")
 class TestIoTHubModuleClientDisconnectEvent(
     IoTHubModuleClientTestsConfig, SharedClientDisconnectEventTests
@@ -1370,6 +1882,60 @@ class TestIoTHubModuleClientReceiveInputMessage(IoTHubModuleClientTestsConfig):
         assert received_message is message
 
 
+@pytest.mark.describe("IoTHubModuleClient (Asynchronous) - .receive_messages_on_input()")
+class TestIoTHubModuleClientReceiveInputMessages(IoTHubModuleClientTestsConfig):
+    @pytest.mark.it("Implicitly enables input messaging feature if not already enabled")
+    async def test_enables_input_messaging_only_if_not_already_enabled(
+        self, client, iothub_pipeline, message
+    ):
+        client._inbox_manager.get_input_message_inbox("some_input")._put(message)
+
+        iothub_pipeline.feature_enabled.__getitem__.return_value = False
+        await client.receive_messages_on_input("some_input", 10)
+        assert iothub_pipeline.enable_feature.call_count == 1
+        assert iothub_pipeline.enable_feature.call_args[0][0] == constant.INPUT_MSG
+
+    @pytest.mark.it(
+        "Returns the available messages from the inbox for the input, up to max_messages"
+    )
+    async def test_returns_messages_from_input_inbox(self, client, iothub_pipeline):
+        iothub_pipeline.feature_enabled.__getitem__.return_value = True
+        messages = [Message(str(i)) for i in range(3)]
+        for message in messages:
+            client._inbox_manager.get_input_message_inbox("some_input")._put(message)
+        client._inbox_manager.get_input_message_inbox("other_input")._put(Message("other"))
+
+        assert await client.receive_messages_on_input("some_input", 10) == messages
+
+
+@pytest.mark.describe("IoTHubModuleClient (Asynchronous) - .input_messages()")
+class TestIoTHubModuleClientInputMessages(IoTHubModuleClientTestsConfig):
+    @pytest.mark.it("Implicitly enables input messaging feature if not already enabled")
+    async def test_enables_input_messaging(self, client, iothub_pipeline, message):
+        client._inbox_manager.get_input_message_inbox("some_input")._put(message)
+        iothub_pipeline.feature_enabled.__getitem__.return_value = False
+
+        assert await client.input_messages("some_input").__anext__() is message
+        assert iothub_pipeline.enable_feature.call_count == 1
+        assert iothub_pipeline.enable_feature.call_args[0][0] == constant.INPUT_MSG
+
+    @pytest.mark.it("Iterates over the messages in the inbox for the input, in order")
+    async def test_iterates_over_input_inbox(self, client, iothub_pipeline):
+        iothub_pipeline.feature_enabled.__getitem__.return_value = True
+        messages = [Message(str(i)) for i in range(3)]
+        for message in messages:
+            client._inbox_manager.get_input_message_inbox("some_input")._put(message)
+        client._inbox_manager.get_input_message_inbox("other_input")._put(Message("other"))
+
+        received_messages = []
+        async for message in client.input_messages("some_input", prefetch=2):
+            received_messages.append(message)
+            if len(received_messages) == len(messages):
+                break
+
+        assert received_messages == messages
+
+
 @pytest.mark.describe("IoTHubModuleClient (Asynchronous) - .receive_method_request()")
 class TestIoTHubModuleClientReceiveMethodRequest(
     IoTHubModuleClientTestsConfig, SharedClientReceiveMethodRequestTests
@@ -1403,3 +1969,99 @@ class TestIoTHubModuleClientReceiveTwinDesiredPropertiesPatch(
     IoTHubModuleClientTestsConfig, SharedClientReceiveTwinDesiredPropertiesPatchTests
 ):
     pass
+
+
+@pytest.mark.describe(
+    "IoTHubModuleClient (Asynchronous) - .enable_payload_compression() / .disable_payload_compression()"
+)
+class TestIoTHubModuleClientPayloadCompression(
+    IoTHubModuleClientTestsConfig, SharedClientPayloadCompressionTests
+):
+    pass
+
+
+@pytest.mark.describe(
+    "IoTHubModuleClient (Asynchronous) - .enable_telemetry_aggregation() / .disable_telemetry_aggregation()"
+)
+class TestIoTHubModuleClientTelemetryAggregation(
+    IoTHubModuleClientTestsConfig, SharedClientTelemetryAggregationTests
+):
+    pass
+
+
+@pytest.mark.describe(
+    "IoTHubModuleClient (Asynchronous) - .enable_rate_limiting() / .disable_rate_limiting()"
+)
+class TestIoTHubModuleClientRateLimiting(IoTHubModuleClientTestsConfig, SharedClientRateLimitingTests):
+    pass
+
+
+@pytest.mark.describe(
+    "IoTHubModuleClient (Asynchronous) - .enable_twin_patch_coalescing() / .disable_twin_patch_coalescing()"
+)
+class TestIoTHubModuleClientTwinPatchCoalescing(
+    IoTHubModuleClientTestsConfig, SharedClientTwinPatchCoalescingTests
+):
+    pass
+
+
+@pytest.mark.describe("IoTHubModuleClient (Asynchronous) - .telemetry_qos")
+class TestIoTHubModuleClientTelemetryQos(
+    IoTHubModuleClientTestsConfig, SharedClientTelemetryQosTests
+):
+    pass
+
+
+@pytest.mark.describe("IoTHubModuleClient (Asynchronous) - .get_statistics()")
+class TestIoTHubModuleClientStatistics(IoTHubModuleClientTestsConfig, SharedClientStatisticsTests):
+    pass
+
+
+@pytest.mark.describe("connect_all() (Asynchronous)")
+class TestConnectAll(object):
+    @pytest.fixture
+    def clients(self, mocker):
+        clients = [mocker.MagicMock() for _ in range(5)]
+        for client in clients:
+            client.connect.side_effect = lambda: create_completed_future()
+        return clients
+
+    @pytest.mark.it("Connects every client")
+    async def test_connects_clients(self, clients):
+        await async_clients.connect_all(clients)
+        for client in clients:
+            assert client.connect.call_count == 1
+
+    @pytest.mark.it("Connects clients at the same time, up to max_concurrent_connects")
+    @pytest.mark.parametrize(
+        "max_concurrent_connects", [pytest.param(1, id="One"), pytest.param(3, id="Three")]
+    )
+    async def test_concurrency(self, clients, max_concurrent_connects):
+        counts = {"connecting": 0, "max": 0}
+
+        async def connect():
+            counts["connecting"] += 1
+            counts["max"] = max(counts["max"], counts["connecting"])
+            await asyncio.sleep(0.01)
+            counts["connecting"] -= 1
+
+        for client in clients:
+            client.connect.side_effect = connect
+        await async_clients.connect_all(clients, max_concurrent_connects=max_concurrent_connects)
+
+        assert counts["max"] == max_concurrent_connects
+
+    @pytest.mark.it("Limits the rate at which clients start connecting")
+    async def test_rate_limit(self, mocker, clients):
+        mock_bucket = mocker.patch.object(async_clients, "TokenBucket").return_value
+        mock_bucket.reserve.return_value = 0
+        await async_clients.connect_all(clients, connections_per_second=20)
+
+        assert async_clients.TokenBucket.call_args == mocker.call(20)
+        assert mock_bucket.reserve.call_count == len(clients)
+
+    @pytest.mark.it("Raises the error if a client fails to connect")
+    async def test_connect_fails(self, clients):
+        clients[0].connect.side_effect = ValueError()
+        with pytest.raises(ValueError):
+            await async_clients.connect_all(clients)
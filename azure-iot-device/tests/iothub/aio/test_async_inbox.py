@@ -7,14 +7,11 @@
 import pytest
 import asyncio
 import logging
-from azure.iot.device.iothub.aio.async_inbox import AsyncClientInbox
+from azure.iot.device.iothub.aio.async_inbox import AsyncClientInbox, AsyncInboxIterator
+from azure.iot.device.iothub.sync_inbox import InboxEmpty
 
 logging.basicConfig(level=logging.INFO)
 
-# Note that some small delays need to be added at the end of async tests due to
-# RuntimeWarnings being thrown by the test ending before janus can correctly
-# resolve its Futures. This may be a bug in janus.
-
 
 @pytest.mark.describe("AsyncClientInbox")
 class TestAsyncClientInbox(object):
@@ -41,7 +38,6 @@ class TestAsyncClientInbox(object):
         assert not inbox.empty()
         await inbox.get()
         assert inbox.empty()
-        await asyncio.sleep(0.01)  # Do this to prevent RuntimeWarning from janus
 
     @pytest.mark.it("Operates according to FIFO")
     @pytest.mark.asyncio
@@ -58,8 +54,6 @@ class TestAsyncClientInbox(object):
         assert await inbox.get() is item2
         assert await inbox.get() is item3
 
-        await asyncio.sleep(0.01)  # Do this to prevent RuntimeWarning from janus
-
 
 @pytest.mark.describe("AsyncClientInbox - ._put()")
 class TestAsyncClientInboxPut(object):
@@ -73,6 +67,47 @@ class TestAsyncClientInboxPut(object):
         assert item in inbox
 
 
+@pytest.mark.describe("AsyncClientInbox - ._put_coalesced()")
+class TestAsyncClientInboxPutCoalesced(object):
+    @pytest.mark.it("Adds the given item to the inbox, if the inbox is empty")
+    def test_adds_item_to_empty_inbox(self, mocker):
+        inbox = AsyncClientInbox()
+        merge = mocker.MagicMock()
+        inbox._put_coalesced("item", merge)
+
+        assert inbox.qsize() == 1
+        assert "item" in inbox
+        assert merge.call_count == 0
+
+    @pytest.mark.it(
+        "Replaces the last item in the inbox with the result of merging the given item into it"
+    )
+    def test_merges_into_last_item(self, mocker):
+        inbox = AsyncClientInbox()
+        inbox._put("item1")
+        inbox._put("item2")
+        merge = mocker.MagicMock(return_value="merged")
+        inbox._put_coalesced("item3", merge)
+
+        assert merge.call_args == mocker.call("item2", "item3")
+        assert inbox.qsize() == 2
+        assert "item1" in inbox
+        assert "merged" in inbox
+        assert "item2" not in inbox
+
+    @pytest.mark.it("Adds the given item after the last item, if they cannot be merged")
+    def test_cannot_merge(self, mocker):
+        inbox = AsyncClientInbox()
+        inbox._put("item1")
+        merge = mocker.MagicMock(return_value=None)
+        inbox._put_coalesced("item2", merge)
+
+        assert merge.call_args == mocker.call("item1", "item2")
+        assert inbox.qsize() == 2
+        assert "item1" in inbox
+        assert "item2" in inbox
+
+
 @pytest.mark.describe("AsyncClientInbox - .get()")
 @pytest.mark.asyncio
 class TestAsyncClientInboxGet(object):
@@ -87,8 +122,6 @@ class TestAsyncClientInboxGet(object):
         assert retrieved_item is item
         assert inbox.empty()
 
-        await asyncio.sleep(0.01)  # Do this to prevent RuntimeWarning from janus
-
     @pytest.mark.it(
         "Blocks on an empty inbox until an item is available to remove and return, if using blocking mode"
     )
@@ -107,6 +140,88 @@ class TestAsyncClientInboxGet(object):
 
         await asyncio.gather(wait_for_item(), insert_item())
 
+    @pytest.mark.it("Returns an item added from another thread")
+    async def test_item_added_from_another_thread(self, mocker):
+        inbox = AsyncClientInbox()
+        item = mocker.MagicMock()
+        loop = asyncio.get_event_loop()
+
+        async def insert_item():
+            await asyncio.sleep(0.1)
+            await loop.run_in_executor(None, inbox._put, item)
+
+        retrieved_item, _ = await asyncio.gather(inbox.get(), insert_item())
+        assert retrieved_item is item
+
+    @pytest.mark.it(
+        "Schedules a single callback on the event loop for all items added while a coroutine is waiting"
+    )
+    async def test_single_wakeup(self, mocker):
+        inbox = AsyncClientInbox()
+        loop = asyncio.get_event_loop()
+        call_soon_threadsafe_spy = mocker.spy(loop, "call_soon_threadsafe")
+
+        async def insert_items():
+            await asyncio.sleep(0.1)
+            for item in range(3):
+                inbox._put(item)
+
+        retrieved_item, _ = await asyncio.gather(inbox.get(), insert_items())
+        assert retrieved_item == 0
+        assert call_soon_threadsafe_spy.call_count == 1
+        assert inbox.qsize() == 2
+
+    @pytest.mark.it("Stops waiting for items if the waiting coroutine is cancelled")
+    async def test_cancelled(self):
+        inbox = AsyncClientInbox()
+        task = asyncio.ensure_future(inbox.get())
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        inbox._put("item")
+        assert "item" in inbox
+        assert inbox._waiters == []
+
+
+@pytest.mark.describe("AsyncClientInbox - .get_many()")
+@pytest.mark.asyncio
+class TestAsyncClientInboxGetMany(object):
+    @pytest.mark.it("Returns and removes the available items, in order, up to max_items")
+    async def test_returns_up_to_max_items(self):
+        inbox = AsyncClientInbox()
+        for item in range(5):
+            inbox._put(item)
+
+        assert await inbox.get_many(3) == [0, 1, 2]
+        assert await inbox.get_many(3) == [3, 4]
+        assert inbox.empty()
+
+    @pytest.mark.it("Waits on an empty inbox until an item is available to remove and return")
+    async def test_waits_for_item(self):
+        inbox = AsyncClientInbox()
+
+        async def insert_item():
+            await asyncio.sleep(0.1)
+            inbox._put("item")
+
+        items, _ = await asyncio.gather(inbox.get_many(10), insert_item())
+        assert items == ["item"]
+
+    @pytest.mark.it(
+        "Raises InboxEmpty exception after a timeout while waiting on an empty inbox, if a timeout is specified"
+    )
+    async def test_times_out(self):
+        inbox = AsyncClientInbox()
+        with pytest.raises(InboxEmpty):
+            await inbox.get_many(10, timeout=0.01)
+
+    @pytest.mark.it("Raises a ValueError if max_items is less than 1")
+    async def test_invalid_max_items(self):
+        with pytest.raises(ValueError):
+            await AsyncClientInbox().get_many(0)
+
 
 @pytest.mark.describe("AsyncClientInbox - .clear()")
 class TestAsyncClientInboxClear(object):
@@ -123,3 +238,119 @@ class TestAsyncClientInboxClear(object):
 
         inbox.clear()
         assert inbox.empty()
+
+
+@pytest.mark.describe("AsyncInboxIterator")
+@pytest.mark.asyncio
+class TestAsyncInboxIterator(object):
+    @pytest.mark.it("Returns the items from the inbox in order")
+    async def test_returns_items_in_order(self):
+        inbox = AsyncClientInbox()
+        for item in range(5):
+            inbox._put(item)
+
+        items = []
+        async for item in AsyncInboxIterator(inbox, prefetch=2):
+            items.append(item)
+            if len(items) == 5:
+                break
+
+        assert items == list(range(5))
+        assert inbox.empty()
+
+    @pytest.mark.it("Takes the items waiting in the inbox up to the prefetch depth at a time")
+    async def test_prefetch(self, mocker):
+        inbox = AsyncClientInbox()
+        for item in range(5):
+            inbox._put(item)
+        get_many_spy = mocker.spy(inbox, "get_many")
+        iterator = AsyncInboxIterator(inbox, prefetch=3)
+
+        for _ in range(3):
+            await iterator.__anext__()
+        assert get_many_spy.call_count == 1
+        assert get_many_spy.call_args == mocker.call(3)
+        assert inbox.qsize() == 2
+
+        await iterator.__anext__()
+        assert get_many_spy.call_count == 2
+        assert inbox.qsize() == 0
+
+    @pytest.mark.it("Waits for an item if the inbox is empty")
+    async def test_waits_for_item(self):
+        inbox = AsyncClientInbox()
+        iterator = AsyncInboxIterator(inbox)
+
+        async def insert_item():
+            await asyncio.sleep(0.1)
+            inbox._put("item")
+
+        item, _ = await asyncio.gather(iterator.__anext__(), insert_item())
+        assert item == "item"
+
+    @pytest.mark.it(
+        "Awaits before_wait each time it waits on the inbox, but not for prefetched items"
+    )
+    async def test_before_wait(self, mocker):
+        inbox = AsyncClientInbox()
+        for item in range(3):
+            inbox._put(item)
+        before_wait = mocker.MagicMock()
+
+        async def before_wait_coroutine():
+            before_wait()
+
+        iterator = AsyncInboxIterator(inbox, prefetch=2, before_wait=before_wait_coroutine)
+        await iterator.__anext__()
+        await iterator.__anext__()
+        assert before_wait.call_count == 1
+        await iterator.__anext__()
+        assert before_wait.call_count == 2
+
+    @pytest.mark.it(
+        "Puts the items it took but did not return back at the front of the inbox when closed"
+    )
+    async def test_aclose(self):
+        inbox = AsyncClientInbox()
+        for item in range(3):
+            inbox._put(item)
+        iterator = AsyncInboxIterator(inbox, prefetch=2)
+        assert await iterator.__anext__() == 0
+
+        await iterator.aclose()
+
+        assert await inbox.get_many(10) == [1, 2]
+
+    @pytest.mark.it(
+        "Puts the items it took but did not return back into the inbox when the consumer breaks out of its loop"
+    )
+    async def test_break(self):
+        inbox = AsyncClientInbox()
+        for item in range(5):
+            inbox._put(item)
+
+        async for item in AsyncInboxIterator(inbox, prefetch=4):
+            break
+
+        assert item == 0
+        assert await inbox.get_many(10) == [1, 2, 3, 4]
+
+    @pytest.mark.it("Wakes a coroutine waiting on the inbox when items are put back")
+    async def test_put_back_wakes_waiter(self):
+        inbox = AsyncClientInbox()
+        inbox._put("item")
+        iterator = AsyncInboxIterator(inbox, prefetch=2)
+        inbox._put("other")
+        # Both items are taken, so the next receive call has to wait
+        await iterator.__anext__()
+        waiter = asyncio.ensure_future(inbox.get())
+        await asyncio.sleep(0.1)
+
+        await iterator.aclose()
+
+        assert await asyncio.wait_for(waiter, 1) == "other"
+
+    @pytest.mark.it("Raises a ValueError if prefetch is less than 1")
+    async def test_invalid_prefetch(self):
+        with pytest.raises(ValueError):
+            AsyncInboxIterator(AsyncClientInbox(), prefetch=0)
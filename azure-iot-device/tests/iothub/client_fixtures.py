@@ -173,6 +173,7 @@ def edge_local_debug_environment():
 class FakeIoTHubPipeline:
     def __init__(self):
         self.feature_enabled = {}  # This just has to be here for the spec
+        self.telemetry_qos = 1
 
     def connect(self, callback=None):
         callback()
@@ -180,6 +181,9 @@ class FakeIoTHubPipeline:
     def disconnect(self, callback=None):
         callback()
 
+    def shutdown(self, timeout=None, callback=None):
+        callback()
+
     def enable_feature(self, feature_name, callback=None):
         callback()
 
@@ -195,12 +199,32 @@ class FakeIoTHubPipeline:
     def send_method_response(self, method_response, callback=None):
         callback()
 
+    def set_payload_compression(
+        self, encoding, threshold=1024, level=6, dictionary=None, dictionary_id=None, callback=None
+    ):
+        if callback:
+            callback()
+
+    def set_telemetry_aggregation(self, window_size=None, window_interval=None, callback=None):
+        if callback:
+            callback()
+
+    def set_rate_limits(self, rate_limits, callback=None):
+        if callback:
+            callback()
+
     def get_twin(self, callback=None):
         callback(None)
 
     def patch_twin_reported_properties(self, patch, callback=None):
         callback()
 
+    def get_statistics(self):
+        return {}
+
+    def reset_statistics(self):
+        pass
+
 
 @pytest.fixture
 def iothub_pipeline(mocker):
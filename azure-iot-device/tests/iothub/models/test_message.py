@@ -6,7 +6,7 @@
 
 import pytest
 import logging
-from azure.iot.device.iothub.models import Message
+from azure.iot.device.iothub.models import Message, decode_timeseries
 from azure.iot.device import constant
 
 logging.basicConfig(level=logging.INFO)
@@ -43,6 +43,12 @@ class TestMessage(object):
         assert msg.content_encoding == encoding
         assert msg.content_type == ctype
 
+    @pytest.mark.it("Instantiates with no qos by default, or with an optional qos")
+    def test_instantiates_with_optional_qos(self):
+        s = "After all this time? Always"
+        assert Message(s).qos is None
+        assert Message(s, qos=0).qos == 0
+
     @pytest.mark.it("Setting message as security message")
     def test_setting_message_as_security_message(self):
         s = "After all this time? Always"
@@ -62,3 +68,27 @@ class TestMessage(object):
     def test_str_rep(self, data):
         msg = Message(data)
         assert str(msg) == str(data)
+
+    @pytest.mark.it("Can be created from a batch of time-series samples")
+    @pytest.mark.parametrize(
+        "compress, expected_content_encoding", [(False, None), (True, "deflate")]
+    )
+    def test_from_timeseries(self, compress, expected_content_encoding):
+        timestamps = [1560000000000, 1560000000100]
+        msg = Message.from_timeseries(
+            timestamps,
+            {"temperature": [20.5, 21.0]},
+            compress=compress,
+            message_id="Hedwig",
+            output_name="owlery",
+            qos=0,
+        )
+
+        assert msg.content_type == constant.TIMESERIES_CONTENT_TYPE
+        assert msg.content_encoding == expected_content_encoding
+        assert msg.message_id == "Hedwig"
+        assert msg.output_name == "owlery"
+        assert msg.qos == 0
+        decoded_timestamps, columns = decode_timeseries(msg)
+        assert list(decoded_timestamps) == timestamps
+        assert list(columns["temperature"]) == [20.5, 21.0]
@@ -0,0 +1,72 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for
+# license information.
+# --------------------------------------------------------------------------
+
+import pytest
+import logging
+from azure.iot.device.iothub.models import RateLimits
+
+logging.basicConfig(level=logging.INFO)
+
+
+@pytest.mark.describe("RateLimits")
+class TestRateLimits(object):
+    @pytest.mark.it("Creates a TokenBucket for each operation class with a limit")
+    def test_buckets(self):
+        rate_limits = RateLimits(telemetry=100, twin=10)
+
+        assert rate_limits.telemetry.rate == 100
+        assert rate_limits.twin.rate == 10
+        assert rate_limits.methods is None
+
+    @pytest.mark.it("Sizes each TokenBucket to allow burst_seconds worth of operations")
+    def test_burst_seconds(self):
+        rate_limits = RateLimits(telemetry=100, twin=0.5, burst_seconds=2)
+
+        assert rate_limits.telemetry.capacity == 200
+        assert rate_limits.twin.capacity == 1
+
+    @pytest.mark.it("Gets the TokenBucket for an operation class")
+    def test_get_bucket(self):
+        rate_limits = RateLimits(telemetry=100)
+
+        assert rate_limits.get_bucket("telemetry") is rate_limits.telemetry
+        assert rate_limits.get_bucket("methods") is None
+
+    @pytest.mark.it("Raises a ValueError if a limit is not greater than 0")
+    def test_invalid_limit(self):
+        with pytest.raises(ValueError):
+            RateLimits(telemetry=0)
+
+
+@pytest.mark.describe("RateLimits - .for_tier()")
+class TestRateLimitsForTier(object):
+    @pytest.mark.it("Uses a fraction of the throttles of the tier and number of units")
+    @pytest.mark.parametrize(
+        "tier, units, telemetry, twin, methods",
+        [
+            pytest.param("S1", 1, 100, 50, 40, id="S1, 1 unit"),
+            pytest.param("S1", 20, 240, 50, 800, id="S1, 20 units"),
+            pytest.param("F1", 1, 100, 50, 40, id="Free"),
+            pytest.param("S2", 1, 120, 50, 120, id="S2, 1 unit"),
+            pytest.param("S2", 20, 2400, 100, 2400, id="S2, 20 units"),
+            pytest.param("s3", 2, 12000, 500, 12288, id="S3, 2 units"),
+        ],
+    )
+    def test_tier(self, tier, units, telemetry, twin, methods):
+        rate_limits = RateLimits.for_tier(tier, units=units, fraction=0.5)
+
+        assert rate_limits.telemetry.rate == pytest.approx(telemetry * 0.5)
+        assert rate_limits.twin.rate == pytest.approx(twin * 0.5)
+        assert rate_limits.methods.rate == pytest.approx(methods * 0.5)
+
+    @pytest.mark.it("Uses 90% of the throttles by default")
+    def test_default_fraction(self):
+        assert RateLimits.for_tier("S1").telemetry.rate == pytest.approx(90)
+
+    @pytest.mark.it("Raises a ValueError for an unknown tier")
+    def test_unknown_tier(self):
+        with pytest.raises(ValueError):
+            RateLimits.for_tier("S4")
@@ -0,0 +1,134 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for
+# license information.
+# --------------------------------------------------------------------------
+
+import array
+import json
+import struct
+import pytest
+import logging
+from azure.iot.device.iothub.models import timeseries
+from azure.iot.device.iothub.models.timeseries import encode_timeseries, decode_timeseries
+
+logging.basicConfig(level=logging.INFO)
+
+fake_timestamps = [1560000000000, 1560000000100, 1560000000200, 1560000000305]
+fake_columns = {"temperature": [20.5, 21.0, 21.25, 20.75], "humidity": [40, 41, 42, 43]}
+
+
+@pytest.mark.describe("Time-series encoding - .encode_timeseries() / .decode_timeseries()")
+class TestEncodeDecodeTimeseries(object):
+    @pytest.mark.it("Round-trips timestamps and columns")
+    @pytest.mark.parametrize("compress", [False, True], ids=["Uncompressed", "Compressed"])
+    def test_round_trip(self, compress):
+        timestamps, columns = decode_timeseries(
+            encode_timeseries(fake_timestamps, fake_columns, compress=compress)
+        )
+
+        assert list(timestamps) == fake_timestamps
+        assert {name: list(values) for name, values in columns.items()} == fake_columns
+
+    @pytest.mark.it("Decodes from bytes, bytearray or memoryview")
+    @pytest.mark.parametrize("buffer_type", [bytes, bytearray, memoryview])
+    def test_buffer_types(self, buffer_type):
+        payload = buffer_type(encode_timeseries(fake_timestamps, fake_columns))
+        timestamps, _ = decode_timeseries(payload)
+
+        assert list(timestamps) == fake_timestamps
+
+    @pytest.mark.it("Keeps the type of array.array columns")
+    @pytest.mark.parametrize("type_code", ["b", "B", "h", "H", "i", "I", "l", "q", "Q", "f", "d"])
+    def test_array_types(self, type_code):
+        values = array.array(type_code, [1, 2, 3, 4])
+        _, columns = decode_timeseries(encode_timeseries(fake_timestamps, {"wand": values}))
+
+        assert columns["wand"].itemsize == values.itemsize
+        assert list(columns["wand"]) == list(values)
+
+    @pytest.mark.it("Encodes sequences of numbers which are not arrays as 64 bit floats")
+    def test_list_columns(self):
+        _, columns = decode_timeseries(encode_timeseries(fake_timestamps, fake_columns))
+
+        assert columns["humidity"].typecode == "d"
+
+    @pytest.mark.it("Packs timestamp deltas with the narrowest integer type that holds them")
+    @pytest.mark.parametrize(
+        "delta, expected_size",
+        [
+            pytest.param(100, 1, id="8 bit"),
+            pytest.param(-1000, 2, id="16 bit"),
+            pytest.param(100000, 4, id="32 bit"),
+            pytest.param(10000000000, 8, id="64 bit"),
+        ],
+    )
+    def test_delta_size(self, delta, expected_size):
+        timestamps = [1560000000000 + delta * i for i in range(11)]
+        payload = encode_timeseries(timestamps, {})
+
+        # header, first timestamp, 10 deltas, column count
+        assert len(payload) == 10 + 8 + 10 * expected_size + 2
+        assert list(decode_timeseries(payload)[0]) == timestamps
+
+    @pytest.mark.it("Produces a much smaller payload than JSON")
+    def test_smaller_than_json(self):
+        timestamps = [1560000000000 + 100 * i for i in range(1000)]
+        values = [20.0 + (i % 10) / 10.0 for i in range(1000)]
+        as_json = json.dumps([{"t": t, "v": v} for t, v in zip(timestamps, values)])
+
+        assert len(encode_timeseries(timestamps, {"v": values})) < len(as_json) / 3
+        assert len(encode_timeseries(timestamps, {"v": values}, compress=True)) < len(as_json) / 50
+
+    @pytest.mark.it("Writes all values in little-endian byte order")
+    def test_little_endian(self):
+        payload = encode_timeseries([1, 2], {"x": array.array("h", [1, 2])})
+
+        assert payload.endswith(struct.pack("<hh", 1, 2))
+        assert payload[10:18] == struct.pack("<q", 1)
+
+    @pytest.mark.it("Raises a ValueError if a column does not have one value per timestamp")
+    def test_column_length_mismatch(self):
+        with pytest.raises(ValueError):
+            encode_timeseries(fake_timestamps, {"temperature": [20.5]})
+
+    @pytest.mark.it("Raises a ValueError if there are no timestamps")
+    def test_empty(self):
+        with pytest.raises(ValueError):
+            encode_timeseries([], {})
+
+    @pytest.mark.it("Raises a ValueError when decoding a payload which is not a time-series batch")
+    @pytest.mark.parametrize(
+        "payload",
+        [
+            pytest.param(b"Mischief managed", id="Not a batch"),
+            pytest.param(b"IOTS", id="Truncated header"),
+            pytest.param(
+                encode_timeseries(fake_timestamps, fake_columns)[:-1], id="Truncated column"
+            ),
+            pytest.param(b"IOTS\x02q\x01\x00\x00\x00" + b"\x00" * 10, id="Unknown version"),
+        ],
+    )
+    def test_invalid_payload(self, payload):
+        with pytest.raises(ValueError):
+            decode_timeseries(payload)
+
+    @pytest.mark.it("Round-trips NumPy arrays without converting them to lists")
+    def test_numpy(self):
+        numpy = pytest.importorskip("numpy")
+        timestamps = numpy.array(fake_timestamps, dtype=numpy.int64)
+        values = numpy.array([1, 2, 3, 4], dtype=numpy.float32)
+        decoded_timestamps, columns = decode_timeseries(
+            encode_timeseries(timestamps, {"wand": values})
+        )
+
+        assert list(decoded_timestamps) == fake_timestamps
+        assert columns["wand"].itemsize == 4
+        assert list(columns["wand"]) == [1, 2, 3, 4]
+        assert encode_timeseries(timestamps, {"wand": values}) == encode_timeseries(
+            fake_timestamps, {"wand": array.array("f", [1, 2, 3, 4])}
+        )
+
+    @pytest.mark.it("Identifies the encoding with a magic number")
+    def test_magic(self):
+        assert encode_timeseries(fake_timestamps, {}).startswith(timeseries.MAGIC)
@@ -0,0 +1,197 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for
+# license information.
+# --------------------------------------------------------------------------
+
+import pytest
+import logging
+from azure.iot.device.iothub.models.twin import (
+    merge_patches,
+    apply_patch,
+    reduce_patch,
+    ReportedPropertiesTracker,
+)
+
+logging.basicConfig(level=logging.INFO)
+
+
+@pytest.mark.describe("merge_patches()")
+class TestMergePatches(object):
+    @pytest.mark.it("Takes the values of the later patch, including its $version")
+    def test_later_values(self):
+        merged = merge_patches(
+            {"house": "Gryffindor", "$version": 1}, {"house": "Slytherin", "$version": 2}
+        )
+        assert merged == {"house": "Slytherin", "$version": 2}
+
+    @pytest.mark.it("Merges nested objects key by key")
+    def test_nested(self):
+        merged = merge_patches(
+            {"pet": {"owl": "Hedwig", "toad": "Trevor"}}, {"pet": {"toad": None, "rat": "Scabbers"}}
+        )
+        assert merged == {"pet": {"owl": "Hedwig", "toad": None, "rat": "Scabbers"}}
+
+    @pytest.mark.it("Keeps deleted properties as None")
+    def test_deleted(self):
+        assert merge_patches({"pet": {"owl": "Hedwig"}}, {"pet": None}) == {"pet": None}
+
+    @pytest.mark.it(
+        "Returns None if the later patch sets a property to an object after the patch deleted it"
+    )
+    def test_object_after_deletion(self):
+        assert merge_patches({"pet": None}, {"pet": {"rat": "Scabbers"}}) is None
+
+    @pytest.mark.it(
+        "Returns None if the later patch sets a property to an object after the patch set it to another kind of value"
+    )
+    @pytest.mark.parametrize(
+        "value",
+        [
+            pytest.param("Hedwig", id="String"),
+            pytest.param(["Hedwig"], id="List"),
+        ],
+    )
+    def test_object_after_other_value(self, value):
+        assert merge_patches({"pet": value}, {"pet": {"rat": "Scabbers"}}) is None
+
+    @pytest.mark.it("Returns None if a nested pair of properties cannot be merged")
+    def test_nested_object_after_deletion(self):
+        assert (
+            merge_patches(
+                {"house": "Gryffindor", "pet": {"owl": None}}, {"pet": {"owl": {"name": "Hedwig"}}}
+            )
+            is None
+        )
+
+    @pytest.mark.it("Does not modify either patch")
+    def test_no_modification(self):
+        patch = {"pet": {"owl": "Hedwig"}}
+        later_patch = {"pet": {"rat": "Scabbers"}}
+        merge_patches(patch, later_patch)
+
+        assert patch == {"pet": {"owl": "Hedwig"}}
+        assert later_patch == {"pet": {"rat": "Scabbers"}}
+
+
+@pytest.mark.describe("apply_patch()")
+class TestApplyPatch(object):
+    @pytest.mark.it("Sets, merges and deletes properties")
+    def test_apply(self):
+        properties = {"house": "Gryffindor", "pet": {"owl": "Hedwig"}, "wand": "holly"}
+        patch = {"house": "Slytherin", "pet": {"rat": "Scabbers"}, "wand": None, "broom": "Nimbus"}
+
+        assert apply_patch(properties, patch) == {
+            "house": "Slytherin",
+            "pet": {"owl": "Hedwig", "rat": "Scabbers"},
+            "broom": "Nimbus",
+        }
+
+    @pytest.mark.it("Removes deletions from objects which replace other values")
+    def test_replace_with_object(self):
+        assert apply_patch({"pet": "Hedwig"}, {"pet": {"rat": "Scabbers", "owl": None}}) == {
+            "pet": {"rat": "Scabbers"}
+        }
+
+    @pytest.mark.it("Copies the values taken from the patch, and does not modify the properties")
+    def test_copies(self):
+        properties = {"pet": {"owl": "Hedwig"}}
+        patch = {"spells": ["Lumos"]}
+        patched = apply_patch(properties, patch)
+        patch["spells"].append("Nox")
+
+        assert patched == {"pet": {"owl": "Hedwig"}, "spells": ["Lumos"]}
+        assert properties == {"pet": {"owl": "Hedwig"}}
+
+    @pytest.mark.it("Keeps deleted properties as None, if keep_deleted is True")
+    def test_keep_deleted(self):
+        properties = {"pet": {"owl": "Hedwig"}, "wand": "holly"}
+        patch = {"pet": {"owl": None}, "wand": None, "broom": None}
+
+        assert apply_patch(properties, patch, keep_deleted=True) == {
+            "pet": {"owl": None},
+            "wand": None,
+            "broom": None,
+        }
+
+
+@pytest.mark.describe("reduce_patch()")
+class TestReducePatch(object):
+    @pytest.mark.it("Keeps only the properties which the patch changes")
+    def test_reduce(self):
+        properties = {"house": "Gryffindor", "pet": {"owl": "Hedwig"}, "wand": "holly"}
+        patch = {"house": "Gryffindor", "pet": {"owl": "Hedwig", "rat": "Scabbers"}, "wand": None}
+
+        assert reduce_patch(properties, patch) == {"pet": {"rat": "Scabbers"}, "wand": None}
+
+    @pytest.mark.it("Keeps deletions of properties which are missing from the properties")
+    def test_delete_unknown(self):
+        properties = {"pet": {"owl": "Hedwig"}}
+        patch = {"pet": {"toad": None}, "broom": None}
+
+        assert reduce_patch(properties, patch) == {"pet": {"toad": None}, "broom": None}
+
+    @pytest.mark.it("Drops deletions of properties which are None in the properties")
+    def test_delete_absent(self):
+        properties = {"pet": {"toad": None}, "broom": None}
+        patch = {"pet": {"toad": None}, "broom": None}
+
+        assert reduce_patch(properties, patch) == {}
+
+    @pytest.mark.it("Keeps values for properties which are None in the properties")
+    def test_set_absent(self):
+        properties = {"pet": None, "broom": None}
+        patch = {"pet": {"owl": "Hedwig"}, "broom": "Nimbus"}
+
+        assert reduce_patch(properties, patch) == patch
+
+    @pytest.mark.it("Returns an empty patch if the patch changes nothing")
+    def test_unchanged(self):
+        properties = {"house": "Gryffindor", "pet": {"owl": "Hedwig"}, "spells": ["Lumos"]}
+        patch = {"house": "Gryffindor", "pet": {"owl": "Hedwig"}, "spells": ["Lumos"]}
+
+        assert reduce_patch(properties, patch) == {}
+
+    @pytest.mark.it("Treats values which are equal in Python but not in JSON as changes")
+    @pytest.mark.parametrize(
+        "value, new_value",
+        [
+            pytest.param(1, True, id="int and bool"),
+            pytest.param(1, 1.0, id="int and float"),
+            pytest.param([1], [True], id="Lists"),
+        ],
+    )
+    def test_json_types(self, value, new_value):
+        assert reduce_patch({"points": value}, {"points": new_value}) == {"points": new_value}
+
+
+@pytest.mark.describe("ReportedPropertiesTracker")
+class TestReportedPropertiesTracker(object):
+    @pytest.mark.it("Reduces patches against the properties in the acknowledged patches")
+    def test_acknowledge(self):
+        tracker = ReportedPropertiesTracker()
+        assert tracker.reduce_patch({"house": "Gryffindor"}) == {"house": "Gryffindor"}
+
+        tracker.acknowledge({"house": "Gryffindor"})
+        tracker.acknowledge({"wand": "holly"})
+        assert tracker.reduce_patch({"house": "Gryffindor", "wand": "holly"}) == {}
+
+    @pytest.mark.it("Is not affected by changes to a patch after it is acknowledged")
+    def test_patch_modified(self):
+        tracker = ReportedPropertiesTracker()
+        state = {"pet": {"owl": "Hedwig"}}
+        tracker.acknowledge(state)
+        state["pet"]["rat"] = "Scabbers"
+
+        assert tracker.reduce_patch(state) == {"pet": {"rat": "Scabbers"}}
+
+    @pytest.mark.it(
+        "Only drops the deletion of a property once an acknowledged patch has deleted it"
+    )
+    def test_deletion(self):
+        tracker = ReportedPropertiesTracker()
+        assert tracker.reduce_patch({"wand": None}) == {"wand": None}
+
+        tracker.acknowledge({"wand": None})
+        assert tracker.reduce_patch({"wand": None}) == {}
+        assert tracker.reduce_patch({"wand": "holly"}) == {"wand": "holly"}
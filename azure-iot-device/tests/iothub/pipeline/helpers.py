@@ -10,6 +10,9 @@ all_iothub_ops = [
     pipeline_ops_iothub.SetIoTHubConnectionArgsOperation,
     pipeline_ops_iothub.SendD2CMessageOperation,
     pipeline_ops_iothub.SendOutputEventOperation,
+    pipeline_ops_iothub.SetPayloadCompressionOperation,
+    pipeline_ops_iothub.SetTelemetryAggregationOperation,
+    pipeline_ops_iothub.SetRateLimitsOperation,
 ]
 
 
@@ -5,12 +5,15 @@
 # --------------------------------------------------------------------------
 
 import pytest
+import sys
 import logging
 import six.moves.urllib as urllib
+from azure.iot.device.common import errors
 from azure.iot.device.common.pipeline import (
     pipeline_stages_base,
     pipeline_stages_mqtt,
     pipeline_ops_base,
+    pipeline_thread,
 )
 from azure.iot.device.iothub.pipeline import (
     pipeline_stages_iothub,
@@ -18,7 +21,7 @@ from azure.iot.device.iothub.pipeline import (
     pipeline_ops_iothub,
     pipeline_events_iothub,
 )
-from azure.iot.device.iothub import Message
+from azure.iot.device.iothub import Message, RateLimits
 from azure.iot.device.iothub.pipeline import IoTHubPipeline, constant
 from azure.iot.device.iothub.auth import (
     SymmetricKeyAuthenticationProvider,
@@ -96,6 +99,9 @@ class TestIoTHubPipelineInstantiation(object):
             pipeline_stages_iothub.UseAuthProviderStage,
             pipeline_stages_iothub.HandleTwinOperationsStage,
             pipeline_stages_base.CoordinateRequestAndResponseStage,
+            pipeline_stages_iothub.TelemetryAggregationStage,
+            pipeline_stages_iothub.PayloadCompressionStage,
+            pipeline_stages_iothub.RateLimitStage,
             pipeline_stages_iothub_mqtt.IoTHubMQTTConverterStage,
             pipeline_stages_base.EnsureConnectionStage,
             pipeline_stages_base.SerializeConnectOpsStage,
@@ -111,6 +117,50 @@ class TestIoTHubPipelineInstantiation(object):
         # Assert there are no more additional stages
         assert curr_stage is None
 
+    @pytest.mark.it(
+        "Configures the MQTTTransportStage with the keep_alive, ping_timeout and max_round_trip_time"
+    )
+    def test_keep_alive(self, auth_provider):
+        pipeline = IoTHubPipeline(
+            auth_provider, keep_alive=15, ping_timeout=5, max_round_trip_time=2
+        )
+        curr_stage = pipeline._pipeline
+        while curr_stage.next:
+            curr_stage = curr_stage.next
+
+        assert curr_stage.keep_alive == 15
+        assert curr_stage.ping_timeout == 5
+        assert curr_stage.max_round_trip_time == 2
+
+    @pytest.mark.it("Raises a ValueError if keep_alive is not a positive integer")
+    @pytest.mark.parametrize(
+        "keep_alive",
+        [
+            pytest.param(0, id="Zero"),
+            pytest.param(-60, id="Negative"),
+            pytest.param(1.5, id="Not an integer"),
+        ],
+    )
+    def test_invalid_keep_alive(self, auth_provider, keep_alive):
+        with pytest.raises(ValueError):
+            IoTHubPipeline(auth_provider, keep_alive=keep_alive)
+
+    @pytest.mark.it("Raises a ValueError if ping_timeout is not greater than zero")
+    @pytest.mark.parametrize(
+        "ping_timeout", [pytest.param(0, id="Zero"), pytest.param(-1.5, id="Negative")]
+    )
+    def test_invalid_ping_timeout(self, auth_provider, ping_timeout):
+        with pytest.raises(ValueError):
+            IoTHubPipeline(auth_provider, ping_timeout=ping_timeout)
+
+    @pytest.mark.it("Raises a ValueError if max_round_trip_time is not greater than zero")
+    @pytest.mark.parametrize(
+        "max_round_trip_time", [pytest.param(0, id="Zero"), pytest.param(-1.5, id="Negative")]
+    )
+    def test_invalid_max_round_trip_time(self, auth_provider, max_round_trip_time):
+        with pytest.raises(ValueError):
+            IoTHubPipeline(auth_provider, max_round_trip_time=max_round_trip_time)
+
     # TODO: revist these tests after auth revision
     # They are too tied to auth types (and there's too much variance in auths to effectively test)
     # Ideally IoTHubPipeline is entirely insulated from any auth differential logic (and module/device distinctions)
@@ -226,6 +276,18 @@ class TestIoTHubPipelineConnect(object):
 
         assert cb.call_count == 0
 
+    @pytest.mark.it(
+        "Triggers the callback with the error if the ConnectOperation was cancelled by a shutdown"
+    )
+    def test_op_cancelled(self, mocker, pipeline):
+        cb = mocker.MagicMock()
+        pipeline.connect(callback=cb)
+        op = pipeline._pipeline.run_op.call_args[0][0]
+        op.error = errors.OperationCancelledError()
+        op.callback(op)
+
+        assert cb.call_args == mocker.call(error=op.error)
+
 
 @pytest.mark.describe("IoTHubPipeline - .disconnect()")
 class TestIoTHubPipelineDisconnect(object):
@@ -286,6 +348,69 @@ class TestIoTHubPipelineDisconnect(object):
 
         assert cb.call_count == 0
 
+    @pytest.mark.it(
+        "Triggers the callback with the error if the DisconnectOperation was cancelled by a shutdown"
+    )
+    def test_op_cancelled(self, mocker, pipeline):
+        cb = mocker.MagicMock()
+        pipeline.disconnect(callback=cb)
+        op = pipeline._pipeline.run_op.call_args[0][0]
+        op.error = errors.OperationCancelledError()
+        op.callback(op)
+
+        assert cb.call_args == mocker.call(error=op.error)
+
+
+@pytest.mark.describe("IoTHubPipeline - .shutdown()")
+class TestIoTHubPipelineShutdown(object):
+    @pytest.mark.it("Runs a ShutdownOperation with the provided timeout on the pipeline")
+    def test_runs_op(self, pipeline):
+        pipeline.shutdown(timeout=5)
+        op = pipeline._pipeline.run_op.call_args[0][0]
+
+        assert pipeline._pipeline.run_op.call_count == 1
+        assert isinstance(op, pipeline_ops_base.ShutdownOperation)
+        assert op.timeout == 5
+
+    @pytest.mark.it("Raises a ValueError without running an op if the timeout is negative")
+    def test_invalid_timeout(self, pipeline):
+        with pytest.raises(ValueError):
+            pipeline.shutdown(timeout=-1)
+
+        assert pipeline._pipeline.run_op.call_count == 0
+
+    @pytest.mark.it(
+        "Triggers an optionally provided callback upon successful completion of the ShutdownOperation"
+    )
+    def test_op_success_with_callback(self, mocker, pipeline):
+        cb = mocker.MagicMock()
+        pipeline.shutdown(callback=cb)
+        assert cb.call_count == 0
+
+        op = pipeline._pipeline.run_op.call_args[0][0]
+        op.callback(op)
+
+        assert cb.call_count == 1
+
+    @pytest.mark.it("Raise SystemExit upon unsuccessful completion of the ShutdownOperation")
+    def test_op_fail(self, pipeline):
+        pipeline.shutdown()
+        op = pipeline._pipeline.run_op.call_args[0][0]
+        op.error = Exception()
+
+        with pytest.raises(SystemExit):
+            op.callback(op)
+
+    @pytest.mark.it("Leaves the pipeline threads shared with other pipelines running")
+    def test_leaves_executors_running(self, pipeline):
+        executor = pipeline_thread._get_named_executor("pipeline")
+        pipeline.shutdown()
+        op = pipeline._pipeline.run_op.call_args[0][0]
+        op.callback(op)
+
+        assert pipeline_thread._get_named_executor("pipeline") is executor
+        assert executor.submit(lambda: True).result()
+
 
 @pytest.mark.describe("IoTHubPipeline - .send_message()")
 class TestIoTHubPipelineSendD2CMessage(object):
@@ -298,6 +423,33 @@ class TestIoTHubPipelineSendD2CMessage(object):
         assert isinstance(op, pipeline_ops_iothub.SendD2CMessageOperation)
         assert op.message == message
 
+    @pytest.mark.it("Uses the pipeline telemetry_qos if the message does not specify a qos")
+    @pytest.mark.parametrize("qos", [0, 1])
+    def test_default_qos(self, pipeline, message, qos):
+        pipeline.telemetry_qos = qos
+        pipeline.send_message(message)
+        op = pipeline._pipeline.run_op.call_args[0][0]
+
+        assert op.qos == qos
+
+    @pytest.mark.it("Uses the message qos if the message specifies one")
+    @pytest.mark.parametrize("qos", [0, 1])
+    def test_message_qos(self, pipeline, message, qos):
+        pipeline.telemetry_qos = 1 - qos
+        message.qos = qos
+        pipeline.send_message(message)
+        op = pipeline._pipeline.run_op.call_args[0][0]
+
+        assert op.qos == qos
+
+    @pytest.mark.it("Raises a ValueError without running an op if the qos is not 0 or 1")
+    def test_invalid_qos(self, pipeline, message):
+        message.qos = 2
+        with pytest.raises(ValueError):
+            pipeline.send_message(message)
+
+        assert pipeline._pipeline.run_op.call_count == 0
+
     @pytest.mark.it(
         "Triggers an optionally provided callback upon successful completion of the SendD2CMessageOperation"
     )
@@ -347,6 +499,18 @@ class TestIoTHubPipelineSendD2CMessage(object):
 
         assert cb.call_count == 0
 
+    @pytest.mark.it(
+        "Triggers the callback with the error if the SendD2CMessageOperation was cancelled by a shutdown"
+    )
+    def test_op_cancelled(self, mocker, pipeline, message):
+        cb = mocker.MagicMock()
+        pipeline.send_message(message, callback=cb)
+        op = pipeline._pipeline.run_op.call_args[0][0]
+        op.error = errors.OperationCancelledError()
+        op.callback(op)
+
+        assert cb.call_args == mocker.call(error=op.error)
+
 
 @pytest.mark.describe("IoTHubPipeline - .send_output_event()")
 class TestIoTHubPipelineSendOutputEvent(object):
@@ -365,6 +529,33 @@ class TestIoTHubPipelineSendOutputEvent(object):
         assert isinstance(op, pipeline_ops_iothub.SendOutputEventOperation)
         assert op.message == message
 
+    @pytest.mark.it("Uses the pipeline telemetry_qos if the message does not specify a qos")
+    @pytest.mark.parametrize("qos", [0, 1])
+    def test_default_qos(self, pipeline, message, qos):
+        pipeline.telemetry_qos = qos
+        pipeline.send_output_event(message)
+        op = pipeline._pipeline.run_op.call_args[0][0]
+
+        assert op.qos == qos
+
+    @pytest.mark.it("Uses the message qos if the message specifies one")
+    @pytest.mark.parametrize("qos", [0, 1])
+    def test_message_qos(self, pipeline, message, qos):
+        pipeline.telemetry_qos = 1 - qos
+        message.qos = qos
+        pipeline.send_output_event(message)
+        op = pipeline._pipeline.run_op.call_args[0][0]
+
+        assert op.qos == qos
+
+    @pytest.mark.it("Raises a ValueError without running an op if the qos is not 0 or 1")
+    def test_invalid_qos(self, pipeline, message):
+        message.qos = 2
+        with pytest.raises(ValueError):
+            pipeline.send_output_event(message)
+
+        assert pipeline._pipeline.run_op.call_count == 0
+
     @pytest.mark.it(
         "Triggers an optionally provided callback upon successful completion of the SendOutputEventOperation"
     )
@@ -414,6 +605,144 @@ class TestIoTHubPipelineSendOutputEvent(object):
 
         assert cb.call_count == 0
 
+    @pytest.mark.it(
+        "Triggers the callback with the error if the SendOutputEventOperation was cancelled by a shutdown"
+    )
+    def test_op_cancelled(self, mocker, pipeline, message):
+        cb = mocker.MagicMock()
+        pipeline.send_output_event(message, callback=cb)
+        op = pipeline._pipeline.run_op.call_args[0][0]
+        op.error = errors.OperationCancelledError()
+        op.callback(op)
+
+        assert cb.call_args == mocker.call(error=op.error)
+
+
+@pytest.mark.describe("IoTHubPipeline - .set_payload_compression()")
+class TestIoTHubPipelineSetPayloadCompression(object):
+    @pytest.mark.it(
+        "Runs a SetPayloadCompressionOperation with the provided settings on the pipeline"
+    )
+    def test_runs_op(self, pipeline):
+        pipeline.set_payload_compression(encoding="gzip", threshold=42, level=9)
+        op = pipeline._pipeline.run_op.call_args[0][0]
+
+        assert pipeline._pipeline.run_op.call_count == 1
+        assert isinstance(op, pipeline_ops_iothub.SetPayloadCompressionOperation)
+        assert op.encoding == "gzip"
+        assert op.threshold == 42
+        assert op.level == 9
+        assert op.dictionary is None
+        assert op.dictionary_id is None
+
+    @pytest.mark.it("Runs a SetPayloadCompressionOperation with a preset dictionary")
+    @pytest.mark.skipif(sys.version_info < (3, 3), reason="Preset dictionaries require Python 3.3+")
+    def test_runs_op_with_dictionary(self, pipeline):
+        pipeline.set_payload_compression(
+            encoding="deflate", dictionary=b"Leviosa", dictionary_id="charms"
+        )
+        op = pipeline._pipeline.run_op.call_args[0][0]
+
+        assert op.dictionary == b"Leviosa"
+        assert op.dictionary_id == "charms"
+
+    @pytest.mark.it("Triggers an optionally provided callback upon completion of the op")
+    def test_op_success_with_callback(self, mocker, pipeline):
+        cb = mocker.MagicMock()
+        pipeline.set_payload_compression(encoding=None, callback=cb)
+        op = pipeline._pipeline.run_op.call_args[0][0]
+        op.callback(op)
+
+        assert cb.call_count == 1
+
+    @pytest.mark.it("Raises a ValueError without running an op if the settings are invalid")
+    @pytest.mark.parametrize(
+        "kwargs",
+        [
+            pytest.param({"encoding": "br"}, id="Unknown encoding"),
+            pytest.param({"encoding": "gzip", "threshold": -1}, id="Negative threshold"),
+            pytest.param({"encoding": "gzip", "level": 0}, id="Level too low"),
+            pytest.param({"encoding": "gzip", "level": 10}, id="Level too high"),
+            pytest.param(
+                {"encoding": "gzip", "dictionary": b"Leviosa", "dictionary_id": "charms"},
+                id="Dictionary with gzip",
+            ),
+            pytest.param(
+                {"encoding": "deflate", "dictionary": b"Leviosa"}, id="Dictionary without id"
+            ),
+        ],
+    )
+    def test_invalid_settings(self, pipeline, kwargs):
+        with pytest.raises(ValueError):
+            pipeline.set_payload_compression(**kwargs)
+
+        assert pipeline._pipeline.run_op.call_count == 0
+
+
+@pytest.mark.describe("IoTHubPipeline - .set_telemetry_aggregation()")
+class TestIoTHubPipelineSetTelemetryAggregation(object):
+    @pytest.mark.it(
+        "Runs a SetTelemetryAggregationOperation with the provided settings on the pipeline"
+    )
+    def test_runs_op(self, pipeline):
+        pipeline.set_telemetry_aggregation(window_size=100, window_interval=1.5)
+        op = pipeline._pipeline.run_op.call_args[0][0]
+
+        assert pipeline._pipeline.run_op.call_count == 1
+        assert isinstance(op, pipeline_ops_iothub.SetTelemetryAggregationOperation)
+        assert op.window_size == 100
+        assert op.window_interval == 1.5
+
+    @pytest.mark.it("Triggers an optionally provided callback upon completion of the op")
+    def test_op_success_with_callback(self, mocker, pipeline):
+        cb = mocker.MagicMock()
+        pipeline.set_telemetry_aggregation(callback=cb)
+        op = pipeline._pipeline.run_op.call_args[0][0]
+        op.callback(op)
+
+        assert cb.call_count == 1
+
+    @pytest.mark.it("Raises a ValueError without running an op if the settings are invalid")
+    @pytest.mark.parametrize(
+        "kwargs",
+        [
+            pytest.param({"window_size": 0}, id="Zero window_size"),
+            pytest.param({"window_size": 2.5}, id="Non-integer window_size"),
+            pytest.param({"window_interval": 0}, id="Zero window_interval"),
+            pytest.param({"window_interval": -1}, id="Negative window_interval"),
+        ],
+    )
+    def test_invalid_settings(self, pipeline, kwargs):
+        with pytest.raises(ValueError):
+            pipeline.set_telemetry_aggregation(**kwargs)
+
+        assert pipeline._pipeline.run_op.call_count == 0
+
+
+@pytest.mark.describe("IoTHubPipeline - .set_rate_limits()")
+class TestIoTHubPipelineSetRateLimits(object):
+    @pytest.mark.it("Runs a SetRateLimitsOperation with the provided RateLimits on the pipeline")
+    @pytest.mark.parametrize(
+        "rate_limits",
+        [pytest.param(RateLimits(telemetry=10), id="Enable"), pytest.param(None, id="Disable")],
+    )
+    def test_runs_op(self, pipeline, rate_limits):
+        pipeline.set_rate_limits(rate_limits)
+        op = pipeline._pipeline.run_op.call_args[0][0]
+
+        assert pipeline._pipeline.run_op.call_count == 1
+        assert isinstance(op, pipeline_ops_iothub.SetRateLimitsOperation)
+        assert op.rate_limits is rate_limits
+
+    @pytest.mark.it("Triggers an optionally provided callback upon completion of the op")
+    def test_op_success_with_callback(self, mocker, pipeline):
+        cb = mocker.MagicMock()
+        pipeline.set_rate_limits(None, callback=cb)
+        op = pipeline._pipeline.run_op.call_args[0][0]
+        op.callback(op)
+
+        assert cb.call_count == 1
+
 
 @pytest.mark.describe("IoTHubPipeline - .send_method_response()")
 class TestIoTHubPipelineSendMethodResponse(object):
@@ -479,6 +808,26 @@ class TestIoTHubPipelineSendMethodResponse(object):
 
         assert cb.call_count == 0
 
+    @pytest.mark.it(
+        "Triggers the callback with the error if the SendMethodResponseOperation was cancelled by a shutdown"
+    )
+    def test_op_cancelled(self, mocker, pipeline, method_response):
+        cb = mocker.MagicMock()
+        pipeline.send_method_response(method_response, callback=cb)
+        op = pipeline._pipeline.run_op.call_args[0][0]
+        op.error = errors.OperationCancelledError()
+        op.callback(op)
+
+        assert cb.call_args == mocker.call(error=op.error)
+
+
+twin_request_errors = [
+    pytest.param(errors.TimeoutError(), id="TimeoutError"),
+    pytest.param(errors.ConnectionDroppedError(), id="ConnectionDroppedError"),
+    pytest.param(errors.PipelineError(), id="PipelineError"),
+    pytest.param(errors.OperationCancelledError(), id="OperationCancelledError"),
+]
+
 
 @pytest.mark.describe("IoTHubPipeline - .get_twin()")
 class TestIoTHubPipelineGetTwin(object):
@@ -507,29 +856,18 @@ class TestIoTHubPipelineGetTwin(object):
 
         assert cb.call_count == 1
 
-    @pytest.mark.it("Raise SystemExit upon unsuccessful completion of the GetTwinOperation")
-    def test_op_fail(self, mocker, pipeline):
-        cb = mocker.MagicMock()
-        pipeline.get_twin(callback=cb)
-        op = pipeline._pipeline.run_op.call_args[0][0]
-        op.error = Exception()
-
-        with pytest.raises(SystemExit):
-            op.callback(op)
-
     @pytest.mark.it(
-        "Does not trigger callback upon unsuccessful completion of the GetTwinOperation"
+        "Triggers the callback with the error upon unsuccessful completion of the GetTwinOperation"
     )
-    def test_op_fail_no_callback(self, mocker, pipeline):
+    @pytest.mark.parametrize("error", twin_request_errors)
+    def test_op_fail(self, mocker, pipeline, error):
         cb = mocker.MagicMock()
         pipeline.get_twin(callback=cb)
         op = pipeline._pipeline.run_op.call_args[0][0]
-        op.error = Exception()
-
-        with pytest.raises(SystemExit):
-            op.callback(op)
+        op.error = error
+        op.callback(op)
 
-        assert cb.call_count == 0
+        assert cb.call_args == mocker.call(error=error)
 
 
 @pytest.mark.describe("IoTHubPipeline - .patch_twin_reported_properties()")
@@ -572,29 +910,26 @@ class TestIoTHubPipelinePatchTwinReportedProperties(object):
         # No assertions required - if the code executes without error, the test passes
 
     @pytest.mark.it(
-        "Raise SystemExit upon unsuccessful completion of the PatchTwinReportedPropertiesOperation"
+        "Triggers the callback with the error upon unsuccessful completion of the PatchTwinReportedPropertiesOperation"
     )
-    def test_op_fail(self, mocker, pipeline, twin_patch):
-        pipeline.patch_twin_reported_properties(twin_patch)
+    @pytest.mark.parametrize("error", twin_request_errors)
+    def test_op_fail(self, mocker, pipeline, twin_patch, error):
+        cb = mocker.MagicMock()
+        pipeline.patch_twin_reported_properties(twin_patch, callback=cb)
         op = pipeline._pipeline.run_op.call_args[0][0]
-        op.error = Exception()
+        op.error = error
+        op.callback(op)
 
-        with pytest.raises(SystemExit):
-            op.callback(op)
+        assert cb.call_args == mocker.call(error=error)
 
     @pytest.mark.it(
-        "Does not trigger callback upon unsuccessful completion of the PatchTwinReportedPropertiesOperation"
+        "Does nothing upon unsuccessful completion of the PatchTwinReportedPropertiesOperation if no callback is provided"
     )
-    def test_op_fail_no_callback(self, mocker, pipeline, twin_patch):
-        cb = mocker.MagicMock()
-        pipeline.patch_twin_reported_properties(twin_patch, callback=cb)
+    def test_op_fail_no_callback(self, pipeline, twin_patch):
+        pipeline.patch_twin_reported_properties(twin_patch)
         op = pipeline._pipeline.run_op.call_args[0][0]
-        op.error = Exception()
-
-        with pytest.raises(SystemExit):
-            op.callback(op)
-
-        assert cb.call_count == 0
+        op.error = errors.TimeoutError()
+        op.callback(op)
 
 
 @pytest.mark.describe("IoTHubPipeline - .enable_feature()")
@@ -679,6 +1014,19 @@ class TestIoTHubPipelineEnableFeature(object):
 
         assert cb.call_count == 0
 
+    @pytest.mark.it(
+        "Triggers the callback with the error if the EnableFeatureOperation was cancelled by a shutdown"
+    )
+    @pytest.mark.parametrize("feature", all_features)
+    def test_op_cancelled(self, mocker, pipeline, feature):
+        cb = mocker.MagicMock()
+        pipeline.enable_feature(feature, callback=cb)
+        op = pipeline._pipeline.run_op.call_args[0][0]
+        op.error = errors.OperationCancelledError()
+        op.callback(op)
+
+        assert cb.call_args == mocker.call(error=op.error)
+
 
 @pytest.mark.describe("IoTHubPipeline - .disable_feature()")
 class TestIoTHubPipelineDisableFeature(object):
@@ -764,6 +1112,19 @@ class TestIoTHubPipelineDisableFeature(object):
 
         assert cb.call_count == 0
 
+    @pytest.mark.it(
+        "Triggers the callback with the error if the DisableFeatureOperation was cancelled by a shutdown"
+    )
+    @pytest.mark.parametrize("feature", all_features)
+    def test_op_cancelled(self, mocker, pipeline, feature):
+        cb = mocker.MagicMock()
+        pipeline.disable_feature(feature, callback=cb)
+        op = pipeline._pipeline.run_op.call_args[0][0]
+        op.error = errors.OperationCancelledError()
+        op.callback(op)
+
+        assert cb.call_args == mocker.call(error=op.error)
+
 
 @pytest.mark.describe("IoTHubPipeline - EVENT: Connected")
 class TestIoTHubPipelineEVENTConnect(object):
@@ -5,6 +5,7 @@
 # --------------------------------------------------------------------------
 import sys
 import logging
+from azure.iot.device.common.pipeline import pipeline_ops_base
 from azure.iot.device.iothub.pipeline import pipeline_ops_iothub
 from tests.common.pipeline import pipeline_data_object_test
 
@@ -40,29 +41,56 @@ pipeline_data_object_test.add_operation_test(
     cls=pipeline_ops_iothub.SendD2CMessageOperation,
     module=this_module,
     positional_arguments=["message"],
-    keyword_arguments={"callback": None},
+    keyword_arguments={"qos": 1, "callback": None},
 )
 pipeline_data_object_test.add_operation_test(
     cls=pipeline_ops_iothub.SendOutputEventOperation,
     module=this_module,
     positional_arguments=["message"],
-    keyword_arguments={"callback": None},
+    keyword_arguments={"qos": 1, "callback": None},
 )
 pipeline_data_object_test.add_operation_test(
     cls=pipeline_ops_iothub.SendMethodResponseOperation,
     module=this_module,
+    extra_defaults={"priority": pipeline_ops_base.PRIORITY_CONTROL},
     positional_arguments=["method_response"],
     keyword_arguments={"callback": None},
 )
 pipeline_data_object_test.add_operation_test(
     cls=pipeline_ops_iothub.GetTwinOperation,
     module=this_module,
+    extra_defaults={"priority": pipeline_ops_base.PRIORITY_CONTROL},
     positional_arguments=[],
     keyword_arguments={"callback": None},
 )
 pipeline_data_object_test.add_operation_test(
     cls=pipeline_ops_iothub.PatchTwinReportedPropertiesOperation,
     module=this_module,
+    extra_defaults={"priority": pipeline_ops_base.PRIORITY_CONTROL},
     positional_arguments=["patch"],
     keyword_arguments={"callback": None},
 )
+pipeline_data_object_test.add_operation_test(
+    cls=pipeline_ops_iothub.SetPayloadCompressionOperation,
+    module=this_module,
+    positional_arguments=["encoding"],
+    keyword_arguments={
+        "threshold": 1024,
+        "level": 6,
+        "dictionary": None,
+        "dictionary_id": None,
+        "callback": None,
+    },
+)
+pipeline_data_object_test.add_operation_test(
+    cls=pipeline_ops_iothub.SetTelemetryAggregationOperation,
+    module=this_module,
+    positional_arguments=[],
+    keyword_arguments={"window_size": None, "window_interval": None, "callback": None},
+)
+pipeline_data_object_test.add_operation_test(
+    cls=pipeline_ops_iothub.SetRateLimitsOperation,
+    module=this_module,
+    positional_arguments=["rate_limits"],
+    keyword_arguments={"callback": None},
+)
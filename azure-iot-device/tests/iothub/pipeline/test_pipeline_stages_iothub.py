@@ -9,10 +9,16 @@ import logging
 import pytest
 import sys
 import threading
+import zlib
 from concurrent.futures import Future
-from azure.iot.device.common import unhandled_exceptions
+from azure.iot.device.common import unhandled_exceptions, timer_scheduler, rate_limiter, errors
 from azure.iot.device.common.pipeline import pipeline_ops_base
-from azure.iot.device.iothub.pipeline import pipeline_stages_iothub, pipeline_ops_iothub
+from azure.iot.device.iothub.pipeline import (
+    pipeline_stages_iothub,
+    pipeline_ops_iothub,
+    pipeline_events_iothub,
+)
+from azure.iot.device.iothub.models import Message, MethodResponse, RateLimits
 from tests.common.pipeline.helpers import (
     assert_callback_succeeded,
     assert_callback_failed,
@@ -348,6 +354,15 @@ class TestUseAuthProviderOnSasTokenUpdated(object):
         with pytest.raises(BaseException):
             future.result()
 
+    @pytest.mark.it("Counts token renewals in the stage statistics")
+    def test_counts_token_renewals(self, stage):
+        stage.on_sas_token_updated()
+        stage.on_sas_token_updated()
+        assert stage.get_statistics() == {"token_renewals": 2}
+
+        stage.reset_statistics()
+        assert stage.get_statistics() == {"token_renewals": 0}
+
 
 pipeline_stage_test.add_base_pipeline_stage_tests(
     cls=pipeline_stages_iothub.HandleTwinOperationsStage,
@@ -548,3 +563,826 @@ class TestHandleTwinOperationsRunOpWithPatchTwinReportedProperties(object):
         stage.next.run_op = functools.partial(next_stage_run_op, (stage.next,))
         stage.run_op(op)
         assert_callback_succeeded(op=op)
+
+
+pipeline_stage_test.add_base_pipeline_stage_tests(
+    cls=pipeline_stages_iothub.PayloadCompressionStage,
+    module=this_module,
+    all_ops=all_common_ops + all_iothub_ops,
+    handled_ops=[pipeline_ops_iothub.SetPayloadCompressionOperation],
+    all_events=all_common_events + all_iothub_events,
+    handled_events=[],
+    extra_initializer_defaults={
+        "encoding": None,
+        "threshold": None,
+        "level": None,
+        "dictionary": None,
+        "dictionary_id": None,
+    },
+)
+
+fake_payload = '{"house": "Hufflepuff", "values": [' + ", ".join(["1.0"] * 200) + "]}"
+fake_dictionary = b'{"house": "Hufflepuff", "values": [1.0, 1.0, 1.0'
+fake_dictionary_id = "sorting-hat-v1"
+
+
+def compress(data, encoding, dictionary=None):
+    wbits = zlib.MAX_WBITS | 16 if encoding == "gzip" else zlib.MAX_WBITS
+    if dictionary:
+        compressor = zlib.compressobj(
+            6, zlib.DEFLATED, wbits, zlib.DEF_MEM_LEVEL, zlib.Z_DEFAULT_STRATEGY, dictionary
+        )
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, wbits)
+    return compressor.compress(data) + compressor.flush()
+
+
+def decompress(data, encoding, dictionary=None):
+    wbits = zlib.MAX_WBITS | 16 if encoding == "gzip" else zlib.MAX_WBITS
+    if dictionary:
+        decompressor = zlib.decompressobj(wbits, dictionary)
+    else:
+        decompressor = zlib.decompressobj(wbits)
+    return decompressor.decompress(data) + decompressor.flush()
+
+
+requires_zdict = pytest.mark.skipif(
+    sys.version_info < (3, 3), reason="Preset dictionaries require Python 3.3+"
+)
+
+
+class PayloadCompressionStageTestConfig(object):
+    @pytest.fixture
+    def stage(self, mocker):
+        return make_mock_stage(mocker, pipeline_stages_iothub.PayloadCompressionStage)
+
+    @pytest.fixture(params=["gzip", "deflate"])
+    def encoding(self, request):
+        return request.param
+
+    @pytest.fixture
+    def enable(self, stage):
+        def enable(encoding, threshold=64, level=6, dictionary=None, dictionary_id=None):
+            stage.run_op(
+                pipeline_ops_iothub.SetPayloadCompressionOperation(
+                    encoding=encoding,
+                    threshold=threshold,
+                    level=level,
+                    dictionary=dictionary,
+                    dictionary_id=dictionary_id,
+                )
+            )
+
+        return enable
+
+
+@pytest.mark.describe(
+    "PayloadCompressionStage - .run_op() -- called with SetPayloadCompressionOperation"
+)
+class TestPayloadCompressionStageRunOpWithSetPayloadCompression(PayloadCompressionStageTestConfig):
+    @pytest.mark.it("Stores the compression settings and completes the op without passing it on")
+    def test_stores_settings(self, stage, callback):
+        op = pipeline_ops_iothub.SetPayloadCompressionOperation(
+            encoding="deflate",
+            threshold=42,
+            level=9,
+            dictionary=fake_dictionary,
+            dictionary_id=fake_dictionary_id,
+            callback=callback,
+        )
+        stage.run_op(op)
+
+        assert stage.encoding == "deflate"
+        assert stage.threshold == 42
+        assert stage.level == 9
+        assert stage.dictionary == fake_dictionary
+        assert stage.dictionary_id == fake_dictionary_id
+        assert stage.next.run_op.call_count == 0
+        assert_callback_succeeded(op=op)
+
+
+@pytest.mark.parametrize(
+    "op_class",
+    [pipeline_ops_iothub.SendD2CMessageOperation, pipeline_ops_iothub.SendOutputEventOperation],
+)
+@pytest.mark.describe("PayloadCompressionStage - .run_op() -- called with message operations")
+class TestPayloadCompressionStageRunOpWithMessage(PayloadCompressionStageTestConfig):
+    @pytest.mark.it("Passes the message through unchanged if compression is not enabled")
+    def test_disabled(self, stage, op_class):
+        message = Message(fake_payload)
+        stage.run_op(op_class(message=message))
+
+        new_op = stage.next.run_op.call_args[0][0]
+        assert new_op.message is message
+        assert message.data == fake_payload
+
+    @pytest.mark.it(
+        "Passes on a copy of the message with a compressed payload and content_encoding, leaving the original message unchanged"
+    )
+    @pytest.mark.parametrize(
+        "data",
+        [
+            fake_payload,
+            fake_payload.encode("utf-8"),
+            bytearray(fake_payload.encode("utf-8")),
+            memoryview(bytearray(fake_payload.encode("utf-8"))),
+        ],
+        ids=["str", "bytes", "bytearray", "memoryview"],
+    )
+    def test_compresses(self, stage, enable, encoding, op_class, data):
+        enable(encoding)
+        message = Message(data)
+        message.custom_properties["wand"] = "holly"
+        stage.run_op(op_class(message=message))
+
+        new_message = stage.next.run_op.call_args[0][0].message
+        assert new_message is not message
+        assert decompress(new_message.data, encoding) == fake_payload.encode("utf-8")
+        assert new_message.content_encoding == encoding
+        assert new_message.custom_properties == {"wand": "holly"}
+        assert message.data == data
+        assert message.content_encoding is None
+
+    @pytest.mark.it("Compresses messages which have a utf-8 content_encoding")
+    def test_compresses_utf8(self, stage, enable, op_class):
+        enable("gzip")
+        message = Message(fake_payload, content_encoding="utf-8")
+        stage.run_op(op_class(message=message))
+
+        new_message = stage.next.run_op.call_args[0][0].message
+        assert new_message.content_encoding == "gzip"
+
+    @pytest.mark.it("Uses the preset dictionary and names it in a custom property")
+    @requires_zdict
+    def test_compresses_with_dictionary(self, stage, enable, op_class):
+        enable("deflate", dictionary=fake_dictionary, dictionary_id=fake_dictionary_id)
+        message = Message(fake_payload)
+        stage.run_op(op_class(message=message))
+
+        new_message = stage.next.run_op.call_args[0][0].message
+        assert decompress(new_message.data, "deflate", fake_dictionary) == fake_payload.encode(
+            "utf-8"
+        )
+        assert new_message.custom_properties == {"compression-dictionary": fake_dictionary_id}
+        assert message.custom_properties == {}
+
+    @pytest.mark.it(
+        "Passes the message through unchanged if the payload is smaller than the threshold"
+    )
+    def test_below_threshold(self, stage, enable, op_class):
+        enable("gzip", threshold=len(fake_payload) + 1)
+        message = Message(fake_payload)
+        stage.run_op(op_class(message=message))
+
+        assert stage.next.run_op.call_args[0][0].message is message
+
+    @pytest.mark.it("Passes the message through unchanged if compression does not make it smaller")
+    def test_incompressible(self, stage, enable, op_class):
+        enable("gzip", threshold=0)
+        message = Message("Nox")
+        stage.run_op(op_class(message=message))
+
+        assert stage.next.run_op.call_args[0][0].message is message
+
+    @pytest.mark.it(
+        "Passes the message through unchanged if it already has a content_encoding other than utf-8"
+    )
+    def test_already_encoded(self, stage, enable, op_class):
+        enable("gzip")
+        message = Message(fake_payload, content_encoding="utf-16")
+        stage.run_op(op_class(message=message))
+
+        assert stage.next.run_op.call_args[0][0].message is message
+
+    @pytest.mark.it("Passes the message through unchanged if the payload is not a str or buffer")
+    def test_not_bytes(self, stage, enable, op_class):
+        enable("gzip", threshold=0)
+        message = Message(12345678901234567890)
+        stage.run_op(op_class(message=message))
+
+        assert stage.next.run_op.call_args[0][0].message is message
+
+    @pytest.mark.it("Counts compressed payloads and the number of bytes saved")
+    def test_statistics(self, stage, enable, op_class):
+        enable("gzip")
+        stage.run_op(op_class(message=Message(fake_payload)))
+
+        new_message = stage.next.run_op.call_args[0][0].message
+        statistics = stage.get_statistics()
+        assert statistics["payloads_compressed"] == 1
+        assert statistics["payload_bytes_saved"] == len(fake_payload) - len(new_message.data)
+
+
+@pytest.mark.parametrize(
+    "make_event",
+    [
+        pytest.param(lambda message: pipeline_events_iothub.C2DMessageEvent(message), id="C2D"),
+        pytest.param(
+            lambda message: pipeline_events_iothub.InputMessageEvent("wand_input", message),
+            id="Input",
+        ),
+    ],
+)
+@pytest.mark.describe("PayloadCompressionStage - .handle_pipeline_event() -- called with messages")
+class TestPayloadCompressionStageHandlePipelineEvent(PayloadCompressionStageTestConfig):
+    @pytest.fixture(autouse=True)
+    def previous(self, stage, mocker):
+        stage.previous = mocker.MagicMock()
+        return stage.previous
+
+    @pytest.fixture
+    def received_message(self, encoding):
+        message = Message(compress(fake_payload.encode("utf-8"), encoding))
+        message.content_encoding = encoding
+        return message
+
+    @pytest.mark.it("Passes the event up unchanged if compression is not enabled")
+    def test_disabled(self, stage, make_event, received_message):
+        data = received_message.data
+        event = make_event(received_message)
+        stage.handle_pipeline_event(event)
+
+        assert stage.previous.handle_pipeline_event.call_args[0][0] is event
+        assert event.message.data == data
+
+    @pytest.mark.it("Decompresses the payload and clears the content_encoding")
+    def test_decompresses(self, stage, enable, make_event, encoding, received_message):
+        enable("gzip")
+        event = make_event(received_message)
+        stage.handle_pipeline_event(event)
+
+        assert stage.previous.handle_pipeline_event.call_args[0][0] is event
+        assert event.message.data == fake_payload.encode("utf-8")
+        assert event.message.content_encoding is None
+        assert stage.get_statistics()["payloads_decompressed"] == 1
+
+    @pytest.mark.it("Decompresses the payload using the preset dictionary named in the message")
+    @requires_zdict
+    def test_decompresses_with_dictionary(self, stage, enable, make_event):
+        enable("deflate", dictionary=fake_dictionary, dictionary_id=fake_dictionary_id)
+        message = Message(compress(fake_payload.encode("utf-8"), "deflate", fake_dictionary))
+        message.content_encoding = "deflate"
+        message.custom_properties["compression-dictionary"] = fake_dictionary_id
+        message.custom_properties["wand"] = "holly"
+        event = make_event(message)
+        stage.handle_pipeline_event(event)
+
+        assert event.message.data == fake_payload.encode("utf-8")
+        assert event.message.custom_properties == {"wand": "holly"}
+
+    @pytest.mark.it("Leaves the payload compressed if it names an unknown preset dictionary")
+    def test_unknown_dictionary(self, stage, enable, make_event, received_message):
+        enable("deflate")
+        data = received_message.data
+        received_message.custom_properties["compression-dictionary"] = "marauders-map"
+        event = make_event(received_message)
+        stage.handle_pipeline_event(event)
+
+        assert stage.previous.handle_pipeline_event.call_args[0][0] is event
+        assert event.message.data == data
+
+    @pytest.mark.it("Leaves the payload untouched if it cannot be decompressed")
+    def test_corrupt_payload(self, stage, enable, make_event, encoding):
+        enable("gzip")
+        message = Message(b"Avada Kedavra")
+        message.content_encoding = encoding
+        event = make_event(message)
+        stage.handle_pipeline_event(event)
+
+        assert stage.previous.handle_pipeline_event.call_args[0][0] is event
+        assert event.message.data == b"Avada Kedavra"
+        assert event.message.content_encoding == encoding
+
+    @pytest.mark.it("Leaves the payload untouched if it has no compression content_encoding")
+    def test_not_compressed(self, stage, enable, make_event):
+        enable("gzip")
+        message = Message(b"Lumos")
+        message.content_encoding = "utf-8"
+        event = make_event(message)
+        stage.handle_pipeline_event(event)
+
+        assert event.message.data == b"Lumos"
+        assert event.message.content_encoding == "utf-8"
+
+
+pipeline_stage_test.add_base_pipeline_stage_tests(
+    cls=pipeline_stages_iothub.TelemetryAggregationStage,
+    module=this_module,
+    all_ops=all_common_ops + all_iothub_ops,
+    handled_ops=[pipeline_ops_iothub.SetTelemetryAggregationOperation],
+    all_events=all_common_events + all_iothub_events,
+    handled_events=[],
+    methods_that_enter_pipeline_thread=["_on_window_timer"],
+    extra_initializer_defaults={"window_size": None, "window_interval": None},
+)
+
+
+class TelemetryAggregationStageTestConfig(object):
+    @pytest.fixture
+    def stage(self, mocker):
+        return make_mock_stage(mocker, pipeline_stages_iothub.TelemetryAggregationStage)
+
+    @pytest.fixture
+    def scheduler(self, mocker):
+        scheduler = mocker.MagicMock()
+        mocker.patch.object(timer_scheduler, "get_scheduler", return_value=scheduler)
+        return scheduler
+
+    @pytest.fixture
+    def enable(self, stage, mocker):
+        def enable(window_size=None, window_interval=None):
+            stage.run_op(
+                pipeline_ops_iothub.SetTelemetryAggregationOperation(
+                    window_size=window_size,
+                    window_interval=window_interval,
+                    callback=mocker.MagicMock(),
+                )
+            )
+
+        return enable
+
+    @pytest.fixture
+    def send(self, stage, mocker):
+        def send(data, qos=1, **kwargs):
+            op = pipeline_ops_iothub.SendD2CMessageOperation(
+                message=Message(data, **kwargs), qos=qos, callback=mocker.MagicMock()
+            )
+            stage.run_op(op)
+            return op
+
+        return send
+
+    def get_summaries(self, stage):
+        return [
+            call[0][0]
+            for call in stage.next.run_op.call_args_list
+            if isinstance(call[0][0], pipeline_ops_iothub.SendD2CMessageOperation)
+        ]
+
+
+@pytest.mark.describe(
+    "TelemetryAggregationStage - .run_op() -- called with SetTelemetryAggregationOperation"
+)
+class TestTelemetryAggregationStageRunOpWithSetTelemetryAggregation(
+    TelemetryAggregationStageTestConfig
+):
+    @pytest.mark.it("Stores the window settings and completes the op without passing it on")
+    def test_stores_settings(self, stage, callback):
+        op = pipeline_ops_iothub.SetTelemetryAggregationOperation(
+            window_size=10, window_interval=2.5, callback=callback
+        )
+        stage.run_op(op)
+
+        assert stage.window_size == 10
+        assert stage.window_interval == 2.5
+        assert stage.next.run_op.call_count == 0
+        assert_callback_succeeded(op=op)
+
+    @pytest.mark.it("Sends a summary of the current window before changing the settings")
+    def test_sends_window(self, stage, enable, send):
+        enable(window_size=10)
+        send('{"temperature": 20}')
+        enable()
+
+        summaries = self.get_summaries(stage)
+        assert len(summaries) == 1
+        assert json.loads(summaries[0].message.data)["temperature"]["count"] == 1
+        assert stage.window_size is None
+
+
+@pytest.mark.describe("TelemetryAggregationStage - .run_op() -- called with ShutdownOperation")
+class TestTelemetryAggregationStageRunOpWithShutdown(TelemetryAggregationStageTestConfig):
+    @pytest.mark.it("Sends a summary of the current window before passing the op on")
+    def test_sends_window(self, mocker, stage, enable, send):
+        enable(window_size=10)
+        send('{"temperature": 20}')
+        op = pipeline_ops_base.ShutdownOperation(callback=mocker.MagicMock())
+        stage.run_op(op)
+
+        passed_ops = [call[0][0] for call in stage.next.run_op.call_args_list]
+        assert len(passed_ops) == 2
+        assert isinstance(passed_ops[0], pipeline_ops_iothub.SendD2CMessageOperation)
+        assert passed_ops[1] is op
+
+
+@pytest.mark.describe(
+    "TelemetryAggregationStage - .run_op() -- called with SendD2CMessageOperation"
+)
+class TestTelemetryAggregationStageRunOpWithSendD2CMessage(TelemetryAggregationStageTestConfig):
+    @pytest.mark.it("Passes the message through if aggregation is not enabled")
+    def test_disabled(self, stage, send):
+        op = send('{"temperature": 20}')
+
+        assert stage.next.run_op.call_args[0][0] is op
+
+    @pytest.mark.it("Completes the op without passing it on when the reading is added to a window")
+    @pytest.mark.parametrize(
+        "data",
+        [
+            pytest.param('{"temperature": 20}', id="str"),
+            pytest.param(b'{"temperature": 20}', id="bytes"),
+            pytest.param({"temperature": 20}, id="dict"),
+        ],
+    )
+    def test_buffers(self, stage, enable, send, data):
+        enable(window_size=10)
+        op = send(data)
+
+        assert stage.next.run_op.call_count == 0
+        assert_callback_succeeded(op=op)
+
+    @pytest.mark.it(
+        "Sends one summary message with the min, max, mean, count and last reading of each key when the window is full"
+    )
+    def test_sends_summary(self, stage, enable, send):
+        enable(window_size=3)
+        send('{"temperature": 20, "humidity": 40}')
+        send('{"temperature": 23.5}')
+        send('{"temperature": 21, "humidity": 50}')
+
+        summaries = self.get_summaries(stage)
+        assert len(summaries) == 1
+        message = summaries[0].message
+        assert message.content_type == "application/json"
+        assert message.content_encoding == "utf-8"
+        assert json.loads(message.data) == {
+            "temperature": {"min": 20.0, "max": 23.5, "mean": 21.5, "count": 3, "last": 21},
+            "humidity": {"min": 40.0, "max": 50.0, "mean": 45.0, "count": 2, "last": 50},
+        }
+
+    @pytest.mark.it("Starts a new window after sending a summary")
+    def test_new_window(self, stage, enable, send):
+        enable(window_size=2)
+        for value in range(5):
+            send('{"temperature": %d}' % value)
+
+        summaries = self.get_summaries(stage)
+        assert len(summaries) == 2
+        assert json.loads(summaries[1].message.data)["temperature"]["min"] == 2.0
+
+    @pytest.mark.it(
+        "Sends the summary at QoS 1 if any reading in the window was sent at QoS 1, otherwise at QoS 0"
+    )
+    @pytest.mark.parametrize("qos_values, expected_qos", [([0, 0], 0), ([0, 1], 1), ([1, 1], 1)])
+    def test_summary_qos(self, stage, enable, send, qos_values, expected_qos):
+        enable(window_size=2)
+        for qos in qos_values:
+            send('{"temperature": 20}', qos=qos)
+
+        assert self.get_summaries(stage)[0].qos == expected_qos
+
+    @pytest.mark.it("Passes messages which cannot be aggregated straight through")
+    @pytest.mark.parametrize(
+        "data, kwargs",
+        [
+            pytest.param("Expelliarmus", {}, id="Not JSON"),
+            pytest.param("[1, 2, 3]", {}, id="JSON array"),
+            pytest.param("{}", {}, id="Empty object"),
+            pytest.param('{"house": "Gryffindor"}', {}, id="Non-numeric value"),
+            pytest.param('{"sorted": true}', {}, id="Boolean value"),
+            pytest.param('{"points": {"Gryffindor": 10}}', {}, id="Nested object"),
+            pytest.param(b"\xff\xfe", {}, id="Invalid utf-8"),
+            pytest.param(42, {}, id="Not a str, bytes or dict"),
+            pytest.param('{"temperature": 20}', {"message_id": "owl-1"}, id="Has message_id"),
+            pytest.param(
+                '{"temperature": 20}', {"content_encoding": "gzip"}, id="Has content_encoding"
+            ),
+        ],
+    )
+    def test_passes_through(self, stage, enable, send, data, kwargs):
+        enable(window_size=10)
+        op = send(data, **kwargs)
+
+        assert stage.next.run_op.call_count == 1
+        assert stage.next.run_op.call_args[0][0] is op
+
+    @pytest.mark.it("Passes messages with custom properties straight through")
+    def test_custom_properties(self, stage, enable, mocker):
+        enable(window_size=10)
+        message = Message('{"temperature": 20}')
+        message.custom_properties["wand"] = "holly"
+        op = pipeline_ops_iothub.SendD2CMessageOperation(
+            message=message, callback=mocker.MagicMock()
+        )
+        stage.run_op(op)
+
+        assert stage.next.run_op.call_args[0][0] is op
+
+    @pytest.mark.it("Reports errors sending a summary to the unhandled exception handler")
+    def test_summary_error(self, stage, enable, send, fake_exception, unhandled_error_handler):
+        def next_stage_run_op(op):
+            op.error = fake_exception
+            op.callback(op)
+
+        stage.next.run_op = next_stage_run_op
+        enable(window_size=1)
+        send('{"temperature": 20}')
+
+        assert unhandled_error_handler.call_count == 1
+        assert unhandled_error_handler.call_args[0][0] is fake_exception
+
+    @pytest.mark.it("Counts aggregated readings and summary messages")
+    def test_statistics(self, stage, enable, send):
+        enable(window_size=2)
+        for value in range(3):
+            send('{"temperature": %d}' % value)
+
+        assert stage.get_statistics() == {"readings_aggregated": 3, "aggregate_messages_sent": 1}
+
+
+@pytest.mark.describe("TelemetryAggregationStage - time windows")
+class TestTelemetryAggregationStageTimeWindow(TelemetryAggregationStageTestConfig):
+    @pytest.mark.it("Schedules a timer for the window interval when the first reading is added")
+    def test_schedules_timer(self, stage, enable, send, scheduler):
+        enable(window_interval=5)
+        send('{"temperature": 20}')
+        send('{"temperature": 21}')
+
+        assert scheduler.schedule.call_count == 1
+        assert scheduler.schedule.call_args[0][0] == 5
+
+    @pytest.mark.it("Sends a summary when the timer fires")
+    def test_timer_sends_summary(self, stage, enable, send, scheduler):
+        enable(window_interval=5)
+        send('{"temperature": 20}')
+        send('{"temperature": 21}')
+        assert self.get_summaries(stage) == []
+
+        schedule_args = scheduler.schedule.call_args
+        schedule_args[0][1](*schedule_args[1]["args"])
+
+        summaries = self.get_summaries(stage)
+        assert len(summaries) == 1
+        assert json.loads(summaries[0].message.data)["temperature"]["count"] == 2
+
+    @pytest.mark.it(
+        "Cancels the timer when the window fills first, and ignores it if it fires late"
+    )
+    def test_cancels_timer(self, stage, enable, send, scheduler):
+        enable(window_size=2, window_interval=5)
+        send('{"temperature": 20}')
+        send('{"temperature": 21}')
+        send('{"temperature": 22}')
+
+        assert scheduler.schedule.return_value.cancel.call_count == 1
+        schedule_args = scheduler.schedule.call_args_list[0]
+        schedule_args[0][1](*schedule_args[1]["args"])
+
+        assert len(self.get_summaries(stage)) == 1
+
+
+@pytest.mark.describe("Telemetry aggregation - summary calculation")
+class TestSummarize(object):
+    @pytest.mark.it("Summarizes readings in pure Python")
+    def test_pure_python(self):
+        assert pipeline_stages_iothub._summarize([3, 1, 2.5, 2]) == {
+            "min": 1.0,
+            "max": 3.0,
+            "mean": 2.125,
+            "count": 4,
+            "last": 2,
+        }
+
+    @pytest.mark.it("Summarizes readings with NumPy, giving the same result as pure Python")
+    def test_numpy(self):
+        numpy = pytest.importorskip("numpy")
+        values = [3, 1, 2.5, 2]
+        assert pipeline_stages_iothub._summarize(values, numpy) == (
+            pipeline_stages_iothub._summarize(values)
+        )
+
+
+pipeline_stage_test.add_base_pipeline_stage_tests(
+    cls=pipeline_stages_iothub.RateLimitStage,
+    module=this_module,
+    all_ops=all_common_ops + all_iothub_ops,
+    handled_ops=[pipeline_ops_iothub.SetRateLimitsOperation],
+    all_events=all_common_events + all_iothub_events,
+    handled_events=[],
+    methods_that_enter_pipeline_thread=["_on_delay_expired"],
+    extra_initializer_defaults={"rate_limits": None},
+)
+
+
+class RateLimitStageTestConfig(object):
+    @pytest.fixture
+    def stage(self, mocker):
+        return make_mock_stage(mocker, pipeline_stages_iothub.RateLimitStage)
+
+    @pytest.fixture(autouse=True)
+    def mock_time(self, mocker):
+        mock_time = mocker.patch.object(rate_limiter, "time")
+        mock_time.time.return_value = 1000.0
+        return mock_time
+
+    @pytest.fixture
+    def scheduler(self, mocker):
+        scheduler = mocker.MagicMock()
+        mocker.patch.object(timer_scheduler, "get_scheduler", return_value=scheduler)
+        return scheduler
+
+    @pytest.fixture
+    def enable(self, stage, mocker):
+        def enable(**kwargs):
+            rate_limits = RateLimits(**kwargs)
+            stage.run_op(
+                pipeline_ops_iothub.SetRateLimitsOperation(
+                    rate_limits=rate_limits, callback=mocker.MagicMock()
+                )
+            )
+            return rate_limits
+
+        return enable
+
+    @pytest.fixture
+    def send(self, stage, mocker):
+        def send():
+            op = pipeline_ops_iothub.SendD2CMessageOperation(
+                message=Message(fake_payload), callback=mocker.MagicMock()
+            )
+            stage.run_op(op)
+            return op
+
+        return send
+
+    @pytest.fixture
+    def send_twin_request(self, stage, mocker):
+        def send_twin_request(request_type="twin"):
+            op = pipeline_ops_base.SendIotRequestOperation(
+                request_type=request_type,
+                method="PATCH",
+                resource_location="/properties/reported/",
+                request_body="{}",
+                request_id="1",
+                callback=mocker.MagicMock(),
+            )
+            stage.run_op(op)
+            return op
+
+        return send_twin_request
+
+    def fire_timers(self, scheduler):
+        for call in scheduler.schedule.call_args_list:
+            call[0][1](*call[1]["args"])
+
+    def get_passed_ops(self, stage):
+        return [call[0][0] for call in stage.next.run_op.call_args_list]
+
+
+@pytest.mark.describe("RateLimitStage - .run_op() -- called with SetRateLimitsOperation")
+class TestRateLimitStageRunOpWithSetRateLimits(RateLimitStageTestConfig):
+    @pytest.mark.it("Stores the RateLimits and completes the op without passing it on")
+    def test_stores_rate_limits(self, stage, callback):
+        rate_limits = RateLimits(telemetry=10)
+        op = pipeline_ops_iothub.SetRateLimitsOperation(rate_limits=rate_limits, callback=callback)
+        stage.run_op(op)
+
+        assert stage.rate_limits is rate_limits
+        assert stage.next.run_op.call_count == 0
+        assert_callback_succeeded(op=op)
+
+
+@pytest.mark.describe("RateLimitStage - .run_op() -- called with rate limited operations")
+class TestRateLimitStageRunOpWithLimitedOps(RateLimitStageTestConfig):
+    @pytest.mark.it("Passes operations on immediately if rate limiting is not enabled")
+    def test_disabled(self, stage, send, scheduler):
+        ops = [send() for _ in range(10)]
+
+        assert self.get_passed_ops(stage) == ops
+        assert scheduler.schedule.call_count == 0
+
+    @pytest.mark.it("Passes operations on immediately up to the burst size")
+    def test_burst(self, stage, enable, send, scheduler):
+        enable(telemetry=5)
+        ops = [send() for _ in range(5)]
+
+        assert self.get_passed_ops(stage) == ops
+        assert scheduler.schedule.call_count == 0
+
+    @pytest.mark.it("Queues operations which exceed the limit until their tokens are available")
+    def test_queues(self, stage, enable, send, scheduler):
+        enable(telemetry=2)
+        ops = [send() for _ in range(4)]
+
+        assert self.get_passed_ops(stage) == ops[:2]
+        assert scheduler.schedule.call_count == 2
+        assert scheduler.schedule.call_args_list[0][0][0] == pytest.approx(0.5)
+        assert scheduler.schedule.call_args_list[1][0][0] == pytest.approx(1.0)
+        assert stage.get_statistics() == {"operations_delayed": 2, "operations_queued": 2}
+
+    @pytest.mark.it("Passes queued operations on in the order they arrived")
+    def test_order(self, stage, enable, send, scheduler):
+        enable(telemetry=1)
+        ops = [send() for _ in range(4)]
+        self.fire_timers(scheduler)
+
+        assert self.get_passed_ops(stage) == ops
+        assert stage.get_statistics()["operations_queued"] == 0
+
+    @pytest.mark.it(
+        "Queues operations behind already queued operations, even if tokens are available"
+    )
+    def test_queues_behind(self, stage, enable, send, scheduler, mock_time):
+        enable(telemetry=1)
+        send()
+        send()
+        mock_time.time.return_value += 10
+        send()
+
+        assert stage.next.run_op.call_count == 1
+        assert scheduler.schedule.call_count == 2
+
+    @pytest.mark.it("Limits twin requests separately from telemetry")
+    def test_twin(self, stage, enable, send, send_twin_request, scheduler):
+        enable(telemetry=1, twin=1)
+        send()
+        send()
+        twin_op = send_twin_request()
+
+        assert self.get_passed_ops(stage)[-1] is twin_op
+        send_twin_request()
+        assert scheduler.schedule.call_count == 2
+
+    @pytest.mark.it("Does not limit requests which are not twin requests")
+    def test_other_request(self, stage, enable, send_twin_request, scheduler):
+        enable(twin=1)
+        ops = [send_twin_request(request_type="not_twin") for _ in range(3)]
+
+        assert self.get_passed_ops(stage) == ops
+
+    @pytest.mark.it("Does not limit operations of a class which has no limit")
+    def test_no_limit(self, stage, enable, send, scheduler):
+        enable(twin=1)
+        ops = [send() for _ in range(3)]
+
+        assert self.get_passed_ops(stage) == ops
+
+    @pytest.mark.it("Counts method responses in chunks of 4 KB")
+    @pytest.mark.parametrize(
+        "payload, chunks",
+        [
+            pytest.param(None, 1, id="Empty payload"),
+            pytest.param("a" * 5000, 2, id="5 KB payload"),
+            pytest.param({"data": "a" * 9000}, 3, id="9 KB payload"),
+        ],
+    )
+    def test_method_response(self, mocker, stage, enable, scheduler, payload, chunks):
+        rate_limits = enable(methods=10)
+        spy_reserve = mocker.spy(rate_limits.methods, "reserve")
+        method_response = MethodResponse(request_id="1", status=200, payload=payload)
+        stage.run_op(
+            pipeline_ops_iothub.SendMethodResponseOperation(
+                method_response=method_response, callback=mocker.MagicMock()
+            )
+        )
+
+        assert spy_reserve.call_args == mocker.call(chunks)
+
+    @pytest.mark.it("Still passes queued operations on after rate limiting is disabled")
+    def test_disable_while_queued(self, stage, enable, send, scheduler, mocker):
+        enable(telemetry=1)
+        ops = [send() for _ in range(2)]
+        stage.run_op(
+            pipeline_ops_iothub.SetRateLimitsOperation(
+                rate_limits=None, callback=mocker.MagicMock()
+            )
+        )
+        self.fire_timers(scheduler)
+
+        assert self.get_passed_ops(stage) == ops
+
+    @pytest.mark.it("Resets the number of operations delayed but not the number queued")
+    def test_reset_statistics(self, stage, enable, send, scheduler):
+        enable(telemetry=1)
+        send()
+        send()
+        stage.reset_statistics()
+
+        assert stage.get_statistics() == {"operations_delayed": 0, "operations_queued": 1}
+
+
+@pytest.mark.describe("RateLimitStage - .run_op() -- called with ShutdownOperation")
+class TestRateLimitStageRunOpWithShutdown(RateLimitStageTestConfig):
+    @pytest.mark.it(
+        "Fails queued operations with an OperationCancelledError, then passes the op on"
+    )
+    def test_fails_queued_ops(self, mocker, stage, enable, send, scheduler):
+        enable(telemetry=1)
+        ops = [send() for _ in range(3)]
+        op = pipeline_ops_base.ShutdownOperation(callback=mocker.MagicMock())
+        stage.run_op(op)
+
+        assert self.get_passed_ops(stage) == [ops[0], op]
+        for queued_op in ops[1:]:
+            assert_callback_failed(op=queued_op, error=errors.OperationCancelledError)
+        assert stage.get_statistics()["operations_queued"] == 0
+
+    @pytest.mark.it("Ignores the timers of the operations which were failed")
+    def test_ignores_timers(self, mocker, stage, enable, send, scheduler):
+        enable(telemetry=1)
+        send()
+        send()
+        stage.run_op(pipeline_ops_base.ShutdownOperation(callback=mocker.MagicMock()))
+        self.fire_timers(scheduler)
+
+        assert stage.next.run_op.call_count == 2
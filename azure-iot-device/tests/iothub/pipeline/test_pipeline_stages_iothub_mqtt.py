@@ -844,6 +844,16 @@ class TestIoTHubMQTTConverterForPublishOps(object):
         new_op = stage.next._execute_op.call_args[0][0]
         assert new_op.payload == params["publish_payload"]
 
+    @pytest.mark.it("Publishes with the qos of the original operation")
+    @pytest.mark.parametrize("qos", [0, 1])
+    def test_uses_op_qos(self, stage, stages_configured_for_both, params, op, qos):
+        if params["op_class"] is pipeline_ops_iothub.SendMethodResponseOperation:
+            pytest.skip()
+        op.qos = qos
+        stage.run_op(op)
+        new_op = stage.next._execute_op.call_args[0][0]
+        assert new_op.qos == qos
+
 
 feature_name_to_subscribe_topic = [
     {
@@ -313,3 +313,111 @@ class TestInboxManagerRouteMethodRequest(object):
         # Method Request 2 was delivered to its corresponding named inbox since the method name is known
         assert method_request2 in named_method_inbox
         assert method_request2 not in generic_method_inbox
+
+
+@pytest.mark.describe("InboxManager - .route_twin_patch()")
+class TestInboxManagerRouteTwinPatch(object):
+    @pytest.mark.it("Adds each twin patch to the twin patch inbox by default")
+    def test_routes_patches(self, manager):
+        patch1 = {"house": "Gryffindor", "$version": 1}
+        patch2 = {"house": "Slytherin", "$version": 2}
+        assert manager.route_twin_patch(patch1)
+        assert manager.route_twin_patch(patch2)
+
+        twin_patch_inbox = manager.get_twin_patch_inbox()
+        assert twin_patch_inbox.qsize() == 2
+        assert patch1 in twin_patch_inbox
+        assert patch2 in twin_patch_inbox
+
+    @pytest.mark.it(
+        "Merges each twin patch into the patch waiting in the twin patch inbox, if coalescing twin patches"
+    )
+    def test_coalesces_patches(self, manager):
+        manager.coalesce_twin_patches = True
+        manager.route_twin_patch({"house": "Gryffindor", "pet": {"owl": "Hedwig"}, "$version": 1})
+        manager.route_twin_patch({"pet": {"rat": "Scabbers"}, "wand": "holly", "$version": 2})
+        manager.route_twin_patch({"pet": {"rat": None}, "house": None, "$version": 3})
+
+        twin_patch_inbox = manager.get_twin_patch_inbox()
+        assert twin_patch_inbox.qsize() == 1
+        assert {
+            "house": None,
+            "pet": {"owl": "Hedwig", "rat": None},
+            "wand": "holly",
+            "$version": 3,
+        } in twin_patch_inbox
+
+    @pytest.mark.it("Adds a twin patch to an empty twin patch inbox, if coalescing twin patches")
+    def test_coalescing_empty_inbox(self, manager):
+        manager.coalesce_twin_patches = True
+        patch = {"house": "Gryffindor", "$version": 1}
+        manager.route_twin_patch(patch)
+
+        twin_patch_inbox = manager.get_twin_patch_inbox()
+        assert twin_patch_inbox.qsize() == 1
+        assert patch in twin_patch_inbox
+
+    @pytest.mark.it(
+        "Queues a twin patch behind the waiting patch, if coalescing twin patches and it sets a property which the waiting patch deleted to an object"
+    )
+    def test_coalescing_after_deletion(self, manager):
+        manager.coalesce_twin_patches = True
+        patch1 = {"pet": None, "$version": 1}
+        patch2 = {"pet": {"rat": "Scabbers"}, "$version": 2}
+        manager.route_twin_patch(patch1)
+        manager.route_twin_patch(patch2)
+
+        twin_patch_inbox = manager.get_twin_patch_inbox()
+        assert twin_patch_inbox.qsize() == 2
+        assert patch1 in twin_patch_inbox
+        assert patch2 in twin_patch_inbox
+
+
+@pytest.mark.describe("InboxManager - .get_statistics()")
+class TestInboxManagerGetStatistics(object):
+    @pytest.mark.it("Starts with no items routed, dropped, or waiting")
+    def test_initial_values(self, manager):
+        assert manager.get_statistics() == {
+            "inbox_items_routed": 0,
+            "inbox_items_dropped": 0,
+            "inbox_depth": 0,
+        }
+
+    @pytest.mark.it("Counts routed items and the items waiting in all inboxes")
+    def test_routed(self, manager, method_request):
+        manager.get_input_message_inbox("some_input")
+        manager.get_method_request_inbox(method_request.name)
+        manager.route_c2d_message(Message("c2d"))
+        manager.route_input_message("some_input", Message("input"))
+        manager.route_method_request(method_request)
+        manager.route_twin_patch({"house": "Gryffindor"})
+
+        statistics = manager.get_statistics()
+        assert statistics["inbox_items_routed"] == 4
+        assert statistics["inbox_depth"] == 4
+
+    @pytest.mark.it("Counts input messages for unknown inputs as dropped")
+    def test_dropped_input(self, manager):
+        manager.route_input_message("unknown_input", Message("input"))
+
+        statistics = manager.get_statistics()
+        assert statistics["inbox_items_dropped"] == 1
+        assert statistics["inbox_items_routed"] == 0
+
+    @pytest.mark.it("Counts method requests cleared from inboxes as dropped")
+    def test_dropped_method_requests(self, manager, method_request):
+        manager.route_method_request(method_request)
+        manager.clear_all_method_requests()
+
+        statistics = manager.get_statistics()
+        assert statistics["inbox_items_dropped"] == 1
+        assert statistics["inbox_depth"] == 0
+
+    @pytest.mark.it("Resets counters but not the items waiting in inboxes")
+    def test_reset(self, manager):
+        manager.route_c2d_message(Message("c2d"))
+        manager.reset_statistics()
+
+        statistics = manager.get_statistics()
+        assert statistics["inbox_items_routed"] == 0
+        assert statistics["inbox_depth"] == 1
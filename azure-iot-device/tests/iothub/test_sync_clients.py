@@ -13,10 +13,12 @@ import io
 import six
 from azure.iot.device.iothub import IoTHubDeviceClient, IoTHubModuleClient
 from azure.iot.device.iothub.pipeline import IoTHubPipeline, constant
-from azure.iot.device.iothub.models import Message, MethodRequest
+from azure.iot.device.iothub.models import Message, MethodRequest, RateLimits
 from azure.iot.device.iothub.sync_inbox import SyncClientInbox, InboxEmpty
 from azure.iot.device.iothub.auth import IoTEdgeError
 import azure.iot.device.iothub.sync_clients as sync_clients
+from azure.iot.device.common import errors
+from azure.iot.device.common.pipeline import pipeline_stages_base
 
 
 logging.basicConfig(level=logging.INFO)
@@ -108,7 +110,24 @@ class SharedClientCreateFromConnectionStringTests(object):
         client_class.create_from_connection_string(*args, **kwargs)
 
         assert mock_pipeline_init.call_count == 1
-        assert mock_pipeline_init.call_args == mocker.call(mock_auth)
+        assert mock_pipeline_init.call_args == mocker.call(
+            mock_auth, keep_alive=None, ping_timeout=None, max_round_trip_time=None
+        )
+
+    @pytest.mark.it(
+        "Passes the keep_alive, ping_timeout and max_round_trip_time to the IoTHubPipeline"
+    )
+    def test_pipeline_keep_alive(self, mocker, client_class, connection_string):
+        mocker.patch("azure.iot.device.iothub.auth.SymmetricKeyAuthenticationProvider")
+        mock_pipeline_init = mocker.patch("azure.iot.device.iothub.pipeline.IoTHubPipeline")
+
+        client_class.create_from_connection_string(
+            connection_string, keep_alive=15, ping_timeout=5, max_round_trip_time=2
+        )
+
+        assert mock_pipeline_init.call_args == mocker.call(
+            mocker.ANY, keep_alive=15, ping_timeout=5, max_round_trip_time=2
+        )
 
     @pytest.mark.it("Uses the IoTHubPipeline to instantiate the client")
     @pytest.mark.parametrize(
@@ -191,7 +210,24 @@ class SharedClientCreateFromSharedAccessSignature(object):
         client_class.create_from_shared_access_signature(sas_token_string)
 
         assert mock_pipeline_init.call_count == 1
-        assert mock_pipeline_init.call_args == mocker.call(mock_auth)
+        assert mock_pipeline_init.call_args == mocker.call(
+            mock_auth, keep_alive=None, ping_timeout=None, max_round_trip_time=None
+        )
+
+    @pytest.mark.it(
+        "Passes the keep_alive, ping_timeout and max_round_trip_time to the IoTHubPipeline"
+    )
+    def test_pipeline_keep_alive(self, mocker, client_class, sas_token_string):
+        mocker.patch("azure.iot.device.iothub.auth.SharedAccessSignatureAuthenticationProvider")
+        mock_pipeline_init = mocker.patch("azure.iot.device.iothub.pipeline.IoTHubPipeline")
+
+        client_class.create_from_shared_access_signature(
+            sas_token_string, keep_alive=15, ping_timeout=5, max_round_trip_time=2
+        )
+
+        assert mock_pipeline_init.call_args == mocker.call(
+            mocker.ANY, keep_alive=15, ping_timeout=5, max_round_trip_time=2
+        )
 
     @pytest.mark.it("Uses the IoTHubPipeline to instantiate the client")
     def test_client_instantiation(self, mocker, client_class, sas_token_string):
@@ -264,6 +300,16 @@ class SharedClientConnectTests(WaitsForEventCompletion):
         )
         client_manual_cb.connect()
 
+    @pytest.mark.it(
+        "Raises the error if the 'connect' pipeline operation is cancelled by a shutdown"
+    )
+    def test_raises_cancelled_error(self, client, iothub_pipeline):
+        error = errors.OperationCancelledError()
+        iothub_pipeline.connect.side_effect = lambda callback: callback(error=error)
+
+        with pytest.raises(errors.OperationCancelledError):
+            client.connect()
+
 
 class SharedClientDisconnectTests(WaitsForEventCompletion):
     @pytest.mark.it("Begins a 'disconnect' pipeline operation")
@@ -282,6 +328,35 @@ class SharedClientDisconnectTests(WaitsForEventCompletion):
         )
         client_manual_cb.disconnect()
 
+    @pytest.mark.it(
+        "Raises the error if the 'disconnect' pipeline operation is cancelled by a shutdown"
+    )
+    def test_raises_cancelled_error(self, client, iothub_pipeline):
+        error = errors.OperationCancelledError()
+        iothub_pipeline.disconnect.side_effect = lambda callback: callback(error=error)
+
+        with pytest.raises(errors.OperationCancelledError):
+            client.disconnect()
+
+
+class SharedClientShutdownTests(WaitsForEventCompletion):
+    @pytest.mark.it("Begins a 'shutdown' pipeline operation with the provided timeout")
+    def test_calls_pipeline_shutdown(self, client, iothub_pipeline):
+        client.shutdown(timeout=5)
+        assert iothub_pipeline.shutdown.call_count == 1
+        assert iothub_pipeline.shutdown.call_args[1]["timeout"] == 5
+
+    @pytest.mark.it(
+        "Waits for the completion of the 'shutdown' pipeline operation before returning"
+    )
+    def test_waits_for_pipeline_op_completion(
+        self, mocker, client_manual_cb, iothub_pipeline_manual_cb
+    ):
+        self.add_event_completion_checks(
+            mocker=mocker, pipeline_function=iothub_pipeline_manual_cb.shutdown
+        )
+        client_manual_cb.shutdown()
+
 
 class SharedClientDisconnectEventTests(object):
     @pytest.mark.it("Clears all pending MethodRequests upon disconnect")
@@ -332,6 +407,16 @@ class SharedClientSendD2CMessageTests(WaitsForEventCompletion):
         assert isinstance(sent_message, Message)
         assert sent_message.data == message_input
 
+    @pytest.mark.it(
+        "Raises the error if the 'send_message' pipeline operation is cancelled by a shutdown"
+    )
+    def test_raises_cancelled_error(self, client, iothub_pipeline, message):
+        error = errors.OperationCancelledError()
+        iothub_pipeline.send_message.side_effect = lambda message, callback: callback(error=error)
+
+        with pytest.raises(errors.OperationCancelledError):
+            client.send_message(message)
+
 
 class SharedClientReceiveMethodRequestTests(object):
     @pytest.mark.it("Implicitly enables methods feature if not already enabled")
@@ -514,6 +599,30 @@ class SharedClientSendMethodResponseTests(WaitsForEventCompletion):
         )
         client_manual_cb.send_method_response(method_response)
 
+    @pytest.mark.it(
+        "Raises the error if the 'send_method_response' pipeline operation is cancelled by a shutdown"
+    )
+    def test_raises_cancelled_error(self, client, iothub_pipeline, method_response):
+        error = errors.OperationCancelledError()
+        iothub_pipeline.send_method_response.side_effect = lambda response, callback: callback(
+            error=error
+        )
+
+        with pytest.raises(errors.OperationCancelledError):
+            client.send_method_response(method_response)
+
+
+def real_pipeline_with_unanswered_twin_requests(mocker, request_timeout):
+    """Create a real IoTHubPipeline whose requests are never answered by the service"""
+    pipeline = IoTHubPipeline(mocker.MagicMock())
+    pipeline.feature_enabled[constant.TWIN] = True
+    stage = pipeline._pipeline
+    while not isinstance(stage, pipeline_stages_base.CoordinateRequestAndResponseStage):
+        stage = stage.next
+    stage.request_timeout = request_timeout
+    mocker.patch.object(stage.next, "run_op")
+    return pipeline
+
 
 class SharedClientGetTwinTests(WaitsForEventCompletion):
     @pytest.mark.it("Implicitly enables twin messaging feature if not already enabled")
@@ -539,6 +648,20 @@ class SharedClientGetTwinTests(WaitsForEventCompletion):
         client.get_twin()
         assert iothub_pipeline.enable_feature.call_count == 0
 
+    @pytest.mark.it(
+        "Raises the error if enabling the twin messaging feature is cancelled by a shutdown"
+    )
+    def test_enable_feature_cancelled(self, client, iothub_pipeline):
+        iothub_pipeline.feature_enabled.__getitem__.return_value = False
+        error = errors.OperationCancelledError()
+        iothub_pipeline.enable_feature.side_effect = lambda feature_name, callback: callback(
+            error=error
+        )
+
+        with pytest.raises(errors.OperationCancelledError):
+            client.get_twin()
+        assert iothub_pipeline.get_twin.call_count == 0
+
     @pytest.mark.it("Begins a 'get_twin' pipeline operation")
     def test_get_twin_calls_pipeline(self, client, iothub_pipeline):
         client.get_twin()
@@ -564,6 +687,32 @@ class SharedClientGetTwinTests(WaitsForEventCompletion):
         returned_twin = client_manual_cb.get_twin()
         assert returned_twin == twin
 
+    @pytest.mark.it("Raises the error if the 'get_twin' pipeline operation fails")
+    @pytest.mark.parametrize(
+        "error",
+        [
+            pytest.param(errors.TimeoutError(), id="TimeoutError"),
+            pytest.param(errors.ConnectionDroppedError(), id="ConnectionDroppedError"),
+            pytest.param(errors.PipelineError(), id="PipelineError"),
+            pytest.param(errors.OperationCancelledError(), id="OperationCancelledError"),
+        ],
+    )
+    def test_raises_error_on_pipeline_op_failure(self, client, iothub_pipeline, error):
+        iothub_pipeline.get_twin.side_effect = lambda callback: callback(error=error)
+
+        with pytest.raises(type(error)):
+            client.get_twin()
+
+    @pytest.mark.it(
+        "Raises TimeoutError if the service does not respond to the twin request in time"
+    )
+    def test_request_timeout(self, mocker, client_class):
+        pipeline = real_pipeline_with_unanswered_twin_requests(mocker, request_timeout=0.1)
+        client = client_class(pipeline)
+
+        with pytest.raises(errors.TimeoutError):
+            client.get_twin()
+
 
 class SharedClientPatchTwinReportedPropertiesTests(WaitsForEventCompletion):
     @pytest.mark.it("Implicitly enables twin messaging feature if not already enabled")
@@ -616,6 +765,92 @@ class SharedClientPatchTwinReportedPropertiesTests(WaitsForEventCompletion):
         )
         client_manual_cb.patch_twin_reported_properties(twin_patch_reported)
 
+    @pytest.mark.it(
+        "Raises the error if the 'patch_twin_reported_properties' pipeline operation fails"
+    )
+    @pytest.mark.parametrize(
+        "error",
+        [
+            pytest.param(errors.TimeoutError(), id="TimeoutError"),
+            pytest.param(errors.ConnectionDroppedError(), id="ConnectionDroppedError"),
+            pytest.param(errors.PipelineError(), id="PipelineError"),
+            pytest.param(errors.OperationCancelledError(), id="OperationCancelledError"),
+        ],
+    )
+    def test_raises_error_on_pipeline_op_failure(
+        self, client, iothub_pipeline, twin_patch_reported, error
+    ):
+        iothub_pipeline.patch_twin_reported_properties.side_effect = (
+            lambda patch, callback: callback(error=error)
+        )
+
+        with pytest.raises(type(error)):
+            client.patch_twin_reported_properties(twin_patch_reported)
+
+    @pytest.mark.it(
+        "Raises TimeoutError if the service does not respond to the reported properties patch in time"
+    )
+    def test_request_timeout(self, mocker, client_class, twin_patch_reported):
+        pipeline = real_pipeline_with_unanswered_twin_requests(mocker, request_timeout=0.1)
+        client = client_class(pipeline)
+
+        with pytest.raises(errors.TimeoutError):
+            client.patch_twin_reported_properties(twin_patch_reported)
+
+    @pytest.mark.it(
+        "Does not treat a failed patch as acknowledged, if reported properties diffing is enabled"
+    )
+    def test_diffing_failed_patch(self, client, iothub_pipeline):
+        client.enable_reported_properties_diffing()
+        iothub_pipeline.patch_twin_reported_properties.side_effect = (
+            lambda patch, callback: callback(error=errors.TimeoutError())
+        )
+        with pytest.raises(errors.TimeoutError):
+            client.patch_twin_reported_properties({"house": "Gryffindor"})
+
+        iothub_pipeline.patch_twin_reported_properties.side_effect = None
+        client.patch_twin_reported_properties({"house": "Gryffindor"})
+
+        assert iothub_pipeline.patch_twin_reported_properties.call_count == 2
+        assert iothub_pipeline.patch_twin_reported_properties.call_args[1]["patch"] == {
+            "house": "Gryffindor"
+        }
+
+    @pytest.mark.it(
+        "Sends only the properties which change the acknowledged reported properties, if reported properties diffing is enabled"
+    )
+    def test_diffing(self, client, iothub_pipeline):
+        client.enable_reported_properties_diffing()
+        client.patch_twin_reported_properties({"house": "Gryffindor", "pet": {"owl": "Hedwig"}})
+        client.patch_twin_reported_properties(
+            {"house": "Gryffindor", "pet": {"owl": "Hedwig", "rat": "Scabbers"}, "wand": None}
+        )
+
+        assert iothub_pipeline.patch_twin_reported_properties.call_count == 2
+        assert iothub_pipeline.patch_twin_reported_properties.call_args[1]["patch"] == {
+            "pet": {"rat": "Scabbers"},
+            "wand": None,
+        }
+
+    @pytest.mark.it(
+        "Does not send a patch which does not change the acknowledged reported properties, if reported properties diffing is enabled"
+    )
+    def test_diffing_unchanged(self, client, iothub_pipeline):
+        client.enable_reported_properties_diffing()
+        client.patch_twin_reported_properties({"house": "Gryffindor"})
+        client.patch_twin_reported_properties({"house": "Gryffindor"})
+
+        assert iothub_pipeline.patch_twin_reported_properties.call_count == 1
+
+    @pytest.mark.it("Sends the patch as provided, if reported properties diffing is disabled")
+    def test_diffing_disabled(self, client, iothub_pipeline):
+        client.enable_reported_properties_diffing()
+        client.disable_reported_properties_diffing()
+        client.patch_twin_reported_properties({"house": "Gryffindor"})
+        client.patch_twin_reported_properties({"house": "Gryffindor"})
+
+        assert iothub_pipeline.patch_twin_reported_properties.call_count == 2
+
 
 class SharedClientReceiveTwinDesiredPropertiesPatchTests(object):
     @pytest.mark.it(
@@ -717,6 +952,147 @@ class SharedClientReceiveTwinDesiredPropertiesPatchTests(object):
             client.receive_twin_desired_properties_patch(block=False)
 
 
+class SharedClientPayloadCompressionTests(object):
+    @pytest.mark.it("Enables gzip compression on the IoTHubPipeline with default settings")
+    def test_enable_defaults(self, mocker, client, iothub_pipeline):
+        client.enable_payload_compression()
+
+        assert iothub_pipeline.set_payload_compression.call_count == 1
+        assert iothub_pipeline.set_payload_compression.call_args == mocker.call(
+            encoding="gzip", threshold=1024, level=6, dictionary=None, dictionary_id=None
+        )
+
+    @pytest.mark.it("Enables compression on the IoTHubPipeline with the provided settings")
+    def test_enable(self, mocker, client, iothub_pipeline):
+        client.enable_payload_compression(
+            encoding="deflate", threshold=1, level=9, dictionary=b"Leviosa", dictionary_id="charms"
+        )
+
+        assert iothub_pipeline.set_payload_compression.call_args == mocker.call(
+            encoding="deflate", threshold=1, level=9, dictionary=b"Leviosa", dictionary_id="charms"
+        )
+
+    @pytest.mark.it("Disables compression on the IoTHubPipeline")
+    def test_disable(self, mocker, client, iothub_pipeline):
+        client.disable_payload_compression()
+
+        assert iothub_pipeline.set_payload_compression.call_args == mocker.call(encoding=None)
+
+
+class SharedClientTelemetryAggregationTests(object):
+    @pytest.mark.it("Enables aggregation on the IoTHubPipeline with the provided settings")
+    @pytest.mark.parametrize("window_size, window_interval", [(100, None), (None, 1.5), (100, 1.5)])
+    def test_enable(self, mocker, client, iothub_pipeline, window_size, window_interval):
+        client.enable_telemetry_aggregation(
+            window_size=window_size, window_interval=window_interval
+        )
+
+        assert iothub_pipeline.set_telemetry_aggregation.call_count == 1
+        assert iothub_pipeline.set_telemetry_aggregation.call_args == mocker.call(
+            window_size=window_size, window_interval=window_interval
+        )
+
+    @pytest.mark.it("Raises a ValueError if neither window_size nor window_interval is provided")
+    def test_enable_no_window(self, client, iothub_pipeline):
+        with pytest.raises(ValueError):
+            client.enable_telemetry_aggregation()
+
+        assert iothub_pipeline.set_telemetry_aggregation.call_count == 0
+
+    @pytest.mark.it("Disables aggregation on the IoTHubPipeline")
+    def test_disable(self, mocker, client, iothub_pipeline):
+        client.disable_telemetry_aggregation()
+
+        assert iothub_pipeline.set_telemetry_aggregation.call_args == mocker.call(
+            window_size=None, window_interval=None
+        )
+
+
+class SharedClientRateLimitingTests(object):
+    @pytest.mark.it("Sets the provided RateLimits on the IoTHubPipeline")
+    def test_enable(self, mocker, client, iothub_pipeline):
+        rate_limits = RateLimits.for_tier("S1")
+        client.enable_rate_limiting(rate_limits)
+
+        assert iothub_pipeline.set_rate_limits.call_count == 1
+        assert iothub_pipeline.set_rate_limits.call_args == mocker.call(rate_limits)
+
+    @pytest.mark.it("Removes the RateLimits from the IoTHubPipeline")
+    def test_disable(self, mocker, client, iothub_pipeline):
+        client.disable_rate_limiting()
+
+        assert iothub_pipeline.set_rate_limits.call_args == mocker.call(None)
+
+
+class SharedClientTwinPatchCoalescingTests(object):
+    @pytest.mark.it("Enables coalescing of twin patches on the InboxManager")
+    def test_enable(self, client):
+        client.enable_twin_patch_coalescing()
+        assert client._inbox_manager.coalesce_twin_patches is True
+
+    @pytest.mark.it("Disables coalescing of twin patches on the InboxManager")
+    def test_disable(self, client):
+        client.enable_twin_patch_coalescing()
+        client.disable_twin_patch_coalescing()
+        assert client._inbox_manager.coalesce_twin_patches is False
+
+    @pytest.mark.it("Receives a single merged patch for the patches which arrived while enabled")
+    def test_receives_merged_patch(self, client, iothub_pipeline):
+        iothub_pipeline.feature_enabled.__getitem__.return_value = True
+        client.enable_twin_patch_coalescing()
+        iothub_pipeline.on_twin_patch_received({"house": "Gryffindor", "$version": 1})
+        iothub_pipeline.on_twin_patch_received({"wand": "holly", "$version": 2})
+
+        patch = client.receive_twin_desired_properties_patch()
+        assert patch == {"house": "Gryffindor", "wand": "holly", "$version": 2}
+        assert client._inbox_manager.get_twin_patch_inbox().empty()
+
+
+class SharedClientTelemetryQosTests(object):
+    @pytest.mark.it("Gets the telemetry_qos from the IoTHubPipeline")
+    def test_get(self, client, iothub_pipeline):
+        iothub_pipeline.telemetry_qos = 0
+        assert client.telemetry_qos == 0
+
+    @pytest.mark.it("Sets the telemetry_qos on the IoTHubPipeline")
+    @pytest.mark.parametrize("qos", [0, 1])
+    def test_set(self, client, iothub_pipeline, qos):
+        client.telemetry_qos = qos
+        assert iothub_pipeline.telemetry_qos == qos
+
+    @pytest.mark.it("Raises a ValueError if set to a qos other than 0 or 1")
+    @pytest.mark.parametrize("qos", [-1, 2, None])
+    def test_set_invalid(self, client, iothub_pipeline, qos):
+        iothub_pipeline.telemetry_qos = 1
+        with pytest.raises(ValueError):
+            client.telemetry_qos = qos
+        assert iothub_pipeline.telemetry_qos == 1
+
+
+class SharedClientStatisticsTests(object):
+    @pytest.mark.it("Returns the statistics from the IoTHubPipeline merged with those of the inboxes")
+    def test_get_statistics(self, client, iothub_pipeline):
+        iothub_pipeline.get_statistics.return_value = {"publishes_sent": 3, "bytes_sent": 42}
+        client._inbox_manager.route_twin_patch({"house": "Hufflepuff"})
+
+        statistics = client.get_statistics()
+
+        assert iothub_pipeline.get_statistics.call_count == 1
+        assert statistics["publishes_sent"] == 3
+        assert statistics["bytes_sent"] == 42
+        assert statistics["inbox_items_routed"] == 1
+        assert statistics["inbox_depth"] == 1
+
+    @pytest.mark.it("Resets the statistics in the IoTHubPipeline and the inboxes")
+    def test_reset_statistics(self, client, iothub_pipeline):
+        client._inbox_manager.route_twin_patch({"house": "Hufflepuff"})
+
+        client.reset_statistics()
+
+        assert iothub_pipeline.reset_statistics.call_count == 1
+        assert client.get_statistics()["inbox_items_routed"] == 0
+
+
 ################
 # DEVICE TESTS #
 ################
@@ -816,7 +1192,9 @@ class TestIoTHubDeviceClientCreateFromX509Certificate(IoTHubDeviceClientTestsCon
         )
 
         assert mock_pipeline_init.call_count == 1
-        assert mock_pipeline_init.call_args == mocker.call(mock_auth)
+        assert mock_pipeline_init.call_args == mocker.call(
+            mock_auth, keep_alive=None, ping_timeout=None, max_round_trip_time=None
+        )
 
     @pytest.mark.it("Uses the IoTHubPipeline to instantiate the client")
     def test_client_instantiation(self, mocker, client_class, x509):
@@ -849,6 +1227,11 @@ class TestIoTHubDeviceClientDisconnect(IoTHubDeviceClientTestsConfig, SharedClie
     pass
 
 
+@pytest.mark.describe("IoTHubDeviceClient (Synchronous) - .shutdown()")
+class TestIoTHubDeviceClientShutdown(IoTHubDeviceClientTestsConfig, SharedClientShutdownTests):
+    pass
+
+
 @pytest.mark.describe("IoTHubDeviceClient (Synchronous) - EVENT: Disconnect")
 class TestIoTHubDeviceClientDisconnectEvent(
     IoTHubDeviceClientTestsConfig, SharedClientDisconnectEventTests
@@ -957,6 +1340,59 @@ class TestIoTHubDeviceClientReceiveC2DMessage(IoTHubDeviceClientTestsConfig):
             client.receive_message(block=False)
 
 
+@pytest.mark.describe("IoTHubDeviceClient (Synchronous) - .receive_messages()")
+class TestIoTHubDeviceClientReceiveC2DMessages(IoTHubDeviceClientTestsConfig):
+    @pytest.mark.it("Implicitly enables C2D messaging feature if not already enabled")
+    def test_enables_c2d_messaging_only_if_not_already_enabled(
+        self, mocker, client, iothub_pipeline
+    ):
+        mocker.patch.object(SyncClientInbox, "get_many")  # patch this so it won't block
+
+        iothub_pipeline.feature_enabled.__getitem__.return_value = False  # C2D will appear disabled
+        client.receive_messages(10)
+        assert iothub_pipeline.enable_feature.call_count == 1
+        assert iothub_pipeline.enable_feature.call_args[0][0] == constant.C2D_MSG
+
+        iothub_pipeline.enable_feature.reset_mock()
+
+        iothub_pipeline.feature_enabled.__getitem__.return_value = True  # C2D will appear enabled
+        client.receive_messages(10)
+        assert iothub_pipeline.enable_feature.call_count == 0
+
+    @pytest.mark.it("Returns the available messages from the C2D inbox, up to max_messages")
+    def test_returns_messages_from_c2d_inbox(self, client):
+        c2d_inbox = client._inbox_manager.get_c2d_message_inbox()
+        messages = [Message(str(i)) for i in range(3)]
+        for message in messages:
+            c2d_inbox._put(message)
+
+        assert client.receive_messages(2) == messages[:2]
+        assert client.receive_messages(2) == messages[2:]
+
+    @pytest.mark.it("Passes the blocking mode and timeout to the C2D inbox")
+    @pytest.mark.parametrize(
+        "block,timeout",
+        [
+            pytest.param(True, None, id="Blocking, no timeout"),
+            pytest.param(True, 10, id="Blocking with timeout"),
+            pytest.param(False, None, id="Nonblocking"),
+        ],
+    )
+    def test_can_be_called_in_mode(self, mocker, client, block, timeout):
+        inbox_mock = mocker.MagicMock(autospec=SyncClientInbox)
+        mocker.patch.object(client._inbox_manager, "get_c2d_message_inbox", return_value=inbox_mock)
+
+        client.receive_messages(10, block=block, timeout=timeout)
+        assert inbox_mock.get_many.call_args == mocker.call(10, block=block, timeout=timeout)
+
+    @pytest.mark.it(
+        "Raises InboxEmpty exception immediately if there are no messages, in nonblocking mode"
+    )
+    def test_no_message_in_inbox_nonblocking_mode(self, client):
+        with pytest.raises(InboxEmpty):
+            client.receive_messages(10, block=False)
+
+
 @pytest.mark.describe("IoTHubDeviceClient (Synchronous) - .receive_method_request()")
 class TestIoTHubDeviceClientReceiveMethodRequest(
     IoTHubDeviceClientTestsConfig, SharedClientReceiveMethodRequestTests
@@ -990,6 +1426,52 @@ class TestIoTHubDeviceClientReceiveTwinDesiredPropertiesPatch(
     pass
 
 
+@pytest.mark.describe(
+    "IoTHubDeviceClient (Synchronous) - .enable_payload_compression() / .disable_payload_compression()"
+)
+class TestIoTHubDeviceClientPayloadCompression(
+    IoTHubDeviceClientTestsConfig, SharedClientPayloadCompressionTests
+):
+    pass
+
+
+@pytest.mark.describe(
+    "IoTHubDeviceClient (Synchronous) - .enable_telemetry_aggregation() / .disable_telemetry_aggregation()"
+)
+class TestIoTHubDeviceClientTelemetryAggregation(
+    IoTHubDeviceClientTestsConfig, SharedClientTelemetryAggregationTests
+):
+    pass
+
+
+@pytest.mark.describe(
+    "IoTHubDeviceClient (Synchronous) - .enable_rate_limiting() / .disable_rate_limiting()"
+)
+class TestIoTHubDeviceClientRateLimiting(IoTHubDeviceClientTestsConfig, SharedClientRateLimitingTests):
+    pass
+
+
+@pytest.mark.describe(
+    "IoTHubDeviceClient (Synchronous) - .enable_twin_patch_coalescing() / .disable_twin_patch_coalescing()"
+)
+class TestIoTHubDeviceClientTwinPatchCoalescing(
+    IoTHubDeviceClientTestsConfig, SharedClientTwinPatchCoalescingTests
+):
+    pass
+
+
+@pytest.mark.describe("IoTHubDeviceClient (Synchronous) - .telemetry_qos")
+class TestIoTHubDeviceClientTelemetryQos(
+    IoTHubDeviceClientTestsConfig, SharedClientTelemetryQosTests
+):
+    pass
+
+
+@pytest.mark.describe("IoTHubDeviceClient (Synchronous) - .get_statistics()")
+class TestIoTHubDeviceClientStatistics(IoTHubDeviceClientTestsConfig, SharedClientStatisticsTests):
+    pass
+
+
 ################
 # MODULE TESTS #
 ################
@@ -1142,7 +1624,9 @@ class TestIoTHubModuleClientCreateFromEdgeEnvironmentWithContainerEnv(
         client_class.create_from_edge_environment()
 
         assert mock_iothub_pipeline_init.call_count == 1
-        assert mock_iothub_pipeline_init.call_args == mocker.call(mock_auth)
+        assert mock_iothub_pipeline_init.call_args == mocker.call(
+            mock_auth, keep_alive=None, ping_timeout=None, max_round_trip_time=None
+        )
         assert mock_edge_pipeline_init.call_count == 1
         assert mock_edge_pipeline_init.call_args == mocker.call(mock_auth)
 
@@ -1300,9 +1784,13 @@ class TestIoTHubModuleClientCreateFromEdgeEnvironmentWithDebugEnv(IoTHubModuleCl
         client_class.create_from_edge_environment()
 
         assert mock_iothub_pipeline_init.call_count == 1
-        assert mock_iothub_pipeline_init.call_args == mocker.call(mock_auth)
+        assert mock_iothub_pipeline_init.call_args == mocker.call(
+            mock_auth, keep_alive=None, ping_timeout=None, max_round_trip_time=None
+        )
         assert mock_edge_pipeline_init.call_count == 1
-        assert mock_iothub_pipeline_init.call_args == mocker.call(mock_auth)
+        assert mock_iothub_pipeline_init.call_args == mocker.call(
+            mock_auth, keep_alive=None, ping_timeout=None, max_round_trip_time=None
+        )
 
     @pytest.mark.it("Uses the IoTHubPipeline and the EdgePipeline to instantiate the client")
     def test_client_instantiation(
@@ -1433,7 +1921,9 @@ class TestIoTHubModuleClientCreateFromX509Certificate(IoTHubModuleClientTestsCon
         )
 
         assert mock_pipeline_init.call_count == 1
-        assert mock_pipeline_init.call_args == mocker.call(mock_auth)
+        assert mock_pipeline_init.call_args == mocker.call(
+            mock_auth, keep_alive=None, ping_timeout=None, max_round_trip_time=None
+        )
 
     @pytest.mark.it("Uses the IoTHubPipeline to instantiate the client")
     def test_client_instantiation(self, mocker, client_class, x509):
@@ -1466,6 +1956,11 @@ class TestIoTHubModuleClientDisconnect(IoTHubModuleClientTestsConfig, SharedClie
     pass
 
 
+@pytest.mark.describe("IoTHubModuleClient (Synchronous) - .shutdown()")
+class TestIoTHubModuleClientShutdown(IoTHubModuleClientTestsConfig, SharedClientShutdownTests):
+    pass
+
+
 @pytest.mark.describe("IoTHubModuleClient (Synchronous) - EVENT: Disconnect")
 class TestIoTHubModuleClientDisconnectEvent(
     IoTHubModuleClientTestsConfig, SharedClientDisconnectEventTests
@@ -1640,6 +2135,47 @@ class TestIoTHubModuleClientReceiveInputMessage(IoTHubModuleClientTestsConfig):
             client.receive_message_on_input(input_name, block=False)
 
 
+@pytest.mark.describe("IoTHubModuleClient (Synchronous) - .receive_messages_on_input()")
+class TestIoTHubModuleClientReceiveInputMessages(IoTHubModuleClientTestsConfig):
+    @pytest.mark.it("Implicitly enables input messaging feature if not already enabled")
+    def test_enables_input_messaging_only_if_not_already_enabled(
+        self, mocker, client, iothub_pipeline
+    ):
+        mocker.patch.object(SyncClientInbox, "get_many")  # patch this so it won't block
+
+        iothub_pipeline.feature_enabled.__getitem__.return_value = False
+        client.receive_messages_on_input("some_input", 10)
+        assert iothub_pipeline.enable_feature.call_count == 1
+        assert iothub_pipeline.enable_feature.call_args[0][0] == constant.INPUT_MSG
+
+        iothub_pipeline.enable_feature.reset_mock()
+
+        iothub_pipeline.feature_enabled.__getitem__.return_value = True
+        client.receive_messages_on_input("some_input", 10)
+        assert iothub_pipeline.enable_feature.call_count == 0
+
+    @pytest.mark.it(
+        "Returns the available messages from the inbox for the input, up to max_messages"
+    )
+    def test_returns_messages_from_input_inbox(self, client):
+        messages = [Message(str(i)) for i in range(3)]
+        for message in messages:
+            client._inbox_manager.get_input_message_inbox("some_input")._put(message)
+        client._inbox_manager.get_input_message_inbox("other_input")._put(Message("other"))
+
+        assert client.receive_messages_on_input("some_input", 10) == messages
+
+    @pytest.mark.it("Passes the blocking mode and timeout to the input inbox")
+    def test_can_be_called_in_mode(self, mocker, client):
+        inbox_mock = mocker.MagicMock(autospec=SyncClientInbox)
+        mocker.patch.object(
+            client._inbox_manager, "get_input_message_inbox", return_value=inbox_mock
+        )
+
+        client.receive_messages_on_input("some_input", 10, block=False, timeout=None)
+        assert inbox_mock.get_many.call_args == mocker.call(10, block=False, timeout=None)
+
+
 @pytest.mark.describe("IoTHubModuleClient (Synchronous) - .receive_method_request()")
 class TestIoTHubModuleClientReceiveMethodRequest(
     IoTHubModuleClientTestsConfig, SharedClientReceiveMethodRequestTests
@@ -1673,6 +2209,107 @@ class TestIoTHubModuleClientReceiveTwinDesiredPropertiesPatch(
     pass
 
 
+@pytest.mark.describe(
+    "IoTHubModuleClient (Synchronous) - .enable_payload_compression() / .disable_payload_compression()"
+)
+class TestIoTHubModuleClientPayloadCompression(
+    IoTHubModuleClientTestsConfig, SharedClientPayloadCompressionTests
+):
+    pass
+
+
+@pytest.mark.describe(
+    "IoTHubModuleClient (Synchronous) - .enable_telemetry_aggregation() / .disable_telemetry_aggregation()"
+)
+class TestIoTHubModuleClientTelemetryAggregation(
+    IoTHubModuleClientTestsConfig, SharedClientTelemetryAggregationTests
+):
+    pass
+
+
+@pytest.mark.describe(
+    "IoTHubModuleClient (Synchronous) - .enable_rate_limiting() / .disable_rate_limiting()"
+)
+class TestIoTHubModuleClientRateLimiting(IoTHubModuleClientTestsConfig, SharedClientRateLimitingTests):
+    pass
+
+
+@pytest.mark.describe(
+    "IoTHubModuleClient (Synchronous) - .enable_twin_patch_coalescing() / .disable_twin_patch_coalescing()"
+)
+class TestIoTHubModuleClientTwinPatchCoalescing(
+    IoTHubModuleClientTestsConfig, SharedClientTwinPatchCoalescingTests
+):
+    pass
+
+
+@pytest.mark.describe("IoTHubModuleClient (Synchronous) - .telemetry_qos")
+class TestIoTHubModuleClientTelemetryQos(
+    IoTHubModuleClientTestsConfig, SharedClientTelemetryQosTests
+):
+    pass
+
+
+@pytest.mark.describe("IoTHubModuleClient (Synchronous) - .get_statistics()")
+class TestIoTHubModuleClientStatistics(IoTHubModuleClientTestsConfig, SharedClientStatisticsTests):
+    pass
+
+
+@pytest.mark.describe("connect_all() (Synchronous)")
+class TestConnectAll(object):
+    @pytest.fixture
+    def clients(self, mocker):
+        return [mocker.MagicMock() for _ in range(5)]
+
+    @pytest.mark.it("Connects every client")
+    def test_connects_clients(self, clients):
+        sync_clients.connect_all(clients)
+        for client in clients:
+            assert client.connect.call_count == 1
+
+    @pytest.mark.it("Connects clients at the same time, up to max_concurrent_connects")
+    @pytest.mark.parametrize(
+        "max_concurrent_connects", [pytest.param(1, id="One"), pytest.param(3, id="Three")]
+    )
+    def test_concurrency(self, clients, max_concurrent_connects):
+        lock = threading.Lock()
+        counts = {"connecting": 0, "max": 0}
+
+        def connect():
+            with lock:
+                counts["connecting"] += 1
+                counts["max"] = max(counts["max"], counts["connecting"])
+            time.sleep(0.05)
+            with lock:
+                counts["connecting"] -= 1
+
+        for client in clients:
+            client.connect.side_effect = connect
+        sync_clients.connect_all(clients, max_concurrent_connects=max_concurrent_connects)
+
+        assert counts["max"] == max_concurrent_connects
+
+    @pytest.mark.it("Limits the rate at which clients start connecting")
+    def test_rate_limit(self, mocker, clients):
+        mock_bucket = mocker.patch.object(sync_clients, "TokenBucket").return_value
+        sync_clients.connect_all(clients, connections_per_second=20)
+
+        assert sync_clients.TokenBucket.call_args == mocker.call(20)
+        assert mock_bucket.acquire.call_count == len(clients)
+
+    @pytest.mark.it("Raises the error if a client fails to connect, after all clients finish")
+    def test_connect_fails(self, clients):
+        clients[0].connect.side_effect = ValueError()
+        with pytest.raises(ValueError):
+            sync_clients.connect_all(clients)
+        for client in clients:
+            assert client.connect.call_count == 1
+
+    @pytest.mark.it("Does nothing if there are no clients")
+    def test_no_clients(self):
+        sync_clients.connect_all([])
+
+
 ####################
 # HELPER FUNCTIONS #
 ####################
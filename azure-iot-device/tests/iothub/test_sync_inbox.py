@@ -66,6 +66,47 @@ class TestSyncClientInboxPut(object):
         assert item in inbox
 
 
+@pytest.mark.describe("SyncClientInbox - ._put_coalesced()")
+class TestSyncClientInboxPutCoalesced(object):
+    @pytest.mark.it("Adds the given item to the inbox, if the inbox is empty")
+    def test_adds_item_to_empty_inbox(self, mocker):
+        inbox = SyncClientInbox()
+        merge = mocker.MagicMock()
+        inbox._put_coalesced("item", merge)
+
+        assert inbox.qsize() == 1
+        assert "item" in inbox
+        assert merge.call_count == 0
+
+    @pytest.mark.it(
+        "Replaces the last item in the inbox with the result of merging the given item into it"
+    )
+    def test_merges_into_last_item(self, mocker):
+        inbox = SyncClientInbox()
+        inbox._put("item1")
+        inbox._put("item2")
+        merge = mocker.MagicMock(return_value="merged")
+        inbox._put_coalesced("item3", merge)
+
+        assert merge.call_args == mocker.call("item2", "item3")
+        assert inbox.qsize() == 2
+        assert "item1" in inbox
+        assert "merged" in inbox
+        assert "item2" not in inbox
+
+    @pytest.mark.it("Adds the given item after the last item, if they cannot be merged")
+    def test_cannot_merge(self, mocker):
+        inbox = SyncClientInbox()
+        inbox._put("item1")
+        merge = mocker.MagicMock(return_value=None)
+        inbox._put_coalesced("item2", merge)
+
+        assert merge.call_args == mocker.call("item1", "item2")
+        assert inbox.qsize() == 2
+        assert "item1" in inbox
+        assert "item2" in inbox
+
+
 @pytest.mark.describe("SyncClientInbox - .get()")
 class TestSyncClientInboxGet(object):
     @pytest.mark.it("Returns and removes the next item from the inbox, if there is one")
@@ -117,6 +158,58 @@ class TestSyncClientInboxGet(object):
             inbox.get(block=False)
 
 
+@pytest.mark.describe("SyncClientInbox - .get_many()")
+class TestSyncClientInboxGetMany(object):
+    @pytest.mark.it("Returns and removes the available items, in order, up to max_items")
+    def test_returns_up_to_max_items(self):
+        inbox = SyncClientInbox()
+        for item in range(5):
+            inbox._put(item)
+
+        assert inbox.get_many(3) == [0, 1, 2]
+        assert inbox.get_many(3) == [3, 4]
+        assert inbox.empty()
+
+    @pytest.mark.it(
+        "Blocks on an empty inbox until an item is available to remove and return, if using blocking mode"
+    )
+    def test_waits_for_item_in_blocking_mode(self):
+        inbox = SyncClientInbox()
+
+        def insert_item():
+            time.sleep(0.01)  # wait before inserting
+            inbox._put("item")
+
+        insertion_thread = threading.Thread(target=insert_item)
+        insertion_thread.start()
+
+        assert inbox.get_many(10, block=True) == ["item"]
+        insertion_thread.join()
+
+    @pytest.mark.it(
+        "Raises InboxEmpty exception after a timeout while blocking on an empty inbox, if a timeout is specified"
+    )
+    def test_times_out_while_blocking_if_timeout_specified(self):
+        inbox = SyncClientInbox()
+        with pytest.raises(InboxEmpty):
+            inbox.get_many(10, block=True, timeout=0.01)
+
+    @pytest.mark.it(
+        "Raises InboxEmpty exception if the inbox is empty, when using non-blocking mode"
+    )
+    def test_raises_empty_if_inbox_empty_in_non_blocking_mode(self):
+        inbox = SyncClientInbox()
+        with pytest.raises(InboxEmpty):
+            inbox.get_many(10, block=False)
+
+    @pytest.mark.it("Raises a ValueError if max_items is less than 1")
+    def test_invalid_max_items(self):
+        inbox = SyncClientInbox()
+        inbox._put("item")
+        with pytest.raises(ValueError):
+            inbox.get_many(0)
+
+
 @pytest.mark.describe("SyncClientInbox - .clear()")
 class TestSyncClientInboxClear(object):
     @pytest.mark.it("Clears all items from the inbox")
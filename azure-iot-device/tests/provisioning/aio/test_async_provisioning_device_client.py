@@ -170,3 +170,50 @@ class TestClientCallsPollingMachine(object):
 
         assert mock_polling_machine.cancel.call_count == 1
         assert callable(mock_polling_machine.cancel.call_args[1]["callback"])
+
+
+@pytest.mark.describe("ProvisioningDeviceClient - Registration Cache")
+class TestClientRegistrationCache(object):
+    @pytest.fixture
+    def client(self, mocker, mock_polling_machine):
+        mqtt_provisioning_pipeline = mocker.MagicMock()
+        mqtt_provisioning_pipeline.id_scope = fake_id_scope
+        mqtt_provisioning_pipeline.registration_id = fake_registration_id
+        mock_polling_machine_init = mocker.patch(
+            "azure.iot.device.provisioning.aio.async_provisioning_device_client.PollingMachine"
+        )
+        mock_polling_machine_init.return_value = mock_polling_machine
+        return ProvisioningDeviceClient(
+            mqtt_provisioning_pipeline, registration_cache=mocker.MagicMock()
+        )
+
+    @pytest.mark.it("Register returns a cached result without calling the polling machine")
+    async def test_register_cache_hit(self, client, mock_polling_machine):
+        cached_result = create_success_result()
+        client._registration_cache.get.return_value = cached_result
+
+        result = await client.register()
+
+        assert result is cached_result
+        assert mock_polling_machine.register.call_count == 0
+
+    @pytest.mark.it("Register stores an assigned result in the cache after a cache miss")
+    async def test_register_cache_miss(self, mocker, client, mock_polling_machine):
+        client._registration_cache.get.return_value = None
+        assigned_result = RegistrationResult(
+            fake_request_id, fake_operation_id, "assigned", fake_registration_state
+        )
+
+        def register_complete_success_callback(callback):
+            callback(assigned_result)
+
+        mocker.patch.object(
+            mock_polling_machine, "register", side_effect=register_complete_success_callback
+        )
+
+        result = await client.register()
+
+        assert result is assigned_result
+        assert client._registration_cache.set.call_args == (
+            (fake_id_scope, fake_registration_id, assigned_result),
+        )
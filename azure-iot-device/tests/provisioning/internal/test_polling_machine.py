@@ -80,10 +80,10 @@ class TestRegister(object):
     def test_on_subscribe_completed_calls_send_register_request_on_request_response_provider(
         self, mock_polling_machine, mocker
     ):
-        mock_init_uuid = mocker.patch(
-            "azure.iot.device.provisioning.internal.polling_machine.uuid.uuid4"
+        mock_next_request_id = mocker.patch(
+            "azure.iot.device.common.id_generator.RequestIdGenerator.next_id"
         )
-        mock_init_uuid.return_value = fake_request_id
+        mock_next_request_id.return_value = fake_request_id
         mock_init_query_timer = mocker.patch(
             "azure.iot.device.provisioning.internal.polling_machine.Timer"
         )
@@ -126,10 +126,10 @@ class TestRegisterResponse(object):
         # to transition into initializing
         polling_machine.register(callback=MagicMock())
 
-        mock_init_uuid = mocker.patch(
-            "azure.iot.device.provisioning.internal.polling_machine.uuid.uuid4"
+        mock_next_request_id = mocker.patch(
+            "azure.iot.device.common.id_generator.RequestIdGenerator.next_id"
         )
-        mock_init_uuid.return_value = fake_request_id
+        mock_next_request_id.return_value = fake_request_id
         key_value_dict = {}
         key_value_dict["request_id"] = [fake_request_id, " "]
         key_value_dict["retry-after"] = [fake_retry_after, " "]
@@ -138,9 +138,9 @@ class TestRegisterResponse(object):
         polling_machine._on_subscribe_completed()
 
         # reset mock to generate different request id for query
-        mock_init_uuid.reset_mock()
+        mock_next_request_id.reset_mock()
         fake_request_id_query = "Request4567"
-        mock_init_uuid.return_value = fake_request_id_query
+        mock_next_request_id.return_value = fake_request_id_query
 
         fake_payload_result = (
             '{"operationId":"' + fake_operation_id + '","status":"' + fake_assigning_status + '"}'
@@ -191,10 +191,10 @@ class TestRegisterResponse(object):
         mock_callback = MagicMock()
         polling_machine.register(callback=mock_callback)
 
-        mock_init_uuid = mocker.patch(
-            "azure.iot.device.provisioning.internal.polling_machine.uuid.uuid4"
+        mock_next_request_id = mocker.patch(
+            "azure.iot.device.common.id_generator.RequestIdGenerator.next_id"
         )
-        mock_init_uuid.return_value = fake_request_id
+        mock_next_request_id.return_value = fake_request_id
         key_value_dict = {}
         key_value_dict["request_id"] = [fake_request_id, " "]
         key_value_dict["retry-after"] = [fake_retry_after, " "]
@@ -261,10 +261,10 @@ class TestRegisterResponse(object):
         mock_callback = MagicMock()
         polling_machine.register(callback=mock_callback)
 
-        mock_init_uuid = mocker.patch(
-            "azure.iot.device.provisioning.internal.polling_machine.uuid.uuid4"
+        mock_next_request_id = mocker.patch(
+            "azure.iot.device.common.id_generator.RequestIdGenerator.next_id"
         )
-        mock_init_uuid.return_value = fake_request_id
+        mock_next_request_id.return_value = fake_request_id
         key_value_dict = {}
         key_value_dict["request_id"] = [fake_request_id, " "]
 
@@ -305,10 +305,10 @@ class TestRegisterResponse(object):
         mock_callback = MagicMock()
         polling_machine.register(callback=mock_callback)
 
-        mock_init_uuid = mocker.patch(
-            "azure.iot.device.provisioning.internal.polling_machine.uuid.uuid4"
+        mock_next_request_id = mocker.patch(
+            "azure.iot.device.common.id_generator.RequestIdGenerator.next_id"
         )
-        mock_init_uuid.return_value = fake_request_id
+        mock_next_request_id.return_value = fake_request_id
         key_value_dict = {}
         key_value_dict["request_id"] = [fake_request_id, " "]
 
@@ -344,10 +344,10 @@ class TestRegisterResponse(object):
         # to transition into initializing
         polling_machine.register(callback=MagicMock())
 
-        mock_init_uuid = mocker.patch(
-            "azure.iot.device.provisioning.internal.polling_machine.uuid.uuid4"
+        mock_next_request_id = mocker.patch(
+            "azure.iot.device.common.id_generator.RequestIdGenerator.next_id"
         )
-        mock_init_uuid.return_value = fake_request_id
+        mock_next_request_id.return_value = fake_request_id
         key_value_dict = {}
         key_value_dict["request_id"] = [fake_request_id, " "]
         key_value_dict["retry-after"] = [fake_retry_after, " "]
@@ -356,9 +356,9 @@ class TestRegisterResponse(object):
         polling_machine._on_subscribe_completed()
 
         # reset mock to generate different request id for second time register
-        mock_init_uuid.reset_mock()
+        mock_next_request_id.reset_mock()
         fake_request_id_2 = "Request4567"
-        mock_init_uuid.return_value = fake_request_id_2
+        mock_next_request_id.return_value = fake_request_id_2
 
         fake_payload_result = "HelloHogwarts"
 
@@ -397,10 +397,10 @@ class TestRegisterResponse(object):
         mock_callback = MagicMock()
         polling_machine.register(callback=mock_callback)
 
-        mock_init_uuid = mocker.patch(
-            "azure.iot.device.provisioning.internal.polling_machine.uuid.uuid4"
+        mock_next_request_id = mocker.patch(
+            "azure.iot.device.common.id_generator.RequestIdGenerator.next_id"
         )
-        mock_init_uuid.return_value = fake_request_id
+        mock_next_request_id.return_value = fake_request_id
 
         # to transition into registering
         polling_machine._on_subscribe_completed()
@@ -437,10 +437,10 @@ class TestQueryResponse(object):
         # to transition into initializing
         polling_machine.register(callback=MagicMock())
 
-        mock_init_uuid = mocker.patch(
-            "azure.iot.device.provisioning.internal.polling_machine.uuid.uuid4"
+        mock_next_request_id = mocker.patch(
+            "azure.iot.device.common.id_generator.RequestIdGenerator.next_id"
         )
-        mock_init_uuid.return_value = fake_request_id
+        mock_next_request_id.return_value = fake_request_id
         key_value_dict = {}
         key_value_dict["request_id"] = [fake_request_id, " "]
 
@@ -448,9 +448,9 @@ class TestQueryResponse(object):
         polling_machine._on_subscribe_completed()
 
         # reset mock to generate different request id for first query
-        mock_init_uuid.reset_mock()
+        mock_next_request_id.reset_mock()
         fake_request_id_query = "Request4567"
-        mock_init_uuid.return_value = fake_request_id_query
+        mock_next_request_id.return_value = fake_request_id_query
         key_value_dict_2 = {}
         key_value_dict_2["request_id"] = [fake_request_id_query, " "]
 
@@ -473,9 +473,9 @@ class TestQueryResponse(object):
         time_up_call()
 
         # reset mock to generate different request id for second query
-        mock_init_uuid.reset_mock()
+        mock_next_request_id.reset_mock()
         fake_request_id_query_2 = "Request7890"
-        mock_init_uuid.return_value = fake_request_id_query_2
+        mock_next_request_id.return_value = fake_request_id_query_2
 
         fake_query_payload_result = (
             '{"operationId":"' + fake_operation_id + '","status":"' + fake_assigning_status + '"}'
@@ -530,10 +530,10 @@ class TestQueryResponse(object):
         mock_callback = MagicMock()
         polling_machine.register(callback=mock_callback)
 
-        mock_init_uuid = mocker.patch(
-            "azure.iot.device.provisioning.internal.polling_machine.uuid.uuid4"
+        mock_next_request_id = mocker.patch(
+            "azure.iot.device.common.id_generator.RequestIdGenerator.next_id"
         )
-        mock_init_uuid.return_value = fake_request_id
+        mock_next_request_id.return_value = fake_request_id
         key_value_dict = {}
         key_value_dict["request_id"] = [fake_request_id, " "]
 
@@ -541,9 +541,9 @@ class TestQueryResponse(object):
         polling_machine._on_subscribe_completed()
 
         # reset mock to generate different request id for first query
-        mock_init_uuid.reset_mock()
+        mock_next_request_id.reset_mock()
         fake_request_id_query = "Request4567"
-        mock_init_uuid.return_value = fake_request_id_query
+        mock_next_request_id.return_value = fake_request_id_query
         key_value_dict_2 = {}
         key_value_dict_2["request_id"] = [fake_request_id_query, " "]
 
@@ -626,10 +626,10 @@ class TestQueryResponse(object):
         mock_callback = MagicMock()
         polling_machine.register(callback=mock_callback)
 
-        mock_init_uuid = mocker.patch(
-            "azure.iot.device.provisioning.internal.polling_machine.uuid.uuid4"
+        mock_next_request_id = mocker.patch(
+            "azure.iot.device.common.id_generator.RequestIdGenerator.next_id"
         )
-        mock_init_uuid.return_value = fake_request_id
+        mock_next_request_id.return_value = fake_request_id
         key_value_dict = {}
         key_value_dict["request_id"] = [fake_request_id, " "]
 
@@ -637,9 +637,9 @@ class TestQueryResponse(object):
         polling_machine._on_subscribe_completed()
 
         # reset mock to generate different request id for first query
-        mock_init_uuid.reset_mock()
+        mock_next_request_id.reset_mock()
         fake_request_id_query = "Request4567"
-        mock_init_uuid.return_value = fake_request_id_query
+        mock_next_request_id.return_value = fake_request_id_query
         key_value_dict_2 = {}
         key_value_dict_2["request_id"] = [fake_request_id_query, " "]
 
@@ -702,10 +702,10 @@ class TestQueryResponse(object):
         # to transition into initializing
         polling_machine.register(callback=MagicMock())
 
-        mock_init_uuid = mocker.patch(
-            "azure.iot.device.provisioning.internal.polling_machine.uuid.uuid4"
+        mock_next_request_id = mocker.patch(
+            "azure.iot.device.common.id_generator.RequestIdGenerator.next_id"
         )
-        mock_init_uuid.return_value = fake_request_id
+        mock_next_request_id.return_value = fake_request_id
         key_value_dict = {}
         key_value_dict["request_id"] = [fake_request_id, " "]
 
@@ -713,9 +713,9 @@ class TestQueryResponse(object):
         polling_machine._on_subscribe_completed()
 
         # reset mock to generate different request id for first query
-        mock_init_uuid.reset_mock()
+        mock_next_request_id.reset_mock()
         fake_request_id_query = "Request4567"
-        mock_init_uuid.return_value = fake_request_id_query
+        mock_next_request_id.return_value = fake_request_id_query
         key_value_dict_2 = {}
         key_value_dict_2["request_id"] = [fake_request_id_query, " "]
 
@@ -738,9 +738,9 @@ class TestQueryResponse(object):
         time_up_call()
 
         # reset mock to generate different request id for second query
-        mock_init_uuid.reset_mock()
+        mock_next_request_id.reset_mock()
         fake_request_id_query_2 = "Request7890"
-        mock_init_uuid.return_value = fake_request_id_query_2
+        mock_next_request_id.return_value = fake_request_id_query_2
 
         fake_query_payload_result = "HelloHogwarts"
 
@@ -817,10 +817,10 @@ class TestCancel(object):
         # to transition into initializing
         polling_machine.register(callback=MagicMock())
 
-        mock_init_uuid = mocker.patch(
-            "azure.iot.device.provisioning.internal.polling_machine.uuid.uuid4"
+        mock_next_request_id = mocker.patch(
+            "azure.iot.device.common.id_generator.RequestIdGenerator.next_id"
         )
-        mock_init_uuid.return_value = fake_request_id
+        mock_next_request_id.return_value = fake_request_id
         key_value_dict = {}
         key_value_dict["request_id"] = [fake_request_id, " "]
 
@@ -828,9 +828,9 @@ class TestCancel(object):
         polling_machine._on_subscribe_completed()
 
         # reset mock to generate different request id for query
-        mock_init_uuid.reset_mock()
+        mock_next_request_id.reset_mock()
         fake_request_id_query = "Request4567"
-        mock_init_uuid.return_value = fake_request_id_query
+        mock_next_request_id.return_value = fake_request_id_query
         key_value_dict_2 = {}
         key_value_dict_2["request_id"] = [fake_request_id_query, " "]
 
@@ -857,3 +857,62 @@ class TestCancel(object):
         polling_machine._on_disconnect_completed_cancel()
 
         assert mock_cancel_callback.call_count == 1
+
+
+@pytest.mark.describe("PollingMachine - State Machine")
+class TestStateMachine(object):
+    @pytest.mark.it("Starts in the disconnected state")
+    def test_initial_state(self, mock_polling_machine):
+        assert mock_polling_machine.state == "disconnected"
+
+    @pytest.mark.it("Moves to the destination state and passes trigger arguments to callbacks")
+    def test_transition(self, mocker, mock_polling_machine):
+        mock_send = mocker.patch.object(mock_polling_machine, "_send_register_request")
+        mock_polling_machine.state = "initializing"
+
+        mock_polling_machine._trig_send_register_request("arg", kwarg="kwarg")
+
+        assert mock_polling_machine.state == "registering"
+        assert mock_send.call_count == 1
+        event_data = mock_send.call_args[0][0]
+        assert event_data.args == ("arg",)
+        assert event_data.kwargs == {"kwarg": "kwarg"}
+
+    @pytest.mark.it("Runs callbacks without changing state for internal transitions")
+    def test_internal_transition(self, mocker, mock_polling_machine):
+        mock_polling_machine.state = "cancelling"
+        mock_polling_machine._trig_wait()
+        assert mock_polling_machine.state == "cancelling"
+
+    @pytest.mark.it("Raises an error for a trigger which is not valid in the current state")
+    def test_invalid_trigger(self, mock_polling_machine):
+        mock_polling_machine.state = "completed"
+        with pytest.raises(RuntimeError):
+            mock_polling_machine._trig_poll()
+        assert mock_polling_machine.state == "completed"
+
+    @pytest.mark.it("Queues triggers fired from a callback until the current transition completes")
+    def test_queued_trigger(self, mocker, mock_polling_machine):
+        states_seen = []
+
+        def send_register_request(event_data):
+            mock_polling_machine._trig_error()
+            # The nested trigger must not run until this transition has finished
+            states_seen.append(mock_polling_machine.state)
+
+        mocker.patch.object(
+            mock_polling_machine, "_send_register_request", side_effect=send_register_request
+        )
+        mock_call_error = mocker.patch.object(mock_polling_machine, "_call_error")
+        mock_polling_machine.state = "initializing"
+
+        mock_polling_machine._trig_send_register_request()
+
+        assert states_seen == ["initializing"]
+        assert mock_polling_machine.state == "error"
+        assert mock_call_error.call_count == 1
+
+    @pytest.mark.it("Raises the cancel error when there is no registration process")
+    def test_cancel_without_registration(self, mock_polling_machine):
+        with pytest.raises(RuntimeError):
+            mock_polling_machine.cancel()
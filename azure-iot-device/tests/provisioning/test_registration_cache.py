@@ -0,0 +1,116 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for
+# license information.
+# --------------------------------------------------------------------------
+import pytest
+import logging
+import os
+from azure.iot.device.provisioning.registration_cache import RegistrationCache
+from azure.iot.device.provisioning.models.registration_result import (
+    RegistrationResult,
+    RegistrationState,
+)
+
+logging.basicConfig(level=logging.INFO)
+
+fake_registration_id = "MyPensieve"
+fake_id_scope = "Enchanted0000Ceiling7898"
+fake_other_registration_id = "MyRemembrall"
+fake_request_id = "request_1234"
+fake_operation_id = "quidditch_world_cup"
+fake_device_id = "MyNimbus2000"
+fake_assigned_hub = "Dumbledore'sArmy"
+fake_sub_status = "FlyingOnHippogriff"
+fake_created_dttm = "2020-05-17"
+fake_last_update_dttm = "2020-10-17"
+fake_etag = "HighQualityFlyingBroom"
+
+
+def create_result(status="assigned"):
+    registration_state = RegistrationState(
+        fake_device_id,
+        fake_assigned_hub,
+        fake_sub_status,
+        fake_created_dttm,
+        fake_last_update_dttm,
+        fake_etag,
+    )
+    return RegistrationResult(fake_request_id, fake_operation_id, status, registration_state)
+
+
+@pytest.fixture
+def cache_path(tmpdir):
+    return str(tmpdir.join("registration_cache.json"))
+
+
+@pytest.fixture
+def cache(cache_path):
+    return RegistrationCache(cache_path)
+
+
+@pytest.mark.describe("RegistrationCache")
+class TestRegistrationCache(object):
+    @pytest.mark.it("Returns None when the cache file does not exist")
+    def test_get_missing_file(self, cache):
+        assert cache.get(fake_id_scope, fake_registration_id) is None
+
+    @pytest.mark.it("Returns a stored result with all of its registration state")
+    def test_set_then_get(self, cache):
+        cache.set(fake_id_scope, fake_registration_id, create_result())
+        result = cache.get(fake_id_scope, fake_registration_id)
+
+        assert result.request_id == fake_request_id
+        assert result.operation_id == fake_operation_id
+        assert result.status == "assigned"
+        assert result.registration_state.device_id == fake_device_id
+        assert result.registration_state.assigned_hub == fake_assigned_hub
+        assert result.registration_state.sub_status == fake_sub_status
+        assert result.registration_state.created_date_time == fake_created_dttm
+        assert result.registration_state.last_update_date_time == fake_last_update_dttm
+        assert result.registration_state.etag == fake_etag
+
+    @pytest.mark.it("Persists results across cache instances")
+    def test_persists(self, cache, cache_path):
+        cache.set(fake_id_scope, fake_registration_id, create_result())
+        result = RegistrationCache(cache_path).get(fake_id_scope, fake_registration_id)
+        assert result.registration_state.assigned_hub == fake_assigned_hub
+
+    @pytest.mark.it("Keys results by ID scope and registration ID")
+    def test_keyed(self, cache):
+        cache.set(fake_id_scope, fake_registration_id, create_result())
+        assert cache.get(fake_id_scope, fake_other_registration_id) is None
+        assert cache.get("OtherScope", fake_registration_id) is None
+
+    @pytest.mark.it("Raises ValueError when asked to store a result that is not assigned")
+    @pytest.mark.parametrize("status", ["assigning", "failed", "disabled"])
+    def test_set_unassigned(self, cache, status):
+        with pytest.raises(ValueError):
+            cache.set(fake_id_scope, fake_registration_id, create_result(status))
+
+    @pytest.mark.it("Removes only the result for the given registration")
+    def test_remove(self, cache):
+        cache.set(fake_id_scope, fake_registration_id, create_result())
+        cache.set(fake_id_scope, fake_other_registration_id, create_result())
+        cache.remove(fake_id_scope, fake_registration_id)
+
+        assert cache.get(fake_id_scope, fake_registration_id) is None
+        assert cache.get(fake_id_scope, fake_other_registration_id) is not None
+
+    @pytest.mark.it("Does not raise when removing a result that is not cached")
+    def test_remove_missing(self, cache):
+        cache.remove(fake_id_scope, fake_registration_id)
+
+    @pytest.mark.it("Treats a corrupt cache file as empty")
+    def test_corrupt_file(self, cache, cache_path):
+        with open(cache_path, "w") as f:
+            f.write("{not json")
+        assert cache.get(fake_id_scope, fake_registration_id) is None
+        cache.set(fake_id_scope, fake_registration_id, create_result())
+        assert cache.get(fake_id_scope, fake_registration_id) is not None
+
+    @pytest.mark.it("Does not leave a temporary file behind after writing")
+    def test_no_temp_file(self, cache, cache_path):
+        cache.set(fake_id_scope, fake_registration_id, create_result())
+        assert os.path.exists(cache_path)
+        assert not os.path.exists(cache_path + ".tmp")
@@ -0,0 +1,89 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for
+# license information.
+# --------------------------------------------------------------------------
+import pytest
+import sys
+import subprocess
+
+lazy_imports_only = pytest.mark.skipif(
+    sys.version_info < (3, 7), reason="Lazy imports require Python 3.7+"
+)
+
+
+def get_modules_loaded_by(statement):
+    """Run an import statement in a fresh interpreter and return the modules it loaded"""
+    script = "import sys\n{}\nprint('\\n'.join(sys.modules))".format(statement)
+    output = subprocess.check_output([sys.executable, "-c", script])
+    return set(output.decode("utf-8").splitlines())
+
+
+@pytest.mark.describe("azure.iot.device package")
+class TestPackageImports(object):
+    @pytest.mark.it("Does not import any subpackages when the package is imported")
+    @lazy_imports_only
+    def test_import_package(self):
+        modules = get_modules_loaded_by("import azure.iot.device")
+        assert "azure.iot.device.iothub" not in modules
+        assert "azure.iot.device.provisioning" not in modules
+        assert "paho" not in modules
+
+    @pytest.mark.it(
+        "Does not import provisioning, requests or the async modules for IoT Hub clients"
+    )
+    @lazy_imports_only
+    def test_import_iothub_client(self):
+        modules = get_modules_loaded_by("from azure.iot.device import IoTHubDeviceClient")
+        assert "azure.iot.device.iothub" in modules
+        assert "azure.iot.device.provisioning" not in modules
+        assert "azure.iot.device.iothub.aio" not in modules
+        assert "requests" not in modules
+
+    @pytest.mark.it("Exposes all public names and subpackages as attributes")
+    @pytest.mark.parametrize(
+        "name",
+        [
+            "IoTHubDeviceClient",
+            "IoTHubModuleClient",
+            "Message",
+            "InboxEmpty",
+            "MethodResponse",
+            "RateLimits",
+            "decode_timeseries",
+            "connect_all",
+            "ProvisioningDeviceClient",
+            "RegistrationResult",
+            "RegistrationCache",
+            "X509",
+            "shutdown_executors",
+            "iothub",
+            "provisioning",
+            "common",
+        ],
+    )
+    def test_public_names(self, name):
+        import azure.iot.device
+
+        assert getattr(azure.iot.device, name) is not None
+
+    @pytest.mark.it("Raises AttributeError for an unknown name")
+    def test_unknown_name(self):
+        import azure.iot.device
+
+        with pytest.raises(AttributeError):
+            azure.iot.device.Horcrux
+
+    @pytest.mark.it("Exposes the asynchronous clients from the aio package")
+    def test_aio_public_names(self):
+        from azure.iot.device import aio
+        from azure.iot.device.iothub.aio import async_clients
+        from azure.iot.device.provisioning.aio import async_provisioning_device_client
+
+        assert aio.IoTHubDeviceClient is async_clients.IoTHubDeviceClient
+        assert aio.IoTHubModuleClient is async_clients.IoTHubModuleClient
+        assert aio.connect_all is async_clients.connect_all
+        assert (
+            aio.ProvisioningDeviceClient
+            is async_provisioning_device_client.ProvisioningDeviceClient
+        )
@@ -0,0 +1,56 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for
+# license information.
+# --------------------------------------------------------------------------
+"""Benchmark the time it takes to import the azure.iot.device package.
+
+Each statement is run in a fresh interpreter, so module caching does not affect the results.
+
+Usage:
+    python scripts/measure_import_time.py [--runs N]
+"""
+
+import argparse
+import subprocess
+import sys
+
+STATEMENTS = [
+    "import azure.iot.device",
+    "from azure.iot.device import IoTHubDeviceClient",
+    "from azure.iot.device import ProvisioningDeviceClient",
+    "from azure.iot.device.aio import IoTHubDeviceClient",
+]
+
+TIMER_SCRIPT = """
+import time
+start = time.perf_counter()
+{statement}
+print(time.perf_counter() - start)
+"""
+
+
+def measure(statement, runs):
+    timings = []
+    for _ in range(runs):
+        output = subprocess.check_output(
+            [sys.executable, "-c", TIMER_SCRIPT.format(statement=statement)]
+        )
+        timings.append(float(output.decode("utf-8").strip().splitlines()[-1]))
+    timings.sort()
+    return timings[0], timings[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure azure.iot.device import time")
+    parser.add_argument("--runs", type=int, default=10, help="number of runs per statement")
+    args = parser.parse_args()
+
+    print("{:<60} {:>10} {:>10}".format("statement", "min (ms)", "median (ms)"))
+    for statement in STATEMENTS:
+        best, median = measure(statement, args.runs)
+        print("{:<60} {:>10.1f} {:>10.1f}".format(statement, best * 1000, median * 1000))
+
+
+if __name__ == "__main__":
+    main()